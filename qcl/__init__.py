@@ -1,10 +1,15 @@
 from dataclasses import dataclass
 import json
+import typing as t
 
 from . import config
 from . import panic
 from . import feedback as fb
 from . import ast2
+from . import qy_parser
+from . import disk_cache
+from . import session
+from . import const_fold
 from . import typer
 from . import cpp_emitter
 from . import base_emitter
@@ -17,18 +22,66 @@ from . import main
 class TranspileOptions:
     print_summary_after_run: bool = config.COMPILER_IN_DEBUG_MODE
     run_debug_routine_after_compilation: bool = config.COMPILER_IN_DEBUG_MODE
+    parse_mode: qy_parser.ParseMode = qy_parser.ParseMode.SllThenLl
+
+    # if set, parsed source files, translated C headers, parsed C headers (libclang ASTs), and typed definitions are
+    # cached in this directory across runs.
+    opt_cache_dir_path: t.Optional[str] = None
+
+    # the number of worker processes used to parse source files, and of worker threads used to load packages.
+    job_count: int = 1
+
+    # if set, each source file is parsed one top-level statement at a time while the typer seeds it.
+    stream_parse: bool = False
+
+    # how the typer solves type variables: cf `typer.TyperEngine`
+    typer_engine: typer.TyperEngine = typer.TyperEngine.Substitution
+
+    # if set, constant expressions are folded into literals before emission: cf `const_fold`
+    fold_constants: bool = True
 
 
 def transpile_one_package_set(path_to_input_root_qyp_file: str, emitter: base_emitter.BaseEmitter, transpile_opts: TranspileOptions):
+    """
+    Transpiles a package set in a fresh compilation session (cf `session`), which is closed once done: nothing from
+    this compilation outlives it but the cache directory, so one process can run many compilations.
+    """
     assert isinstance(path_to_input_root_qyp_file, str)
     assert isinstance(emitter, base_emitter.BaseEmitter)
 
+    with session.CompilationSession():
+        help_transpile_one_package_set(path_to_input_root_qyp_file, emitter, transpile_opts)
+
+
+def help_transpile_one_package_set(path_to_input_root_qyp_file: str, emitter: base_emitter.BaseEmitter, transpile_opts: TranspileOptions):
+
     # FIXME: auto-detect target platform
     target_platform = platform.core_linux_amd64
     # target_platform = platform.core_windows_amd64
     # target_platform = platform.core_macos_amd64
 
-    qyp_set = ast2.QypSet.load(path_to_input_root_qyp_file, target_platform)
+    parse_opts = qy_parser.ParseOptions(
+        mode=transpile_opts.parse_mode,
+        opt_ast_cache=(
+            disk_cache.DiskCache(transpile_opts.opt_cache_dir_path, "ast1")
+            if transpile_opts.opt_cache_dir_path is not None else
+            None
+        ),
+        opt_c_header_cache=(
+            disk_cache.DiskCache(transpile_opts.opt_cache_dir_path, "c_headers")
+            if transpile_opts.opt_cache_dir_path is not None else
+            None
+        ),
+        opt_c_ast_cache=(
+            disk_cache.DiskCache(transpile_opts.opt_cache_dir_path, "c_asts")
+            if transpile_opts.opt_cache_dir_path is not None else
+            None
+        ),
+        job_count=transpile_opts.job_count,
+        streaming=transpile_opts.stream_parse
+    )
+
+    qyp_set = ast2.QypSet.load(path_to_input_root_qyp_file, target_platform, parse_opts)
     if qyp_set is None:
         panic.because(
             panic.ExitCode.BadProjectFile,
@@ -51,12 +104,23 @@ def transpile_one_package_set(path_to_input_root_qyp_file: str, emitter: base_em
 
         # typing native source files:
         # - two distinct passes: seeding and modelling
-        typer.type_one_qyp_set(qyp_set)
+        typer.type_one_qyp_set(
+            qyp_set,
+            transpile_opts.typer_engine,
+            opt_typed_scc_cache=(
+                disk_cache.DiskCache(transpile_opts.opt_cache_dir_path, "typed_sccs")
+                if transpile_opts.opt_cache_dir_path is not None else
+                None
+            )
+        )
 
         # TODO: run post-typing checks
         # - e.g. check that 'main' has the correct signature.
 
         # compile-time evaluation:
+        if transpile_opts.fold_constants:
+            folded_node_count = const_fold.fold_constants_in_qyp_set(qyp_set)
+            print(f"INFO: Folded {folded_node_count} constant expression node(s)")
 
         # emitting:
         emitter.emit_qyp_set(qyp_set)
@@ -1,6 +1,9 @@
-from antlr4 import FileStream, CommonTokenStream, PredictionMode
+from antlr4 import FileStream, InputStream, CommonTokenStream, PredictionMode, Token
 from antlr4 import ParserRuleContext
+from antlr4.ListTokenSource import ListTokenSource
 from antlr4.error.ErrorListener import ErrorListener as ANTLR4ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 
 from .grammars.QySourceFileLexer import QySourceFileLexer
 from .grammars.QySourceFileParser import QySourceFileParser
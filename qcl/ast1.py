@@ -3,12 +3,13 @@
 """
 
 import abc
+import functools
 import typing as t
 import enum
-from collections import defaultdict
 
 from . import common
 from . import feedback as fb
+from . import session
 
 if t.TYPE_CHECKING:
     from . import typer
@@ -85,6 +86,8 @@ class LinearTypeOp(enum.Enum):
 #
 
 class BaseFileNode(object, metaclass=abc.ABCMeta):
+    __slots__ = ('loc', 'wb_ctx')
+
     def __init__(self, loc: fb.ILoc):
         super().__init__()
         self.loc = loc
@@ -96,18 +99,33 @@ class BaseFileNode(object, metaclass=abc.ABCMeta):
 
 
 class WbTypeMixin(common.Mixin):
-    all = []
+    __slots__ = ()
+
+    # every typed node is tracked by the current compilation session (cf `session.CompilationSession`), which also
+    # holds the session's `ast_node_sub_index`: an index of free variables to expressions in which they occur.
+    # it is updated and used by 'apply_sub_everywhere', so that only nodes whose types mention a substituted variable
+    # are rewritten.
+    # NOTE: a node may also be listed under variables its type no longer mentions (e.g. if its type was reassigned):
+    # such entries are harmless, since rewriting the node then leaves its type unchanged.
 
-    # sub_index is an index of free variables to expressions in which they occur.
-    # it is updated and used by 'apply_sub_everywhere'
-    sub_index = defaultdict(list)
-    
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self._wb_type = None
 
-        WbTypeMixin.all.append(self)
+        session.current().typed_ast_node_list.append(self)
         
+    def __setstate__(self, state):
+        # nodes restored by `pickle` (e.g. from the AST cache) bypass `__init__`, but must still be tracked.
+        # slotted objects are pickled as a `(dict_state, slots_state)` pair.
+        opt_dict_state, slots_state = state
+        assert opt_dict_state is None
+        for attr_name, attr_value in slots_state.items():
+            setattr(self, attr_name, attr_value)
+        current_session = session.current()
+        current_session.typed_ast_node_list.append(self)
+        if self._wb_type is not None:
+            WbTypeMixin.index_ast_node(current_session.ast_node_sub_index, self)
+
     @property
     def wb_type(self):
         return self._wb_type
@@ -115,32 +133,50 @@ class WbTypeMixin(common.Mixin):
     @wb_type.setter
     def wb_type(self, new_type):
         self._wb_type = new_type
-        WbTypeMixin.index_ast_node(WbTypeMixin.sub_index, self)
+        WbTypeMixin.index_ast_node(session.current().ast_node_sub_index, self)
 
     @staticmethod
-    def index_ast_node(new_index, ast_node):
+    def index_ast_node(new_index, ast_node, opt_free_vars=None):
         assert ast_node._wb_type is not None
-        for t in ast_node._wb_type.oc_free_vars:
+        for t in (opt_free_vars if opt_free_vars is not None else ast_node._wb_type.oc_free_vars):
             new_index[t].append(ast_node)
 
     @staticmethod
     def apply_sub_everywhere(sub):
-        new_index = defaultdict(list)
-        
-        for ast_node in WbTypeMixin.all:
-            if ast_node._wb_type is not None:
-                ast_node._wb_type = sub.rewrite_type(ast_node._wb_type)
-                WbTypeMixin.index_ast_node(new_index, ast_node)
-
-        WbTypeMixin.sub_index = new_index
+        # only the nodes indexed under a substituted variable can change: their entries are removed from the index,
+        # and each node is re-indexed under the variables its rewritten type introduces.
+        # (entries for variables that are not substituted stay valid, since rewriting leaves these variables in place)
+        sub_index = session.current().ast_node_sub_index
+        affected_node_map = {}
+        for var in sub.oc_sub_map_keys:
+            for ast_node in sub_index.pop(var, ()):
+                affected_node_map[id(ast_node)] = ast_node
+
+        for ast_node in affected_node_map.values():
+            old_type = ast_node._wb_type
+            new_type = sub.rewrite_type(old_type)
+            if new_type is not old_type:
+                ast_node._wb_type = new_type
+                WbTypeMixin.index_ast_node(
+                    sub_index, ast_node,
+                    [
+                        var
+                        for var in new_type.oc_free_vars
+                        if var not in old_type.oc_free_vars or var in sub.oc_sub_map_keys
+                    ]
+                )
 
 
 class BaseTypeSpec(WbTypeMixin, BaseFileNode):
+    __slots__ = ('_wb_type',)
+
     def __init__(self, loc: fb.ILoc):
         super().__init__(loc)
 
 
 class BaseExpression(WbTypeMixin, BaseFileNode):
+    __slots__ = ('_wb_type', 'opt_cached_const_value', 'cache_valid')
+
     def __init__(self, loc: fb.ILoc):
         super().__init__(loc)
         self.opt_cached_const_value = None
@@ -148,11 +184,15 @@ class BaseExpression(WbTypeMixin, BaseFileNode):
 
 
 class BaseStatement(BaseFileNode):
+    __slots__ = ()
+
     def __init__(self, loc: fb.ILoc):
         super().__init__(loc)
 
 
 class MIdQualifierNode(common.Mixin):
+    __slots__ = ()
+
     def __init__(self, name: str, *args, **kwargs) -> None:
         assert isinstance(self, BaseFileNode)
         super().__init__(*args, **kwargs)
@@ -173,11 +213,15 @@ class MIdQualifierNode(common.Mixin):
 #
 
 class BaseIdQualifierStatement(MIdQualifierNode, BaseStatement):
+    __slots__ = ('name',)
+
     def __init__(self, loc: fb.ILoc, name: str):
         super().__init__(name, loc)
 
 
 class Bind1vStatement(BaseIdQualifierStatement):
+    __slots__ = ('initializer', 'is_constant')
+
     def __init__(self, loc: fb.ILoc, name: str, initializer: t.Optional[BaseExpression], is_constant: bool = False):
         super().__init__(loc, name)
         self.initializer = initializer
@@ -185,6 +229,8 @@ class Bind1vStatement(BaseIdQualifierStatement):
 
 
 class Bind1fStatement(BaseIdQualifierStatement):
+    __slots__ = ('args_names', 'args_types', 'body_exp', 'opt_ret_ts', 'is_variadic', 'is_pub', 'x_def')
+
     def __init__(
         self, 
         loc: fb.ILoc, 
@@ -213,6 +259,8 @@ class Bind1fStatement(BaseIdQualifierStatement):
 
 
 class Extern1vStatement(Bind1vStatement):
+    __slots__ = ('var_type_spec', 'extern_notation')
+
     def __init__(self, loc, var_name: str, var_ts: "BaseTypeSpec", var_str):
         super().__init__(loc, var_name, None)
         self.var_type_spec = var_ts
@@ -223,6 +271,8 @@ class Extern1vStatement(Bind1vStatement):
 
 
 class Extern1fStatement(Bind1fStatement):
+    __slots__ = ('extern_notation',)
+
     def __init__(
         self, loc: fb.ILoc, 
         name: str, arg_names: t.List[str], arg_typespecs: t.List["BaseTypeSpec"], ret_typespec: "BaseTypeSpec",
@@ -237,12 +287,16 @@ class Extern1fStatement(Bind1fStatement):
 
 
 class Bind1tStatement(BaseIdQualifierStatement):
+    __slots__ = ('initializer',)
+
     def __init__(self, loc: fb.ILoc, name: str, initializer: BaseTypeSpec):
         super().__init__(loc, name)
         self.initializer = initializer
 
 
 class ConstStatement(BaseStatement):
+    __slots__ = ('body', 'const_type_spec', 'wb_ctx_chain', 'wb_synth_pred_binders')
+
     def __init__(self, loc: fb.ILoc, body: t.List[BaseStatement], const_type_spec: "BaseTypeSpec"):
         super().__init__(loc)
         self.loc = loc
@@ -263,6 +317,8 @@ class ConstStatement(BaseStatement):
 
 
 class ReturnStatement(BaseStatement):
+    __slots__ = ('returned_exp', 'is_shallow')
+
     def __init__(self, loc, returned_exp: BaseExpression, is_shallow=True):
         super().__init__(loc)
         self.returned_exp = returned_exp
@@ -270,6 +326,8 @@ class ReturnStatement(BaseStatement):
 
 
 class DiscardStatement(BaseStatement):
+    __slots__ = ('discarded_exp',)
+
     def __init__(self, loc: fb.ILoc, discarded_exp: BaseExpression):
         super().__init__(loc)
         self.discarded_exp = discarded_exp
@@ -281,6 +339,8 @@ class LoopStyle(enum.Enum):
 
 
 class LoopStatement(BaseStatement):
+    __slots__ = ('cond', 'body', 'loop_style')
+
     def __init__(self, loc: fb.ILoc, cond: BaseExpression, body: BaseExpression, loop_style: LoopStyle):
         super().__init__(loc)
         self.cond = cond
@@ -295,6 +355,8 @@ class LoopStatement(BaseStatement):
 #
 
 class BaseNumberExpression(BaseExpression):
+    __slots__ = ('text', 'value', 'width_in_bits')
+
     def __init__(self, loc: fb.ILoc, text: str, value: t.Union[int, float], width_in_bits: int):
         super().__init__(loc)
         self.text = text
@@ -303,6 +365,8 @@ class BaseNumberExpression(BaseExpression):
 
 
 class IntExpression(BaseNumberExpression):
+    __slots__ = ('text_base', 'is_unsigned')
+
     def __init__(
             self,
             loc: fb.ILoc,
@@ -320,6 +384,8 @@ class IntExpression(BaseNumberExpression):
 
 
 class FloatExpression(BaseNumberExpression):
+    __slots__ = ()
+
     def __init__(self, loc: fb.ILoc, text: str, value: float, width_in_bits=64):
         super().__init__(loc, text, value, width_in_bits)
         self.value: float
@@ -327,6 +393,8 @@ class FloatExpression(BaseNumberExpression):
 
 
 class StringExpression(BaseExpression):
+    __slots__ = ('pieces', 'value')
+
     def __init__(self, loc: fb.ILoc, pieces: t.List[str], value: str):
         super().__init__(loc)
         self.pieces = pieces
@@ -335,11 +403,15 @@ class StringExpression(BaseExpression):
 
 
 class IdRefExpression(MIdQualifierNode, BaseExpression):
+    __slots__ = ('name',)
+
     def __init__(self, loc: fb.ILoc, name: str):
         super().__init__(name, loc)
 
 
 class IfExpression(BaseExpression):
+    __slots__ = ('cond_exp', 'then_exp', 'else_exp')
+
     def __init__(
         self, 
         loc: fb.ILoc, 
@@ -354,6 +426,8 @@ class IfExpression(BaseExpression):
 
 
 class LambdaExpression(BaseExpression):
+    __slots__ = ('arg_names', 'body_prefix', 'opt_body_tail', 'no_closure')
+
     def __init__(
         self, loc: fb.ILoc, 
         opt_arg_names: t.Optional[t.List[str]],
@@ -369,6 +443,8 @@ class LambdaExpression(BaseExpression):
 
 
 class ProcCallExpression(BaseExpression):
+    __slots__ = ('proc', 'arg_exps')
+
     def __init__(self, loc: fb.ILoc, proc: BaseExpression, arg_exps: t.List[BaseExpression]):
         super().__init__(loc)
         self.proc = proc
@@ -381,6 +457,8 @@ class ConstructExpression(BaseExpression):
     Returns the value de-referencing this stack pointer.
     """
 
+    __slots__ = ('made_ts', 'initializer_list')
+
     def __init__(self, loc: fb.ILoc, made_ts: BaseTypeSpec, initializer_list: t.List[BaseExpression]):
         super().__init__(loc)
         self.made_ts = made_ts
@@ -392,6 +470,8 @@ class CopyExpression(BaseExpression):
     Allocates memory, then copies a value to this memory. Returns the pointer to memory.
     """
 
+    __slots__ = ('copied_val', 'allocator', 'is_mut')
+
     class Allocator(enum.Enum):
         Push = enum.auto()  # allocates object on the stack, returns [possibly mutable] pointer
         Heap = enum.auto()  # allocates object on the stack, returns [possibly mutable] pointer
@@ -404,6 +484,8 @@ class CopyExpression(BaseExpression):
 
 
 class DotIdExpression(BaseExpression):
+    __slots__ = ('container', 'key')
+
     def __init__(self, loc: fb.ILoc, container: BaseExpression, key: str):
         super().__init__(loc)
         self.container = container
@@ -411,6 +493,8 @@ class DotIdExpression(BaseExpression):
 
 
 class IndexExpression(BaseExpression):
+    __slots__ = ('container', 'index', 'ret_ref')
+
     def __init__(self, loc: fb.ILoc, container: BaseExpression, index: BaseExpression, ret_ref: bool):
         super().__init__(loc)
         self.container = container
@@ -419,6 +503,8 @@ class IndexExpression(BaseExpression):
 
 
 class UnaryOpExpression(BaseExpression):
+    __slots__ = ('operator', 'operand')
+
     def __init__(self, loc: fb.ILoc, operator: UnaryOperator, operand: BaseExpression):
         super().__init__(loc)
         self.operator = operator
@@ -426,6 +512,8 @@ class UnaryOpExpression(BaseExpression):
 
 
 class BinaryOpExpression(BaseExpression):
+    __slots__ = ('operator', 'lt_operand_exp', 'rt_operand_exp')
+
     def __init__(self, loc: fb.ILoc, operator: BinaryOperator, lt_operand: BaseExpression, rt_operand: BaseExpression):
         super().__init__(loc)
         self.operator = operator
@@ -433,6 +521,8 @@ class BinaryOpExpression(BaseExpression):
         self.rt_operand_exp = rt_operand
 
 class UpdateExpression(BaseExpression):
+    __slots__ = ('store_address', 'stored_value')
+
     def __init__(self, loc: fb.ILoc, store_address: BaseExpression, stored_value: BaseExpression):
         super().__init__(loc)
         self.store_address = store_address
@@ -446,11 +536,15 @@ class UpdateExpression(BaseExpression):
 #
 
 class IdRefTypeSpec(MIdQualifierNode, BaseTypeSpec):
+    __slots__ = ('name',)
+
     def __init__(self, loc: fb.ILoc, name: str):
         super().__init__(name, loc)
 
 
 class BuiltinPrimitiveTypeSpec(BaseTypeSpec):
+    __slots__ = ('identity',)
+
     def __init__(self, loc: fb.ILoc, identity: BuiltinPrimitiveTypeIdentity):
         super().__init__(loc)
         self.identity = identity
@@ -479,6 +573,8 @@ class BuiltinPrimitiveTypeSpec(BaseTypeSpec):
 
 
 class AdtTypeSpec(BaseTypeSpec):
+    __slots__ = ('linear_op', 'fields_list', 'fields_dict')
+
     def __init__(self, loc: fb.ILoc, linear_op: LinearTypeOp, args: t.List[t.Tuple[OptStr, BaseTypeSpec]]):
         super().__init__(loc)
         self.linear_op = linear_op
@@ -502,6 +598,8 @@ class AdtTypeSpec(BaseTypeSpec):
 
 
 class PtrTypeSpec(BaseTypeSpec):
+    __slots__ = ('pointee_type_spec', 'is_mut')
+
     def __init__(self, loc: fb.ILoc, pointee_type_spec: BaseTypeSpec, is_mut: bool):
         super().__init__(loc)
         self.pointee_type_spec = pointee_type_spec
@@ -509,6 +607,8 @@ class PtrTypeSpec(BaseTypeSpec):
 
 
 class ArrayTypeSpec(BaseTypeSpec):
+    __slots__ = ('element_type_spec', 'count_expression', 'is_mut')
+
     def __init__(self, loc: fb.ILoc, element_type_spec: BaseTypeSpec, count_expression: BaseExpression, is_mut: bool):
         super().__init__(loc)
         self.element_type_spec = element_type_spec
@@ -517,6 +617,8 @@ class ArrayTypeSpec(BaseTypeSpec):
 
 
 class ArrayBoxTypeSpec(BaseTypeSpec):
+    __slots__ = ('element_type_spec', 'is_mut')
+
     def __init__(self, loc: fb.ILoc, element_type_spec: BaseTypeSpec, is_mut: bool):
         super().__init__(loc)
         self.element_type_spec = element_type_spec
@@ -524,6 +626,8 @@ class ArrayBoxTypeSpec(BaseTypeSpec):
 
 
 class ProcSignatureTypeSpec(BaseTypeSpec):
+    __slots__ = ('opt_args_list', 'ret_ts', 'takes_closure', 'is_c_variadic')
+
     def __init__(
         self, 
         loc: fb.ILoc, 
@@ -537,3 +641,75 @@ class ProcSignatureTypeSpec(BaseTypeSpec):
         self.ret_ts = ret_ts
         self.takes_closure = takes_closure
         self.is_c_variadic = is_c_variadic
+
+
+#
+#
+# Structural comparison:
+#
+#
+
+# attributes written back by the typer and later passes: these are not part of the parsed structure.
+non_structural_attr_names = {
+    'wb_ctx', '_wb_type', 'x_def', 'wb_ctx_chain', 'wb_synth_pred_binders',
+    'opt_cached_const_value', 'cache_valid'
+}
+
+
+@functools.lru_cache(maxsize=None)
+def structural_attr_names(node_class: type) -> t.Tuple[str, ...]:
+    return tuple(sorted(
+        attr_name
+        for base_class in node_class.__mro__
+        for attr_name in base_class.__dict__.get('__slots__', ())
+        if attr_name != 'loc' and attr_name not in non_structural_attr_names
+    ))
+
+
+def iter_subtree_nodes(root: t.Any) -> t.Iterator[BaseFileNode]:
+    """
+    Yields every node in an AST (sub)tree (or a list of trees) exactly once, in no particular order, following the
+    same (structural) attributes as `dump_tree`.
+    """
+    visited_node_ids = set()
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, BaseFileNode):
+            if id(item) in visited_node_ids:
+                continue
+            visited_node_ids.add(id(item))
+            yield item
+            for attr_name in structural_attr_names(item.__class__):
+                opt_attr_value = getattr(item, attr_name, None)
+                if opt_attr_value is not None:
+                    stack.append(opt_attr_value)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+
+
+def dump_tree(node: t.Any) -> t.Any:
+    """
+    Returns a hashable, structural rendering of an AST (sub)tree, including locations but excluding writeback
+    properties. Two trees (e.g. produced by different parsing strategies) have the same structure iff their dumps
+    compare equal.
+    """
+    if isinstance(node, BaseFileNode):
+        return (
+            node.__class__.__name__,
+            str(node.loc),
+            tuple(
+                (attr_name, dump_tree(attr_value))
+                for attr_name in structural_attr_names(node.__class__)
+                if hasattr(node, attr_name)
+                for attr_value in [getattr(node, attr_name)]
+            )
+        )
+    elif isinstance(node, (list, tuple)):
+        return tuple(map(dump_tree, node))
+    elif isinstance(node, dict):
+        return tuple((key, dump_tree(value)) for key, value in node.items())
+    else:
+        return node
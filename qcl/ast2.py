@@ -13,9 +13,14 @@ BaseQyp is a base qy package: it includes...
 """
 
 import abc
+import concurrent.futures
+import contextlib
+import contextvars
 import functools
+import io
 import os.path
 import json
+import threading
 import typing as t
 import sys
 from collections import OrderedDict
@@ -38,7 +43,11 @@ import jstyleson as jsonc
 
 class QypSet(object):
     @staticmethod
-    def load(path_to_root_qyp_file: str, target_platform: platform.CorePlatform) -> t.Optional["QypSet"]:
+    def load(
+        path_to_root_qyp_file: str,
+        target_platform: platform.CorePlatform,
+        parse_opts: t.Optional[qy_parser.ParseOptions] = None
+    ) -> t.Optional["QypSet"]:
         # checking input file path:
         if not path_to_root_qyp_file.endswith(config.QYP_FILE_EXTENSION):
             panic.because(
@@ -53,45 +62,36 @@ class QypSet(object):
                 path_to_root_qyp_file
             )
 
-        # using a BFS to iteratively construct a second list of objects parallel to the input list of paths
+        # loading every reachable Qyp/Qyx on a pool of worker threads: see `load_qyp_graph`.
         # NOTE: paths must be absolute to properly detect cycles.
-        # NOTE: we maintain a third parallel list with the parent node for each qyp to load
-        qyp_path_queue: t.List[str] = [os.path.abspath(path_to_root_qyp_file)]
+        root_qyp_path = os.path.abspath(path_to_root_qyp_file)
+        load_result_map = QypSet.load_qyp_graph(root_qyp_path, target_platform, parse_opts)
+
+        # then, visiting the loaded Qyps in BFS order, so `qyp_name_map`, logs, and errors are exactly as if each Qyp
+        # were loaded in turn:
+        # NOTE: we maintain a parallel list with the parent node for each qyp visited
+        qyp_path_queue: t.List[str] = [root_qyp_path]
         qyp_path_queue_parent_list = [None]
+        qyp_path_set: t.Set[str] = {root_qyp_path}
         qyp_path_index: int = 0
-        qyps: t.List[NativeQyp] = []
-        qyp_name_map: t.OrderedDict[str, "NativeQyp"] = OrderedDict()
+        qyps: t.List[BaseQyp] = []
+        qyp_name_map: t.OrderedDict[str, "BaseQyp"] = OrderedDict()
         all_loaded_ok = True
         while qyp_path_index < len(qyp_path_queue):
-            # acquiring the next path to load:
+            # acquiring the next path to visit:
             opt_parent_path = qyp_path_queue_parent_list[qyp_path_index]
             qyp_path_to_load = qyp_path_queue[qyp_path_index]
-            
-            # loading the qyp at this path:
-            loader_map = {
-                config.QYP_FILE_EXTENSION: NativeQyp.load,
-                config.QYX_FILE_EXTENSION: CQyx.load
-            }
-            for loader_ext, loader_fun in loader_map.items():
-                if qyp_path_to_load.endswith(loader_ext):
-                    # using this loader to load the qyp/qyx at this path:
-                    loaded_qyp = loader_fun(qyp_path_to_load, target_platform)
-                    break
-            else:
-                more = ""
-                for wrong_ext in config.WRONG_QYP_LIKE_EXTENSIONS:
-                    if qyp_path_to_load.endswith(wrong_ext):
-                        more += f"... received wrong/incomplete extension '{wrong_ext}'.\n"
-                        break
-                expected_exts = loader_map.keys()
-                expected_exts_desc = ', '.join((f"'{expected_ext}'" for expected_ext in expected_exts))
-                more += f"... expected extensions: {expected_exts_desc}\n"
-                more += f"... see file:"
-                panic.because(
-                    panic.ExitCode.BadProjectFile,
-                    f"Dependency '{qyp_path_to_load}' does not have a valid extension.\n{more}",
-                    opt_file_path=opt_parent_path
-                )
+
+            # checking the extension of this path, then replaying the output and any error from loading it:
+            QypSet.get_loader_fun(qyp_path_to_load, opt_parent_path)
+            load_result = load_result_map[qyp_path_to_load]
+            sys.stdout.write(load_result.stdout_text)
+            sys.stderr.write(load_result.stderr_text)
+            if load_result.opt_panic_exc is not None:
+                # syntax errors in the Qyps visited before this one are reported first.
+                NativeQyp.load_all_src_files([qyp for qyp in qyps if isinstance(qyp, NativeQyp)], parse_opts)
+                raise load_result.opt_panic_exc
+            loaded_qyp = load_result.opt_qyp
             qyps.append(loaded_qyp)
 
             # complaining if the loaded qyp has the same name as another we've already loaded;
@@ -104,45 +104,125 @@ class QypSet(object):
                 qyp_name_map[loaded_qyp.js_name] = loaded_qyp
 
             # adding all dependency paths to the BFS queue:
-            # NOTE: 'qsl' or Qy standard library is always a dependency
-            for dep_index, dep_path in enumerate(loaded_qyp.js_dep_path_list):
-                if dep_path.startswith("https://"):
-                    panic.because(
-                        panic.ExitCode.BadProjectFile,
-                        f"Dependency path cannot start with 'https://': see 'deps' item {1 + dep_index}: {dep_path}\n"
-                        r"(this will be implemented in the future)",
-                        qyp_path_to_load
-                    )
-                elif dep_path.startswith("/"):
-                    panic.because(
-                        panic.ExitCode.BadProjectFile,
-                        f"Dependency path cannot start with '/': see 'deps' item {1 + dep_index}: {dep_path}",
-                        qyp_path_to_load
-                    )
-                elif dep_path.startswith("$"):
-                    # builtin path
-                    p = dep_path[1:]
-                    assert os.path.isfile(p)
-                    target_path = os.path.abspath(p)
-                else:
-                    # relative path
-                    target_path = os.path.abspath(os.path.join(loaded_qyp.dir_path, dep_path))
-                
-                if target_path not in qyp_path_queue:
+            for dep_qyp_path in load_result.dep_qyp_path_list:
+                if dep_qyp_path not in qyp_path_set:
                     qyp_path_queue_parent_list.append(qyp_path_to_load)
-                    qyp_path_queue.append(target_path)
+                    qyp_path_queue.append(dep_qyp_path)
+                    qyp_path_set.add(dep_qyp_path)
 
             # incrementing the index into the path queue:
             qyp_path_index += 1
 
+        # parsing the source files of all native Qyps at once, so they can be parsed in parallel, and syntax errors
+        # are reported before any C header is translated:
+        NativeQyp.load_all_src_files(
+            [qyp for qyp in qyps if isinstance(qyp, NativeQyp)],
+            parse_opts
+        )
+
+        # translating C headers to Qy:
+        # NOTE: this creates types, so it must happen on this thread, in this order.
+        for qyp in qyps:
+            if isinstance(qyp, CQyx):
+                qyp.translate_headers()
+
         if all_loaded_ok:
-            return QypSet(qyps[0], qyp_name_map)
+            # each Qyp's dependencies, by name, in the order they are listed:
+            # NOTE: a Qyp never depends on itself, even though QSL is added to the dependencies of every native Qyp.
+            dep_graph = OrderedDict()
+            for qyp in qyps:
+                dep_graph[qyp.js_name] = [
+                    load_result_map[dep_qyp_path].opt_qyp.js_name
+                    for dep_qyp_path in load_result_map[qyp.file_path].dep_qyp_path_list
+                    if dep_qyp_path != qyp.file_path
+                ]
+            return QypSet(qyps[0], qyp_name_map, dep_graph)
         else:
             return None
 
-    def __init__(self, root_qyp: "NativeQyp", qyp_name_map: t.OrderedDict[str, "BaseQyp"]) -> None:
+    @staticmethod
+    def load_qyp_graph(
+        root_qyp_path: str,
+        target_platform: platform.CorePlatform,
+        parse_opts: t.Optional[qy_parser.ParseOptions]
+    ) -> t.Dict[str, "QypLoadResult"]:
+        """
+        Loads every Qyp/Qyx reachable from the root on a pool of `parse_opts.job_count` worker threads, starting each
+        load as soon as the package depending on it is loaded, so independent packages are loaded at the same time.
+        Reading project files and parsing C headers with libclang (which releases the GIL) happen on the workers;
+        Qy source files are parsed later, by `NativeQyp.load_all_src_files`.
+        Returns the result of each load by absolute path, including failed loads: dependencies of failed loads and
+        paths with an invalid extension are not loaded.
+        """
+        job_count = parse_opts.job_count if parse_opts is not None else 1
+        load_result_map = {}
+        stdout_router = ThreadOutputRouter(sys.stdout)
+        stderr_router = ThreadOutputRouter(sys.stderr)
+        with contextlib.redirect_stdout(stdout_router), contextlib.redirect_stderr(stderr_router):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, job_count)) as executor:
+                def submit(qyp_path):
+                    # NOTE: workers load in a copy of this thread's context, so they share its compilation session.
+                    return executor.submit(
+                        contextvars.copy_context().run,
+                        load_one_qyp_in_worker,
+                        qyp_path, target_platform, parse_opts, stdout_router, stderr_router
+                    )
+
+                submitted_qyp_path_set = {root_qyp_path}
+                pending_futures = {submit(root_qyp_path)}
+                while pending_futures:
+                    done_futures, pending_futures = concurrent.futures.wait(
+                        pending_futures,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done_futures:
+                        load_result = future.result()
+                        load_result_map[load_result.qyp_path] = load_result
+                        for dep_qyp_path in load_result.dep_qyp_path_list:
+                            if dep_qyp_path in submitted_qyp_path_set:
+                                continue
+                            submitted_qyp_path_set.add(dep_qyp_path)
+                            if QypSet.opt_loader_fun(dep_qyp_path) is not None:
+                                pending_futures.add(submit(dep_qyp_path))
+        return load_result_map
+
+    @staticmethod
+    def opt_loader_fun(qyp_path: str):
+        for loader_ext, loader_fun in qyp_loader_map.items():
+            if qyp_path.endswith(loader_ext):
+                return loader_fun
+        return None
+
+    @staticmethod
+    def get_loader_fun(qyp_path: str, opt_parent_path: t.Optional[str]):
+        opt_loader_fun = QypSet.opt_loader_fun(qyp_path)
+        if opt_loader_fun is not None:
+            return opt_loader_fun
+        
+        more = ""
+        for wrong_ext in config.WRONG_QYP_LIKE_EXTENSIONS:
+            if qyp_path.endswith(wrong_ext):
+                more += f"... received wrong/incomplete extension '{wrong_ext}'.\n"
+                break
+        expected_exts = qyp_loader_map.keys()
+        expected_exts_desc = ', '.join((f"'{expected_ext}'" for expected_ext in expected_exts))
+        more += f"... expected extensions: {expected_exts_desc}\n"
+        more += f"... see file:"
+        panic.because(
+            panic.ExitCode.BadProjectFile,
+            f"Dependency '{qyp_path}' does not have a valid extension.\n{more}",
+            opt_file_path=opt_parent_path
+        )
+
+    def __init__(
+        self, 
+        root_qyp: "NativeQyp", 
+        qyp_name_map: t.OrderedDict[str, "BaseQyp"],
+        dep_graph: t.OrderedDict[str, t.List[str]]
+    ) -> None:
         super().__init__()
         self.qyp_name_map = qyp_name_map
+        self.dep_graph = dep_graph
         self.root_qyp = root_qyp
         self.wb_root_ctx = None
 
@@ -156,7 +236,87 @@ class QypSet(object):
         for qyp_name, qyp in self.qyp_name_map.items():
             for src_file_path, source_file in qyp.src_map.items():
                 yield qyp_name, src_file_path, source_file
-        
+
+
+class QypLoadResult(object):
+    def __init__(
+        self, 
+        qyp_path: str, 
+        opt_qyp: t.Optional["BaseQyp"],
+        dep_qyp_path_list: t.List[str],
+        stdout_text: str,
+        stderr_text: str,
+        opt_panic_exc: t.Optional[panic.PanicException]
+    ) -> None:
+        super().__init__()
+        self.qyp_path = qyp_path
+        self.opt_qyp = opt_qyp
+        self.dep_qyp_path_list = dep_qyp_path_list
+        self.stdout_text = stdout_text
+        self.stderr_text = stderr_text
+        self.opt_panic_exc = opt_panic_exc
+
+
+def load_one_qyp_in_worker(
+    qyp_path: str, 
+    target_platform: platform.CorePlatform, 
+    parse_opts: t.Optional[qy_parser.ParseOptions],
+    stdout_router: "ThreadOutputRouter",
+    stderr_router: "ThreadOutputRouter"
+) -> QypLoadResult:
+    """
+    Runs on a worker thread of `QypSet.load_qyp_graph`: output and panics are kept in the result instead of being
+    written or raised, so `QypSet.load` can replay them in order.
+    """
+    with stdout_router.buffer_this_thread() as stdout_buffer, stderr_router.buffer_this_thread() as stderr_buffer:
+        try:
+            loaded_qyp = QypSet.opt_loader_fun(qyp_path)(qyp_path, target_platform, parse_opts)
+            dep_qyp_path_list = loaded_qyp.resolve_dep_paths()
+            opt_panic_exc = None
+        except panic.PanicException as exc:
+            loaded_qyp = None
+            dep_qyp_path_list = []
+            opt_panic_exc = exc
+    return QypLoadResult(
+        qyp_path, loaded_qyp, dep_qyp_path_list, 
+        stdout_buffer.getvalue(), stderr_buffer.getvalue(), 
+        opt_panic_exc
+    )
+
+
+class ThreadOutputRouter(object):
+    """
+    Stands in for `sys.stdout` or `sys.stderr` while Qyps are loaded on worker threads: text written by a thread
+    inside `buffer_this_thread` is kept in that thread's buffer, while all other text is passed through.
+    """
+
+    def __init__(self, stream) -> None:
+        super().__init__()
+        self.stream = stream
+        self.thread_state = threading.local()
+
+    @contextlib.contextmanager
+    def buffer_this_thread(self):
+        buffer = io.StringIO()
+        self.thread_state.opt_buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.thread_state.opt_buffer = None
+
+    def write(self, text: str) -> int:
+        opt_buffer = getattr(self.thread_state, "opt_buffer", None)
+        if opt_buffer is not None:
+            return opt_buffer.write(text)
+        else:
+            return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
 
 class BaseQyp(object, metaclass=abc.ABCMeta):
     def __init__(
@@ -214,10 +374,39 @@ class BaseQyp(object, metaclass=abc.ABCMeta):
     def iter_native_src_paths(self):
         pass
 
+    def resolve_dep_paths(self) -> t.List[str]:
+        """
+        Returns the absolute path of each dependency, in order.
+        """
+        dep_qyp_path_list = []
+        for dep_index, dep_path in enumerate(self.js_dep_path_list):
+            if dep_path.startswith("https://"):
+                panic.because(
+                    panic.ExitCode.BadProjectFile,
+                    f"Dependency path cannot start with 'https://': see 'deps' item {1 + dep_index}: {dep_path}\n"
+                    r"(this will be implemented in the future)",
+                    self.file_path
+                )
+            elif dep_path.startswith("/"):
+                panic.because(
+                    panic.ExitCode.BadProjectFile,
+                    f"Dependency path cannot start with '/': see 'deps' item {1 + dep_index}: {dep_path}",
+                    self.file_path
+                )
+            elif dep_path.startswith("$"):
+                # builtin path
+                p = dep_path[1:]
+                assert os.path.isfile(p)
+                dep_qyp_path_list.append(os.path.abspath(p))
+            else:
+                # relative path
+                dep_qyp_path_list.append(os.path.abspath(os.path.join(self.dir_path, dep_path)))
+        return dep_qyp_path_list
+
 
 class NativeQyp(BaseQyp):
     @staticmethod
-    def load(path_to_root_qyp_file: str, target_platform: platform.CorePlatform) -> "NativeQyp":
+    def load(path_to_root_qyp_file: str, target_platform: platform.CorePlatform, parse_opts: t.Optional[qy_parser.ParseOptions]) -> "NativeQyp":
         try:
             with open(path_to_root_qyp_file, "r") as project_file:
                 js_map = jsonc.load(project_file)
@@ -247,13 +436,15 @@ class NativeQyp(BaseQyp):
         # logging:
         print(f"INFO: Loading Qyp: {path_to_root_qyp_file}")
 
-        # loading each source file, checking for duplicates or errors:
+        # checking each source file for duplicates or errors:
+        # NOTE: source files are only parsed later, by `load_all_src_files`
         qyp_dir_path = os.path.dirname(path_to_root_qyp_file)
-        src_map = {}
+        abs_src_file_path_list = []
+        abs_src_file_path_set = set()
         for rel_src_file_path in js_map["src"]:
             abs_src_file_path = os.path.abspath(os.path.join(qyp_dir_path, rel_src_file_path))
 
-            if abs_src_file_path in src_map:
+            if abs_src_file_path in abs_src_file_path_set:
                 panic.because(
                     panic.ExitCode.BadProjectFile,
                     f"Source file added multiple times to project: {path_to_root_qyp_file}\nSource file path:",
@@ -267,7 +458,9 @@ class NativeQyp(BaseQyp):
                     opt_file_path=abs_src_file_path
                 )
 
-            src_map[abs_src_file_path] = QySourceFile.load(abs_src_file_path)
+            QySourceFile.check_path(abs_src_file_path)
+            abs_src_file_path_list.append(abs_src_file_path)
+            abs_src_file_path_set.add(abs_src_file_path)
 
         # create a Qy project (Qyp)
         return NativeQyp(
@@ -277,22 +470,50 @@ class NativeQyp(BaseQyp):
             project_help=js_map["help"],
             qy_src_path_list=js_map["src"],
             dep_path_list=js_map.get("deps", []),
-            qy_src_map=src_map
+            abs_src_file_path_list=abs_src_file_path_list
         )
 
+    @staticmethod
+    def load_all_src_files(qyps: t.List["NativeQyp"], parse_opts: t.Optional[qy_parser.ParseOptions]):
+        """
+        Parses the source files of several Qyps in one batch (in parallel if `parse_opts.job_count > 1`), filling
+        each Qyp's `src_map` in source order.
+        """
+        all_abs_src_file_paths = [
+            abs_src_file_path
+            for qyp in qyps
+            for abs_src_file_path in qyp.abs_src_file_path_list
+        ]
+        print(f"INFO: Parsing {len(all_abs_src_file_paths)} Qy source file(s):")
+        if parse_opts is not None and parse_opts.streaming:
+            # each file is parsed when its statements are first consumed, i.e. while seeding.
+            for qyp in qyps:
+                for abs_src_file_path in qyp.abs_src_file_path_list:
+                    qyp.src_map[abs_src_file_path] = QySourceFile(
+                        abs_src_file_path, [],
+                        opt_stmt_stream=qy_parser.iter_one_file(abs_src_file_path, parse_opts)
+                    )
+            return
+
+        all_stmt_lists = iter(qy_parser.parse_files(all_abs_src_file_paths, parse_opts))
+        for qyp in qyps:
+            for abs_src_file_path in qyp.abs_src_file_path_list:
+                qyp.src_map[abs_src_file_path] = QySourceFile(abs_src_file_path, next(all_stmt_lists))
+
     def __init__(
         self,
         qyp_file_path: str, dir_path: str,
         author: str, project_help: str,
         qy_src_path_list: t.List[str],
         dep_path_list: t.List[str],
-        qy_src_map: t.Dict[str, "QySourceFile"]
+        abs_src_file_path_list: t.List[str]
     ) -> None:
         """
         WARNING: Do not instantiate this class directly.
         Instead, invoke `Qyp.load`
         """
-        super().__init__(qyp_file_path, dir_path, author, project_help, qy_src_path_list, dep_path_list, qy_src_map)
+        super().__init__(qyp_file_path, dir_path, author, project_help, qy_src_path_list, dep_path_list, {})
+        self.abs_src_file_path_list = abs_src_file_path_list
         
         # every native Qyp depends on QSL
         self.js_dep_path_list.append(qsl_qyp_dep_path)
@@ -308,7 +529,7 @@ class BaseQyx(BaseQyp, metaclass=abc.ABCMeta):
     """
 
     @classmethod
-    def load(cls, path_to_root_qyx_file: str, target_platform: platform.CorePlatform) -> "BaseQyx":
+    def load(cls, path_to_root_qyx_file: str, target_platform: platform.CorePlatform, parse_opts: t.Optional[qy_parser.ParseOptions]) -> "BaseQyx":
         try:
             with open(path_to_root_qyx_file, "r") as project_file:
                 js_map = jsonc.load(project_file)
@@ -342,7 +563,7 @@ class BaseQyx(BaseQyp, metaclass=abc.ABCMeta):
         # dispatching to language-specific loaders:
         lang = js_map["binder"].upper()
         if lang == 'C-V1':
-            return cls.load_ext(target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, lang)
+            return cls.load_ext(target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, lang, parse_opts)
         else:
             panic.because(
                 panic.ExitCode.BadProjectFile,
@@ -351,7 +572,7 @@ class BaseQyx(BaseQyp, metaclass=abc.ABCMeta):
         
     @classmethod
     @abc.abstractmethod
-    def load_ext(cls, target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, language):
+    def load_ext(cls, target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, language, parse_opts):
         raise NotImplementedError("BaseQyx.load_ext: This method should be overridden before invocation.")
 
     def iter_native_src_paths(self):
@@ -384,13 +605,26 @@ class CQyx(BaseQyx):
         project_help: str, 
         src_path_list: t.List[str], 
         dep_path_list: t.List[str],
-        c_source_files: t.List["CSourceFile"]
+        untranslated_header_list: t.List[t.Tuple[str, t.List[str], c_parser.PreparedCFile]],
+        impl_c_source_files: t.List["CSourceFile"],
+        c_flags: t.List[str]
     ) -> None:
-        super().__init__(qyp_file_path, dir_path, author, project_help, src_path_list, dep_path_list, dict(zip(src_path_list, c_source_files)))
-        self.c_source_files = c_source_files
+        """
+        :param untranslated_header_list: a `(path, provided_symbol_list, prepared_header)` triple for each header, in
+            order: see `translate_headers`.
+        :param c_flags: the flags used to compile this package's C sources (and to parse its headers), for the
+            target platform.
+        """
+        super().__init__(qyp_file_path, dir_path, author, project_help, src_path_list, dep_path_list, {})
+        self.untranslated_header_list = untranslated_header_list
+        self.impl_c_source_files = impl_c_source_files
+        self.c_flags = c_flags
+        
+        # filled by `translate_headers`: headers, then implementation sources.
+        self.c_source_files = []
 
     @classmethod
-    def load_ext(cls, target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, binder_name):
+    def load_ext(cls, target_platform, js_map, path_to_root_qyx_file, qyx_dir_path, binder_name, parse_opts):
         assert binder_name == 'C-V1'
         assert isinstance(target_platform, platform.Platform)
 
@@ -416,10 +650,13 @@ class CQyx(BaseQyx):
         selected_platform_args = platform_args_map.get(target_platform.core_platform_type, CQyxV1_CompilerArgs.default)
         headers_objs = common_args.headers + selected_platform_args.headers
         sources_objs = common_args.sources + selected_platform_args.sources
+        c_flags = common_args.c_flags + selected_platform_args.c_flags
+        opt_c_header_cache = parse_opts.opt_c_header_cache if parse_opts is not None else None
+        opt_c_ast_cache = parse_opts.opt_c_ast_cache if parse_opts is not None else None
 
-        # loading headers in 2 parallel lists:
-        header_c_source_files = []
+        # checking headers in 2 parallel lists:
         header_src_path_list = []
+        provided_symbol_lists = []
         for index, include_obj in enumerate(headers_objs):
             include_path = include_obj.path
             CQyx.check_obj_is_str_else_panic(f"includes[{index}].path", include_path, path_to_root_qyx_file)
@@ -427,9 +664,21 @@ class CQyx(BaseQyx):
             CQyx.check_obj_is_all_str_list_else_panic(f"includes[{index}].path", provided_symbol_list, path_to_root_qyx_file)
             abs_include_path = include_path if os.path.isabs(include_path) else os.path.join(qyx_dir_path, include_path)
             abs_include_path = os.path.normpath(abs_include_path)
-            c_source_file = CSourceFile.load(abs_include_path, provided_symbol_list, is_header=True)
-            header_c_source_files.append(c_source_file)
+            CSourceFile.check_path(abs_include_path, is_header=True)
             header_src_path_list.append(abs_include_path)
+            provided_symbol_lists.append(provided_symbol_list)
+
+        # preparing headers (parsing with libclang as one package TU, or finding in the header cache):
+        # NOTE: headers are only translated to Qy later, by `translate_headers`, since this may run on a worker thread
+        # (see `QypSet.load`).
+        prepared_header_list = c_parser.prepare_package_headers(
+            [
+                (abs_include_path, set(provided_symbol_list))
+                for abs_include_path, provided_symbol_list in zip(header_src_path_list, provided_symbol_lists)
+            ],
+            c_flags, target_platform.name, opt_c_header_cache, opt_c_ast_cache
+        )
+        untranslated_header_list = list(zip(header_src_path_list, provided_symbol_lists, prepared_header_list))
 
         # loading implementation sources (just referenced, never read) in 2 parallel lists:
         impl_c_source_files = []
@@ -444,33 +693,51 @@ class CQyx(BaseQyx):
             impl_src_path_list.append(abs_src_path)
 
         # combining headers and sources:
-        c_source_files = header_c_source_files + impl_c_source_files
         src_path_list = header_src_path_list + impl_src_path_list
 
+        # returning:
+        return CQyx(
+            qyp_file_path=path_to_root_qyx_file,
+            dir_path=qyx_dir_path,
+            author=js_map["author"],
+            project_help=js_map["help"],
+            src_path_list=src_path_list,
+            dep_path_list=js_map.get("deps", []),
+            untranslated_header_list=untranslated_header_list,
+            impl_c_source_files=impl_c_source_files,
+            c_flags=c_flags
+        )
+
+    def translate_headers(self):
+        """
+        Translates the symbols provided by each header to Qy, filling `c_source_files` and `src_map`.
+        Translation creates types, so `QypSet.load` translates the headers of all Qyxs on one thread, in a
+        deterministic order.
+        """
+        header_c_source_files = [
+            CSourceFile.load(abs_include_path, provided_symbol_list, is_header=True, opt_prepared=prepared_header)
+            for abs_include_path, provided_symbol_list, prepared_header in self.untranslated_header_list
+        ]
+
         # checking that all symbols claimed to be provided in the JSON were found:
         all_provided_symbols = functools.reduce(
             lambda a, b: a | b, 
             (set(csf.this_file_provided_symbol_set) for csf in header_c_source_files)
         )
+        provided_symbol_list = self.untranslated_header_list[-1][1]
         missing_symbols = set(provided_symbol_list) - all_provided_symbols
         if missing_symbols:
             panic.because(
                 panic.ExitCode.CompilationFailed,
                 f"CQyx: could not find all provided symbols in project file when scanning headers. Missing symbols:\n" +
                 '- ' + '\n- '.join(sorted(missing_symbols)),
-                opt_file_path=path_to_root_qyx_file
+                opt_file_path=self.file_path
             )
-        
-        # returning:
-        return CQyx(
-            qyp_file_path=path_to_root_qyx_file,
-            dir_path=qyx_dir_path,
-            author=js_map["author"],
-            project_help=js_map["help"],
-            src_path_list=src_path_list,
-            dep_path_list=js_map.get("deps", []),
-            c_source_files=c_source_files
-        )
+
+        # releasing the prepared headers (and their libclang TUs), then combining headers and sources:
+        self.untranslated_header_list = []
+        self.c_source_files = header_c_source_files + self.impl_c_source_files
+        self.src_map.update(zip(self.src_path_list, self.c_source_files))
 
     @staticmethod
     def check_binder_args_obj(top_level_key, arg_obj, required_per_obj_keys):
@@ -624,6 +891,11 @@ qyp_supported_keys = qyp_required_keys | qyp_optional_keys
 qyx_required_keys = base_qyp_required_keys | {"binder"}
 qyx_optional_keys = base_qyp_optional_keys
 
+qyp_loader_map = {
+    config.QYP_FILE_EXTENSION: NativeQyp.load,
+    config.QYX_FILE_EXTENSION: CQyx.load
+}
+
 
 #
 #
@@ -632,19 +904,49 @@ qyx_optional_keys = base_qyp_optional_keys
 #
 
 class BaseSourceFile(object, metaclass=abc.ABCMeta):
-    def __init__(self, source_file_path: str, stmt_list: t.List[ast1.BaseStatement]) -> None:
+    def __init__(
+        self,
+        source_file_path: str,
+        stmt_list: t.List[ast1.BaseStatement],
+        opt_stmt_stream: t.Optional[t.Iterator[ast1.BaseStatement]] = None
+    ) -> None:
+        """
+        :param stmt_list: the top-level statements of this file, or just the first few if `opt_stmt_stream` is set.
+        :param opt_stmt_stream: if set, yields the rest of this file's top-level statements, e.g. as they are parsed
+            by `qy_parser.iter_one_file`.
+        """
         assert all((isinstance(it, ast1.BaseStatement) for it in stmt_list))
         assert os.path.isabs(source_file_path)
         
         super().__init__()
         self.file_path = source_file_path
-        self.stmt_list = stmt_list
+        self._stmt_list = stmt_list
+        self.opt_stmt_stream = opt_stmt_stream
 
         # writeback properties: properties computed over the course of evaluation and 'written back' for later:
         self.wb_typer_ctx = None
 
         self.extern_str = self.get_extern_str()
 
+    @property
+    def stmt_list(self) -> t.List[ast1.BaseStatement]:
+        for _ in self.iter_stmts():
+            pass
+        return self._stmt_list
+
+    def iter_stmts(self) -> t.Iterator[ast1.BaseStatement]:
+        """
+        Yields this file's top-level statements, pulling any statements not yet loaded from `opt_stmt_stream`.
+        """
+        yield from self._stmt_list
+        while self.opt_stmt_stream is not None:
+            opt_stmt = next(self.opt_stmt_stream, None)
+            if opt_stmt is None:
+                self.opt_stmt_stream = None
+            else:
+                self._stmt_list.append(opt_stmt)
+                yield opt_stmt
+
     @classmethod
     @abc.abstractmethod
     def get_extern_str(cls) -> t.Optional[str]:
@@ -653,7 +955,13 @@ class BaseSourceFile(object, metaclass=abc.ABCMeta):
 
 class QySourceFile(BaseSourceFile):
     @staticmethod
-    def load(source_file_path: str) -> "QySourceFile":
+    def load(source_file_path: str, parse_opts: t.Optional[qy_parser.ParseOptions] = None) -> "QySourceFile":
+        QySourceFile.check_path(source_file_path)
+        stmt_list = qy_parser.parse_one_file(source_file_path, parse_opts)
+        return QySourceFile(source_file_path, stmt_list)
+
+    @staticmethod
+    def check_path(source_file_path: str):
         if not source_file_path.endswith(config.QY_SOURCE_FILE_EXTENSION):
             panic.because(
                 panic.ExitCode.BadProjectFile, 
@@ -666,8 +974,6 @@ class QySourceFile(BaseSourceFile):
                 "source file path does not refer to a file:",
                 source_file_path
             )
-        stmt_list = qy_parser.parse_one_file(source_file_path)
-        return QySourceFile(source_file_path, stmt_list)
 
     @classmethod
     def get_extern_str(cls) -> t.Optional[str]:
@@ -687,7 +993,32 @@ class CSourceFile(BaseSourceFile):
         self.is_header = is_header
 
     @staticmethod
-    def load(source_file_path: str, provided_symbol_list: t.List[str], is_header) -> "CSourceFile":
+    def load(
+        source_file_path: str, 
+        provided_symbol_list: t.List[str], 
+        is_header, 
+        opt_prepared: t.Optional[c_parser.PreparedCFile] = None
+    ) -> "CSourceFile":
+        """
+        :param opt_prepared: the file as returned by `c_parser.prepare_one_file`, if already prepared.
+        """
+        CSourceFile.check_path(source_file_path, is_header)
+
+        provided_symbol_set = set(provided_symbol_list)
+        stmt_list, this_provided_symbol_set = c_parser.parse_one_file(source_file_path, provided_symbol_set, is_header, opt_prepared)
+        assert isinstance(stmt_list, list)
+
+        if this_provided_symbol_set != provided_symbol_set:
+            missing_symbol_set = provided_symbol_set - this_provided_symbol_set
+            panic.because(
+                panic.ExitCode.ExternCompileFailed,
+                f"exported symbols were not found in C code: {', '.join(sorted(missing_symbol_set))}"
+            )
+
+        return CSourceFile(source_file_path, stmt_list, this_provided_symbol_set, is_header)
+
+    @staticmethod
+    def check_path(source_file_path: str, is_header):
         if is_header:
             if not source_file_path.endswith(config.C_HEADER_FILE_EXTENSION):
                 panic.because(
@@ -712,19 +1043,6 @@ class CSourceFile(BaseSourceFile):
                 source_file_path
             )
 
-        provided_symbol_set = set(provided_symbol_list)
-        stmt_list, this_provided_symbol_set = c_parser.parse_one_file(source_file_path, provided_symbol_set, is_header)
-        assert isinstance(stmt_list, list)
-
-        if this_provided_symbol_set != provided_symbol_set:
-            missing_symbol_set = provided_symbol_set - this_provided_symbol_set
-            panic.because(
-                panic.ExitCode.ExternCompileFailed,
-                f"exported symbols were not found in C code: {', '.join(sorted(missing_symbol_set))}"
-            )
-
-        return CSourceFile(source_file_path, stmt_list, this_provided_symbol_set, is_header)
-
     @classmethod
     def get_extern_str(cls) -> t.Optional[str]:
         return "C"
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import os
+import os.path
+import tempfile
+import unittest
+import unittest.mock
+
+from . import ast2
+from . import panic
+from . import platform
+from . import qy_parser
+
+
+repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_qyp(dir_path, name, deps, **extra_keys):
+    js_map = {"author": "test", "help": f"the '{name}' package", "src": [], "deps": deps}
+    js_map.update(extra_keys)
+    with open(os.path.join(dir_path, f"{name}.qyp.jsonc"), "w") as f:
+        json.dump(js_map, f)
+
+
+def load_quietly(root_qyp_path, job_count):
+    stdout_buffer = io.StringIO()
+    stderr_buffer = io.StringIO()
+    with contextlib.redirect_stdout(stdout_buffer), contextlib.redirect_stderr(stderr_buffer):
+        try:
+            qyp_set = ast2.QypSet.load(
+                root_qyp_path,
+                platform.core_linux_amd64,
+                qy_parser.ParseOptions(job_count=job_count)
+            )
+            return qyp_set, stdout_buffer.getvalue(), None
+        except panic.PanicException as exc:
+            return None, stdout_buffer.getvalue(), (exc.exit_code, stderr_buffer.getvalue())
+
+
+class TestQypSetLoad(unittest.TestCase):
+    def setUp(self):
+        # `qsl_qyp_dep_path` is found relative to 'qc.py', which is not running.
+        self.old_qsl_qyp_dep_path = ast2.qsl_qyp_dep_path
+        ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+
+    def tearDown(self):
+        ast2.qsl_qyp_dep_path = self.old_qsl_qyp_dep_path
+
+    def test_parallel_load_matches_serial(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            # a diamond with a cycle: root -> {a, b, c}, a -> {b, d}, b -> a, c -> d
+            write_qyp(dir_path, "root", ["./a.qyp.jsonc", "./b.qyp.jsonc", "./c.qyp.jsonc"])
+            write_qyp(dir_path, "a", ["./b.qyp.jsonc", "./d.qyp.jsonc"])
+            write_qyp(dir_path, "b", ["./a.qyp.jsonc"])
+            write_qyp(dir_path, "c", ["./d.qyp.jsonc"])
+            write_qyp(dir_path, "d", [])
+            root_qyp_path = os.path.join(dir_path, "root.qyp.jsonc")
+
+            serial_qyp_set, serial_log, _ = load_quietly(root_qyp_path, job_count=1)
+            for _ in range(3):
+                parallel_qyp_set, parallel_log, _ = load_quietly(root_qyp_path, job_count=4)
+                self.assertEqual(list(serial_qyp_set.qyp_name_map), list(parallel_qyp_set.qyp_name_map))
+                self.assertEqual(serial_qyp_set.dep_graph, parallel_qyp_set.dep_graph)
+                self.assertEqual(serial_log, parallel_log)
+
+        self.assertEqual(
+            list(serial_qyp_set.qyp_name_map),
+            ["root", "a", "b", "c", "qsl", "d", "file", "memory", "string"]
+        )
+        self.assertEqual(serial_qyp_set.dep_graph["root"], ["a", "b", "c", "qsl"])
+        self.assertEqual(serial_qyp_set.dep_graph["b"], ["a", "qsl"])
+        self.assertEqual(serial_qyp_set.dep_graph["qsl"], ["file", "memory", "string"])
+        self.assertEqual(serial_qyp_set.dep_graph["file"], [])
+
+    def test_parallel_load_reports_first_error_in_bfs_order(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_qyp(dir_path, "root", ["./ok.qyp.jsonc", "./bad1.qyp.jsonc"])
+            write_qyp(dir_path, "ok", ["./bad2.qyp.jsonc", "./bad3.json"])
+            write_qyp(dir_path, "bad1", [], extra="1")
+            write_qyp(dir_path, "bad2", [], extra="2")
+            root_qyp_path = os.path.join(dir_path, "root.qyp.jsonc")
+
+            _, serial_log, serial_error = load_quietly(root_qyp_path, job_count=1)
+            _, parallel_log, parallel_error = load_quietly(root_qyp_path, job_count=4)
+
+        self.assertEqual(serial_error, parallel_error)
+        self.assertEqual(serial_log, parallel_log)
+        exit_code, stderr_text = serial_error
+        self.assertEqual(exit_code, panic.ExitCode.BadProjectFile)
+        self.assertIn("bad1.qyp.jsonc", stderr_text)
+        self.assertNotIn("bad2.qyp.jsonc", stderr_text)
+        self.assertNotIn("bad2.qyp.jsonc", serial_log)
+
+    def test_syntax_errors_are_reported_before_translating_headers(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            with open(os.path.join(dir_path, "root.qy"), "w") as f:
+                f.write("val bad = ;\n")
+            write_qyp(dir_path, "root", ["./bad.qyp.jsonc"], src=["./root.qy"])
+            write_qyp(dir_path, "bad", [], extra="1")
+            root_qyp_path = os.path.join(dir_path, "root.qyp.jsonc")
+
+            # the root Qyp is visited before its dependencies, so its syntax error is reported first.
+            with unittest.mock.patch.object(ast2.CQyx, "translate_headers"):
+                _, _, error = load_quietly(root_qyp_path, job_count=1)
+            self.assertEqual(error[0], panic.ExitCode.SyntaxError)
+
+            write_qyp(dir_path, "root", [], src=["./root.qy"])
+            with unittest.mock.patch.object(ast2.CQyx, "translate_headers") as translate_headers_mock:
+                _, _, error = load_quietly(root_qyp_path, job_count=1)
+            self.assertEqual(error[0], panic.ExitCode.SyntaxError)
+            translate_headers_mock.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,7 +22,12 @@
 #   - node.type.get_pointee()
 
 import typing as t
-import itertools
+import ctypes
+import functools
+import io
+import os.path
+import pickle
+import threading
 
 import clang.cindex
 
@@ -30,167 +35,645 @@ from . import ast1
 from . import panic
 from . import feedback
 from . import types
+from . import config
+from . import disk_cache
+from . import session
 
-index = clang.cindex.Index.create()
 CursorKind = clang.cindex.CursorKind
 TypeKind = clang.cindex.TypeKind
 
+# libclang indices must not be used by several threads at once, so each thread creates its own, when it first needs
+# one (see `get_index`): importing this module never creates an index.
+index_per_thread = threading.local()
+
+# translating C types to Qy shares the compilation session's `declaration_cache_map`, so only one TU is translated at a
+# time.
+translation_lock = threading.Lock()
+
+def get_index() -> clang.cindex.Index:
+    """
+    Returns this thread's libclang index, which every TU parsed or loaded on this thread shares (and keeps alive).
+    """
+    opt_index = getattr(index_per_thread, "opt_index", None)
+    if opt_index is None:
+        opt_index = clang.cindex.Index.create()
+        index_per_thread.opt_index = opt_index
+    return opt_index
+
+
+def parse_tu(source_file_path, c_flags: t.List[str], unsaved_files=None) -> clang.cindex.TranslationUnit:
+    """
+    Parses a C file with libclang, without translating anything to Qy.
+    Only declarations are translated, so function bodies are skipped, and the file is parsed as an incomplete TU
+    (i.e. a header).
+    :param unsaved_files: `(path, contents)` pairs for files that are not on disk.
+    """
+    return get_index().parse(
+        source_file_path,
+        args=c_flags,
+        unsaved_files=unsaved_files,
+        options=(
+            clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES |
+            clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+            # | clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+        )
+    )
 
-def parse_one_file(source_file_path, all_provided_symbols: t.Set[str], is_header: bool) -> t.Tuple[t.List[ast1.BaseStatement], t.Set[str]]:
+
+class PreparedCFile(object):
+    """
+    A C file ready to be translated by `parse_one_file`: either parsed by libclang (on its own, or as part of a
+    package TU), or found in the header cache.
+    """
+
+    def __init__(
+        self,
+        source_file_path: str,
+        c_flags: t.List[str],
+        opt_tu: t.Optional[clang.cindex.TranslationUnit],
+        opt_header_cache: t.Optional[disk_cache.DiskCache],
+        opt_manifest_key: t.Optional[str],
+        opt_entry_key: t.Optional[str]
+    ) -> None:
+        super().__init__()
+        self.source_file_path = source_file_path
+        self.c_flags = c_flags
+        self.opt_tu = opt_tu
+        self.opt_header_cache = opt_header_cache
+        self.opt_manifest_key = opt_manifest_key
+        self.opt_entry_key = opt_entry_key
+
+
+def prepare_one_file(
+    source_file_path,
+    all_provided_symbols: t.Set[str],
+    c_flags: t.List[str],
+    platform_name: str,
+    opt_header_cache: t.Optional[disk_cache.DiskCache] = None
+) -> PreparedCFile:
+    """
+    Does the slow part of `parse_one_file`, which is safe to run on several threads at once: finds the file's
+    translation in `opt_header_cache`, or else parses the file with libclang.
+    Files that provide no symbols are never parsed, since there is nothing to translate.
+    """
+    prepared = look_up_one_file(source_file_path, all_provided_symbols, c_flags, platform_name, opt_header_cache)
+    if prepared.opt_entry_key is None and all_provided_symbols:
+        prepared.opt_tu = parse_tu(source_file_path, c_flags)
+    return prepared
+
+
+def prepare_package_headers(
+    header_list: t.List[t.Tuple[str, t.Set[str]]],
+    c_flags: t.List[str],
+    platform_name: str,
+    opt_header_cache: t.Optional[disk_cache.DiskCache] = None,
+    opt_ast_cache: t.Optional[disk_cache.DiskCache] = None
+) -> t.List[PreparedCFile]:
+    """
+    Like `prepare_one_file` for each `(path, provided_symbols)` header of a CQyx package, except that headers not
+    found in `opt_header_cache` are parsed together, as one package TU (see `load_package_tu`), so files included by
+    several headers are only preprocessed once.
+    """
+    prepared_header_list = [
+        look_up_one_file(header_path, provided_symbols, c_flags, platform_name, opt_header_cache)
+        for header_path, provided_symbols in header_list
+    ]
+    unprepared_header_list = [
+        prepared_header
+        for prepared_header, (_, provided_symbols) in zip(prepared_header_list, header_list)
+        if prepared_header.opt_entry_key is None and provided_symbols
+    ]
+    if unprepared_header_list:
+        package_tu = load_package_tu(
+            [header_path for header_path, _ in header_list],
+            c_flags, platform_name, opt_ast_cache
+        )
+        for prepared_header in unprepared_header_list:
+            prepared_header.opt_tu = package_tu
+    return prepared_header_list
+
+
+def look_up_one_file(
+    source_file_path,
+    all_provided_symbols: t.Set[str],
+    c_flags: t.List[str],
+    platform_name: str,
+    opt_header_cache: t.Optional[disk_cache.DiskCache]
+) -> PreparedCFile:
+    """
+    Returns a C file to translate, without a TU: if its translation is in `opt_header_cache`, `opt_entry_key` is set.
+    """
     print(f"\t{source_file_path}")
+
+    opt_manifest_key = None
+    if all_provided_symbols and opt_header_cache is not None:
+        opt_manifest_key = header_manifest_key(source_file_path, all_provided_symbols, c_flags, platform_name)
+        if opt_manifest_key is not None:
+            opt_entry_key = manifest_entry_key(opt_header_cache, opt_manifest_key)
+            if opt_entry_key is not None and opt_header_cache.has(opt_entry_key):
+                return PreparedCFile(source_file_path, c_flags, None, opt_header_cache, opt_manifest_key, opt_entry_key)
+
+    return PreparedCFile(source_file_path, c_flags, None, opt_header_cache, opt_manifest_key, None)
+
+
+def parse_one_file(
+    source_file_path, 
+    all_provided_symbols: t.Set[str], 
+    is_header: bool,
+    opt_prepared: t.Optional[PreparedCFile] = None
+) -> t.Tuple[t.List[ast1.BaseStatement], t.Set[str]]:
+    """
+    Translates the provided symbols of a C file to Qy.
+    :param opt_prepared: the file as returned by `prepare_one_file`, if already prepared.
+    """
+    if opt_prepared is None:
+        opt_prepared = prepare_one_file(source_file_path, all_provided_symbols, [], "")
     
-    tu = index.parse(
-        source_file_path,
-        # options=clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+    if not all_provided_symbols:
+        return [], set()
+
+    with translation_lock:
+        # restoring the translation from the header cache if possible:
+        if opt_prepared.opt_entry_key is not None:
+            opt_restored = restore_translation(opt_prepared.opt_header_cache, opt_prepared.opt_entry_key)
+            if opt_restored is not None:
+                return opt_restored
+
+        tu = opt_prepared.opt_tu
+        if tu is None:
+            tu = parse_tu(source_file_path, opt_prepared.c_flags)
+        # dbg_print_visit(tu, tu.cursor)
+
+        # making a copy of 'provided_symbols', then popping as symbols are discovered:
+        old_declaration_name_set = set(session.current().declaration_cache_map.keys())
+        rem_provided_symbols = set(all_provided_symbols)
+        stmt_list = translate_tu(tu, source_file_path, rem_provided_symbols)
+
+        # finding which symbols were discovered:
+        exposed_symbols = all_provided_symbols - rem_provided_symbols
+
+        if opt_prepared.opt_manifest_key is not None:
+            save_translation(opt_prepared, tu, old_declaration_name_set, stmt_list, exposed_symbols)
+        
+        return stmt_list, exposed_symbols
+
+
+#
+# Header cache:
+# translating a header to Qy is cached across runs in a `disk_cache.DiskCache`.
+#
+# Like `ccache`'s direct mode, each header has 2 entries:
+# - the 'manifest', keyed by the header's contents, c-flags, platform, and provided symbols, lists every file the
+#   header includes (transitively).
+# - the translation itself, keyed by the manifest key and the contents of every file listed in the manifest.
+# Both keys can be computed without libclang.
+#
+# Translations share struct and union types with each other by name through the compilation session's
+# `declaration_cache_map`.
+# A translation refers to the types it did not create (its 'imports') by name, and is only restored if every import
+# is declared and every type it creates (its 'exports') is not, i.e. when translating it again would produce the same
+# result.
+#
+
+def header_manifest_key(source_file_path, all_provided_symbols: t.Set[str], c_flags: t.List[str], platform_name: str) -> t.Optional[str]:
+    try:
+        with open(source_file_path, "rb") as source_file:
+            contents = source_file.read()
+    except OSError:
+        return None
+    return disk_cache.hash_digest(
+        "manifest", translator_fingerprint(),
+        source_file_path, contents,
+        platform_name,
+        "\0".join(c_flags),
+        "\0".join(sorted(all_provided_symbols))
+    )
+
+
+def manifest_entry_key(cache: disk_cache.DiskCache, manifest_key: str, opt_included_file_paths=None) -> t.Optional[str]:
+    """
+    Returns the key of the entry described by a manifest (e.g. a header's translation), or `None` if there is no
+    manifest or an included file cannot be read.
+    :param opt_included_file_paths: the files the header includes, if known: otherwise, read from the manifest.
+    """
+    if opt_included_file_paths is None:
+        opt_included_file_paths = cache.get(manifest_key)
+        if opt_included_file_paths is None:
+            return None
+    
+    parts = ["entry", manifest_key]
+    for included_file_path in opt_included_file_paths:
+        try:
+            with open(included_file_path, "rb") as included_file:
+                parts += [included_file_path, included_file.read()]
+        except OSError:
+            return None
+    return disk_cache.hash_digest(*parts)
+
+
+@functools.lru_cache(maxsize=None)
+def libclang_fingerprint() -> str:
+    # libclang is identified by its file's path, size, and modification time: it is too large to hash every run.
+    libclang_path = clang.cindex.conf.lib._name
+    try:
+        libclang_stat = os.stat(libclang_path)
+        return f"{libclang_path}:{libclang_stat.st_size}:{libclang_stat.st_mtime_ns}"
+    except OSError:
+        return libclang_path
+
+
+@functools.lru_cache(maxsize=None)
+def translator_fingerprint() -> str:
+    return disk_cache.hash_digest(
+        config.COMPILER_VERSION,
+        libclang_fingerprint(),
+        disk_cache.hash_source_files(__file__, ast1.__file__, types.__file__, feedback.__file__)
     )
-    # dbg_print_visit(tu, tu.cursor)
 
-    # making a copy of 'provided_symbols', then popping as symbols are discovered:
-    rem_provided_symbols = set(all_provided_symbols)
-    if rem_provided_symbols:
-        stmt_list = translate_tu(tu, rem_provided_symbols)
-    else:
-        stmt_list = []
 
-    # finding which symbols were discovered:
-    exposed_symbols = all_provided_symbols - rem_provided_symbols
+def list_included_file_paths(tu) -> t.List[str]:
+    included_file_paths = []
+    for file_inclusion in tu.get_includes():
+        included_file_path = os.path.abspath(file_inclusion.include.name)
+        if included_file_path not in included_file_paths:
+            included_file_paths.append(included_file_path)
+    return included_file_paths
+
+
+def save_translation(prepared: PreparedCFile, tu, old_declaration_name_set, stmt_list, exposed_symbols):
+    included_file_paths = list_included_file_paths(tu)
+    opt_entry_key = manifest_entry_key(prepared.opt_header_cache, prepared.opt_manifest_key, included_file_paths)
+    if opt_entry_key is None:
+        return
+
+    declaration_cache_map = session.current().declaration_cache_map
+    export_map = {
+        name: ts
+        for name, ts in declaration_cache_map.items()
+        if name not in old_declaration_name_set
+    }
+    import_name_map = {
+        id(declaration_cache_map[name].wb_type): name
+        for name in old_declaration_name_set
+    }
+    data_file = io.BytesIO()
+    pickler = TranslationPickler(data_file, import_name_map)
+    try:
+        pickler.dump((stmt_list, exposed_symbols, export_map))
+    except RecursionError:
+        return
+    
+    entry = (sorted(pickler.import_name_set), sorted(export_map.keys()), data_file.getvalue())
+    if prepared.opt_header_cache.put(opt_entry_key, entry):
+        prepared.opt_header_cache.put(prepared.opt_manifest_key, included_file_paths)
+
+
+def restore_translation(header_cache: disk_cache.DiskCache, entry_key: str):
+    opt_entry = header_cache.get(entry_key)
+    if opt_entry is None:
+        return None
+    import_names, export_names, data = opt_entry
+    declaration_cache_map = session.current().declaration_cache_map
+    if not all(name in declaration_cache_map for name in import_names):
+        return None
+    if any(name in declaration_cache_map for name in export_names):
+        return None
+
+    try:
+        stmt_list, exposed_symbols, export_map = TranslationUnpickler(io.BytesIO(data)).load()
+    except Exception:
+        return None
+    declaration_cache_map.update(export_map)
     return stmt_list, exposed_symbols
 
 
-def translate_tu(tu, rem_provided_symbols) -> t.List[ast1.BaseStatement]:
-    iter_list = []
-    for child_node in tu.cursor.get_children():
-        iter_list += list(translate_tu_top_level_stmt(tu, child_node, rem_provided_symbols))
-    return list(itertools.chain(iter_list))
+class TranslationPickler(pickle.Pickler):
+    """
+    Pickles translated statements, referring to imported types by name, and to atomic types by value (so they are
+    still unique once restored).
+    """
+
+    def __init__(self, data_file, import_name_map: t.Dict[int, str]) -> None:
+        super().__init__(data_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.import_name_map = import_name_map
+        self.import_name_set = set()
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, types.BaseType):
+            return None
+        
+        opt_import_name = self.import_name_map.get(id(obj), None)
+        if opt_import_name is not None:
+            self.import_name_set.add(opt_import_name)
+            return ("import", opt_import_name)
+        # NOTE: translation may set `is_mut` on atomic types, so it is restored too.
+        elif isinstance(obj, types.IntType):
+            return ("int", obj.width_in_bits, obj.is_signed, obj.is_mut)
+        elif isinstance(obj, types.FloatType):
+            return ("float", obj.width_in_bits, obj.is_mut)
+        elif isinstance(obj, types.VoidType):
+            return ("void", obj.is_mut)
+        else:
+            return None
+
+
+class TranslationUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == "import":
+            return session.current().declaration_cache_map[pid[1]].wb_type
+        elif kind == "int":
+            _, width_in_bits, is_signed, is_mut = pid
+            atomic_type = types.IntType.get(width_in_bits, is_signed)
+        elif kind == "float":
+            _, width_in_bits, is_mut = pid
+            atomic_type = types.FloatType.get(width_in_bits)
+        elif kind == "void":
+            _, is_mut = pid
+            atomic_type = types.VoidType.singleton
+        else:
+            raise pickle.UnpicklingError(f"unknown persistent ID: {pid}")
+        atomic_type.is_mut = is_mut
+        return atomic_type
+
+
+#
+# Package TUs:
+# the headers of a CQyx package are parsed together, as one TU including each header in order (like the emitted C++
+# does), rather than one TU per header, so files included by several headers (e.g. QSL's 'prim/integer.h', or system
+# headers) are only preprocessed once per package.
+#
+# Package TUs are also cached across runs in a `disk_cache.DiskCache`, as libclang AST files, which load much faster
+# than the headers parse.
+# Like translations (see 'Header cache' above), each package TU has a manifest, keyed by its headers' paths and
+# contents, c-flags, platform, and libclang (AST files are specific to a libclang build), that lists every file the
+# package TU includes: the AST file is keyed by the manifest key and the contents of these files.
+# Unlike translations, AST files do not depend on the translator, so they survive changes to it.
+#
+
+# the package TU is a file that is never written to disk: its name only needs to differ from every header's.
+package_tu_file_name = ".qyx-package-headers.h"
+
+
+def load_package_tu(
+    header_paths: t.List[str],
+    c_flags: t.List[str],
+    platform_name: str,
+    opt_ast_cache: t.Optional[disk_cache.DiskCache] = None
+) -> clang.cindex.TranslationUnit:
+    """
+    Returns a TU including each header in order: loaded from `opt_ast_cache` if possible, else parsed (and saved).
+    """
+    package_tu_path = os.path.join(os.path.dirname(header_paths[0]), package_tu_file_name)
+
+    opt_manifest_key = None
+    if opt_ast_cache is not None:
+        opt_manifest_key = package_manifest_key(header_paths, c_flags, platform_name)
+        if opt_manifest_key is not None:
+            opt_entry_key = manifest_entry_key(opt_ast_cache, opt_manifest_key)
+            if opt_entry_key is not None:
+                opt_ast_file_path = opt_ast_cache.get_file_path(opt_entry_key)
+                if opt_ast_file_path is not None:
+                    try:
+                        return clang.cindex.TranslationUnit.from_ast_file(opt_ast_file_path, get_index())
+                    except clang.cindex.TranslationUnitLoadError:
+                        pass
+
+    package_tu_text = "".join(f'#include "{header_path}"\n' for header_path in header_paths)
+    package_tu = parse_tu(package_tu_path, c_flags, unsaved_files=[(package_tu_path, package_tu_text)])
+    if opt_manifest_key is not None:
+        included_file_paths = list_included_file_paths(package_tu)
+        opt_entry_key = manifest_entry_key(opt_ast_cache, opt_manifest_key, included_file_paths)
+        if opt_entry_key is not None and opt_ast_cache.put_file(opt_entry_key, package_tu.save):
+            opt_ast_cache.put(opt_manifest_key, included_file_paths)
+    return package_tu
+
+
+def package_manifest_key(header_paths: t.List[str], c_flags: t.List[str], platform_name: str) -> t.Optional[str]:
+    parts = ["package-manifest", config.COMPILER_VERSION, libclang_fingerprint(), platform_name, "\0".join(c_flags)]
+    for header_path in header_paths:
+        try:
+            with open(header_path, "rb") as header_file:
+                parts += [header_path, header_file.read()]
+        except OSError:
+            return None
+    return disk_cache.hash_digest(*parts)
+
+
+def translate_tu(tu, file_path, rem_provided_symbols) -> t.List[ast1.BaseStatement]:
+    """
+    Translates the declarations of the provided symbols in order, stopping as soon as all of them are found.
+    Only the file's own top-level declarations are visited at first: declarations from included files are only
+    visited if some provided symbols are still missing, i.e. if the header re-exports symbols from a file it includes.
+    :param file_path: the translated file, which is not the TU's main file in a package TU: locations without a file
+    (e.g. of builtin types) are reported in it.
+    """
+    # NOTE: in a package TU, the file's own declarations are not in the TU's main file.
+    opt_own_file_path = file_path if tu.spelling != file_path else None
+    is_own_node = get_is_own_node(tu, opt_own_file_path)
+
+    stmt_list = []
+    for node in list_own_top_level_nodes(tu, rem_provided_symbols, is_own_node):
+        if not rem_provided_symbols:
+            return stmt_list
+        stmt_list += translate_tu_top_level_stmt(tu, file_path, node, rem_provided_symbols)
+
+    if rem_provided_symbols:
+        for node in tu.cursor.get_children():
+            if not rem_provided_symbols:
+                break
+            if not is_own_node(node):
+                stmt_list += translate_tu_top_level_stmt(tu, file_path, node, rem_provided_symbols)
+
+    return stmt_list
+
+
+def get_is_own_node(tu, opt_own_file_path=None) -> t.Callable[[clang.cindex.Cursor], bool]:
+    if opt_own_file_path is None:
+        return lambda node: is_in_main_file(node.location)
+    
+    own_file = tu.get_file(opt_own_file_path)
+    def is_own_node(node):
+        node_file = node.location.file
+        return node_file is not None and is_same_file(node_file, own_file)
+    return is_own_node
+
+
+def list_own_top_level_nodes(tu, provided_symbols: t.Set[str], is_own_node=None) -> t.List[clang.cindex.Cursor]:
+    """
+    Lists the top-level cursors in the translated file itself that are named after provided symbols, in order,
+    stopping once every provided symbol has been named.
+    Every translated statement declares a provided symbol (by name), so no other cursor needs to be translated.
+    :param is_own_node: see `get_is_own_node`: by default, cursors in the TU's main file are the file's own.
+    """
+    if is_own_node is None:
+        is_own_node = get_is_own_node(tu)
+
+    own_nodes = []
+    unnamed_symbols = set(provided_symbols)
+    
+    def visitor(node, parent, _):
+        # like `Cursor.get_children`: keeping the TU alive while the cursor is.
+        node._tu = tu
+        if node.spelling in provided_symbols and is_own_node(node):
+            own_nodes.append(node)
+            unnamed_symbols.discard(node.spelling)
+            if not unnamed_symbols:
+                return 0  # break
+        return 1  # continue
+
+    if provided_symbols:
+        clang.cindex.conf.lib.clang_visitChildren(tu.cursor, clang.cindex.callbacks["cursor_visit"](visitor), None)
+    return own_nodes
+
+
+# NOTE: much faster than comparing `location.file.name` with the TU's path.
+is_in_main_file = clang.cindex.conf.lib.clang_Location_isFromMainFile
+is_in_main_file.argtypes = [clang.cindex.SourceLocation]
+is_in_main_file.restype = ctypes.c_int
 
+is_same_file = clang.cindex.conf.lib.clang_File_isEqual
+is_same_file.argtypes = [clang.cindex.c_object_p, clang.cindex.c_object_p]
+is_same_file.restype = ctypes.c_int
 
-def translate_tu_top_level_stmt(tu, node, rem_provided_symbols) -> t.Iterable[ast1.BaseStatement]:
+
+def translate_tu_top_level_stmt(tu, file_path, node, rem_provided_symbols) -> t.Iterable[ast1.BaseStatement]:
     CursorKind = clang.cindex.CursorKind
 
     if node.kind == CursorKind.INCLUSION_DIRECTIVE:
-        yield from translate_inclusion_directive(tu, node, rem_provided_symbols)
+        yield from translate_inclusion_directive(tu, file_path, node, rem_provided_symbols)
     elif node.kind == CursorKind.MACRO_DEFINITION:
-        yield from translate_macro_definition(tu, node, rem_provided_symbols)
+        yield from translate_macro_definition(tu, file_path, node, rem_provided_symbols)
 
     elif node.kind in (CursorKind.STRUCT_DECL, CursorKind.UNION_DECL):
-        yield from translate_adt_decl(tu, node, rem_provided_symbols)
+        yield from translate_adt_decl(tu, file_path, node, rem_provided_symbols)
     elif node.kind == CursorKind.ENUM_DECL:
-        yield from translate_enum_decl(tu, node, rem_provided_symbols)
+        yield from translate_enum_decl(tu, file_path, node, rem_provided_symbols)
     elif node.kind == CursorKind.FUNCTION_DECL:
-        yield from translate_function_decl(tu, node, rem_provided_symbols)
+        yield from translate_function_decl(tu, file_path, node, rem_provided_symbols)
     elif node.kind == CursorKind.VAR_DECL:
-        yield from translate_variable_decl(tu, node, rem_provided_symbols)
+        yield from translate_variable_decl(tu, file_path, node, rem_provided_symbols)
     elif node.kind == CursorKind.TYPEDEF_DECL:
-        yield from translate_typedef_decl(tu, node, rem_provided_symbols)
+        yield from translate_typedef_decl(tu, file_path, node, rem_provided_symbols)
 
     elif node.kind in (CursorKind.STATIC_ASSERT,):
         # do nothing
         yield from iter(())
 
-    else:
-        # ignore this statement
+    elif node.spelling in rem_provided_symbols:
         raise NotImplementedError(f"Compiler error: unknown statement in extern C code: {node.kind}")
 
+    else:
+        # ignore this statement: it does not declare a provided symbol
+        yield from iter(())
 
-def translate_inclusion_directive(tu, node, rem_provided_symbols):
+
+def translate_inclusion_directive(tu, file_path, node, rem_provided_symbols):
     # TODO: recursively search for more symbols in the mentioned TU
     return iter(())
 
 
-def translate_macro_definition(tu, node, rem_provided_symbols):
+def translate_macro_definition(tu, file_path, node, rem_provided_symbols):
     tokens = list(clang.cindex.TokenGroup.get_tokens(tu, node.extent))
     macro_name = tokens[0].spelling
     if macro_name in rem_provided_symbols:
         panic.because(
             panic.ExitCode.UnsupportedExternCFeature,
             "C macros cannot be exported (please re-bind as an inline function, constant, or type if possible)",
-            opt_loc=loc(node)
+            opt_loc=loc(node, file_path)
         )
     return iter(())
 
 
-def translate_adt_decl(tu, node, rem_provided_symbols):
+def translate_adt_decl(tu, file_path, node, rem_provided_symbols):
     assert node.kind in (CursorKind.UNION_DECL, CursorKind.STRUCT_DECL)
     adt_name = node.spelling
     if adt_name in rem_provided_symbols:
         rem_provided_symbols.remove(adt_name)
-        adt_ts = translate_clang_type_to_ts(node.type, is_direct_use=False)
+        adt_ts = translate_clang_type_to_ts(node.type, file_path, is_direct_use=False)
         assert adt_ts.wb_type is not None
-        yield ast1.Bind1tStatement(loc(node), adt_name, adt_ts)
+        yield ast1.Bind1tStatement(loc(node, file_path), adt_name, adt_ts)
 
 
-def translate_enum_decl(tu, node, rem_provided_symbols):
+def translate_enum_decl(tu, file_path, node, rem_provided_symbols):
     enum_name = node.spelling
     if enum_name in rem_provided_symbols:
         rem_provided_symbols.remove(enum_name)
-        const_ts = translate_clang_type_to_ts(node.enum_type)
+        const_ts = translate_clang_type_to_ts(node.enum_type, file_path)
         body = []
         for entry in node.get_children():
             assert entry.kind == CursorKind.ENUM_CONSTANT_DECL
             enum_entry_value = entry.enum_value
             init_exp = ast1.IntExpression(
-                loc(entry),
+                loc(entry, file_path),
                 str(enum_entry_value),
                 enum_entry_value,
                 10,
                 is_unsigned=const_ts.is_unsigned_int,
                 width_in_bits=const_ts.int_width_in_bits
             )
-            bind1v_stmt = ast1.Bind1vStatement(loc(entry), entry.spelling, init_exp, is_constant=True)
+            bind1v_stmt = ast1.Bind1vStatement(loc(entry, file_path), entry.spelling, init_exp, is_constant=True)
             body.append(bind1v_stmt)
-        yield ast1.ConstStatement(loc(node), body, const_ts)
+        yield ast1.ConstStatement(loc(node, file_path), body, const_ts)
 
 
-def translate_adt_field_decl_to_ts(tu, node, rem_provided_symbols):
+def translate_adt_field_decl_to_ts(tu, file_path, node, rem_provided_symbols):
     assert node.kind == CursorKind.FIELD_DECL
-    return translate_clang_type_to_ts(node.type)
+    return translate_clang_type_to_ts(node.type, file_path)
 
 
-def translate_function_decl(tu, node, rem_provided_symbols):
+def translate_function_decl(tu, file_path, node, rem_provided_symbols):
     func_name = node.spelling
     if func_name in rem_provided_symbols:
         rem_provided_symbols.remove(func_name)
         clang_func_ret_type = node.type.get_result()
         arg_names = [arg_node.spelling for arg_node in node.get_arguments()]
         arg_typespecs = [
-            translate_clang_type_to_ts(clang_arg_type, False) 
+            translate_clang_type_to_ts(clang_arg_type, file_path, False) 
             for clang_arg_type in node.type.argument_types()
         ]
-        ret_ts = translate_clang_type_to_ts(node.type.get_result())
+        ret_ts = translate_clang_type_to_ts(node.type.get_result(), file_path)
         fn_str = (
             clang_func_ret_type.spelling + " " + 
             node.spelling + 
             "(" + ', '.join((t.spelling for t in node.type.argument_types())) + ")"
         )
-        yield ast1.Extern1fStatement(loc(node), func_name, arg_names, arg_typespecs, ret_ts, fn_str)
+        yield ast1.Extern1fStatement(loc(node, file_path), func_name, arg_names, arg_typespecs, ret_ts, fn_str)
         
     # exit()
 
 
-def translate_variable_decl(tu, node, rem_provided_symbols):
+def translate_variable_decl(tu, file_path, node, rem_provided_symbols):
     var_name = node.spelling
     if var_name in rem_provided_symbols:
         rem_provided_symbols.remove(var_name)
-        var_ts = translate_clang_type_to_ts(node.type, True)
+        var_ts = translate_clang_type_to_ts(node.type, file_path, True)
         var_str = node.type.spelling + " " + node.spelling
         # is_mut = var_ts.wb_type.is_mut
-        yield ast1.Extern1vStatement(loc(node), var_name, var_ts, var_str)
+        yield ast1.Extern1vStatement(loc(node, file_path), var_name, var_ts, var_str)
 
 
-def translate_typedef_decl(tu, node, rem_provided_symbols):
+def translate_typedef_decl(tu, file_path, node, rem_provided_symbols):
     type_name = node.spelling
     if type_name in rem_provided_symbols:
         rem_provided_symbols.remove(type_name)
-        stmt = ast1.Bind1tStatement(loc(node), type_name, translate_clang_type_to_ts(node.type, False))
+        stmt = ast1.Bind1tStatement(loc(node, file_path), type_name, translate_clang_type_to_ts(node.type, file_path, False))
         yield stmt
 
 
-def loc(node):
-    return feedback.FileLoc(node.translation_unit.spelling, feedback.FilePos(node.location.line-1, node.location.column-1))
+def loc(node, file_path):
+    """
+    :param file_path: the translated file (cf `translate_tu`), in which locations without a file are reported.
+    """
+    # NOTE: a node's file is not the TU's main file if it is included (e.g. in a package TU).
+    node_file = node.location.file
+    if node_file is not None:
+        file_path = node_file.name
+    return feedback.FileLoc(file_path, feedback.FilePos(node.location.line-1, node.location.column-1))
 
 
-def c_type_loc(c_type):
-    return loc(c_type.get_declaration())
+def c_type_loc(c_type, file_path):
+    return loc(c_type.get_declaration(), file_path)
 
     
 def dbg_print_visit(tu, node, indent_count=1, tab_w=2):
@@ -244,13 +727,18 @@ def dbg_print_visit(tu, node, indent_count=1, tab_w=2):
         dbg_print_visit(tu, child, 1 + indent_count)
 
 
-def translate_clang_type_to_ts(c_type: clang.cindex.Type, is_direct_use=True) -> ast1.BaseTypeSpec:
-    ts = help_translate_clang_type_to_ts(c_type.get_canonical(), is_direct_use=is_direct_use)
-    ts.wb_type.is_mut = not c_type.is_const_qualified()
+def translate_clang_type_to_ts(c_type: clang.cindex.Type, file_path, is_direct_use=True) -> ast1.BaseTypeSpec:
+    ts = help_translate_clang_type_to_ts(c_type.get_canonical(), file_path, is_direct_use=is_direct_use)
+    is_mut = not c_type.is_const_qualified()
+    if isinstance(ts.wb_type, types.BaseStructuralType):
+        # hash-consed types are shared, so they cannot be modified in place.
+        ts.wb_type = ts.wb_type.with_is_mut(is_mut)
+    else:
+        ts.wb_type.is_mut = is_mut
     return ts
 
 
-def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
+def help_translate_clang_type_to_ts(c_type, file_path, is_direct_use) -> ast1.BaseTypeSpec:
     size_in_bytes = c_type.get_size()
     if is_direct_use and size_in_bytes <= 0 and c_type.kind != TypeKind.VOID:
         # error: indirect type def used directly
@@ -260,11 +748,11 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             opt_file_path=c_type.translation_unit.spelling
         )
     if c_type.kind == TypeKind.VOID:
-        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type), ast1.BuiltinPrimitiveTypeIdentity.Void)
+        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type, file_path), ast1.BuiltinPrimitiveTypeIdentity.Void)
         ts.wb_type = types.VoidType.singleton
         return ts
     elif c_type.kind == TypeKind.BOOL:
-        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type), ast1.BuiltinPrimitiveTypeIdentity.Bool)
+        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type, file_path), ast1.BuiltinPrimitiveTypeIdentity.Bool)
         ts.wb_type = types.IntType.get(8, is_signed=False)
         return ts
     elif c_type.kind in (TypeKind.CHAR_S, TypeKind.SCHAR, TypeKind.SHORT, TypeKind.INT, TypeKind.LONG, TypeKind.LONGLONG):
@@ -274,7 +762,7 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             4: ast1.BuiltinPrimitiveTypeIdentity.Int32,
             8: ast1.BuiltinPrimitiveTypeIdentity.Int64
         }[size_in_bytes]
-        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type), builtin_primitive_type_id)
+        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type, file_path), builtin_primitive_type_id)
         ts.wb_type = types.IntType.get(8 * size_in_bytes, is_signed=True)
         return ts
     elif c_type.kind in (TypeKind.UCHAR, TypeKind.USHORT, TypeKind.UINT, TypeKind.ULONG, TypeKind.ULONGLONG):
@@ -284,7 +772,7 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             4: ast1.BuiltinPrimitiveTypeIdentity.UInt32,
             8: ast1.BuiltinPrimitiveTypeIdentity.UInt64
         }[size_in_bytes]
-        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type), builtin_primitive_type_id)
+        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type, file_path), builtin_primitive_type_id)
         ts.wb_type = types.IntType.get(8 * size_in_bytes, is_signed=False)
         return ts
     elif c_type.kind in (TypeKind.FLOAT, TypeKind.DOUBLE, TypeKind.LONGDOUBLE):
@@ -293,13 +781,14 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             8: ast1.BuiltinPrimitiveTypeIdentity.Float64,
             16: ast1.BuiltinPrimitiveTypeIdentity.Float128
         }[size_in_bytes]
-        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type), builtin_primitive_type_id)
+        ts = ast1.BuiltinPrimitiveTypeSpec(c_type_loc(c_type, file_path), builtin_primitive_type_id)
         ts.wb_type = types.FloatType.get(8 * size_in_bytes)
         return ts
     elif c_type.kind == TypeKind.RECORD:
         # struct or union: must recurse
         declaration = c_type.get_declaration()
         type_name = declaration.spelling
+        declaration_cache_map = session.current().declaration_cache_map
         opt_cached_ts = declaration_cache_map.get(type_name, None)
         type_ctor = {
             ast1.LinearTypeOp.Product: types.StructType,
@@ -307,7 +796,7 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
         }[lto_map[declaration.kind]]
         if opt_cached_ts is not None:
             assert opt_cached_ts.wb_type is not None
-            ts = ast1.IdRefTypeSpec(c_type_loc(c_type), type_name)
+            ts = ast1.IdRefTypeSpec(c_type_loc(c_type, file_path), type_name)
             ts.wb_type = opt_cached_ts.wb_type
             return ts
         else:
@@ -317,7 +806,7 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             # refer to this instance with no fields, and we can retroactively
             # push the fields into this instance.
             fields = []
-            ts = ast1.AdtTypeSpec(c_type_loc(c_type), lto_map[declaration.kind], fields)
+            ts = ast1.AdtTypeSpec(c_type_loc(c_type, file_path), lto_map[declaration.kind], fields)
             ts.wb_type = type_ctor([], opt_name=type_name)  # temporary wb_type
 
             declaration_cache_map[type_name] = ts
@@ -325,7 +814,7 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             for it in c_type.get_fields():
                 field_key = (
                     it.spelling, 
-                    translate_clang_type_to_ts(it.type, is_direct_use=is_direct_use)
+                    translate_clang_type_to_ts(it.type, file_path, is_direct_use=is_direct_use)
                 )
                 fields.append(field_key)
                 ts.push_field(field_key)
@@ -339,36 +828,35 @@ def help_translate_clang_type_to_ts(c_type, is_direct_use) -> ast1.BaseTypeSpec:
             return ts
     elif c_type.kind == TypeKind.POINTER:
         clang_pointee_ts = c_type.get_pointee()
-        pointee_ts = translate_clang_type_to_ts(clang_pointee_ts, False)
+        pointee_ts = translate_clang_type_to_ts(clang_pointee_ts, file_path, False)
         contents_is_mut = not clang_pointee_ts.is_const_qualified()
-        ts = ast1.PtrTypeSpec(c_type_loc(c_type), pointee_ts, contents_is_mut)
+        ts = ast1.PtrTypeSpec(c_type_loc(c_type, file_path), pointee_ts, contents_is_mut)
         ts.wb_type = types.PointerType.new(pointee_ts.wb_type, contents_is_mut)
         return ts
     elif c_type.kind == TypeKind.ENUM:
-        ts = translate_clang_type_to_ts(c_type.get_declaration().enum_type)
+        ts = translate_clang_type_to_ts(c_type.get_declaration().enum_type, file_path)
         assert ts.wb_type is not None
         return ts
     elif c_type.kind == TypeKind.FUNCTIONPROTO:
-        arg_types = [translate_clang_type_to_ts(arg_type, is_direct_use=False).wb_type for arg_type in c_type.argument_types()]
-        ret_ts = translate_clang_type_to_ts(c_type.get_result(), is_direct_use=False)
+        arg_types = [translate_clang_type_to_ts(arg_type, file_path, is_direct_use=False).wb_type for arg_type in c_type.argument_types()]
+        ret_ts = translate_clang_type_to_ts(c_type.get_result(), file_path, is_direct_use=False)
         is_func_variadic = c_type.is_function_variadic()
         if is_func_variadic:
             raise NotImplementedError("Exposing variadic function type.")
-        ts = ast1.ProcSignatureTypeSpec(c_type_loc(c_type), arg_types, ret_ts, takes_closure=False, is_c_variadic=is_func_variadic)
+        ts = ast1.ProcSignatureTypeSpec(c_type_loc(c_type, file_path), arg_types, ret_ts, takes_closure=False, is_c_variadic=is_func_variadic)
         ts.wb_type = types.ProcedureType.new(arg_types, ret_ts.wb_type, has_closure_slot=False, is_c_variadic=is_func_variadic)
         return ts
     elif c_type.kind == TypeKind.CONSTANTARRAY:
-        element_type_spec = translate_clang_type_to_ts(c_type.element_type, is_direct_use=False)
+        element_type_spec = translate_clang_type_to_ts(c_type.element_type, file_path, is_direct_use=False)
         element_count = c_type.element_count
         is_mut = c_type.element_type.is_const_qualified()
-        ts = ast1.ArrayTypeSpec(c_type_loc(c_type), element_type_spec, element_count, is_mut)
-        ts.wb_type = types.ArrayType.new(element_type_spec.wb_type, types.UniqueValueType(element_count), is_mut)
+        ts = ast1.ArrayTypeSpec(c_type_loc(c_type, file_path), element_type_spec, element_count, is_mut)
+        ts.wb_type = types.ArrayType.new(element_type_spec.wb_type, types.UniqueValueType.get(element_count), is_mut)
         return ts
     else:
         raise NotImplementedError(f"Unknown Clang canonical type kind for type: '{c_type.spelling}' with kind={c_type.kind}")
 
 
-declaration_cache_map = {}
 lto_map = {
     CursorKind.STRUCT_DECL: ast1.LinearTypeOp.Product,
     CursorKind.UNION_DECL: ast1.LinearTypeOp.Sum
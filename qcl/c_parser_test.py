@@ -0,0 +1,170 @@
+import contextlib
+import io
+import os.path
+import tempfile
+import unittest
+import unittest.mock
+
+from . import ast1
+from . import c_parser
+from . import disk_cache
+from . import session
+
+
+a_header_text = """
+#pragma once
+struct A { int x; double y; };
+typedef struct A A;
+A* a_new(int x);
+"""
+
+b_header_text = """
+#pragma once
+#include "a.h"
+struct B { A* a; unsigned char flags[4]; };
+void b_init(struct B* b, A const* a);
+"""
+
+c_header_text = """
+#pragma once
+#include "a.h"
+static inline int c_get(void) { return a_new(42) != 0; }
+"""
+
+header_symbol_map = {
+    "a.h": {"A", "a_new"},
+    "b.h": {"B", "b_init"},
+    "c.h": {"c_get", "a_new"},
+}
+
+
+def dump_translation(stmt_list):
+    return (
+        ast1.dump_tree(stmt_list),
+        [
+            (node.__class__.__name__, str(node.wb_type))
+            for node in ast1.iter_subtree_nodes(stmt_list)
+            if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None
+        ]
+    )
+
+
+class TestHeaderTranslation(unittest.TestCase):
+    def setUp(self):
+        self.session = session.CompilationSession().__enter__()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.header_dir_path = os.path.join(self.temp_dir.name, "include")
+        os.mkdir(self.header_dir_path)
+        self.write_header("a.h", a_header_text)
+        self.write_header("b.h", b_header_text)
+        self.write_header("c.h", c_header_text)
+        self.header_cache = disk_cache.DiskCache(self.temp_dir.name, "c_headers")
+
+    def tearDown(self):
+        self.session.__exit__(None, None, None)
+        self.temp_dir.cleanup()
+
+    def write_header(self, file_name, text):
+        with open(os.path.join(self.header_dir_path, file_name), "w") as header_file:
+            header_file.write(text)
+
+    def translate(self, file_names, opt_header_cache):
+        """
+        Translates headers in order, as if from a fresh compiler: returns each header's statements and the number
+        of files parsed by libclang.
+        """
+        self.session.declaration_cache_map.clear()
+        stmt_lists = []
+        with unittest.mock.patch.object(c_parser, "parse_tu", wraps=c_parser.parse_tu) as parse_tu:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for file_name in file_names:
+                    file_path = os.path.join(self.header_dir_path, file_name)
+                    provided_symbols = header_symbol_map[file_name]
+                    prepared = c_parser.prepare_one_file(
+                        file_path, provided_symbols, ["-Wall"], "linux-amd64", opt_header_cache
+                    )
+                    stmt_list, exposed_symbols = c_parser.parse_one_file(file_path, provided_symbols, True, prepared)
+                    self.assertEqual(exposed_symbols, provided_symbols)
+                    stmt_lists.append(stmt_list)
+            return stmt_lists, parse_tu.call_count
+
+    def translate_package(self, file_names, opt_ast_cache):
+        """
+        Like `translate`, but prepares the headers together, as a package.
+        """
+        self.session.declaration_cache_map.clear()
+        header_list = [
+            (os.path.join(self.header_dir_path, file_name), header_symbol_map[file_name])
+            for file_name in file_names
+        ]
+        stmt_lists = []
+        with unittest.mock.patch.object(c_parser, "parse_tu", wraps=c_parser.parse_tu) as parse_tu:
+            with contextlib.redirect_stdout(io.StringIO()):
+                prepared_header_list = c_parser.prepare_package_headers(
+                    header_list, ["-Wall"], "linux-amd64", None, opt_ast_cache
+                )
+                for (file_path, provided_symbols), prepared in zip(header_list, prepared_header_list):
+                    stmt_list, exposed_symbols = c_parser.parse_one_file(file_path, provided_symbols, True, prepared)
+                    self.assertEqual(exposed_symbols, provided_symbols)
+                    stmt_lists.append(stmt_list)
+            return stmt_lists, parse_tu.call_count
+
+    def test_warm_translation_matches_cold_without_libclang(self):
+        expected_stmt_lists, _ = self.translate(["a.h", "b.h"], None)
+        self.translate(["a.h", "b.h"], self.header_cache)
+        stmt_lists, parse_count = self.translate(["a.h", "b.h"], self.header_cache)
+
+        self.assertEqual(parse_count, 0)
+        self.assertEqual(
+            list(map(dump_translation, stmt_lists)),
+            list(map(dump_translation, expected_stmt_lists))
+        )
+
+        # 'b.h' refers to the same struct type as 'a.h', not a copy:
+        a_type = self.session.declaration_cache_map["A"].wb_type
+        b_type = self.session.declaration_cache_map["B"].wb_type
+        self.assertIs(b_type.field_types[0].pointee_type, a_type)
+
+    def test_changed_include_is_translated_again(self):
+        self.translate(["a.h", "b.h"], self.header_cache)
+        self.write_header("a.h", a_header_text.replace("double y;", "double y; char z;"))
+
+        expected_stmt_lists, _ = self.translate(["a.h", "b.h"], None)
+        stmt_lists, parse_count = self.translate(["a.h", "b.h"], self.header_cache)
+        self.assertEqual(parse_count, 2)
+        self.assertEqual(
+            list(map(dump_translation, stmt_lists)),
+            list(map(dump_translation, expected_stmt_lists))
+        )
+
+    def test_translation_with_missing_imports_is_not_restored(self):
+        # cached after 'a.h', the translation of 'b.h' imports 'A', so it cannot be restored on its own:
+        self.translate(["a.h", "b.h"], self.header_cache)
+
+        expected_stmt_lists, _ = self.translate(["b.h"], None)
+        stmt_lists, parse_count = self.translate(["b.h"], self.header_cache)
+        self.assertEqual(parse_count, 1)
+        self.assertEqual(
+            list(map(dump_translation, stmt_lists)),
+            list(map(dump_translation, expected_stmt_lists))
+        )
+
+    def test_package_translation_matches_separate_translation(self):
+        ast_cache = disk_cache.DiskCache(self.temp_dir.name, "c_asts")
+        expected_stmt_lists, _ = self.translate(["a.h", "b.h", "c.h"], None)
+        # without the AST cache, then with it (cold, then warm):
+        for opt_ast_cache, expected_parse_count in [(None, 1), (ast_cache, 1), (ast_cache, 0)]:
+            stmt_lists, parse_count = self.translate_package(["a.h", "b.h", "c.h"], opt_ast_cache)
+            self.assertEqual(parse_count, expected_parse_count)
+            self.assertEqual(
+                list(map(dump_translation, stmt_lists)),
+                list(map(dump_translation, expected_stmt_lists))
+            )
+
+    def test_reexported_symbols_are_found_in_included_files(self):
+        [stmt_list], _ = self.translate(["c.h"], None)
+        self.assertEqual([stmt.name for stmt in stmt_list], ["c_get", "a_new"])
+
+
+if __name__ == "__main__":
+    unittest.main()
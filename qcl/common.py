@@ -1,3 +1,5 @@
 class Mixin(object):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -7,4 +7,5 @@ WRONG_QYP_LIKE_EXTENSIONS = [
 QY_SOURCE_FILE_EXTENSION = ".qy"
 C_HEADER_FILE_EXTENSION = ".h"
 C_SOURCE_FILE_EXTENSIONS = [".c", ".a", ".lib", ".so", ".dylib", ".dll"]
+COMPILER_VERSION = "2.1"
 COMPILER_IN_DEBUG_MODE = True
@@ -0,0 +1,349 @@
+"""
+`const_fold` folds constant expressions after typing and before emission, so the emitter can print literals instead of
+operator trees and references to compile-time constants.
+
+Every operator expression whose operands are literals or compile-time constants, and every reference to a
+compile-time constant (including `pred!`), is replaced by its value: the value is written back to the expression's
+`opt_cached_const_value` (as a `ConstantValue`), with `cache_valid` set, and the emitter prints it as a literal of the
+expression's type. Literals themselves are left untouched, so they keep their original notation (e.g. hexadecimal).
+
+Folding follows the semantics of the emitted C++, so that it never changes what a program computes:
+- unsigned integer arithmetic wraps around to the width of its type;
+- an operation that is undefined or implementation-specific in C++ (e.g. signed overflow, division by zero, shifting
+  by more than the width of the type, or shifting a negative value) is not folded, nor is integer arithmetic on types
+  narrower than 32 bits, which C++ promotes to `int`;
+- expressions of integer types narrower than 32 bits are never replaced, since C++ has no literals of these types,
+  but their values are still used to fold comparisons;
+- `F32` arithmetic is rounded to single precision after each operation, and operations yielding infinities or NaNs
+  are not folded.
+An expression that cannot be folded is emitted as written.
+"""
+
+import dataclasses
+import math
+import struct
+import typing as t
+
+from . import ast1
+from . import ast2
+from . import types
+from . import typer
+
+
+@dataclasses.dataclass(frozen=True)
+class ConstantValue:
+    value: t.Union[int, float]
+    type: t.Union[types.IntType, types.FloatType]
+
+
+def fold_constants_in_qyp_set(qyp_set: ast2.QypSet) -> int:
+    """
+    Folds every constant expression in a typed package set, returning the number of expression nodes folded.
+    """
+    folder = ConstantFolder()
+    folded_node_count = 0
+    for _, _, source_file in qyp_set.iter_src_paths():
+        if isinstance(source_file, ast2.QySourceFile):
+            for node in ast1.iter_subtree_nodes(source_file.stmt_list):
+                if isinstance(node, ast1.BaseExpression):
+                    folder.fold(node)
+                    folded_node_count += node.cache_valid
+    return folded_node_count
+
+
+class ConstantFolder(object):
+    """
+    Folds expressions in post-order using an explicit stack of tasks, like `interp.ConstantEvaluator`, so that long
+    chains of constants (e.g. the `pred!` chains of 'const' blocks) never exhaust the Python stack.
+    Each expression and each definition is folded at most once.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # the values of folded expressions and definitions, or `None` for those that cannot be folded.
+        self.exp_value_map: t.Dict[ast1.BaseExpression, t.Optional[ConstantValue]] = {}
+        self.def_value_map: t.Dict["typer.ValueDefinition", t.Optional[ConstantValue]] = {}
+
+        # the definitions whose initializers are being folded: a definition that depends on itself is not folded.
+        self.pending_defs: t.Set["typer.ValueDefinition"] = set()
+
+        self.task_stack = []
+        self.value_stack: t.List[t.Optional[ConstantValue]] = []
+
+    def fold(self, exp: ast1.BaseExpression) -> t.Optional[ConstantValue]:
+        self.task_stack.append((self.visit, exp))
+        while self.task_stack:
+            task, arg = self.task_stack.pop()
+            task(arg)
+        assert len(self.value_stack) == 1
+        return self.value_stack.pop()
+
+    def visit(self, exp: ast1.BaseExpression):
+        if exp in self.exp_value_map:
+            self.value_stack.append(self.exp_value_map[exp])
+
+        elif isinstance(exp, ast1.IntExpression):
+            self.value_stack.append(int_literal_value(exp))
+
+        elif isinstance(exp, ast1.FloatExpression):
+            self.value_stack.append(float_literal_value(exp))
+
+        elif isinstance(exp, ast1.UnaryOpExpression):
+            self.task_stack.append((self.apply_unary_operator, exp))
+            self.task_stack.append((self.visit, exp.operand))
+
+        elif isinstance(exp, ast1.BinaryOpExpression):
+            self.task_stack.append((self.apply_binary_operator, exp))
+            self.task_stack.append((self.visit, exp.rt_operand_exp))
+            self.task_stack.append((self.visit, exp.lt_operand_exp))
+
+        elif isinstance(exp, ast1.IdRefExpression):
+            opt_def_obj = constant_definition(exp)
+            if opt_def_obj is None or opt_def_obj in self.pending_defs:
+                self.set_exp_value(exp, None)
+            elif opt_def_obj in self.def_value_map:
+                self.set_exp_value(exp, self.def_value_map[opt_def_obj])
+            else:
+                self.pending_defs.add(opt_def_obj)
+                self.task_stack.append((self.leave_definition, (exp, opt_def_obj)))
+                self.task_stack.append((self.visit, opt_def_obj.binder.initializer))
+
+        else:
+            self.set_exp_value(exp, None)
+
+    def leave_definition(self, arg: t.Tuple[ast1.IdRefExpression, "typer.ValueDefinition"]):
+        exp, def_obj = arg
+        self.pending_defs.remove(def_obj)
+        opt_value = self.value_stack.pop()
+
+        # the initializer must have exactly the type of the definition, since the literal replaces the definition.
+        _, def_type = def_obj.scheme.instantiate()
+        if opt_value is not None and opt_value.type is not atomic_type(def_type):
+            opt_value = None
+
+        self.def_value_map[def_obj] = opt_value
+        self.set_exp_value(exp, opt_value)
+
+    def apply_unary_operator(self, exp: ast1.UnaryOpExpression):
+        opt_operand = self.value_stack.pop()
+        if opt_operand is None:
+            self.set_exp_value(exp, None)
+        else:
+            self.set_exp_value(exp, fold_unary_operator(exp.operator, opt_operand))
+
+    def apply_binary_operator(self, exp: ast1.BinaryOpExpression):
+        opt_rt_operand = self.value_stack.pop()
+        opt_lt_operand = self.value_stack.pop()
+        if opt_lt_operand is None or opt_rt_operand is None:
+            self.set_exp_value(exp, None)
+        else:
+            self.set_exp_value(exp, fold_binary_operator(exp.operator, opt_lt_operand, opt_rt_operand))
+
+    def set_exp_value(self, exp: ast1.BaseExpression, opt_value: t.Optional[ConstantValue]):
+        self.exp_value_map[exp] = opt_value
+        if opt_value is not None and is_literal_type(opt_value.type):
+            exp.opt_cached_const_value = opt_value
+            exp.cache_valid = True
+        self.value_stack.append(opt_value)
+
+
+def constant_definition(exp: ast1.IdRefExpression) -> t.Optional["typer.ValueDefinition"]:
+    """
+    Returns the definition referred to by `exp` if it is a compile-time constant bound to an initializer (i.e. not a
+    function or an extern), else `None`.
+    """
+    if exp.wb_ctx is None:
+        return None
+    opt_def_obj = exp.wb_ctx.try_lookup(exp.name)
+    if not isinstance(opt_def_obj, typer.ValueDefinition) or not opt_def_obj.is_compile_time_constant:
+        return None
+    if opt_def_obj.extern_tag is not None or opt_def_obj.scheme.vars:
+        return None
+    if not isinstance(opt_def_obj.binder, ast1.Bind1vStatement) or opt_def_obj.binder.initializer is None:
+        return None
+    return opt_def_obj
+
+
+#
+# Values:
+#
+
+bool_type = types.IntType.get(1, is_signed=False)
+
+
+def atomic_type(qy_type: types.BaseType) -> t.Optional[t.Union[types.IntType, types.FloatType]]:
+    """
+    Returns the (immutable) numeric type equivalent to `qy_type`, or `None` if it is not numeric.
+    """
+    if isinstance(qy_type, types.IntType):
+        return types.IntType.get(qy_type.width_in_bits, qy_type.is_signed)
+    elif isinstance(qy_type, types.FloatType):
+        return types.FloatType.get(qy_type.width_in_bits)
+    else:
+        return None
+
+
+def int_literal_value(exp: ast1.IntExpression) -> t.Optional[ConstantValue]:
+    return opt_int_value(exp.value, types.IntType.get(exp.width_in_bits, is_signed=not exp.is_unsigned))
+
+
+def float_literal_value(exp: ast1.FloatExpression) -> t.Optional[ConstantValue]:
+    return opt_float_value(exp.value, types.FloatType.get(exp.width_in_bits))
+
+
+def opt_int_value(value: int, int_type: types.IntType) -> t.Optional[ConstantValue]:
+    min_value, max_value = int_range(int_type)
+    if min_value <= value <= max_value:
+        return ConstantValue(value, int_type)
+    else:
+        return None
+
+
+def opt_float_value(value: float, float_type: types.FloatType) -> t.Optional[ConstantValue]:
+    if float_type.width_in_bits == 32:
+        try:
+            value = struct.unpack('f', struct.pack('f', value))[0]
+        except OverflowError:
+            return None
+    if math.isfinite(value):
+        return ConstantValue(value, float_type)
+    else:
+        return None
+
+
+def int_range(int_type: types.IntType) -> t.Tuple[int, int]:
+    if int_type.is_signed:
+        return -(1 << (int_type.width_in_bits - 1)), (1 << (int_type.width_in_bits - 1)) - 1
+    else:
+        return 0, (1 << int_type.width_in_bits) - 1
+
+
+def is_arithmetic_int_type(qy_type: types.BaseType) -> bool:
+    # narrower integers are promoted to `int` by C++, so their arithmetic is not performed in their own type.
+    return isinstance(qy_type, types.IntType) and qy_type.width_in_bits >= 32
+
+
+def is_literal_type(qy_type: types.BaseType) -> bool:
+    # C++ has no literals of narrower integer types: their values are still folded into comparisons, but expressions
+    # of these types are emitted as written.
+    return qy_type is bool_type or isinstance(qy_type, types.FloatType) or is_arithmetic_int_type(qy_type)
+
+
+#
+# Operators:
+#
+
+def fold_unary_operator(operator: ast1.UnaryOperator, operand: ConstantValue) -> t.Optional[ConstantValue]:
+    operand_type = operand.type
+    if operator == ast1.UnaryOperator.LogicalNot:
+        if operand_type is bool_type:
+            return ConstantValue(int(not operand.value), bool_type)
+    elif operator in (ast1.UnaryOperator.Minus, ast1.UnaryOperator.Plus):
+        sign = -1 if operator == ast1.UnaryOperator.Minus else 1
+        if isinstance(operand_type, types.FloatType):
+            return opt_float_value(sign * operand.value, operand_type)
+        elif is_arithmetic_int_type(operand_type) and operand_type.is_signed:
+            return opt_int_value(sign * operand.value, operand_type)
+    return None
+
+
+def fold_binary_operator(
+    operator: ast1.BinaryOperator,
+    lt_operand: ConstantValue,
+    rt_operand: ConstantValue
+) -> t.Optional[ConstantValue]:
+    operand_type = lt_operand.type
+    if rt_operand.type is not operand_type:
+        return None
+    lt_value, rt_value = lt_operand.value, rt_operand.value
+
+    if operator in comparison_operator_map:
+        return ConstantValue(int(comparison_operator_map[operator](lt_value, rt_value)), bool_type)
+    elif operator in (ast1.BinaryOperator.LogicalAnd, ast1.BinaryOperator.LogicalOr):
+        if operand_type is not bool_type:
+            return None
+        if operator == ast1.BinaryOperator.LogicalAnd:
+            return ConstantValue(int(lt_value and rt_value), bool_type)
+        else:
+            return ConstantValue(int(lt_value or rt_value), bool_type)
+    elif isinstance(operand_type, types.FloatType):
+        return fold_float_binary_operator(operator, lt_value, rt_value, operand_type)
+    elif is_arithmetic_int_type(operand_type):
+        return fold_int_binary_operator(operator, lt_value, rt_value, operand_type)
+    else:
+        return None
+
+
+comparison_operator_map: t.Dict[ast1.BinaryOperator, t.Callable[[t.Any, t.Any], bool]] = {
+    ast1.BinaryOperator.LThan: lambda lt_value, rt_value: lt_value < rt_value,
+    ast1.BinaryOperator.GThan: lambda lt_value, rt_value: lt_value > rt_value,
+    ast1.BinaryOperator.LEq: lambda lt_value, rt_value: lt_value <= rt_value,
+    ast1.BinaryOperator.GEq: lambda lt_value, rt_value: lt_value >= rt_value,
+    ast1.BinaryOperator.Eq: lambda lt_value, rt_value: lt_value == rt_value,
+    ast1.BinaryOperator.NEq: lambda lt_value, rt_value: lt_value != rt_value,
+}
+
+
+def fold_float_binary_operator(
+    operator: ast1.BinaryOperator,
+    lt_value: float,
+    rt_value: float,
+    float_type: types.FloatType
+) -> t.Optional[ConstantValue]:
+    if operator == ast1.BinaryOperator.Add:
+        return opt_float_value(lt_value + rt_value, float_type)
+    elif operator == ast1.BinaryOperator.Sub:
+        return opt_float_value(lt_value - rt_value, float_type)
+    elif operator == ast1.BinaryOperator.Mul:
+        return opt_float_value(lt_value * rt_value, float_type)
+    elif operator == ast1.BinaryOperator.Div and rt_value != 0:
+        return opt_float_value(lt_value / rt_value, float_type)
+    else:
+        return None
+
+
+def fold_int_binary_operator(
+    operator: ast1.BinaryOperator,
+    lt_value: int,
+    rt_value: int,
+    int_type: types.IntType
+) -> t.Optional[ConstantValue]:
+    width_in_bits = int_type.width_in_bits
+
+    if operator == ast1.BinaryOperator.Add:
+        res = lt_value + rt_value
+    elif operator == ast1.BinaryOperator.Sub:
+        res = lt_value - rt_value
+    elif operator == ast1.BinaryOperator.Mul:
+        res = lt_value * rt_value
+    elif operator in (ast1.BinaryOperator.Div, ast1.BinaryOperator.Mod):
+        if rt_value == 0:
+            return None
+        # C++ rounds quotients toward zero, whereas Python rounds them down.
+        quotient = abs(lt_value) // abs(rt_value)
+        if (lt_value < 0) != (rt_value < 0):
+            quotient = -quotient
+        res = quotient if operator == ast1.BinaryOperator.Div else lt_value - rt_value * quotient
+    elif operator in (ast1.BinaryOperator.LSh, ast1.BinaryOperator.RSh):
+        if not 0 <= rt_value < width_in_bits:
+            return None
+        if lt_value < 0:
+            # undefined for left shifts, and implementation-defined for right shifts.
+            return None
+        elif operator == ast1.BinaryOperator.RSh:
+            res = lt_value >> rt_value
+        else:
+            res = lt_value << rt_value
+    elif operator == ast1.BinaryOperator.BitwiseAnd:
+        res = lt_value & rt_value
+    elif operator == ast1.BinaryOperator.BitwiseXOr:
+        res = lt_value ^ rt_value
+    elif operator == ast1.BinaryOperator.BitwiseOr:
+        res = lt_value | rt_value
+    else:
+        return None
+
+    if not int_type.is_signed:
+        res &= (1 << width_in_bits) - 1
+    return opt_int_value(res, int_type)
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import os.path
+import unittest
+
+from . import ast1
+from . import ast2
+from . import const_fold
+from . import cpp_emitter
+from . import platform
+from . import qy_parser
+from . import session
+from . import typer
+from . import typer_test
+from . import types
+
+
+class TestConstantFolder(typer_test.PackageSetTestMixin, unittest.TestCase):
+    def fold_package(self, name, source_text, engine):
+        """
+        Types a package made of one source file with `engine` and folds it, returning its top-level statements and
+        the number of expression nodes folded.
+        Call it in a compilation session.
+        """
+        root_qyp_path = self.write_package(name, source_text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+            typer.type_one_qyp_set(qyp_set, engine)
+        folded_node_count = const_fold.fold_constants_in_qyp_set(qyp_set)
+        source_file_path = os.path.join(os.path.dirname(root_qyp_path), f"{name}.qy")
+        self.qyp_set = qyp_set
+        return qyp_set.root_qyp.src_map[source_file_path].stmt_list, folded_node_count
+
+    def assert_folded_values(self, const_stmt, expected_values):
+        """
+        Checks the folded value of each entry of a 'const' block, where `None` means that it must not be folded.
+        """
+        for entry, expected_value in zip(const_stmt.body, expected_values):
+            with self.subTest(entry=entry.name):
+                if expected_value is None:
+                    self.assertFalse(entry.initializer.cache_valid)
+                else:
+                    self.assertTrue(entry.initializer.cache_valid)
+                    self.assertEqual(entry.initializer.opt_cached_const_value, expected_value)
+
+    def test_integer_folding_follows_cpp_semantics(self):
+        i32 = types.IntType.get(32, is_signed=True)
+        u32 = types.IntType.get(32, is_signed=False)
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine), session.CompilationSession():
+                stmt_list, _ = self.fold_package(f"ints_{engine.name}", "\n".join([
+                    "const: Int { A = 6 * 7; B = (0 - pred!) / 5; C = (0 - A) % 5;",
+                    "D = 2147483647 + 1; E = 1 << 32; F = A / 0; G = (0 - 8) >> 1; };",
+                    "const: UInt { H = 0u - 1u; I = pred! * 2u; };",
+                ]), engine)
+                self.assert_folded_values(stmt_list[0], [
+                    const_fold.ConstantValue(42, i32),
+                    # rounded toward zero, as in C++:
+                    const_fold.ConstantValue(-8, i32),
+                    const_fold.ConstantValue(-2, i32),
+                    # undefined in C++:
+                    None,
+                    None,
+                    None,
+                    # implementation-defined in C++:
+                    None,
+                ])
+                self.assert_folded_values(stmt_list[1], [
+                    const_fold.ConstantValue(0xFFFFFFFF, u32),
+                    const_fold.ConstantValue(0xFFFFFFFE, u32),
+                ])
+
+    def test_long_pred_chains_are_folded(self):
+        # like `interp_test`, a chain deeper than Python's default recursion limit, yet short enough for the
+        # substitution engine.
+        entry_count = 1200
+        entry_lines = ["E0 = 0;"] + [f"E{i} = 1 + pred!;" for i in range(1, entry_count)]
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine), session.CompilationSession():
+                stmt_list, folded_node_count = self.fold_package(
+                    f"chain_{engine.name}", "const: Int {\n" + "\n".join(entry_lines) + "\n};\n", engine
+                )
+                (const_stmt,) = stmt_list
+                self.assertEqual(const_stmt.body[-1].initializer.opt_cached_const_value.value, entry_count - 1)
+
+                # each entry but the first folds an addition and a 'pred!' reference.
+                self.assertEqual(folded_node_count, 2 * (entry_count - 1))
+
+    def test_narrow_integer_constants_are_not_replaced(self):
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine), session.CompilationSession():
+                package_name = f"narrow_{engine.name}"
+                stmt_list, folded_node_count = self.fold_package(package_name, "\n".join([
+                    "const: UShort { A = 3us; B = pred!; };",
+                    "fn main () -> Int = do { val x = A; val c = A < 4us; 0 };",
+                ]), engine)
+                # C++ has no 'unsigned short' literals, but comparisons are still folded:
+                self.assert_folded_values(stmt_list[0], [None, None])
+                (comparison_exp,) = [
+                    node for node in ast1.iter_subtree_nodes(stmt_list[1])
+                    if isinstance(node, ast1.BinaryOpExpression)
+                ]
+                self.assertEqual(
+                    comparison_exp.opt_cached_const_value, const_fold.ConstantValue(1, const_fold.bool_type)
+                )
+                self.assertEqual(folded_node_count, 1)
+
+                output_dir_path = os.path.join(self.temp_dir.name, f"qc-build-{engine.name}")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cpp_emitter.Emitter(output_dir_path).emit_qyp_set(self.qyp_set)
+                with open(os.path.join(output_dir_path, "impl", package_name, f"{package_name}.cpp")) as cpp_file:
+                    self.assertIn("true", cpp_file.read())
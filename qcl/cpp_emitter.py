@@ -4,9 +4,9 @@ import os
 import os.path
 import typing as t
 import enum
+import io
 import json
-import itertools
-import shutil
+import math
 
 from . import feedback
 from . import ast1
@@ -14,27 +14,50 @@ from . import ast2
 from . import types
 from . import typer
 from . import base_emitter
+from . import const_fold
 from . import interp
+from . import output_dir
 from . import panic
 
 #
 # Interface:
 #
 
+class TranslationUnitMode(enum.Enum):
+    # one '.cpp' file per Qy source file, which the C++ compiler can build in parallel and rebuild separately.
+    PerSourceFile = enum.auto()
+    # one '.cpp' file per Qyp.
+    Unity = enum.auto()
+
+
 class Emitter(base_emitter.BaseEmitter):
     """
     Emitter compiles a QypSet into C++ code and a CMakeLists.txt file.
-        - each Qyp is compiled into a '.hpp/.cpp' pair
+        - each Qyp is compiled into a header, 'impl/<qyp>.hpp', and C++ sources (cf `TranslationUnitMode`):
+            - either one '.cpp' file per source file, 'impl/<qyp>/<source-file>.cpp', sharing the package's
+              declarations through its header;
+            - or a single 'impl/<qyp>.cpp' (a "unity" build).
         - each type definition is compiled into its own header file in the `types/` subdirectory
+    Unless `incremental_output` is false, only files whose contents changed are rewritten: cf `output_dir`.
     """
 
-    def __init__(self, rel_output_dir_path: str) -> None:
+    def __init__(
+        self,
+        rel_output_dir_path: str,
+        incremental_output: bool = True,
+        tu_mode: TranslationUnitMode = TranslationUnitMode.PerSourceFile
+    ) -> None:
         super().__init__()
+        self.tu_mode = tu_mode
         self.root_rel_output_dir_path = rel_output_dir_path
         self.root_abs_output_dir_path = os.path.abspath(rel_output_dir_path)
+        self.output_dir = output_dir.OutputDirectory(self.root_abs_output_dir_path, incremental=incremental_output)
         self.types_abs_output_dir_path = os.path.join(self.root_abs_output_dir_path, "types")
         self.impl_abs_output_dir_path = os.path.join(self.root_abs_output_dir_path, "impl")
         self.pub_type_to_header_name_map = {}
+
+        # the C++ files generated for each native Qyp, relative to the output directory: used by 'emit_cmake_lists'
+        self.qyp_output_file_paths_map: t.Dict[str, t.List[str]] = {}
         
         # v-- used by 'check_global_definition'
         self.global_symbol_loc_map = {}
@@ -53,17 +76,16 @@ class Emitter(base_emitter.BaseEmitter):
         assert isinstance(builtin_string_type_def, typer.TypeDefinition)
         self.cached_builtin_string_type = builtin_string_type_def.scheme.instantiate_monomorphically()
 
-        # cleaning old directories:
-        # on macOS, Windows, with case-insensitive paths, renaming symbols with different case 
-        # results in stale files being used instead.
-        if os.path.isdir(self.root_abs_output_dir_path):
-            shutil.rmtree(self.root_abs_output_dir_path)
-
-        # creating fresh directories:
-        os.makedirs(self.root_abs_output_dir_path, exist_ok=False)
-        os.makedirs(self.types_abs_output_dir_path, exist_ok=False)
-        os.makedirs(self.impl_abs_output_dir_path, exist_ok=False)
+        # files are only moved into the output directory once all of them are emitted:
+        self.output_dir.open()
+        try:
+            self.emit_qyp_set_files(qyp_set)
+            self.output_dir.commit()
+        except BaseException:
+            self.output_dir.discard()
+            raise
 
+    def emit_qyp_set_files(self, qyp_set: ast2.QypSet):
         # collecting all extern headers:
         extern_header_source_files = []
         for qyp_name, qyp in qyp_set.qyp_name_map.items():
@@ -117,8 +139,8 @@ class Emitter(base_emitter.BaseEmitter):
             self.emit_one_per_type_header_pair(qy_type, type_name, type_decl_file, type_def_file)
             
             # finalizing:
-            type_decl_file.close()
-            type_def_file.close()
+            self.close_output_file(type_decl_file)
+            self.close_output_file(type_def_file)
 
     def collect_pub_named_types(self, stmt_list):
         for stmt in stmt_list:
@@ -222,15 +244,17 @@ class Emitter(base_emitter.BaseEmitter):
     #
 
     def emit_native_qyp_impl(self, qyp_name: str, qyp: ast2.NativeQyp, extern_header_source_files: t.List[ast2.BaseSourceFile]):
+        if self.tu_mode == TranslationUnitMode.Unity:
+            self.emit_native_qyp_impl_unity(qyp_name, qyp, extern_header_source_files)
+        else:
+            self.emit_native_qyp_impl_per_source_file(qyp_name, qyp, extern_header_source_files)
+
+    def emit_native_qyp_impl_unity(self, qyp_name: str, qyp: ast2.NativeQyp, extern_header_source_files: t.List[ast2.BaseSourceFile]):
         # creating output files, adding external project headers to all includes:
         output_file_stem = os.path.join(self.impl_abs_output_dir_path, qyp_name)
         self.active_h_file = CppFileWriter(DocType.MainHeader, output_file_stem)
         self.active_c_file = CppFileWriter(DocType.MainSource, output_file_stem)
-
-        for source_file in extern_header_source_files:
-            abs_extern_header_path = source_file.file_path
-            self.active_h_file.include_specs.append(IncludeSpec(abs_extern_header_path, use_angle_brackets=False, extern_str=source_file.extern_str))
-            self.active_h_file.include_specs.append(IncludeSpec(abs_extern_header_path, use_angle_brackets=False, extern_str=source_file.extern_str))
+        self.add_extern_header_includes(self.active_h_file, extern_header_source_files)
         
         print(f"INFO: Generating C/C++ file pair:\n\t{self.active_c_file.path}\n\t{self.active_h_file.path}")
         
@@ -245,11 +269,77 @@ class Emitter(base_emitter.BaseEmitter):
                 self.emit_statement_impl(self.active_c_file, stmt, is_top_level=True, decl_print_pass=False)
                 self.emit_statement_impl(self.active_h_file, stmt, is_top_level=True, decl_print_pass=False)
 
-        self.active_c_file.close()
-        self.active_h_file.close()
+        self.qyp_output_file_paths_map[qyp_name] = [self.relpath(self.active_h_file.path), self.relpath(self.active_c_file.path)]
+        self.close_output_file(self.active_c_file)
+        self.close_output_file(self.active_h_file)
         self.active_c_file = None
         self.active_h_file = None
 
+    def emit_native_qyp_impl_per_source_file(self, qyp_name: str, qyp: ast2.NativeQyp, extern_header_source_files: t.List[ast2.BaseSourceFile]):
+        # the package header holds everything but function definitions (and top-level discards): besides the public
+        # declarations, it also holds the declarations private to this Qyp, which are shared by all its source files.
+        self.active_h_file = CppFileWriter(DocType.MainHeader, os.path.join(self.impl_abs_output_dir_path, qyp_name))
+        self.add_extern_header_includes(self.active_h_file, extern_header_source_files)
+        header_include_path = self.relpath(self.active_h_file.path)
+        pvt_decl_fragment = StringWriter(DocType.MainSource)
+
+        src_file_stem_map = self.per_source_file_stem_map(qyp_name, qyp)
+        print(f"INFO: Generating C/C++ header and {len(src_file_stem_map)} source file(s):\n\t{self.active_h_file.path}")
+
+        for src_file_path, src_obj in qyp.src_map.items():
+            assert isinstance(src_obj, ast2.QySourceFile)
+            for stmt in src_obj.stmt_list:
+                self.emit_statement_impl(self.active_h_file, stmt, is_top_level=True, decl_print_pass=True)
+                self.emit_statement_impl(pvt_decl_fragment, stmt, is_top_level=True, decl_print_pass=True)
+        for src_file_path, src_obj in qyp.src_map.items():
+            assert isinstance(src_obj, ast2.QySourceFile)
+            for stmt in src_obj.stmt_list:
+                self.emit_statement_impl(self.active_h_file, stmt, is_top_level=True, decl_print_pass=False)
+                if not isinstance(stmt, (ast1.Bind1fStatement, ast1.DiscardStatement)):
+                    self.emit_statement_impl(pvt_decl_fragment, stmt, is_top_level=True, decl_print_pass=False)
+        
+        self.active_h_file.print("// package-private declarations:")
+        self.active_h_file.print(pvt_decl_fragment.close())
+
+        output_file_paths = [header_include_path]
+        for src_file_path, src_obj in qyp.src_map.items():
+            self.active_c_file = CppFileWriter(
+                DocType.MainSource, src_file_stem_map[src_file_path],
+                opt_header_include_path=header_include_path
+            )
+            print(f"\t{self.active_c_file.path}")
+            for stmt in src_obj.stmt_list:
+                if isinstance(stmt, (ast1.Bind1fStatement, ast1.DiscardStatement)):
+                    self.emit_statement_impl(self.active_c_file, stmt, is_top_level=True, decl_print_pass=False)
+            output_file_paths.append(self.relpath(self.active_c_file.path))
+            self.close_output_file(self.active_c_file)
+            self.active_c_file = None
+
+        self.qyp_output_file_paths_map[qyp_name] = output_file_paths
+        self.close_output_file(self.active_h_file)
+        self.active_h_file = None
+
+    def per_source_file_stem_map(self, qyp_name: str, qyp: ast2.NativeQyp) -> t.Dict[str, str]:
+        """
+        Maps the path of each source file of a Qyp to the stem of its '.cpp' file: 'impl/<qyp>/<path-in-qyp>'
+        """
+        qyp_dir_path = os.path.dirname(qyp.file_path)
+        src_file_stem_map = {}
+        for src_file_path in qyp.src_map:
+            rel_src_file_path = os.path.relpath(src_file_path, qyp_dir_path)
+            rel_src_file_stem = os.path.join(*(
+                "__" if path_part == os.pardir else path_part
+                for path_part in os.path.normpath(os.path.splitext(rel_src_file_path)[0]).split(os.sep)
+            ))
+            src_file_stem_map[src_file_path] = os.path.join(self.impl_abs_output_dir_path, qyp_name, rel_src_file_stem)
+        return src_file_stem_map
+
+    def add_extern_header_includes(self, header_file: "CppFileWriter", extern_header_source_files: t.List[ast2.BaseSourceFile]):
+        for source_file in extern_header_source_files:
+            abs_extern_header_path = source_file.file_path
+            header_file.include_specs.append(IncludeSpec(abs_extern_header_path, use_angle_brackets=False, extern_str=source_file.extern_str))
+            header_file.include_specs.append(IncludeSpec(abs_extern_header_path, use_angle_brackets=False, extern_str=source_file.extern_str))
+
     def emit_statement_impl(self, s, stmt: ast1.BaseStatement, is_top_level: bool, decl_print_pass: bool = False):
         self.translate_statement_impl(s, stmt, is_top_level, decl_print_pass)
         
@@ -486,7 +576,13 @@ class Emitter(base_emitter.BaseEmitter):
         return ret_str
 
     def translate_expression_with_type(self, exp: ast1.BaseExpression) -> t.Tuple[str, types.BaseConcreteType]:
-        if isinstance(exp, ast1.IdRefExpression):
+        if exp.cache_valid:
+            # folded by 'const_fold':
+            constant = exp.opt_cached_const_value
+            assert isinstance(constant, const_fold.ConstantValue)
+            return self.translate_constant_value(constant), constant.type
+
+        elif isinstance(exp, ast1.IdRefExpression):
             def_obj = exp.lookup_def_obj()
             assert isinstance(def_obj, typer.BaseDefinition)
             s, def_type = def_obj.scheme.instantiate()
@@ -494,7 +590,7 @@ class Emitter(base_emitter.BaseEmitter):
             
             if exp.name.endswith('!'):
                 if exp.name == "pred!":
-                    res = interp.evaluate_constant(def_obj.binder.initializer)
+                    res = interp.evaluate_definition(def_obj, exp.loc)
                     if res is None:
                         panic.because(
                             panic.ExitCode.CompileTimeEvaluationError,
@@ -787,6 +883,33 @@ class Emitter(base_emitter.BaseEmitter):
             # print(f"WARNING: Don't know how to translate expression to C++: {exp}")
             # return f"<NotImplemented:{exp.desc}>", None
 
+    def translate_constant_value(self, constant: "const_fold.ConstantValue") -> str:
+        """
+        Returns a C++ literal of exactly the type of a folded constant, so folding never changes the type of the
+        expressions it replaces.
+        """
+        constant_type = constant.type
+        if isinstance(constant_type, types.IntType) and constant_type.width_in_bits == 1:
+            return ['false', 'true'][constant.value]
+        elif isinstance(constant_type, types.IntType):
+            assert constant_type.width_in_bits in (32, 64)
+            suffix = ('' if constant_type.is_signed else 'u') + ('LL' if constant_type.width_in_bits == 64 else '')
+            min_value, _ = const_fold.int_range(constant_type)
+            if constant_type.is_signed and constant.value == min_value:
+                # e.g. '-2147483648' negates '2147483648', which does not fit in an 'int'.
+                return f"(-{-constant.value - 1}{suffix} - 1)"
+            elif constant.value < 0:
+                return f"(-{-constant.value}{suffix})"
+            else:
+                return f"{constant.value}{suffix}"
+        else:
+            assert isinstance(constant_type, types.FloatType)
+            suffix = 'f' if constant_type.width_in_bits == 32 else ''
+            if math.copysign(1.0, constant.value) < 0:
+                return f"(-{-constant.value}{suffix})"
+            else:
+                return f"{constant.value}{suffix}"
+
     #
     # part 3: generating CMakeLists.txt files
     #
@@ -795,7 +918,7 @@ class Emitter(base_emitter.BaseEmitter):
         cml_file_path = f"{self.root_abs_output_dir_path}/CMakeLists.txt"
         output_path = normalize_backslash_path(self.root_abs_output_dir_path)
             
-        with open(cml_file_path, 'w') as cml_file:
+        with io.StringIO() as cml_file:
             def cml_print(*args, **kwargs):
                 assert 'file' not in kwargs
                 print(*args, **kwargs, file=cml_file)
@@ -814,43 +937,78 @@ class Emitter(base_emitter.BaseEmitter):
             cml_print(f"endif()")
             cml_print()
 
-            # all source files go into one 'add_executable' for now.
-            # more granular package-by-package control will require inter-package dependency analysis, which can get hairy.
-            
-            # first, visiting all qyps and gathering a list of files:
-            main_target_name = None
-            extern_source_file_paths = []
-            native_source_file_paths = []
+            # each package is built as its own library target, linked to the libraries of the packages it depends on:
+            # the root package is built as the executable instead, so it only links the libraries it needs (directly or
+            # not), and build systems can cache and build each package separately.
+            cpp_source_suffix = f".{CppFileWriter.doc_file_path_suffix[DocType.MainSource]}"
             for qyp_name, qyp in qyp_set.qyp_name_map.items():
                 if isinstance(qyp, ast2.NativeQyp):
-                    if qyp is qyp_set.root_qyp:
-                        # expect only one root per project:
-                        assert main_target_name is None
-                        main_target_name = qyp_name
-
-                    native_source_file_paths.append(f"impl/{qyp_name}.{CppFileWriter.doc_file_path_suffix[DocType.MainHeader]}")
-                    native_source_file_paths.append(f"impl/{qyp_name}.{CppFileWriter.doc_file_path_suffix[DocType.MainSource]}")
-
+                    source_file_paths = self.qyp_output_file_paths_map[qyp_name]
+                    is_compiled = any(file_path.endswith(cpp_source_suffix) for file_path in source_file_paths)
+                    c_flags = []
                 elif isinstance(qyp, ast2.CQyx):
-                    for c_source_file in qyp.c_source_files:
-                        if not c_source_file.is_header:
-                            file_path = self.relpath(c_source_file.file_path)
-                            extern_source_file_paths.append(file_path)
-
+                    source_file_paths = [
+                        self.relpath(c_source_file.file_path)
+                        for c_source_file in qyp.c_source_files
+                        if not c_source_file.is_header
+                    ]
+                    is_compiled = bool(source_file_paths)
+                    c_flags = qyp.c_flags
                 else:
                     raise NotImplementedError(f"emit_cmake_lists: Unknown Qyp of type {qyp.__class__.__name__}")
 
-            # emitting 'add_executable' call to tie everything together:
-            assert main_target_name is not None
-            cml_print(f"add_executable({main_target_name}")
-            for source_file_path in itertools.chain(extern_source_file_paths, native_source_file_paths):
-                cml_print(f"\t{source_file_path}")
-            cml_print(")")
+                target_name = cmake_target_name(qyp_set, qyp_name)
+                if qyp is qyp_set.root_qyp or is_compiled:
+                    if qyp is qyp_set.root_qyp:
+                        assert isinstance(qyp, ast2.NativeQyp)
+                        cml_print(f"add_executable({target_name}")
+                        link_scope = "PRIVATE"
+                    else:
+                        cml_print(f"add_library({target_name} STATIC")
+                        link_scope = "PUBLIC"
+                    for source_file_path in source_file_paths:
+                        cml_print(f"\t{source_file_path}")
+                    cml_print(")")
+                else:
+                    # header-only: nothing to build, but its dependencies are still linked into its dependents.
+                    cml_print(f"add_library({target_name} INTERFACE)")
+                    link_scope = "INTERFACE"
+
+                # 'c-flags' only apply to this package's own sources:
+                if c_flags and is_compiled:
+                    cml_print(f"target_compile_options({target_name} PRIVATE")
+                    for c_flag in c_flags:
+                        cml_print(f"\t{json.dumps(c_flag)}")
+                    cml_print(")")
+
+                dep_qyp_names = qyp_set.dep_graph[qyp_name]
+                if dep_qyp_names:
+                    cml_print(f"target_link_libraries({target_name} {link_scope}")
+                    for dep_qyp_name in dep_qyp_names:
+                        cml_print(f"\t{cmake_target_name(qyp_set, dep_qyp_name)}")
+                    cml_print(")")
+                cml_print()
+
+            self.output_dir.write_file(cml_file_path, cml_file.getvalue())
+
+    def close_output_file(self, cpp_file: "CppFileWriter"):
+        self.output_dir.write_file(cpp_file.path, cpp_file.close())
 
     def relpath(self, input_path):
         return normalize_backslash_path(os.path.relpath(input_path, self.root_abs_output_dir_path))
 
 
+def cmake_target_name(qyp_set: ast2.QypSet, qyp_name: str) -> str:
+    """
+    Returns the name of the CMake target building a Qyp: the root Qyp's executable is named after it, and every other
+    Qyp's library is prefixed, so it never clashes with the executable or with names reserved by CMake (e.g. 'test').
+    """
+    if qyp_name == qyp_set.root_qyp.js_name:
+        return qyp_name
+    else:
+        return f"qyp-{qyp_name}"
+
+
 #
 # C++ generator:
 # adapted from https://www.codeproject.com/script/Articles/ViewDownloads.aspx?aid=571645
@@ -995,7 +1153,13 @@ class CppFileWriter(StringWriter):
         DocType.TypeDeclHeader: "decl.hpp"
     }
 
-    def __init__(self, doc_type: DocType, file_stem: str, indent_str='\t') -> None:
+    def __init__(
+        self,
+        doc_type: DocType,
+        file_stem: str,
+        indent_str='\t',
+        opt_header_include_path: t.Optional[str] = None
+    ) -> None:
         super().__init__(doc_type, indent_str=indent_str)
         assert doc_type in CppFileWriter.doc_file_path_suffix
         self.stem = file_stem
@@ -1014,7 +1178,10 @@ class CppFileWriter(StringWriter):
             self.add_common_stdlib_header_includes()
         elif self.doc_type == DocType.MainSource:
             # including the header file, as is customary for implementation files:
-            include_spec = IncludeSpec(use_angle_brackets=False, include_path=self.stem_base+"."+CppFileWriter.doc_file_path_suffix[DocType.MainHeader])
+            # by default, the header sharing this file's stem.
+            if opt_header_include_path is None:
+                opt_header_include_path = self.stem_base+"."+CppFileWriter.doc_file_path_suffix[DocType.MainHeader]
+            include_spec = IncludeSpec(use_angle_brackets=False, include_path=opt_header_include_path)
             self.include_specs.append(include_spec)
             self.add_common_stdlib_header_includes()
             # writing some text
@@ -1026,15 +1193,6 @@ class CppFileWriter(StringWriter):
         elif self.doc_type == DocType.TypeDefHeader:
             self.print("#pragma once", target_section=DocumentSectionId.Prefix)
             self.print(target_section=DocumentSectionId.Prefix)
-        
-    def close(self) -> str:
-        chunk_text = super().close()
-
-        # printing to the file in a single system call:
-        with open(self.path, 'w', buffering=len(chunk_text)) as os_file_handle:
-            print(chunk_text, file=os_file_handle, end='')
-
-        return chunk_text
 
 
 
@@ -0,0 +1,133 @@
+"""
+`disk_cache` is a persistent, content-addressed store for compiler intermediates (e.g. parsed `ast1` trees).
+It lets unchanged inputs skip expensive work across separate `qc` invocations.
+
+Each entry is addressed by a key computed by the client from everything the entry depends on (usually file
+contents and a compiler/grammar fingerprint), so entries never need to be invalidated: a changed input simply
+produces a different key.
+Entries are stored as zlib-compressed pickles, one file per entry, except for files stored as-is with `put_file`.
+Writes are atomic (write to a temporary file, then rename), so concurrent compilers sharing a cache directory never
+observe torn entries.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import tempfile
+import typing as t
+import zlib
+
+
+default_root_dir_path = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", None) or os.path.join(os.path.expanduser("~"), ".cache"),
+    "qc"
+)
+
+
+class DiskCache(object):
+    def __init__(self, root_dir_path: str, namespace: str) -> None:
+        super().__init__()
+        self.dir_path = os.path.join(root_dir_path, namespace)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.dir_path, key[:2], key[2:])
+
+    def has(self, key: str) -> bool:
+        return os.path.isfile(self.entry_path(key))
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        """
+        Returns the object stored under `key`, or `None` if there is no such entry.
+        Unreadable or corrupt entries (e.g. written by an incompatible compiler) are treated as missing.
+        """
+        try:
+            with open(self.entry_path(key), "rb") as entry_file:
+                compressed_data = entry_file.read()
+        except OSError:
+            return None
+
+        try:
+            return pickle.loads(zlib.decompress(compressed_data))
+        except Exception:
+            return None
+
+    def put(self, key: str, obj: t.Any) -> bool:
+        """
+        Stores `obj` under `key`, returning whether the entry was written.
+        Failing to write an entry is never an error: the cache is only an optimization.
+        """
+        try:
+            data = zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except RecursionError:
+            # very deeply nested trees cannot be pickled: just skip caching them.
+            return False
+
+        entry_path = self.entry_path(key)
+        entry_dir_path = os.path.dirname(entry_path)
+        try:
+            os.makedirs(entry_dir_path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir_path, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as tmp_file:
+                    tmp_file.write(data)
+                os.replace(tmp_path, entry_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            return False
+        return True
+
+    def get_file_path(self, key: str) -> t.Optional[str]:
+        """
+        Returns the path of the file stored under `key` by `put_file`, or `None` if there is no such entry.
+        """
+        entry_path = self.entry_path(key)
+        return entry_path if os.path.isfile(entry_path) else None
+
+    def put_file(self, key: str, write_file: t.Callable[[str], None]) -> bool:
+        """
+        Stores the file written by `write_file(path)` under `key` as-is (i.e. neither pickled nor compressed), so it
+        can be read in place through `get_file_path` (e.g. by libclang), returning whether the entry was written.
+        """
+        entry_path = self.entry_path(key)
+        entry_dir_path = os.path.dirname(entry_path)
+        try:
+            os.makedirs(entry_dir_path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir_path, prefix=".tmp-")
+            os.close(fd)
+            try:
+                write_file(tmp_path)
+                os.replace(tmp_path, entry_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception:
+            return False
+        return True
+
+
+def hash_digest(*parts: t.Union[bytes, str]) -> str:
+    """
+    Returns a hex digest of a sequence of byte strings (or `str`s, encoded as UTF-8).
+    Parts are length-prefixed, so different splits of the same bytes produce different digests.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        hasher.update(len(part).to_bytes(8, "little"))
+        hasher.update(part)
+    return hasher.hexdigest()
+
+
+def hash_source_files(*file_paths: str) -> str:
+    """
+    Returns a digest of the contents of the given files: used to fingerprint the compiler's own sources.
+    """
+    contents = []
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            contents.append(f.read())
+    return hash_digest(*contents)
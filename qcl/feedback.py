@@ -1,14 +1,22 @@
 import abc
+import array
+import bisect
+import itertools
+import threading
 import typing as t
 
 
 class ILoc(object, metaclass=abc.ABCMeta):
+    __slots__ = ()
+
     @abc.abstractmethod
     def __str__(self):
         pass
 
 
 class BuiltinLoc(ILoc):
+    __slots__ = ('desc',)
+
     def __init__(self, desc: str):
         super().__init__()
         self.desc = desc
@@ -18,6 +26,8 @@ class BuiltinLoc(ILoc):
 
 
 class FileLoc(ILoc):
+    __slots__ = ('file_path', 'file_region')
+
     def __init__(self, file_path: str, file_region: "BaseFileRegion"):
         super().__init__()
         self.file_path = file_path
@@ -27,7 +37,49 @@ class FileLoc(ILoc):
         return f"{self.file_path}:{self.file_region}"
 
 
+class SourceFileLoc(ILoc):
+    """
+    A compact location in a source file registered with a `SourceFileTable`, e.g. the span of an AST node.
+    Only the file's table and ID, and the character offsets of the span are stored: lines and columns are worked out
+    on demand from the file's line table.
+    """
+
+    __slots__ = ('file_table', 'file_id', 'start_offset', 'end_offset')
+
+    def __init__(self, file_table: "SourceFileTable", file_id: int, start_offset: int, end_offset: int):
+        super().__init__()
+        self.file_table = file_table
+        self.file_id = file_id
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+
+    @property
+    def file_path(self) -> str:
+        return self.file_table.file_path(self.file_id)
+
+    @property
+    def file_region(self) -> "FileSpan":
+        return FileSpan(
+            self.file_table.pos_of_offset(self.file_id, self.start_offset),
+            self.file_table.pos_of_offset(self.file_id, self.end_offset)
+        )
+
+    def __str__(self):
+        return f"{self.file_path}:{self.file_region}"
+
+    def __reduce__(self):
+        # file IDs are only valid in the table that assigned them, so locations are pickled by path.
+        return make_source_file_loc, (self.file_path, self.start_offset, self.end_offset)
+
+
+def make_source_file_loc(file_path: str, start_offset: int, end_offset: int) -> SourceFileLoc:
+    file_table = current_source_file_table()
+    return SourceFileLoc(file_table, file_table.intern(file_path), start_offset, end_offset)
+
+
 class BaseFileRegion(object, metaclass=abc.ABCMeta):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -37,6 +89,8 @@ class BaseFileRegion(object, metaclass=abc.ABCMeta):
 
 
 class FilePos(BaseFileRegion):
+    __slots__ = ('line_index', 'col_index')
+
     def __init__(self, line_index, col_index) -> None:
         super().__init__()
         self.line_index = line_index
@@ -55,6 +109,8 @@ class FilePos(BaseFileRegion):
 
 
 class FileSpan(BaseFileRegion):
+    __slots__ = ('first_pos', 'last_pos')
+
     def __init__(self, first_char_pos: FilePos, opt_last_char_pos: t.Optional[FilePos] = None) -> None:
         super().__init__()
         self.first_pos = first_char_pos
@@ -68,3 +124,84 @@ class FileSpan(BaseFileRegion):
                 return f"{self.first_pos.line_num}:{self.first_pos.col_num}-{self.last_pos.col_num}"
         else:
             return f"{self.first_pos}-{self.last_pos}"
+
+
+#
+# Source file table:
+#
+
+class SourceFileTable(object):
+    """
+    Maps the IDs used by `SourceFileLoc` to file paths and line tables.
+    Each compilation session has its own table (cf `current_source_file_table`), so file IDs are only valid in the
+    table that assigned them. Since every location refers to its table, locations can still be read once their
+    session is closed.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.file_path_list: t.List[str] = []
+        self.file_id_map: t.Dict[str, int] = {}
+        self.line_table_list: t.List[t.Optional[array.array]] = []
+        self.lock = threading.Lock()
+
+    def intern(self, file_path: str, opt_text: t.Optional[str] = None) -> int:
+        """
+        Returns the ID of the source file at `file_path`, registering it if required.
+        If the file's `opt_text` is provided (e.g. because it was just parsed), its line table is (re)built from it;
+        otherwise, the line table is built from the file's contents on disk when first required.
+        """
+        with self.lock:
+            opt_file_id = self.file_id_map.get(file_path, None)
+            if opt_file_id is None:
+                opt_file_id = len(self.file_path_list)
+                self.file_path_list.append(file_path)
+                self.line_table_list.append(None)
+                self.file_id_map[file_path] = opt_file_id
+            if opt_text is not None:
+                self.line_table_list[opt_file_id] = make_line_table(opt_text)
+            return opt_file_id
+
+    def file_path(self, file_id: int) -> str:
+        return self.file_path_list[file_id]
+
+    def pos_of_offset(self, file_id: int, offset: int) -> FilePos:
+        line_table = self.line_table_list[file_id]
+        if line_table is None:
+            line_table = self.load_line_table(file_id)
+        line_index = bisect.bisect_right(line_table, offset) - 1
+        return FilePos(line_index, offset - line_table[line_index])
+
+    def load_line_table(self, file_id: int) -> array.array:
+        try:
+            # like ANTLR, counting every byte as one character:
+            with open(self.file_path(file_id), 'rb') as source_file:
+                text = source_file.read().decode('latin-1')
+        except OSError:
+            text = ""
+        line_table = make_line_table(text)
+        self.line_table_list[file_id] = line_table
+        return line_table
+
+
+def current_source_file_table() -> SourceFileTable:
+    # NOTE: imported here since `session` is built on this module.
+    from . import session
+    opt_file_table = session.current().source_file_table
+    assert opt_file_table is not None
+    return opt_file_table
+
+
+def intern_source_file(file_path: str, opt_text: t.Optional[str] = None) -> int:
+    """
+    Like `SourceFileTable.intern`, in the current compilation session's table.
+    """
+    return current_source_file_table().intern(file_path, opt_text)
+
+
+def make_line_table(text: str) -> array.array:
+    # only '\n' starts a new line, as in ANTLR.
+    return array.array('L', itertools.accumulate(
+        (len(line) + 1 for line in text.split('\n')[:-1]),
+        initial=0
+    ))
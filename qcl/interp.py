@@ -1,82 +1,176 @@
 """
 `interp` handles compile-time evaluation.
 This should be run during the typer.
+
+The value of each compile-time constant definition is computed at most once per compilation session (cf
+`session.CompilationSession.constant_value_map`), so chains of definitions referring to their predecessors (e.g. the
+`pred!` chains of 'const' blocks) are evaluated in linear time.
+Evaluation is iterative, so long chains never exhaust the Python stack, and a definition whose initializer refers
+back to itself is reported as an error.
 """
 
+import operator
+import typing as t
+
 from . import ast1
+from . import feedback as fb
 from . import typer
 from . import panic
+from . import session
+
+
+unary_operator_map: t.Dict[ast1.UnaryOperator, t.Callable[[t.Any], t.Any]] = {
+    ast1.UnaryOperator.LogicalNot: operator.not_,
+    ast1.UnaryOperator.Minus: operator.neg,
+    ast1.UnaryOperator.Plus: operator.pos,
+}
+
+# NOTE: both operands of logical operators are always evaluated.
+binary_operator_map: t.Dict[ast1.BinaryOperator, t.Callable[[t.Any, t.Any], t.Any]] = {
+    ast1.BinaryOperator.Mul: operator.mul,
+    ast1.BinaryOperator.Div: operator.truediv,
+    ast1.BinaryOperator.Mod: operator.mod,
+    ast1.BinaryOperator.Add: operator.add,
+    ast1.BinaryOperator.Sub: operator.sub,
+    ast1.BinaryOperator.LSh: operator.lshift,
+    ast1.BinaryOperator.RSh: operator.rshift,
+    ast1.BinaryOperator.BitwiseAnd: operator.and_,
+    ast1.BinaryOperator.BitwiseXOr: operator.xor,
+    ast1.BinaryOperator.BitwiseOr: operator.or_,
+    ast1.BinaryOperator.LThan: operator.lt,
+    ast1.BinaryOperator.GThan: operator.gt,
+    ast1.BinaryOperator.LEq: operator.le,
+    ast1.BinaryOperator.GEq: operator.ge,
+    ast1.BinaryOperator.Eq: operator.eq,
+    ast1.BinaryOperator.NEq: operator.ne,
+    ast1.BinaryOperator.LogicalAnd: lambda lt_operand_value, rt_operand_value: lt_operand_value and rt_operand_value,
+    ast1.BinaryOperator.LogicalOr: lambda lt_operand_value, rt_operand_value: lt_operand_value or rt_operand_value,
+}
 
 
 def evaluate_constant(exp: ast1.BaseExpression):
-    if isinstance(exp, (ast1.IntExpression, ast1.FloatExpression, ast1.StringExpression)):
-        return exp.value
-    
-    elif isinstance(exp, ast1.UnaryOpExpression):
-        assert exp.operand is not None
-        
-        operand_value = evaluate_constant(exp.operand)
-        try:
-            return {
-                ast1.UnaryOperator.LogicalNot: lambda: not operand_value,
-                ast1.UnaryOperator.Minus: lambda: -operand_value,
-                ast1.UnaryOperator.Plus: lambda: +operand_value
-            }[exp.operator]()
-        except KeyError:
-            # error handled below...
-            pass
-
-    
-    elif isinstance(exp, ast1.BinaryOpExpression):
-        assert exp.lt_operand_exp is not None and exp.rt_operand_exp is not None
-        
-        lt_operand_value = evaluate_constant(exp.lt_operand_exp)
-        rt_operand_value = evaluate_constant(exp.rt_operand_exp)
-        try:
-            return {
-                ast1.BinaryOperator.Mul: lambda: lt_operand_value * rt_operand_value,
-                ast1.BinaryOperator.Div: lambda: lt_operand_value / rt_operand_value,
-                ast1.BinaryOperator.Mod: lambda: lt_operand_value % rt_operand_value,
-                ast1.BinaryOperator.Add: lambda: lt_operand_value + rt_operand_value,
-                ast1.BinaryOperator.Sub: lambda: lt_operand_value - rt_operand_value,
-                ast1.BinaryOperator.LSh: lambda: lt_operand_value << rt_operand_value,
-                ast1.BinaryOperator.RSh: lambda: lt_operand_value >> rt_operand_value,
-                ast1.BinaryOperator.BitwiseAnd: lambda: lt_operand_value & rt_operand_value,
-                ast1.BinaryOperator.BitwiseXOr: lambda: lt_operand_value ^ rt_operand_value,
-                ast1.BinaryOperator.BitwiseOr: lambda: lt_operand_value | rt_operand_value,
-                ast1.BinaryOperator.LThan: lambda: lt_operand_value < rt_operand_value,
-                ast1.BinaryOperator.GThan: lambda: lt_operand_value > rt_operand_value,
-                ast1.BinaryOperator.LEq: lambda: lt_operand_value <= rt_operand_value,
-                ast1.BinaryOperator.GEq: lambda: lt_operand_value >= rt_operand_value,
-                ast1.BinaryOperator.Eq: lambda: lt_operand_value == rt_operand_value,
-                ast1.BinaryOperator.NEq: lambda: lt_operand_value != rt_operand_value,
-                ast1.BinaryOperator.LogicalAnd: lambda: lt_operand_value and rt_operand_value,
-                ast1.BinaryOperator.LogicalOr: lambda: lt_operand_value or rt_operand_value
-            }[exp.operator]()
-        except KeyError:
-            # error handled below...
-            pass
-
-    
-    elif isinstance(exp, ast1.IdRefExpression):
-        def_obj = exp.lookup_def_obj()
-    
-        if not isinstance(def_obj, typer.ValueDefinition):
-            panic.because(
-                panic.ExitCode.CompileTimeEvaluationError,
-                f"Expected a value ID but received a type ID: {def_obj.name}",
-                opt_loc=exp.loc
-            )
+    return ConstantEvaluator().evaluate(exp)
+
+
+def evaluate_definition(def_obj: "typer.BaseDefinition", use_loc: fb.ILoc):
+    """
+    Returns the value of a compile-time constant definition used at `use_loc`.
+    """
+    return ConstantEvaluator().evaluate_definition(def_obj, use_loc)
+
+
+class ConstantEvaluator(object):
+    """
+    Evaluates an expression in post-order using an explicit stack of tasks: each task either visits an expression,
+    applies an operator to the values of its (already visited) operands, or stores the value of a definition whose
+    initializer was just evaluated.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.value_map = session.current().constant_value_map
+
+        # the definitions whose initializers are being evaluated, in the order they were entered (as dict keys).
+        self.pending_defs: t.Dict["typer.BaseDefinition", None] = {}
+
+        self.task_stack = []
+        self.value_stack = []
 
-        if not def_obj.is_compile_time_constant:
+    def evaluate(self, exp: ast1.BaseExpression):
+        self.task_stack.append((self.visit, exp))
+        return self.run()
+
+    def evaluate_definition(self, def_obj: "typer.BaseDefinition", use_loc: fb.ILoc):
+        check_constant_definition(def_obj, use_loc)
+        opt_value = self.value_map.get(def_obj, None)
+        if opt_value is not None:
+            return opt_value
+        self.enter_definition(def_obj, use_loc)
+        return self.run()
+
+    def run(self):
+        while self.task_stack:
+            task, arg = self.task_stack.pop()
+            task(arg)
+        assert len(self.value_stack) == 1
+        return self.value_stack.pop()
+
+    def visit(self, exp: ast1.BaseExpression):
+        if isinstance(exp, (ast1.IntExpression, ast1.FloatExpression, ast1.StringExpression)):
+            self.value_stack.append(exp.value)
+
+        elif isinstance(exp, ast1.UnaryOpExpression):
+            assert exp.operand is not None
+            self.task_stack.append((self.apply_unary_operator, exp))
+            self.task_stack.append((self.visit, exp.operand))
+
+        elif isinstance(exp, ast1.BinaryOpExpression):
+            assert exp.lt_operand_exp is not None and exp.rt_operand_exp is not None
+            self.task_stack.append((self.apply_binary_operator, exp))
+            self.task_stack.append((self.visit, exp.rt_operand_exp))
+            self.task_stack.append((self.visit, exp.lt_operand_exp))
+
+        elif isinstance(exp, ast1.IdRefExpression):
+            def_obj = exp.lookup_def_obj()
+            check_constant_definition(def_obj, exp.loc)
+            opt_value = self.value_map.get(def_obj, None)
+            if opt_value is not None:
+                self.value_stack.append(opt_value)
+            else:
+                self.enter_definition(def_obj, exp.loc)
+
+        else:
+            raise_cannot_evaluate(exp)
+
+    def enter_definition(self, def_obj: "typer.BaseDefinition", use_loc: fb.ILoc):
+        if def_obj in self.pending_defs:
+            pending_def_list = list(self.pending_defs)
+            cycle_def_list = pending_def_list[pending_def_list.index(def_obj):] + [def_obj]
             panic.because(
                 panic.ExitCode.CompileTimeEvaluationError,
-                f"Cannot evaluate non-const ID: {def_obj.name}",
-                opt_loc=exp.loc
+                f"Compile-time constant depends on its own value: {' -> '.join(d.name for d in cycle_def_list)}",
+                opt_loc=use_loc
             )
-        
-        return evaluate_constant(def_obj.binder.initializer)
+        self.pending_defs[def_obj] = None
+        self.task_stack.append((self.leave_definition, def_obj))
+        self.task_stack.append((self.visit, def_obj.binder.initializer))
+
+    def leave_definition(self, def_obj: "typer.BaseDefinition"):
+        del self.pending_defs[def_obj]
+        self.value_map[def_obj] = self.value_stack[-1]
+
+    def apply_unary_operator(self, exp: ast1.UnaryOpExpression):
+        opt_operator_fn = unary_operator_map.get(exp.operator, None)
+        if opt_operator_fn is None:
+            raise_cannot_evaluate(exp)
+        self.value_stack.append(opt_operator_fn(self.value_stack.pop()))
+
+    def apply_binary_operator(self, exp: ast1.BinaryOpExpression):
+        opt_operator_fn = binary_operator_map.get(exp.operator, None)
+        if opt_operator_fn is None:
+            raise_cannot_evaluate(exp)
+        rt_operand_value = self.value_stack.pop()
+        lt_operand_value = self.value_stack.pop()
+        self.value_stack.append(opt_operator_fn(lt_operand_value, rt_operand_value))
+
+
+def check_constant_definition(def_obj: "typer.BaseDefinition", use_loc: fb.ILoc):
+    if not isinstance(def_obj, typer.ValueDefinition):
+        panic.because(
+            panic.ExitCode.CompileTimeEvaluationError,
+            f"Expected a value ID but received a type ID: {def_obj.name}",
+            opt_loc=use_loc
+        )
+
+    if not def_obj.is_compile_time_constant:
+        panic.because(
+            panic.ExitCode.CompileTimeEvaluationError,
+            f"Cannot evaluate non-const ID: {def_obj.name}",
+            opt_loc=use_loc
+        )
+
 
+def raise_cannot_evaluate(exp: ast1.BaseExpression):
     panic.because(
         panic.ExitCode.CompileTimeEvaluationError,
         f"Cannot evaluate expression at compile-time: {exp.desc}",
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os.path
+import unittest
+import unittest.mock
+
+from . import ast1
+from . import ast2
+from . import interp
+from . import panic
+from . import platform
+from . import qy_parser
+from . import session
+from . import typer
+from . import typer_test
+
+
+class TestConstantEvaluator(typer_test.PackageSetTestMixin, unittest.TestCase):
+    def type_const_block(self, name, entry_lines, engine):
+        """
+        Types a package made of one 'const' block with `engine`, returning the 'pred!' references in it, in order.
+        Call it in a compilation session, which must stay current while these references are evaluated.
+        """
+        source_text = "const: Int {\n" + "".join(f"    {line}\n" for line in entry_lines) + "};\n"
+        root_qyp_path = self.write_package(name, source_text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+            typer.type_one_qyp_set(qyp_set, engine)
+        source_file_path = os.path.join(os.path.dirname(root_qyp_path), f"{name}.qy")
+        (const_stmt,) = qyp_set.root_qyp.src_map[source_file_path].stmt_list
+        return [
+            node
+            for entry in const_stmt.body
+            for node in ast1.iter_subtree_nodes(entry.initializer)
+            if isinstance(node, ast1.IdRefExpression) and node.name == "pred!"
+        ]
+
+    def test_pred_chains_are_evaluated_in_linear_time(self):
+        # deeper than Python's default recursion limit, yet short enough for the substitution engine, which slows down
+        # quadratically with the length of a statement.
+        entry_count = 1200
+        entry_lines = ["E0 = 0;"] + [f"E{i} = 1 + pred!;" for i in range(1, entry_count)]
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine), session.CompilationSession():
+                pred_refs = self.type_const_block(f"chain_{engine.name}", entry_lines, engine)
+                self.assertEqual(len(pred_refs), entry_count - 1)
+
+                with unittest.mock.patch.object(
+                    ast1.IdRefExpression, "lookup_def_obj",
+                    autospec=True, side_effect=ast1.IdRefExpression.lookup_def_obj
+                ) as lookup_def_obj:
+                    # the last reference first: its chain spans the whole block, deeper than Python's recursion limit.
+                    self.assertEqual(interp.evaluate_constant(pred_refs[-1]), entry_count - 2)
+                    values = [interp.evaluate_constant(pred_ref) for pred_ref in pred_refs]
+                self.assertEqual(values, list(range(entry_count - 1)))
+                self.assertLessEqual(lookup_def_obj.call_count, 3 * entry_count)
+
+    def test_cyclic_constants_are_reported(self):
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine), session.CompilationSession():
+                pred_refs = self.type_const_block(
+                    f"cycle_{engine.name}", ["A = 0;", "B = 1 + B;", "C = pred!;"], engine
+                )
+                with contextlib.redirect_stderr(io.StringIO()):
+                    with self.assertRaises(panic.PanicException) as caught:
+                        interp.evaluate_constant(pred_refs[-1])
+                self.assertEqual(caught.exception.exit_code, panic.ExitCode.CompileTimeEvaluationError)
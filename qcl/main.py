@@ -9,12 +9,22 @@ def main():
     args_obj = parse_args()
     transpile_opts = qcl.TranspileOptions(
         print_summary_after_run=args_obj.verbose > 0,
-        run_debug_routine_after_compilation=False
+        run_debug_routine_after_compilation=False,
+        parse_mode=parse_mode_map[args_obj.parse_mode],
+        opt_cache_dir_path=None if args_obj.no_cache else args_obj.cache_dir_path,
+        job_count=args_obj.job_count,
+        stream_parse=args_obj.stream_parse,
+        typer_engine=typer_engine_map[args_obj.typer_engine],
+        fold_constants=not args_obj.no_const_fold
     )
     root_qyp_path = args_obj.root_qyp_path
     output_dir_path = args_obj.output_dir_path
 
-    emitter = qcl.cpp_emitter.Emitter(output_dir_path)
+    emitter = qcl.cpp_emitter.Emitter(
+        output_dir_path,
+        incremental_output=not args_obj.clean_output,
+        tu_mode=tu_mode_map[args_obj.tu_mode]
+    )
     root_qyp = qcl.transpile_one_package_set(root_qyp_path, emitter, transpile_opts)
     del root_qyp
 
@@ -32,14 +42,72 @@ def parse_args():
         help="The directory to which output is written. If it does not exist, it will be created.",
         default="./qc-build"
     )
+    arg_parser.add_argument(
+        "--tu-mode", choices=tu_mode_map.keys(),
+        help="How C++ translation units are generated. 'per-file' (default) generates one '.cpp' file per Qy source file, sharing each package's declarations through its header, so the C++ compiler can build them in parallel and only rebuild the files that changed. 'unity' generates a single '.cpp' file per package, which can optimize better: e.g. for release builds.",
+        default="per-file"
+    )
+    arg_parser.add_argument(
+        "--clean-output", action="store_true",
+        help="If specified, the output directory is deleted and every file is rewritten. By default, only files whose contents changed are replaced (keeping the modification times of the others, so downstream builds are incremental), and files that are no longer generated are removed."
+    )
     arg_parser.add_argument(
         "-v", "--verbose", action="count",
         help="If 'verbose' mode is specified, the compiler prints a bunch of information about compiled files to STDOUT. Good for debugging the compiler.",
         default=0
     )
+    arg_parser.add_argument(
+        "--parse-mode", choices=parse_mode_map.keys(),
+        help="How the parser predicts alternatives. 'sll-ll' (default) tries fast SLL prediction first and only falls back to full LL on failure. 'exact-ambiguity' runs full LL with exact ambiguity detection, reporting grammar ambiguities as errors: useful for debugging the grammar, but very slow. 'pratt' uses a hand-written parser instead of ANTLR, falling back to 'sll-ll' to report syntax errors.",
+        default="sll-ll"
+    )
+    arg_parser.add_argument(
+        "--typer-engine", choices=typer_engine_map.keys(),
+        help="How the typer solves type variables. 'substitution' (default) composes substitutions, applying them to every typed node after each top-level statement. 'union-find' binds variables in place in a union-find store and resolves every typed node once, after solving: this scales better on large source files.",
+        default="substitution"
+    )
+    arg_parser.add_argument(
+        "--no-const-fold", action="store_true",
+        help="If specified, constant expressions and references to compile-time constants are emitted as written instead of being folded into literals.",
+    )
+    arg_parser.add_argument(
+        "-j", "--jobs", dest="job_count", metavar="<N>", type=int,
+        help="The number of worker processes used to parse source files, and of worker threads used to load packages (default: 1, i.e. no worker processes).",
+        default=1
+    )
+    arg_parser.add_argument(
+        "--stream-parse", action="store_true",
+        help="If specified, each source file is parsed one top-level statement at a time as the typer consumes it, releasing parse trees early: this lowers peak memory use on very large source files. Files are then parsed in this process, so '--jobs' is ignored.",
+    )
+    arg_parser.add_argument(
+        "--cache-dir", dest="cache_dir_path", metavar="<cache-dir-path>",
+        help="The directory in which parsed source files, translated C headers, parsed C headers, and typed definitions are cached across runs.",
+        default=qcl.disk_cache.default_root_dir_path
+    )
+    arg_parser.add_argument(
+        "--no-cache", action="store_true",
+        help="If specified, the compiler neither reads nor writes the persistent cache.",
+    )
     return arg_parser.parse_args()
 
 
+parse_mode_map = {
+    "sll-ll": qcl.qy_parser.ParseMode.SllThenLl,
+    "exact-ambiguity": qcl.qy_parser.ParseMode.ExactAmbiguityDetection,
+    "pratt": qcl.qy_parser.ParseMode.Pratt
+}
+
+tu_mode_map = {
+    "per-file": qcl.cpp_emitter.TranslationUnitMode.PerSourceFile,
+    "unity": qcl.cpp_emitter.TranslationUnitMode.Unity
+}
+
+typer_engine_map = {
+    "substitution": qcl.typer.TyperEngine.Substitution,
+    "union-find": qcl.typer.TyperEngine.UnionFind
+}
+
+
 def main_wrapper(profiling=False):
     try:
         if profiling:
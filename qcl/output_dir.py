@@ -0,0 +1,200 @@
+"""
+`output_dir` writes the files generated by an emitter into its output directory.
+
+In incremental mode (the default), every file is first written to a staging directory inside the output directory.
+Once emission succeeds, each staged file is compared with the file already on disk, and only files whose contents
+changed are moved into place (with an atomic rename), so unchanged files keep their modification times and build
+tools downstream (e.g. CMake/make) only rebuild what actually changed. If emission fails, the output directory is left
+exactly as the previous run wrote it.
+
+Files written by the previous run are tracked in a manifest, so files that are no longer generated are removed
+without deleting the whole tree: files in the output directory that the compiler did not write (e.g. a CMake build
+directory) are left alone. An output directory without a manifest (e.g. written by an older compiler, which deleted
+and rewrote the whole directory on every run) has all its files treated as previous outputs, once.
+
+On case-insensitive filesystems (e.g. the defaults on macOS and Windows), paths differing only by case name the same
+file, so renaming a symbol's case must not leave the old spelling behind (nor delete the new file as stale): file
+names are compared by their case-folded spelling there, and a file whose name changed case is replaced rather than
+overwritten in place.
+
+In clean mode, the output directory is deleted and every file is written directly, as the emitter used to do.
+"""
+
+import filecmp
+import json
+import os
+import os.path
+import shutil
+import typing as t
+
+from . import panic
+
+
+staging_dir_name = ".qc-staging"
+manifest_file_name = ".qc-manifest.json"
+manifest_version = 1
+
+
+class OutputDirectory(object):
+    """
+    Call `open` before writing any file with `write_file`, then either `commit` once every file is written, or
+    `discard` if emission failed.
+    """
+
+    def __init__(self, root_dir_path: str, incremental: bool = True) -> None:
+        super().__init__()
+        self.root_dir_path = os.path.abspath(root_dir_path)
+        self.staging_dir_path = os.path.join(self.root_dir_path, staging_dir_name)
+        self.manifest_file_path = os.path.join(self.root_dir_path, manifest_file_name)
+        self.incremental = incremental
+
+        # the path of every file written by this run, relative to the root directory, in the order first written (as
+        # dict keys): a file may be written more than once, the last version is kept.
+        self.rel_file_paths: t.Dict[str, None] = {}
+
+    def open(self):
+        self.rel_file_paths = {}
+        if self.incremental:
+            if os.path.isdir(self.staging_dir_path):
+                # left behind by a run that was interrupted.
+                shutil.rmtree(self.staging_dir_path)
+            os.makedirs(self.staging_dir_path)
+        else:
+            if os.path.isdir(self.root_dir_path):
+                shutil.rmtree(self.root_dir_path)
+            os.makedirs(self.root_dir_path)
+
+    def write_file(self, file_path: str, text: str):
+        """
+        Writes a generated text file, given its path inside the output directory.
+        """
+        rel_file_path = os.path.relpath(os.path.abspath(file_path), self.root_dir_path)
+        assert not rel_file_path.startswith(os.pardir) and not os.path.isabs(rel_file_path)
+        self.rel_file_paths[rel_file_path] = None
+
+        write_dir_path = self.staging_dir_path if self.incremental else self.root_dir_path
+        write_file_path = os.path.join(write_dir_path, rel_file_path)
+        os.makedirs(os.path.dirname(write_file_path), exist_ok=True)
+
+        # printing to the file in a single system call:
+        with open(write_file_path, 'w', buffering=max(len(text), 1)) as os_file_handle:
+            print(text, file=os_file_handle, end='')
+
+    def discard(self):
+        if self.incremental and os.path.isdir(self.staging_dir_path):
+            shutil.rmtree(self.staging_dir_path)
+
+    def commit(self):
+        """
+        Moves every changed file into place, removes stale files, and records the files written by this run.
+        """
+        if not self.incremental:
+            self.save_manifest(list(self.rel_file_paths))
+            print(f"INFO: Wrote {len(self.rel_file_paths)} output file(s)")
+            return
+
+        is_case_sensitive = is_case_sensitive_dir(self.staging_dir_path)
+        path_key = (lambda path: path) if is_case_sensitive else str.casefold
+        new_path_map = {}
+        for rel_file_path in self.rel_file_paths:
+            opt_clashing_path = new_path_map.setdefault(path_key(rel_file_path), rel_file_path)
+            if opt_clashing_path != rel_file_path:
+                panic.because(
+                    panic.ExitCode.EmitterError,
+                    f"Output files {repr(opt_clashing_path)} and {repr(rel_file_path)} differ only by case, but this "
+                    f"filesystem is case-insensitive: please rename one of the symbols generating them."
+                )
+
+        old_path_map = {path_key(rel_file_path): rel_file_path for rel_file_path in self.load_manifest()}
+
+        changed_file_count = 0
+        for key, rel_file_path in new_path_map.items():
+            staged_file_path = os.path.join(self.staging_dir_path, rel_file_path)
+            target_file_path = os.path.join(self.root_dir_path, rel_file_path)
+            opt_old_rel_file_path = old_path_map.get(key, None)
+            if opt_old_rel_file_path is not None and opt_old_rel_file_path != rel_file_path:
+                # the file name changed case: the old spelling may name the same file as the new one.
+                remove_file(os.path.join(self.root_dir_path, opt_old_rel_file_path))
+            elif os.path.isfile(target_file_path) and filecmp.cmp(staged_file_path, target_file_path, shallow=False):
+                continue
+            os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
+            os.replace(staged_file_path, target_file_path)
+            changed_file_count += 1
+
+        stale_file_count = 0
+        for key, old_rel_file_path in old_path_map.items():
+            if key not in new_path_map:
+                remove_file(os.path.join(self.root_dir_path, old_rel_file_path))
+                remove_empty_parent_dirs(os.path.join(self.root_dir_path, old_rel_file_path), self.root_dir_path)
+                stale_file_count += 1
+
+        self.save_manifest(list(new_path_map.values()))
+        shutil.rmtree(self.staging_dir_path)
+
+        print(
+            f"INFO: Wrote {changed_file_count} changed output file(s), "
+            f"kept {len(new_path_map) - changed_file_count} unchanged, "
+            f"removed {stale_file_count} stale"
+        )
+
+    def load_manifest(self) -> t.List[str]:
+        """
+        Returns the files written by the previous run, relative to the root directory.
+        """
+        try:
+            with open(self.manifest_file_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest["version"] == manifest_version:
+                return manifest["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or unreadable.
+            pass
+        return self.list_existing_files()
+
+    def save_manifest(self, rel_file_path_list: t.List[str]):
+        tmp_manifest_file_path = self.manifest_file_path + ".tmp"
+        with open(tmp_manifest_file_path, 'w') as manifest_file:
+            json.dump({"version": manifest_version, "files": rel_file_path_list}, manifest_file, indent=1)
+        os.replace(tmp_manifest_file_path, self.manifest_file_path)
+
+    def list_existing_files(self) -> t.List[str]:
+        rel_file_path_list = []
+        for dir_path, dir_names, file_names in os.walk(self.root_dir_path):
+            if dir_path == self.root_dir_path:
+                dir_names[:] = [dir_name for dir_name in dir_names if dir_name != staging_dir_name]
+            for file_name in file_names:
+                rel_file_path = os.path.relpath(os.path.join(dir_path, file_name), self.root_dir_path)
+                if not rel_file_path.startswith(manifest_file_name):
+                    rel_file_path_list.append(rel_file_path)
+        return rel_file_path_list
+
+
+def is_case_sensitive_dir(dir_path: str) -> bool:
+    """
+    Returns whether file names in `dir_path` are case-sensitive, by creating a probe file in it.
+    """
+    probe_file_path = os.path.join(dir_path, ".qc-case-probe")
+    with open(probe_file_path, 'w'):
+        pass
+    try:
+        return not os.path.exists(os.path.join(dir_path, ".QC-CASE-PROBE"))
+    finally:
+        os.remove(probe_file_path)
+
+
+def remove_file(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_empty_parent_dirs(file_path: str, root_dir_path: str):
+    dir_path = os.path.dirname(file_path)
+    while dir_path != root_dir_path and dir_path.startswith(root_dir_path):
+        try:
+            os.rmdir(dir_path)
+        except OSError:
+            # not empty, or already removed.
+            return
+        dir_path = os.path.dirname(dir_path)
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import os
+import os.path
+import tempfile
+import unittest
+import unittest.mock
+
+from . import output_dir
+from . import panic
+
+
+class TestOutputDirectory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root_dir_path = os.path.join(self.temp_dir.name, "qc-build")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def emit(self, file_text_map, incremental=True):
+        """
+        Runs an emission writing the given files, keyed by path relative to the output directory.
+        """
+        out = output_dir.OutputDirectory(self.root_dir_path, incremental=incremental)
+        out.open()
+        for rel_file_path, text in file_text_map.items():
+            out.write_file(os.path.join(self.root_dir_path, rel_file_path), text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            out.commit()
+
+    def read(self, rel_file_path):
+        with open(os.path.join(self.root_dir_path, rel_file_path)) as output_file:
+            return output_file.read()
+
+    def list_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dir_path, file_name), self.root_dir_path)
+            for dir_path, _, file_names in os.walk(self.root_dir_path)
+            for file_name in file_names
+            if file_name != output_dir.manifest_file_name
+        )
+
+    def test_only_changed_files_are_replaced(self):
+        self.emit({"impl/a.cpp": "int a;\n", "impl/b.cpp": "int b;\n"})
+        old_mtime_ns = 1_000_000_000
+        for rel_file_path in ("impl/a.cpp", "impl/b.cpp"):
+            os.utime(os.path.join(self.root_dir_path, rel_file_path), ns=(old_mtime_ns, old_mtime_ns))
+
+        self.emit({"impl/a.cpp": "int a;\n", "impl/b.cpp": "long b;\n"})
+        self.assertEqual(os.stat(os.path.join(self.root_dir_path, "impl/a.cpp")).st_mtime_ns, old_mtime_ns)
+        self.assertNotEqual(os.stat(os.path.join(self.root_dir_path, "impl/b.cpp")).st_mtime_ns, old_mtime_ns)
+        self.assertEqual(self.read("impl/b.cpp"), "long b;\n")
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir_path, output_dir.staging_dir_name)))
+
+    def test_stale_files_are_removed_but_untracked_files_are_kept(self):
+        self.emit({"CMakeLists.txt": "", "impl/a.cpp": "", "types/T.decl.hpp": ""})
+        os.makedirs(os.path.join(self.root_dir_path, "build"))
+        with open(os.path.join(self.root_dir_path, "build", "CMakeCache.txt"), "w"):
+            pass
+
+        self.emit({"CMakeLists.txt": "", "impl/a.cpp": ""})
+        self.assertEqual(self.list_files(), ["CMakeLists.txt", "build/CMakeCache.txt", "impl/a.cpp"])
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir_path, "types")))
+
+    def test_discarded_emission_leaves_previous_output(self):
+        self.emit({"impl/a.cpp": "int a;\n"})
+        out = output_dir.OutputDirectory(self.root_dir_path)
+        out.open()
+        out.write_file(os.path.join(self.root_dir_path, "impl/a.cpp"), "broken")
+        out.write_file(os.path.join(self.root_dir_path, "impl/b.cpp"), "broken")
+        out.discard()
+        self.assertEqual(self.list_files(), ["impl/a.cpp"])
+        self.assertEqual(self.read("impl/a.cpp"), "int a;\n")
+
+    def test_case_insensitive_filesystems(self):
+        with unittest.mock.patch.object(output_dir, "is_case_sensitive_dir", return_value=False):
+            self.emit({"types/vec.decl.hpp": "struct Vec;\n"})
+            self.emit({"types/Vec.decl.hpp": "struct Vec;\n"})
+            self.assertEqual(self.list_files(), ["types/Vec.decl.hpp"])
+
+            with contextlib.redirect_stderr(io.StringIO()):
+                with self.assertRaises(panic.PanicException) as caught:
+                    self.emit({"types/Vec.decl.hpp": "", "types/VEC.decl.hpp": ""})
+            self.assertEqual(caught.exception.exit_code, panic.ExitCode.EmitterError)
@@ -1,6 +1,17 @@
 import os.path
+import sys
+import bisect
+import io
+import contextlib
+import concurrent.futures
 import typing as t
 import re
+import enum
+import functools
+import inspect
+import itertools
+import dataclasses
+import pickle
 import ast as python_ast
 
 from . import antlr
@@ -8,34 +19,300 @@ from . import feedback as fb
 from . import panic
 from . import ast1
 from . import config
+from . import common
+from . import disk_cache
+from . import session
+from . import qy_pratt_parser
 
 
-def parse_one_file(abs_file_path: str) -> t.List[ast1.BaseStatement]:
+class ParseMode(enum.Enum):
+    # Production mode: first try the fast SLL prediction mode, bailing out on the first error, then
+    # re-parse with full LL only if SLL fails. SLL is exact for all syntactically valid input that
+    # does not need full context, so this only affects how fast we get to an answer, never the answer.
+    SllThenLl = enum.auto()
+
+    # Grammar-debugging mode: full LL with exact ambiguity detection. This is very slow, so it is opt-in.
+    ExactAmbiguityDetection = enum.auto()
+
+    # Hand-written front-end (see `qy_pratt_parser`) that skips ANTLR's parse trees. It cannot report errors,
+    # so files it rejects are re-parsed in `SllThenLl` mode.
+    Pratt = enum.auto()
+
+
+@dataclasses.dataclass
+class ParseOptions:
+    mode: ParseMode = ParseMode.SllThenLl
+
+    # if set, parsed files are stored in and loaded from this persistent cache.
+    opt_ast_cache: t.Optional[disk_cache.DiskCache] = None
+
+    # if set, C headers translated to Qy by `c_parser` are stored in and loaded from this persistent cache.
+    opt_c_header_cache: t.Optional[disk_cache.DiskCache] = None
+
+    # if set, the headers of each CQyx package are parsed by libclang as one TU, stored in and loaded from this
+    # persistent cache as an AST file (see `c_parser.load_package_tu`).
+    opt_c_ast_cache: t.Optional[disk_cache.DiskCache] = None
+
+    # the number of worker processes used by `parse_files` (1 parses in this process), and of worker threads used
+    # by `ast2.QypSet.load_qyp_graph`.
+    job_count: int = 1
+
+    # if set, source files are parsed lazily with `iter_one_file` as their statements are consumed, instead of
+    # up-front by `parse_files` (so `job_count` is ignored).
+    streaming: bool = False
+
+
+def parse_one_file(abs_file_path: str, opts: t.Optional[ParseOptions] = None) -> t.List[ast1.BaseStatement]:
     """
     (lazily) parses the contents of a source file.
     """
     if config.COMPILER_IN_DEBUG_MODE:
         assert abs_file_path == os.path.abspath(abs_file_path)
+    if opts is None:
+        opts = ParseOptions()
     
     print(f"\t{abs_file_path}")
     
+    # parsed files are cached in memory for the rest of the compilation session.
+    file_parse_cache = session.current().file_parse_cache
     opt_cached_result = file_parse_cache.get(abs_file_path, None)
     if opt_cached_result is not None:
         return opt_cached_result
+
+    opt_ast_cache_key = None
+    if uses_ast_cache(opts):
+        opt_ast_cache_key = ast_cache_key(abs_file_path, opts.mode)
+        opt_cached_result = opts.opt_ast_cache.get(opt_ast_cache_key)
+        if opt_cached_result is not None:
+            file_parse_cache[abs_file_path] = opt_cached_result
+            return opt_cached_result
+
+    fresh_result = parse_one_file_without_caching(abs_file_path, opts.mode)
+    file_parse_cache[abs_file_path] = fresh_result
+    if opt_ast_cache_key is not None:
+        opts.opt_ast_cache.put(opt_ast_cache_key, fresh_result)
+    return fresh_result
+
+
+def parse_files(abs_file_paths: t.List[str], opts: t.Optional[ParseOptions] = None) -> t.List[t.List[ast1.BaseStatement]]:
+    """
+    Parses several source files, returning a statement list for each path in order.
+    Files missing from both caches are parsed on a pool of `opts.job_count` worker processes; results, logs, and
+    syntax errors (the first in `abs_file_paths` order is reported) are exactly as if `parse_one_file` was invoked
+    on each path in order.
+    """
+    if opts is None:
+        opts = ParseOptions()
+    if opts.job_count <= 1:
+        return [parse_one_file(abs_file_path, opts) for abs_file_path in abs_file_paths]
+
+    # first, serving files from the in-memory and persistent caches, collecting the rest:
+    file_parse_cache = session.current().file_parse_cache
+    uncached_file_paths = []
+    uncached_file_path_set = set()
+    uncached_file_keys = []
+    for abs_file_path in abs_file_paths:
+        if config.COMPILER_IN_DEBUG_MODE:
+            assert abs_file_path == os.path.abspath(abs_file_path)
+        print(f"\t{abs_file_path}")
+
+        if abs_file_path in file_parse_cache or abs_file_path in uncached_file_path_set:
+            continue
+
+        opt_ast_cache_key = None
+        if uses_ast_cache(opts):
+            opt_ast_cache_key = ast_cache_key(abs_file_path, opts.mode)
+            opt_cached_result = opts.opt_ast_cache.get(opt_ast_cache_key)
+            if opt_cached_result is not None:
+                file_parse_cache[abs_file_path] = opt_cached_result
+                continue
+
+        uncached_file_paths.append(abs_file_path)
+        uncached_file_path_set.add(abs_file_path)
+        uncached_file_keys.append(opt_ast_cache_key)
+
+    # then, parsing all remaining files in parallel, collecting results in order:
+    if uncached_file_paths:
+        worker_count = min(opts.job_count, len(uncached_file_paths))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=worker_count) as executor:
+            futures = [
+                executor.submit(parse_one_file_in_worker, abs_file_path, opts.mode)
+                for abs_file_path in uncached_file_paths
+            ]
+            for abs_file_path, opt_ast_cache_key, future in zip(uncached_file_paths, uncached_file_keys, futures):
+                is_ok, payload = future.result()
+                if not is_ok:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    exit_code, msg, stderr_text = payload
+                    sys.stderr.write(stderr_text)
+                    raise panic.PanicException(exit_code, msg)
+
+                # unpickling on this thread, so locations are registered with this thread's compilation session:
+                stmt_list = pickle.loads(payload)
+                file_parse_cache[abs_file_path] = stmt_list
+                if opt_ast_cache_key is not None:
+                    opts.opt_ast_cache.put(opt_ast_cache_key, stmt_list)
+
+    return [file_parse_cache[abs_file_path] for abs_file_path in abs_file_paths]
+
+
+def parse_one_file_in_worker(abs_file_path: str, mode: ParseMode):
+    """
+    Runs in a worker process of `parse_files`: panics are sent back (with the error message printed so far) instead
+    of being raised, so the parent can report them in order.
+    Statement lists are sent back pickled, since the executor would otherwise unpickle them on its own thread.
+    """
+    stderr_buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr_buffer):
+            return True, pickle.dumps(parse_one_file_without_caching(abs_file_path, mode))
+    except panic.PanicException as exc:
+        return False, (exc.exit_code, exc.msg, stderr_buffer.getvalue())
+
+
+def uses_ast_cache(opts: ParseOptions) -> bool:
+    # ambiguities are reported while parsing, so a grammar-debugging run must always parse.
+    return opts.opt_ast_cache is not None and opts.mode != ParseMode.ExactAmbiguityDetection
+
+
+def ast_cache_key(abs_file_path: str, mode: ParseMode) -> str:
+    """
+    Returns the key of a source file's parsed `ast1` tree in the persistent AST cache.
+    The key covers the file's path (baked into every location) and contents, the parse mode, the grammar, and the
+    compiler code that builds `ast1` trees.
+    """
+    with open(abs_file_path, "rb") as source_file:
+        contents = source_file.read()
+    return disk_cache.hash_digest(
+        abs_file_path, contents, mode.name, grammar_fingerprint(), ast_builder_fingerprint()
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def grammar_fingerprint() -> str:
+    # the generated lexer and parser embed the serialized ATN, so they change whenever the grammar does.
+    return disk_cache.hash_source_files(
+        inspect.getfile(antlr.QySourceFileLexer),
+        inspect.getfile(antlr.QySourceFileParser)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def ast_builder_fingerprint() -> str:
+    return disk_cache.hash_digest(
+        config.COMPILER_VERSION,
+        disk_cache.hash_source_files(__file__, qy_pratt_parser.__file__, ast1.__file__, fb.__file__, common.__file__)
+    )
+
+
+def parse_one_file_without_caching(abs_file_path: str, mode: ParseMode = ParseMode.SllThenLl) -> t.List[ast1.BaseStatement]:
+    if config.COMPILER_IN_DEBUG_MODE:
+        assert os.path.isfile(abs_file_path)
+
+    if mode == ParseMode.Pratt:
+        try:
+            return qy_pratt_parser.parse_one_file(abs_file_path)
+        except qy_pratt_parser.ParseError:
+            mode = ParseMode.SllThenLl
+
+    antlr_text_stream, antlr_parser, error_listener = make_antlr_parser(abs_file_path, mode)
+    if mode == ParseMode.ExactAmbiguityDetection:
+        source_file_parse_tree = antlr_parser.sourceFile()
+    elif mode == ParseMode.SllThenLl:
+        source_file_parse_tree = parse_with_sll_then_ll(antlr_parser, error_listener, antlr.QySourceFileParser.sourceFile)
     else:
-        fresh_result = parse_one_file_without_caching(abs_file_path)
-        file_parse_cache[abs_file_path] = fresh_result
-        return fresh_result
+        raise NotImplementedError(f"Unknown parse mode: {mode}")
 
+    visitor = AstConstructorVisitor(abs_file_path, fb.intern_source_file(abs_file_path, antlr_text_stream.strdata))
+    return visitor.visit(source_file_parse_tree)
 
-file_parse_cache: t.Dict[str, t.List[ast1.BaseStatement]] = {}
 
+def iter_one_file(abs_file_path: str, opts: t.Optional[ParseOptions] = None) -> t.Iterator[ast1.BaseStatement]:
+    """
+    Like `parse_one_file`, but yields the top-level statements of a source file one at a time, as soon as each is
+    parsed. Only a complete statement list is ever cached.
+    """
+    if config.COMPILER_IN_DEBUG_MODE:
+        assert abs_file_path == os.path.abspath(abs_file_path)
+    if opts is None:
+        opts = ParseOptions()
+
+    print(f"\t{abs_file_path}")
 
-def parse_one_file_without_caching(abs_file_path: str) -> t.List[ast1.BaseStatement]:
+    file_parse_cache = session.current().file_parse_cache
+    opt_cached_result = file_parse_cache.get(abs_file_path, None)
+    if opt_cached_result is not None:
+        yield from opt_cached_result
+        return
+
+    opt_ast_cache_key = None
+    if uses_ast_cache(opts):
+        opt_ast_cache_key = ast_cache_key(abs_file_path, opts.mode)
+        opt_cached_result = opts.opt_ast_cache.get(opt_ast_cache_key)
+        if opt_cached_result is not None:
+            file_parse_cache[abs_file_path] = opt_cached_result
+            yield from opt_cached_result
+            return
+
+    fresh_result = []
+    for stmt in iter_one_file_without_caching(abs_file_path, opts.mode):
+        fresh_result.append(stmt)
+        yield stmt
+    file_parse_cache[abs_file_path] = fresh_result
+    if opt_ast_cache_key is not None:
+        opts.opt_ast_cache.put(opt_ast_cache_key, fresh_result)
+
+
+def iter_one_file_without_caching(abs_file_path: str, mode: ParseMode = ParseMode.SllThenLl) -> t.Iterator[ast1.BaseStatement]:
+    """
+    Parses a source file one top-level statement at a time, yielding each statement's AST as soon as it is built.
+    Unlike `parse_one_file_without_caching`, the ANTLR parse tree of each statement is dropped before the next
+    statement is parsed, so peak memory use does not grow with the file's parse tree.
+    Syntax errors are reported when the offending statement is reached, so statements before it are still yielded.
+    """
     if config.COMPILER_IN_DEBUG_MODE:
         assert os.path.isfile(abs_file_path)
 
-    error_listener = QyErrorListener(abs_file_path)
+    if mode == ParseMode.Pratt:
+        # the hand-written front-end builds no parse trees, so there is nothing to release early.
+        yield from parse_one_file_without_caching(abs_file_path, mode)
+        return
+
+    antlr_text_stream, antlr_parser, error_listener = make_antlr_parser(abs_file_path, mode)
+    antlr_token_stream = antlr_parser.getTokenStream()
+    visitor = AstConstructorVisitor(abs_file_path, fb.intern_source_file(abs_file_path, antlr_text_stream.strdata))
+
+    # mirroring `sourceFile: (statements+=statement ';')* EOF`, one statement at a time:
+    while antlr_token_stream.LA(1) != antlr.Token.EOF:
+        if mode == ParseMode.ExactAmbiguityDetection:
+            statement_parse_tree = antlr_parser.statement()
+        elif mode == ParseMode.SllThenLl:
+            statement_parse_tree = parse_with_sll_then_ll(antlr_parser, error_listener, antlr.QySourceFileParser.statement)
+        else:
+            raise NotImplementedError(f"Unknown parse mode: {mode}")
+        stmt = visitor.visit(statement_parse_tree)
+        del statement_parse_tree
+
+        separator_token = antlr_token_stream.LT(1)
+        if separator_token.type != semicolon_token_type:
+            error_listener.syntaxError(
+                antlr_parser, separator_token, separator_token.line, separator_token.column,
+                f"mismatched input {antlr_parser._errHandler.getTokenErrorDisplay(separator_token)} expecting ';'",
+                None
+            )
+        antlr_token_stream.consume()
+
+        yield stmt
+
+
+semicolon_token_type = antlr.QySourceFileParser.literalNames.index("';'")
+
+
+def make_antlr_parser(abs_file_path: str, mode: ParseMode):
+    """
+    Returns an ANTLR parser for a source file (with its input stream and error listener), configured for `mode`.
+    """
+    error_listener = QyErrorListener(abs_file_path, report_ambiguity=(mode == ParseMode.ExactAmbiguityDetection))
 
     antlr_text_stream = antlr.FileStream(abs_file_path)
     antlr_lexer = antlr.QySourceFileLexer(antlr_text_stream)
@@ -45,18 +322,52 @@ def parse_one_file_without_caching(abs_file_path: str) -> t.List[ast1.BaseStatem
     antlr_token_stream = antlr.CommonTokenStream(antlr_lexer)
     antlr_parser = antlr.QySourceFileParser(antlr_token_stream)
     antlr_parser.removeErrorListeners()
-    antlr_parser._interp.predictionMode = antlr.PredictionMode.LL_EXACT_AMBIG_DETECTION
-    antlr_parser.addErrorListener(error_listener)
 
-    visitor = AstConstructorVisitor(abs_file_path)
-    source_file_parse_tree = antlr_parser.sourceFile()
-    return visitor.visit(source_file_parse_tree)
+    if mode == ParseMode.ExactAmbiguityDetection:
+        antlr_parser._interp.predictionMode = antlr.PredictionMode.LL_EXACT_AMBIG_DETECTION
+        antlr_parser.addErrorListener(error_listener)
+
+    return antlr_text_stream, antlr_parser, error_listener
+
+
+def parse_with_sll_then_ll(antlr_parser, opt_error_listener: t.Optional["QyErrorListener"], rule_fn):
+    """
+    Two-stage parsing: runs `rule_fn` on `antlr_parser` in SLL mode without error recovery, then, only if
+    that fails, rewinds the token stream and runs `rule_fn` again in full LL mode, reporting errors to
+    `opt_error_listener`.
+    NOTE: SLL mode can only fail on valid input if the grammar requires full context to decide, so the
+    second stage also reports genuine syntax errors.
+    If `opt_error_listener` is `None`, the second stage bails on the first error too, raising
+    `antlr.ParseCancellationException`.
+    """
+
+    # stage 1: SLL, bail on first error
+    start_token_index = antlr_parser.getTokenStream().index
+    antlr_parser._errHandler = antlr.BailErrorStrategy()
+    antlr_parser._interp.predictionMode = antlr.PredictionMode.SLL
+    try:
+        return rule_fn(antlr_parser)
+    except antlr.ParseCancellationException:
+        pass
+
+    # stage 2: LL, default error strategy reporting to our listener
+    antlr_parser.getTokenStream().seek(start_token_index)
+    antlr_parser._interp.predictionMode = antlr.PredictionMode.LL
+    if opt_error_listener is None:
+        return rule_fn(antlr_parser)
+    antlr_parser._errHandler = antlr.DefaultErrorStrategy()
+    antlr_parser.addErrorListener(opt_error_listener)
+    try:
+        return rule_fn(antlr_parser)
+    finally:
+        antlr_parser.removeErrorListener(opt_error_listener)
 
 
 class QyErrorListener(antlr.ANTLR4ErrorListener):
-    def __init__(self, source_file_path: str):
+    def __init__(self, source_file_path: str, report_ambiguity: bool = True):
         super().__init__()
         self.source_file_path = source_file_path
+        self.report_ambiguity = report_ambiguity
 
     def syntaxError(self, recognizer, offending_symbol, line, column, message, e):
         panic.because(
@@ -67,7 +378,9 @@ class QyErrorListener(antlr.ANTLR4ErrorListener):
         )
 
     def reportAmbiguity(self, recognizer, dfa, start_index, stop_index, exact, ambig_alts, configs):
-        if not exact:
+        # NOTE: plain LL mode stops at the first conflict it finds and reports it as an inexact ambiguity,
+        # so we only treat ambiguities as errors in the grammar-debugging mode.
+        if self.report_ambiguity and not exact:
             # raise excepts.ParserCompilationError(f"Inexact parser ambiguity detected (...)")
             # NOTE: https://www.antlr.org/api/Java/org/antlr/v4/runtime/ANTLRErrorListener.html
             # "...which does not result in a syntax error"
@@ -84,85 +397,18 @@ class QyErrorListener(antlr.ANTLR4ErrorListener):
 
 
 class AstConstructorVisitor(antlr.QySourceFileVisitor):
-    def __init__(self, source_file_path: str):
+    def __init__(self, source_file_path: str, source_file_id: int):
         super().__init__()
         self.source_file_path = source_file_path
+        self.source_file_table = fb.current_source_file_table()
+        self.source_file_id = source_file_id
 
     #
     # helpers:
     #
 
     def loc(self, ctx: antlr.ParserRuleContext):
-        # setting the start line and column according to ANTLR:
-        start_line_index = ctx.start.line - 1
-        start_col_index = ctx.start.column
-
-        # setting the end line and column according to ANTLR:
-        if ctx.stop is not None:
-            end_line_index = ctx.stop.line - 1
-            end_col_index = ctx.stop.column
-
-            # extending the end column by the length of the last token:
-            # FIXME: inefficient check to ensure no 'multiline-string-literal' tokens
-            #        can be replaced by a better check in ANTLR-- e.g. using vocabulary?
-            if '\n' not in ctx.stop.text:
-                end_col_index += len(ctx.stop.text)
-        else:
-            end_line_index = start_line_index
-            end_col_index = start_col_index
-
-        return fb.FileLoc(
-            self.source_file_path,
-            fb.FileSpan(
-                fb.FilePos(start_line_index, start_col_index),
-                fb.FilePos(end_line_index, end_col_index)
-            )
-        )
-
-    def make_int_expression(self, ctx, raw_text: str, base: int):
-        # splitting the number text:
-        numeric_text, suffix_text = AstConstructorVisitor.split_number_text(raw_text)
-
-        # parsing the suffix:
-        width_in_bits = 32
-        is_unsigned = False
-        for suffix_character in suffix_text:
-            if suffix_character in ('u', 'U'):
-                is_unsigned = True
-            elif suffix_character in ('l', 'L'):
-                width_in_bits = 64
-            elif suffix_character in ('s', 'S'):
-                width_in_bits = 16
-            elif suffix_character in ('b', 'B'):
-                width_in_bits = 8
-            else:
-                raise NotImplementedError(f"Unknown integer suffix char: {repr(suffix_character)}")
-
-        # parsing the numeric text to find the Python value:
-        value = int(numeric_text, base)
-
-        # returning the new expression:
-        return ast1.IntExpression(self.loc(ctx), raw_text, value, base, is_unsigned, width_in_bits)
-
-    def make_float_expression(self, ctx, raw_text: str):
-        # splitting the number text:
-        numeric_text, suffix_text = AstConstructorVisitor.split_number_text(raw_text)
-
-        # parsing the suffix:
-        width_in_bits = 64
-        for suffix_character in suffix_text:
-            if suffix_character in ('f', 'F'):
-                width_in_bits = 32
-            elif suffix_character in ('d', 'D'):
-                width_in_bits = 64
-            else:
-                raise NotImplementedError(f"Unknown float suffix char: {repr(suffix_character)}")
-
-        # parsing the numeric text to find the Python value:
-        value = float(numeric_text)
-
-        # returning the new expression:
-        return ast1.FloatExpression(self.loc(ctx), raw_text, value, width_in_bits)
+        return loc_of_tokens(self.source_file_table, self.source_file_id, ctx.start, ctx.stop)
 
     #
     # Files & blocks:
@@ -276,13 +522,6 @@ class AstConstructorVisitor(antlr.QySourceFileVisitor):
         assert isinstance(res, ast1.BaseExpression)
         return res
 
-    @staticmethod
-    def split_number_text(raw_literal_number_text):
-        match_obj = re.match(compiled_number_matcher_pattern, raw_literal_number_text)
-        numeric_text = match_obj.group(2).replace('_', '')
-        suffix_text = match_obj.group(3)
-        return numeric_text, suffix_text
-
     def visitLitBoolean(self, ctx: antlr.QySourceFileParser.LitBooleanContext):
         if ctx.is_true:
             return ast1.IntExpression(self.loc(ctx), text="1", value=1, base=10, is_unsigned=True, width_in_bits=1)
@@ -292,15 +531,15 @@ class AstConstructorVisitor(antlr.QySourceFileVisitor):
     def visitLitInteger(self, ctx: antlr.QySourceFileParser.LitIntegerContext) -> ast1.IntExpression:
         raw_text = ctx.getText()
         if ctx.deci is not None:
-            return self.make_int_expression(ctx, raw_text, 10)
+            return make_int_expression(self.loc(ctx), raw_text, 10)
         elif ctx.hexi is not None:
-            return self.make_int_expression(ctx, raw_text, 16)
+            return make_int_expression(self.loc(ctx), raw_text, 16)
         else:
             raise NotImplementedError("Unknown integer literal")
 
     def visitLitFloat(self, ctx: antlr.QySourceFileParser.LitFloatContext) -> ast1.FloatExpression:
         raw_text = ctx.tok.text
-        return self.make_float_expression(ctx, raw_text)
+        return make_float_expression(self.loc(ctx), raw_text)
 
     def visitLitString(self, ctx: antlr.QySourceFileParser.LitStringContext):
         piece_text_list = []
@@ -378,13 +617,7 @@ class AstConstructorVisitor(antlr.QySourceFileVisitor):
         )
 
     def visitUnaryOperator(self, ctx: antlr.QySourceFileParser.UnaryOperatorContext) -> ast1.UnaryOperator:
-        return {
-            '*': ast1.UnaryOperator.DeRef,
-            'not': ast1.UnaryOperator.LogicalNot,
-            '-': ast1.UnaryOperator.Minus,
-            '+': ast1.UnaryOperator.Plus,
-            'do': ast1.UnaryOperator.Do
-        }[ctx.getText()]
+        return unary_operator_map[ctx.getText()]
 
     def visitBinaryExpression(self, ctx: antlr.QySourceFileParser.BinaryExpressionContext) -> ast1.BinaryOpExpression:
         return self.visit(ctx.through)
@@ -536,22 +769,7 @@ class AstConstructorVisitor(antlr.QySourceFileVisitor):
         if ctx.id_tok is not None:
             return ast1.IdRefTypeSpec(self.loc(ctx), ctx.id_tok.text)
         else:
-            return ast1.BuiltinPrimitiveTypeSpec(
-                self.loc(ctx), {
-                    'Float': ast1.BuiltinPrimitiveTypeIdentity.Float32,
-                    'Double': ast1.BuiltinPrimitiveTypeIdentity.Float64,
-                    'Long': ast1.BuiltinPrimitiveTypeIdentity.Int64,
-                    'Int': ast1.BuiltinPrimitiveTypeIdentity.Int32,
-                    'Short': ast1.BuiltinPrimitiveTypeIdentity.Int16,
-                    'Char': ast1.BuiltinPrimitiveTypeIdentity.Int8,
-                    'ULong': ast1.BuiltinPrimitiveTypeIdentity.UInt64,
-                    'UInt': ast1.BuiltinPrimitiveTypeIdentity.UInt32,
-                    'UShort': ast1.BuiltinPrimitiveTypeIdentity.UInt16,
-                    'Byte': ast1.BuiltinPrimitiveTypeIdentity.UInt8,
-                    'Bool': ast1.BuiltinPrimitiveTypeIdentity.Bool,
-                    'Void': ast1.BuiltinPrimitiveTypeIdentity.Void
-                }[ctx.tok.text]
-            )
+            return ast1.BuiltinPrimitiveTypeSpec(self.loc(ctx), builtin_primitive_type_identity_map[ctx.tok.text])
 
     def visitArrayTypeSpec(self, ctx: antlr.QySourceFileParser.ArrayTypeSpecContext):
         if ctx.through is not None:
@@ -628,3 +846,441 @@ class AstConstructorVisitor(antlr.QySourceFileVisitor):
 
 
 compiled_number_matcher_pattern = re.compile(r"(0[xb])?([0-9_.]+)([a-zA-Z]*)")
+
+
+#
+# Incremental re-parsing:
+# after an edit, only the text around the edit is re-lexed, and only the top-level statements it affects are
+# re-parsed, e.g. for an editor server or watch-mode rebuilds.
+#
+
+@dataclasses.dataclass
+class TextEdit:
+    """
+    Replaces the characters in `[start_offset, end_offset)` of a source text with `new_text`.
+    """
+    start_offset: int
+    end_offset: int
+    new_text: str
+
+    def apply(self, text: str) -> str:
+        return text[:self.start_offset] + self.new_text + text[self.end_offset:]
+
+
+@dataclasses.dataclass
+class IncrementalParse:
+    """
+    A parsed source text, with everything `reparse_after_edit` needs to update it after an edit.
+    """
+    source_file_path: str
+    text: str
+
+    # every token of `text`, ending with an EOF token, and, for each token, the furthest offset the lexer read while
+    # producing it (including any skipped text before it): tokens are only unaffected by an edit if the lexer never
+    # read the edited text while producing them or any earlier token.
+    tokens: t.List[antlr.Token]
+    token_lookahead_list: t.List[int]
+
+    stmt_list: t.List[ast1.BaseStatement]
+
+    # the first token of each top-level statement: each statement ends with the ';' before the next one's first token.
+    stmt_first_tokens: t.List[antlr.Token]
+
+    # how much work the last update did:
+    relexed_token_count: int = 0
+    reparsed_stmt_count: int = 0
+
+
+class LookaheadTrackingInputStream(antlr.InputStream):
+    """
+    An input stream that remembers the furthest offset read, e.g. by the lexer looking ahead.
+    """
+
+    def __init__(self, data: str) -> None:
+        super().__init__(data)
+        self.max_read_offset = -1
+
+    def LA(self, offset: int):
+        read_offset = self._index + offset - 1
+        if read_offset > self.max_read_offset:
+            self.max_read_offset = read_offset
+        return super().LA(offset)
+
+
+def parse_text_incrementally(source_file_path: str, text: str) -> IncrementalParse:
+    """
+    Parses a whole source text, keeping the tokens required to update the result with `reparse_after_edit`.
+    Syntax errors are reported like `parse_one_file` would.
+    """
+    tokens = []
+    token_lookahead_list = []
+    for token, lookahead in iter_tokens_with_lookahead(source_file_path, text, 0):
+        tokens.append(token)
+        token_lookahead_list.append(lookahead)
+
+    stmt_list, stmt_first_tokens = parse_token_list(source_file_path, tokens, QyErrorListener(source_file_path))
+    fb.intern_source_file(source_file_path, text)
+    return IncrementalParse(
+        source_file_path, text,
+        tokens, token_lookahead_list,
+        stmt_list, stmt_first_tokens,
+        relexed_token_count=len(tokens),
+        reparsed_stmt_count=len(stmt_list)
+    )
+
+
+def reparse_after_edit(prev: IncrementalParse, edit: TextEdit) -> IncrementalParse:
+    """
+    Returns the result of parsing `prev.text` after `edit`, exactly as if it was parsed from scratch.
+    Only the text around the edit is re-lexed, and only the top-level statements whose tokens changed (or which the
+    edit touches) are re-parsed: all other statements are reused, with their locations shifted past the edit.
+    Syntax errors are reported like `parse_one_file` would.
+    NOTE: on success, `prev` must not be used again, since its tokens and nodes are moved into the result; on
+    failure, `prev` is left unchanged.
+    """
+    old_text = prev.text
+    old_tokens = prev.tokens
+    assert 0 <= edit.start_offset <= edit.end_offset <= len(old_text)
+    new_text = edit.apply(old_text)
+    new_edit_end_offset = edit.start_offset + len(edit.new_text)
+    delta = new_edit_end_offset - edit.end_offset
+
+    # re-lexing from just after the last token whose lexing never read the edited text, until a new token starts
+    # where an old one did past the edit: from there on, the lexer sees the same text, so the old tokens still hold.
+    max_lookahead_list = list(itertools.accumulate(prev.token_lookahead_list, max))
+    relex_index = bisect.bisect_left(max_lookahead_list, edit.start_offset)
+    relex_offset = 0 if relex_index == 0 else old_tokens[relex_index - 1].stop + 1
+    relexed_tokens = []
+    relexed_lookahead_list = []
+    for token, lookahead in iter_tokens_with_lookahead(prev.source_file_path, new_text, relex_offset):
+        if token.start >= new_edit_end_offset:
+            sync_index = bisect_tokens(old_tokens, token.start - delta, relex_index)
+            if sync_index < len(old_tokens) and old_tokens[sync_index].start == token.start - delta:
+                sync_lookahead = lookahead
+                break
+        relexed_tokens.append(token)
+        relexed_lookahead_list.append(lookahead)
+    else:
+        assert False, "expected the old and new EOF tokens to line up"
+
+    # trimming re-lexed tokens that did not change from both ends:
+    # old tokens in `[changed_begin, changed_end)` are replaced by `relexed_tokens[prefix_len:relexed_end]`.
+    prefix_len = 0
+    while (
+        prefix_len < len(relexed_tokens) and relex_index + prefix_len < sync_index and
+        is_same_token(relexed_tokens[prefix_len], old_tokens[relex_index + prefix_len], 0)
+    ):
+        prefix_len += 1
+    changed_begin = relex_index + prefix_len
+    changed_end = sync_index
+    relexed_end = len(relexed_tokens)
+    while (
+        relexed_end > prefix_len and changed_end > changed_begin and
+        is_same_token(relexed_tokens[relexed_end - 1], old_tokens[changed_end - 1], delta)
+    ):
+        relexed_end -= 1
+        changed_end -= 1
+    changed_tokens = relexed_tokens[prefix_len:relexed_end]
+
+    # selecting the top-level statements to re-parse: `[first_stmt_index, end_stmt_index)`
+    first_stmt_index, end_stmt_index = stmt_range_of_tokens(prev, changed_begin, changed_end)
+    opt_touched_stmt_range = stmt_range_touched_by_edit(prev, edit)
+    if opt_touched_stmt_range is not None:
+        first_stmt_index = min(first_stmt_index, opt_touched_stmt_range[0])
+        end_stmt_index = max(end_stmt_index, opt_touched_stmt_range[1])
+    region_begin = first_token_index_of_stmt(prev, first_stmt_index)
+    region_end = first_token_index_of_stmt(prev, end_stmt_index)
+    assert region_begin <= changed_begin <= changed_end <= region_end
+
+    # re-parsing these statements, with copies of their old tokens after the edit moved into place:
+    token_shifter = TokenShifter(old_text, new_text, edit)
+    moved_region_tokens = [token_shifter.shifted_copy(token) for token in old_tokens[changed_end:region_end]]
+    region_tokens = old_tokens[region_begin:changed_begin] + changed_tokens + moved_region_tokens
+    if region_tokens:
+        try:
+            region_stmt_list, region_stmt_first_tokens = parse_token_list(prev.source_file_path, region_tokens, None)
+        except antlr.ParseCancellationException:
+            # e.g. the statements after the edit now join those before it: re-parsing everything, reporting errors.
+            return parse_text_incrementally(prev.source_file_path, new_text)
+    else:
+        region_stmt_list, region_stmt_first_tokens = [], []
+
+    # success: moving the rest of the old tokens and statements into place (in-place, so `prev` is invalidated).
+    for token in old_tokens[region_end:]:
+        token_shifter.shift(token)
+    reused_stmt_list = prev.stmt_list[end_stmt_index:]
+    shift_stmt_locs(reused_stmt_list, delta)
+    fb.intern_source_file(prev.source_file_path, new_text)
+
+    # the skipped text before the sync token may have changed, so only the tokens after it keep their lookahead:
+    token_lookahead_list = (
+        prev.token_lookahead_list[:relex_index] +
+        relexed_lookahead_list +
+        [sync_lookahead] +
+        [
+            old_lookahead + delta if old_lookahead >= 0 else old_lookahead
+            for old_lookahead in prev.token_lookahead_list[sync_index + 1:]
+        ]
+    )
+
+    return IncrementalParse(
+        prev.source_file_path, new_text,
+        old_tokens[:changed_begin] + changed_tokens + moved_region_tokens + old_tokens[region_end:],
+        token_lookahead_list,
+        prev.stmt_list[:first_stmt_index] + region_stmt_list + reused_stmt_list,
+        prev.stmt_first_tokens[:first_stmt_index] + region_stmt_first_tokens + prev.stmt_first_tokens[end_stmt_index:],
+        relexed_token_count=len(relexed_tokens),
+        reparsed_stmt_count=len(region_stmt_list)
+    )
+
+
+def iter_tokens_with_lookahead(source_file_path: str, text: str, start_offset: int):
+    """
+    Yields the tokens of `text` from `start_offset` (which must be where the lexer would start a token) up to EOF,
+    each with the furthest offset the lexer read while producing it (or -1 if it read nothing, e.g. for EOF).
+    """
+    text_stream = LookaheadTrackingInputStream(text)
+    lexer = antlr.QySourceFileLexer(text_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(QyErrorListener(source_file_path))
+    text_stream.seek(start_offset)
+    lexer.line = 1 + text.count('\n', 0, start_offset)
+    lexer.column = start_offset - (text.rfind('\n', 0, start_offset) + 1)
+
+    while True:
+        text_stream.max_read_offset = -1
+        token = lexer.nextToken()
+        # tokens outlive their input stream (and are moved by later edits), so their text is copied out:
+        token.text = token.text
+        yield token, text_stream.max_read_offset
+        if token.type == antlr.Token.EOF:
+            return
+
+
+def parse_token_list(source_file_path: str, tokens: t.List[antlr.Token], opt_error_listener: t.Optional[QyErrorListener]):
+    """
+    Parses a list of tokens (that need not end with EOF) as a `sourceFile`, returning its top-level statements and
+    the first token of each.
+    If `opt_error_listener` is `None`, syntax errors raise `antlr.ParseCancellationException` instead.
+    """
+    antlr_parser = antlr.QySourceFileParser(antlr.CommonTokenStream(antlr.ListTokenSource(tokens)))
+    antlr_parser.removeErrorListeners()
+    source_file_parse_tree = parse_with_sll_then_ll(antlr_parser, opt_error_listener, antlr.QySourceFileParser.sourceFile)
+
+    # the line table is only updated once the whole update succeeds:
+    visitor = AstConstructorVisitor(source_file_path, fb.intern_source_file(source_file_path))
+    stmt_list = visitor.visit(source_file_parse_tree)
+    return stmt_list, [stmt_ctx.start for stmt_ctx in source_file_parse_tree.statements]
+
+
+def bisect_tokens(tokens: t.List[antlr.Token], offset: int, lo: int = 0) -> int:
+    # returns the index of the first token in `tokens[lo:]` starting at or after `offset`.
+    hi = len(tokens)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if tokens[mid].start < offset:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def is_same_token(new_token: antlr.Token, old_token: antlr.Token, delta: int) -> bool:
+    return (
+        new_token.type == old_token.type and
+        new_token.start == old_token.start + delta and
+        new_token.text == old_token.text
+    )
+
+
+def stmt_index_of_token(parse: IncrementalParse, token_index: int) -> int:
+    # returns the index of the top-level statement containing a token, or the statement count for EOF.
+    if token_index == len(parse.tokens) - 1:
+        return len(parse.stmt_list)
+    return bisect_tokens(parse.stmt_first_tokens, parse.tokens[token_index].start + 1) - 1
+
+
+def first_token_index_of_stmt(parse: IncrementalParse, stmt_index: int) -> int:
+    # returns the index of the first token of a top-level statement, or of EOF for the statement count.
+    if stmt_index == len(parse.stmt_list):
+        return len(parse.tokens) - 1
+    return bisect_tokens(parse.tokens, parse.stmt_first_tokens[stmt_index].start)
+
+
+def is_first_token_of_stmt(parse: IncrementalParse, token_index: int) -> bool:
+    stmt_index = stmt_index_of_token(parse, token_index)
+    return stmt_index == len(parse.stmt_list) or parse.stmt_first_tokens[stmt_index] is parse.tokens[token_index]
+
+
+def stmt_range_of_tokens(parse: IncrementalParse, begin: int, end: int) -> t.Tuple[int, int]:
+    # returns the range of top-level statements containing the tokens in `[begin, end)`: if this range of tokens is
+    # empty, the range of statements is empty too unless `begin` lies inside a statement.
+    if begin < end:
+        return stmt_index_of_token(parse, begin), stmt_index_of_token(parse, end - 1) + 1
+    stmt_index = stmt_index_of_token(parse, begin)
+    if is_first_token_of_stmt(parse, begin):
+        return stmt_index, stmt_index
+    else:
+        return stmt_index, stmt_index + 1
+
+
+def stmt_range_touched_by_edit(parse: IncrementalParse, edit: TextEdit) -> t.Optional[t.Tuple[int, int]]:
+    # returns the range of top-level statements whose text (up to and including the final ';') overlaps or is
+    # adjacent to the edited text, if any.
+    last_index_before = bisect_tokens(parse.tokens, edit.start_offset) - 1
+    if last_index_before < 0:
+        first_stmt_index = 0
+    else:
+        first_stmt_index = stmt_index_of_token(parse, last_index_before)
+        last_token_before = parse.tokens[last_index_before]
+        if last_token_before.stop + 1 < edit.start_offset and is_first_token_of_stmt(parse, last_index_before + 1):
+            # the edit starts in the gap after a statement.
+            first_stmt_index += 1
+    end_stmt_index = bisect_tokens(parse.stmt_first_tokens, edit.end_offset + 1)
+    if first_stmt_index < end_stmt_index:
+        return first_stmt_index, end_stmt_index
+    else:
+        return None
+
+
+def shift_stmt_locs(stmt_list: t.List[ast1.BaseStatement], delta: int):
+    shifted_loc_ids = set()
+    for node in ast1.iter_subtree_nodes(stmt_list):
+        loc = node.loc
+        if isinstance(loc, fb.SourceFileLoc) and id(loc) not in shifted_loc_ids:
+            shifted_loc_ids.add(id(loc))
+            loc.start_offset += delta
+            loc.end_offset += delta
+
+
+class TokenShifter(object):
+    """
+    Moves tokens after an edit to their new offset, line, and column.
+    """
+
+    def __init__(self, old_text: str, new_text: str, edit: TextEdit) -> None:
+        super().__init__()
+        new_edit_end_offset = edit.start_offset + len(edit.new_text)
+        self.delta = new_edit_end_offset - edit.end_offset
+        self.line_delta = edit.new_text.count('\n') - old_text.count('\n', edit.start_offset, edit.end_offset)
+
+        # tokens on the same line as the end of the edit also move horizontally:
+        self.old_edit_end_line = 1 + old_text.count('\n', 0, edit.end_offset)
+        self.column_delta = (
+            (new_edit_end_offset - (new_text.rfind('\n', 0, new_edit_end_offset) + 1)) -
+            (edit.end_offset - (old_text.rfind('\n', 0, edit.end_offset) + 1))
+        )
+
+    def shift(self, token: antlr.Token):
+        if token.line == self.old_edit_end_line:
+            token.column += self.column_delta
+        token.line += self.line_delta
+        token.start += self.delta
+        token.stop += self.delta
+
+    def shifted_copy(self, token: antlr.Token) -> antlr.Token:
+        token = token.clone()
+        self.shift(token)
+        return token
+
+
+#
+# Helpers shared with the hand-written front-end (see `qy_pratt_parser`):
+#
+
+def loc_of_tokens(
+    source_file_table: fb.SourceFileTable, source_file_id: int, start_tok, opt_stop_tok
+) -> fb.SourceFileLoc:
+    # tokens need only provide ANTLR's `start` (offset) and `text` attributes.
+    start_offset = start_tok.start
+
+    # setting the end offset according to ANTLR:
+    if opt_stop_tok is not None:
+        end_offset = opt_stop_tok.start
+
+        # extending the end by the length of the last token:
+        # FIXME: inefficient check to ensure no 'multiline-string-literal' tokens
+        #        can be replaced by a better check in ANTLR-- e.g. using vocabulary?
+        if '\n' not in opt_stop_tok.text:
+            end_offset += len(opt_stop_tok.text)
+    else:
+        end_offset = start_offset
+
+    return fb.SourceFileLoc(source_file_table, source_file_id, start_offset, end_offset)
+
+
+def split_number_text(raw_literal_number_text):
+    match_obj = re.match(compiled_number_matcher_pattern, raw_literal_number_text)
+    numeric_text = match_obj.group(2).replace('_', '')
+    suffix_text = match_obj.group(3)
+    return numeric_text, suffix_text
+
+
+def make_int_expression(loc: fb.ILoc, raw_text: str, base: int) -> ast1.IntExpression:
+    # splitting the number text:
+    numeric_text, suffix_text = split_number_text(raw_text)
+
+    # parsing the suffix:
+    width_in_bits = 32
+    is_unsigned = False
+    for suffix_character in suffix_text:
+        if suffix_character in ('u', 'U'):
+            is_unsigned = True
+        elif suffix_character in ('l', 'L'):
+            width_in_bits = 64
+        elif suffix_character in ('s', 'S'):
+            width_in_bits = 16
+        elif suffix_character in ('b', 'B'):
+            width_in_bits = 8
+        else:
+            raise NotImplementedError(f"Unknown integer suffix char: {repr(suffix_character)}")
+
+    # parsing the numeric text to find the Python value:
+    value = int(numeric_text, base)
+
+    # returning the new expression:
+    return ast1.IntExpression(loc, raw_text, value, base, is_unsigned, width_in_bits)
+
+def make_float_expression(loc: fb.ILoc, raw_text: str) -> ast1.FloatExpression:
+    # splitting the number text:
+    numeric_text, suffix_text = split_number_text(raw_text)
+
+    # parsing the suffix:
+    width_in_bits = 64
+    for suffix_character in suffix_text:
+        if suffix_character in ('f', 'F'):
+            width_in_bits = 32
+        elif suffix_character in ('d', 'D'):
+            width_in_bits = 64
+        else:
+            raise NotImplementedError(f"Unknown float suffix char: {repr(suffix_character)}")
+
+    # parsing the numeric text to find the Python value:
+    value = float(numeric_text)
+
+    # returning the new expression:
+    return ast1.FloatExpression(loc, raw_text, value, width_in_bits)
+
+
+unary_operator_map = {
+    '*': ast1.UnaryOperator.DeRef,
+    'not': ast1.UnaryOperator.LogicalNot,
+    '-': ast1.UnaryOperator.Minus,
+    '+': ast1.UnaryOperator.Plus,
+    'do': ast1.UnaryOperator.Do
+}
+
+builtin_primitive_type_identity_map = {
+    'Float': ast1.BuiltinPrimitiveTypeIdentity.Float32,
+    'Double': ast1.BuiltinPrimitiveTypeIdentity.Float64,
+    'Long': ast1.BuiltinPrimitiveTypeIdentity.Int64,
+    'Int': ast1.BuiltinPrimitiveTypeIdentity.Int32,
+    'Short': ast1.BuiltinPrimitiveTypeIdentity.Int16,
+    'Char': ast1.BuiltinPrimitiveTypeIdentity.Int8,
+    'ULong': ast1.BuiltinPrimitiveTypeIdentity.UInt64,
+    'UInt': ast1.BuiltinPrimitiveTypeIdentity.UInt32,
+    'UShort': ast1.BuiltinPrimitiveTypeIdentity.UInt16,
+    'Byte': ast1.BuiltinPrimitiveTypeIdentity.UInt8,
+    'Bool': ast1.BuiltinPrimitiveTypeIdentity.Bool,
+    'Void': ast1.BuiltinPrimitiveTypeIdentity.Void
+}
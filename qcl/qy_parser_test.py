@@ -0,0 +1,469 @@
+import contextlib
+import io
+import os
+import os.path
+import random
+import tempfile
+import unittest
+import unittest.mock
+
+from . import antlr
+from . import ast1
+from . import disk_cache
+from . import panic
+from . import qy_parser
+from . import qy_pratt_parser
+from . import session
+
+
+repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_example_source_files():
+    eg_dir_path = os.path.join(repo_dir_path, "eg")
+    return sorted(
+        os.path.join(dir_path, file_name)
+        for dir_path, _, file_names in os.walk(eg_dir_path)
+        for file_name in file_names
+        if file_name.endswith(".qy")
+    )
+
+
+def parse_quietly(abs_file_paths, opts):
+    stderr_buffer = io.StringIO()
+    with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr_buffer):
+        try:
+            return qy_parser.parse_files(abs_file_paths, opts), None
+        except panic.PanicException as exc:
+            return None, (exc.exit_code, stderr_buffer.getvalue())
+
+
+class TestParallelParse(unittest.TestCase):
+    def test_parallel_parse_matches_serial(self):
+        # only files that currently parse: some examples use retired syntax.
+        file_paths = [
+            file_path
+            for file_path in find_example_source_files()
+            if parse_quietly([file_path], qy_parser.ParseOptions())[0] is not None
+        ]
+        self.assertTrue(file_paths)
+
+        serial_result, _ = parse_quietly(file_paths, qy_parser.ParseOptions(job_count=1))
+        parallel_result, _ = parse_quietly(file_paths, qy_parser.ParseOptions(job_count=4))
+        self.assertEqual(ast1.dump_tree(serial_result), ast1.dump_tree(parallel_result))
+
+    def test_parallel_parse_reports_first_error_in_source_order(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            file_contents = [
+                "val ok = 1;\n",
+                "val ok = 1;\nval bad1 = ;\n",
+                "val bad2 = = 2;\n",
+            ]
+            file_paths = []
+            for index, contents in enumerate(file_contents):
+                file_path = os.path.join(dir_path, f"f{index}.qy")
+                with open(file_path, "w") as f:
+                    f.write(contents)
+                file_paths.append(file_path)
+
+            _, serial_error = parse_quietly(file_paths, qy_parser.ParseOptions(job_count=1))
+            _, parallel_error = parse_quietly(file_paths, qy_parser.ParseOptions(job_count=3))
+            self.assertIsNotNone(serial_error)
+            self.assertEqual(serial_error, parallel_error)
+            self.assertIn("f1.qy", parallel_error[1])
+
+
+#
+# Differential tests: the hand-written front-end must agree with ANTLR.
+#
+
+def antlr_tokenize(text):
+    # returns `None` on lexer errors.
+    lexer = antlr.QySourceFileLexer(antlr.InputStream(text))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(qy_parser.QyErrorListener("<text>"))
+    tokens = []
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            while True:
+                tok = lexer.nextToken()
+                tokens.append((tok.type, tok.text, tok.start))
+                if tok.type == antlr.Token.EOF:
+                    return tokens
+        except panic.PanicException:
+            return None
+
+
+def pratt_tokenize(text):
+    # returns `None` on lexer errors.
+    try:
+        return [(tok.type, tok.text, tok.start) for tok in qy_pratt_parser.tokenize(text)]
+    except qy_pratt_parser.ParseError:
+        return None
+
+
+def antlr_parse_text(dir_path, text):
+    # returns the dumped tree, or `None` on syntax errors.
+    file_path = os.path.join(dir_path, "test.qy")
+    with open(file_path, "w") as f:
+        f.write(text)
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return ast1.dump_tree(qy_parser.parse_one_file_without_caching(file_path, qy_parser.ParseMode.SllThenLl))
+        except panic.PanicException:
+            return None
+
+
+def pratt_parse_text(dir_path, text):
+    # returns the dumped tree, or `None` on syntax errors.
+    try:
+        return ast1.dump_tree(qy_pratt_parser.parse_text(os.path.join(dir_path, "test.qy"), text))
+    except qy_pratt_parser.ParseError:
+        return None
+
+
+class TestAstCache(unittest.TestCase):
+    def count_parses(self, file_path, opts):
+        with unittest.mock.patch.object(
+            qy_parser, "parse_one_file_without_caching", wraps=qy_parser.parse_one_file_without_caching
+        ) as parse_mock:
+            result, _ = parse_quietly([file_path], opts)
+        self.assertIsNotNone(result)
+        return parse_mock.call_count
+
+    def test_cached_files_are_parsed_again_in_other_modes(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            file_path = os.path.join(dir_path, "f.qy")
+            with open(file_path, "w") as f:
+                f.write("val ok = 1;\n")
+            ast_cache = disk_cache.DiskCache(dir_path, "ast")
+
+            parse_counts = [
+                self.count_parses(file_path, qy_parser.ParseOptions(mode=mode, opt_ast_cache=ast_cache))
+                for mode in [
+                    qy_parser.ParseMode.SllThenLl,
+                    qy_parser.ParseMode.SllThenLl,
+                    qy_parser.ParseMode.Pratt,
+                    qy_parser.ParseMode.ExactAmbiguityDetection,
+                    qy_parser.ParseMode.ExactAmbiguityDetection,
+                ]
+            ]
+            # ambiguities are only detected while parsing, so that mode never uses the cache.
+            self.assertEqual(parse_counts, [1, 0, 1, 1, 1])
+
+
+class RandomProgramGenerator(object):
+    """
+    Generates random, mostly well-formed Qy programs that use every grammar rule, with random spacing and
+    comments so that locations are checked too.
+    """
+
+    binary_operators = [
+        ':=', 'or', '||', 'and', '&&', '|', '^', '&', '==', '!=', '<', '>', '<=', '>=', '<<', '>>',
+        '+', '-', '*', '/', '%'
+    ]
+    unary_operators = ['*', 'not ', '-', '+', 'do ']
+    builtin_type_names = [
+        'Float', 'Double', 'Char', 'Short', 'Int', 'Long', 'Byte', 'UShort', 'UInt', 'ULong', 'Bool', 'Void'
+    ]
+    primary_expressions = [
+        "a", "b", "x1", "_t", "true", "false", "pred!",
+        "0", "42", "42u", "7L", "0x10", "3us", "1.5", "2.0f", "0.25d",
+        "'s'", '"d\\n"', '"a" \'b\'', '"""m\nl"""',
+    ]
+
+    def __init__(self, seed):
+        super().__init__()
+        self.rng = random.Random(seed)
+
+    def sp(self):
+        return self.rng.choice([" ", " ", " ", "", "\n", "\n  ", "\t", " /* c */ ", " // c\n"])
+
+    def name(self):
+        return self.rng.choice(["a", "b", "x1", "_t", "foo", "Vec"])
+
+    def source_file(self):
+        return "".join(self.statement(3) + ";" + self.sp() for _ in range(self.rng.randint(1, 4)))
+
+    def statement(self, depth):
+        sp = self.sp
+        choice = self.rng.randrange(10)
+        if choice == 0:
+            return f"val {self.name()}{sp()}={sp()}{self.expression(depth)}"
+        elif choice == 1:
+            args = ",".join(f"{self.name()}:{sp()}{self.type_spec(depth - 1)}" for _ in range(self.rng.randint(0, 2)))
+            ret = f"{sp()}->{sp()}{self.type_spec(depth - 1)}" if self.rng.random() < 0.5 else ""
+            pub = "pub " if self.rng.random() < 0.5 else ""
+            return f"{pub}fn {self.name()}({args}){ret}{sp()}={sp()}{self.expression(depth)}"
+        elif choice == 2:
+            return f"type {self.name()} = {self.type_spec(depth)}"
+        elif choice == 3:
+            body = "".join(f"{self.name()} = {self.expression(depth - 1)};{sp()}" for _ in range(self.rng.randint(0, 2)))
+            return f"const:{sp()}{self.type_spec(depth - 1)}{sp()}{{{body}}}"
+        elif choice == 4:
+            return f"return {self.expression(depth)}"
+        elif choice == 5:
+            return f"while {self.expression(depth - 1)} do {self.block(depth - 1)}"
+        elif choice == 6:
+            return f"do{sp()}{self.block(depth - 1)}{sp()}while {self.expression(depth - 1)}"
+        else:
+            return self.expression(depth)
+
+    def block(self, depth):
+        return "{" + "".join(self.statement(depth) + ";" + self.sp() for _ in range(self.rng.randint(0, 2))) + "}"
+
+    def expression(self, depth):
+        sp = self.sp
+        choice = self.rng.randrange(14) if depth > 0 else 13
+        if choice < 3:
+            operator = self.rng.choice(self.binary_operators)
+            return f"{self.expression(depth - 1)}{sp()}{operator}{sp()}{self.expression(depth - 1)}"
+        elif choice == 3:
+            return f"{self.rng.choice(self.unary_operators)}{self.expression(depth - 1)}"
+        elif choice == 4:
+            return f"({sp()}{self.expression(depth - 1)}{sp()})"
+        elif choice == 5:
+            args = f",{sp()}".join(self.expression(depth - 2) for _ in range(self.rng.randint(0, 3)))
+            return f"{self.expression(depth - 1)}({args})"
+        elif choice == 6:
+            key = self.rng.choice([self.name(), f"get({self.expression(depth - 2)})", "ptr(a)"])
+            return f"{self.expression(depth - 1)}.{key}"
+        elif choice == 7:
+            return self.lambda_expression(depth - 1)
+        elif choice == 8:
+            else_text = f"{sp()}else{sp()}{self.lambda_expression(depth - 1)}" if self.rng.random() < 0.5 else ""
+            return f"if{sp()}({self.expression(depth - 1)}){sp()}{self.lambda_expression(depth - 1)}{else_text}"
+        elif choice == 9:
+            args = ",".join(self.expression(depth - 2) for _ in range(self.rng.randint(0, 2)))
+            return f"new {self.type_spec(depth - 1)}({args})"
+        elif choice == 10:
+            return f"{self.rng.choice(['push', 'heap'])}{self.rng.choice([' ', ' mut '])}{self.expression(depth - 1)}"
+        else:
+            return self.rng.choice(self.primary_expressions)
+
+    def lambda_expression(self, depth):
+        sp = self.sp
+        head = ""
+        if self.rng.random() < 0.5:
+            arg_names = ", ".join(self.name() for _ in range(self.rng.randint(0, 2)))
+            head = f"({arg_names}){sp()}{self.rng.choice(['=>', '->'])}{sp()}"
+        prefix = "".join(self.statement(depth) + ";" + sp() for _ in range(self.rng.randint(0, 2)))
+        tail = self.expression(depth) if self.rng.random() < 0.6 else ""
+        return f"{{{sp()}{head}{prefix}{tail}{sp()}}}"
+
+    def type_spec(self, depth):
+        sp = self.sp
+        choice = self.rng.randrange(9) if depth > 0 else 8
+        if choice == 0:
+            return f"{self.rng.choice(['Ptr', 'MutPtr'])}[{self.type_spec(depth - 1)}]"
+        elif choice == 1:
+            return f"{self.rng.choice(['Array', 'MutArray'])}[{self.type_spec(depth - 1)},{sp()}{self.expression(1)}]"
+        elif choice == 2:
+            return f"{self.rng.choice(['ArrayBox', 'MutArrayBox'])}[{self.type_spec(depth - 1)}]"
+        elif choice == 3:
+            arrow = self.rng.choice(['->', '=>'])
+            return f"({self.type_arg_specs(depth - 1)}){sp()}{arrow}{sp()}{self.type_spec(depth - 1)}"
+        elif choice == 4:
+            return f"{{{self.type_arg_specs(depth - 1)}}}"
+        elif choice == 5:
+            return f"({self.type_arg_specs(depth - 1)})"
+        else:
+            return self.rng.choice([self.name()] + self.builtin_type_names)
+
+    def type_arg_specs(self, depth):
+        return ", ".join(
+            (f"{self.name()}: " if self.rng.random() < 0.5 else "") + self.type_spec(depth)
+            for _ in range(self.rng.randint(0, 2))
+        )
+
+
+class TestPrattParser(unittest.TestCase):
+    tricky_lexer_inputs = [
+        "x!=y pred! pred!x mac!",
+        "1u.5f 1..2 0x 0x1Fu 1.5lf 1_000 1sx 0x1b",
+        "''' a ''' ''' '' \"\"\" \"\"\"\"",
+        "'\\\\' '\\'' \"a\\nb\" '\\x41'",
+        "a\r\nb\tc //x\n/*\n*/ q",
+        "/* /* */ */ x /* /* */ y",
+        "/* /*/ x",
+        " /* x",
+        "::= := : =>= -> <<= >>",
+        "Float Floats valx val @",
+    ]
+
+    def test_lexer_matches_antlr(self):
+        example_texts = []
+        for file_path in find_example_source_files():
+            with open(file_path) as f:
+                example_texts.append(f.read())
+        for text in self.tricky_lexer_inputs + example_texts:
+            with self.subTest(text=text[:40]):
+                self.assertEqual(pratt_tokenize(text), antlr_tokenize(text))
+
+    def test_example_files_match_antlr(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            for file_path in find_example_source_files():
+                with self.subTest(file_path=file_path):
+                    with open(file_path) as f:
+                        text = f.read()
+                    self.assertEqual(pratt_parse_text(dir_path, text), antlr_parse_text(dir_path, text))
+
+    def test_random_programs_match_antlr(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            generator = RandomProgramGenerator(seed=0)
+            for _ in range(300):
+                text = generator.source_file()
+                with self.subTest(text=text):
+                    self.assertEqual(pratt_parse_text(dir_path, text), antlr_parse_text(dir_path, text))
+
+    def test_mutated_programs_match_antlr(self):
+        # deleting a random character mostly produces syntax errors, which both parsers must reject.
+        with tempfile.TemporaryDirectory() as dir_path:
+            generator = RandomProgramGenerator(seed=1)
+            for _ in range(300):
+                text = generator.source_file()
+                cut_index = generator.rng.randrange(len(text))
+                text = text[:cut_index] + text[cut_index + 1:]
+                with self.subTest(text=text):
+                    self.assertEqual(pratt_parse_text(dir_path, text), antlr_parse_text(dir_path, text))
+
+
+#
+# Streaming tests: parsing one top-level statement at a time must not change the result.
+#
+
+def streaming_parse_text(dir_path, text, mode=qy_parser.ParseMode.SllThenLl):
+    # returns the dumped tree, or `None` on syntax errors.
+    file_path = os.path.join(dir_path, "test.qy")
+    with open(file_path, "w") as f:
+        f.write(text)
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return ast1.dump_tree(list(qy_parser.iter_one_file_without_caching(file_path, mode)))
+        except panic.PanicException:
+            return None
+
+
+class TestStreamingParse(unittest.TestCase):
+    def test_example_files_match_whole_file_parse(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            for file_path in find_example_source_files():
+                with self.subTest(file_path=file_path):
+                    with open(file_path) as f:
+                        text = f.read()
+                    self.assertEqual(streaming_parse_text(dir_path, text), antlr_parse_text(dir_path, text))
+
+    def test_random_programs_match_whole_file_parse(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            generator = RandomProgramGenerator(seed=2)
+            for index in range(200):
+                text = generator.source_file()
+                if index % 2:
+                    # also checking that both reject the same syntax errors:
+                    cut_index = generator.rng.randrange(len(text))
+                    text = text[:cut_index] + text[cut_index + 1:]
+                with self.subTest(text=text):
+                    self.assertEqual(streaming_parse_text(dir_path, text), antlr_parse_text(dir_path, text))
+
+    def test_statements_are_yielded_before_syntax_errors(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            file_path = os.path.join(dir_path, "test.qy")
+            with open(file_path, "w") as f:
+                f.write("val a = 1;\nval b = 2;\nval c = = 3;\n")
+
+            stmt_names = []
+            with contextlib.redirect_stderr(io.StringIO()) as stderr_buffer:
+                with self.assertRaises(panic.PanicException):
+                    for stmt in qy_parser.iter_one_file_without_caching(file_path):
+                        stmt_names.append(stmt.name)
+            self.assertEqual(stmt_names, ["a", "b"])
+            self.assertIn("test.qy:3:", stderr_buffer.getvalue())
+
+
+#
+# Incremental re-parsing tests: updating a parse after an edit must match parsing the new text from scratch.
+#
+
+def parse_text_incrementally_quietly(file_path, text):
+    # returns `None` on syntax errors.
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return qy_parser.parse_text_incrementally(file_path, text)
+        except panic.PanicException:
+            return None
+
+
+def reparse_after_edit_quietly(prev, edit):
+    # returns `None` on syntax errors.
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return qy_parser.reparse_after_edit(prev, edit)
+        except panic.PanicException:
+            return None
+
+
+def dump_incremental_parse(parse):
+    return (
+        ast1.dump_tree(parse.stmt_list),
+        [(tok.type, tok.text, tok.start, tok.stop, tok.line, tok.column) for tok in parse.tokens],
+        parse.token_lookahead_list,
+        [tok.start for tok in parse.stmt_first_tokens],
+    )
+
+
+class TestIncrementalParse(unittest.TestCase):
+    file_path = os.path.join(tempfile.gettempdir(), "qy_incremental_parse_test.qy")
+
+    def test_random_edits_match_full_parse(self):
+        generator = RandomProgramGenerator(seed=3)
+        edit_texts = [' ', '\n', '/*', '*/', '"""', "'''", '"', ';', '{', '}', 'x', '1', ' /* c */ ', '//c\n']
+        for _ in range(30):
+            parse = parse_text_incrementally_quietly(self.file_path, generator.source_file())
+            if parse is None:
+                continue
+            for _ in range(10):
+                start_offset = generator.rng.randrange(len(parse.text) + 1)
+                end_offset = min(len(parse.text), start_offset + generator.rng.choice([0, 1, 2, 5, 20]))
+                if generator.rng.random() < 0.5:
+                    new_text = generator.rng.choice(edit_texts)
+                else:
+                    new_text = generator.statement(2) + ";"
+                edit = qy_parser.TextEdit(start_offset, end_offset, new_text)
+                with self.subTest(text=parse.text, edit=edit):
+                    expected_parse = parse_text_incrementally_quietly(self.file_path, edit.apply(parse.text))
+                    actual_parse = reparse_after_edit_quietly(parse, edit)
+                    if expected_parse is None:
+                        # rejected edits leave the previous parse usable.
+                        self.assertIsNone(actual_parse)
+                    else:
+                        self.assertIsNotNone(actual_parse)
+                        self.assertEqual(dump_incremental_parse(actual_parse), dump_incremental_parse(expected_parse))
+                        parse = actual_parse
+
+    def test_edit_reparses_only_affected_statements(self):
+        parse = qy_parser.parse_text_incrementally(
+            self.file_path,
+            "val a = 1;\nval b = 2;\nval c = /* three */ 3;\n"
+        )
+        old_stmt_list = parse.stmt_list
+        edit_offset = parse.text.index("2")
+        new_parse = qy_parser.reparse_after_edit(parse, qy_parser.TextEdit(edit_offset, edit_offset + 1, "20 + 2"))
+
+        self.assertEqual(new_parse.reparsed_stmt_count, 1)
+        self.assertIs(new_parse.stmt_list[0], old_stmt_list[0])
+        self.assertIsNot(new_parse.stmt_list[1], old_stmt_list[1])
+        self.assertIs(new_parse.stmt_list[2], old_stmt_list[2])
+        self.assertEqual(str(new_parse.stmt_list[2].initializer.loc), f"{self.file_path}:3:21-22")
+        self.assertEqual(
+            dump_incremental_parse(new_parse),
+            dump_incremental_parse(qy_parser.parse_text_incrementally(self.file_path, new_parse.text))
+        )
+
+    def test_opening_a_comment_relexes_to_its_end(self):
+        parse = qy_parser.parse_text_incrementally(self.file_path, "val a = 1;\nval b = 2; /* note */\nval c = 3;\n")
+        new_parse = qy_parser.reparse_after_edit(parse, qy_parser.TextEdit(0, 0, "/* "))
+        self.assertEqual([stmt.name for stmt in new_parse.stmt_list], ["c"])
+        self.assertEqual(
+            dump_incremental_parse(new_parse),
+            dump_incremental_parse(qy_parser.parse_text_incrementally(self.file_path, new_parse.text))
+        )
@@ -0,0 +1,718 @@
+"""
+`qy_pratt_parser` is a hand-written front-end for Qy source files: a regex-driven lexer feeding a recursive-descent
+parser that handles binary expressions by precedence climbing (a.k.a. Pratt parsing).
+It accepts the language of 'grammars/QySourceFile.g4' and builds the same `ast1` trees (with the same locations)
+as `qy_parser.AstConstructorVisitor`, without building an ANTLR parse tree first: e.g. a literal is one node
+rather than the bottom of a ten-level chain of binary expression contexts.
+It does not produce diagnostics: on any lexical or syntax error, it raises `ParseError`, and the caller is
+expected to re-parse the file with ANTLR, which reports the error properly.
+"""
+
+import re
+import typing as t
+import ast as python_ast
+
+from . import antlr
+from . import ast1
+from . import feedback as fb
+from . import qy_parser
+
+
+class ParseError(Exception):
+    pass
+
+
+#
+# Tokens:
+#
+
+# token types are the same as ANTLR's, so streams produced by both lexers can be compared directly.
+EOF = antlr.Token.EOF
+MACRO_ID = antlr.QySourceFileParser.MACRO_ID
+ID = antlr.QySourceFileParser.ID
+LIT_DEC_INT = antlr.QySourceFileParser.LIT_DEC_INT
+LIT_HEX_INT = antlr.QySourceFileParser.LIT_HEX_INT
+LIT_FLOAT = antlr.QySourceFileParser.LIT_FLOAT
+LIT_SQ_STRING = antlr.QySourceFileParser.LIT_SQ_STRING
+LIT_DQ_STRING = antlr.QySourceFileParser.LIT_DQ_STRING
+LIT_ML_DQ_STRING = antlr.QySourceFileParser.LIT_ML_DQ_STRING
+LIT_ML_SQ_STRING = antlr.QySourceFileParser.LIT_ML_SQ_STRING
+
+string_token_types = (LIT_SQ_STRING, LIT_DQ_STRING, LIT_ML_DQ_STRING, LIT_ML_SQ_STRING)
+
+# maps the text of each literal token in the grammar (keywords and punctuation) to its token type.
+literal_token_type_map = {
+    literal_name[1:-1]: token_type
+    for token_type, literal_name in enumerate(antlr.QySourceFileParser.literalNames)
+    if literal_name != '<INVALID>'
+}
+
+
+class Token(object):
+    # mirrors the attributes of `antlr.Token` used by `qy_parser.loc_of_tokens`
+    __slots__ = ('type', 'text', 'start')
+
+    def __init__(self, token_type: int, text: str, start: int) -> None:
+        super().__init__()
+        self.type = token_type
+        self.text = text
+        self.start = start
+
+    def __repr__(self) -> str:
+        return f"Token({self.type}, {self.text!r}, {self.start})"
+
+
+# NOTE: Python's `re` picks the first alternative that matches rather than the longest one, so alternatives are
+#       ordered such that the first match is always ANTLR's longest match:
+#       - '//' comments before '/', '/*' before '/'
+#       - multi-line strings before single-line ones (which would otherwise match an empty string)
+#       - floats before integers, hex integers before decimal ones
+#       - operators longest-first
+#       Escape sequences follow the grammar's `ANY_ESC` fragment to the letter, including its quirks.
+any_esc_pattern_text = r"\\[\\nrt]|\\x[0-9a-fA-F]{2}\\u[0-9a-fA-F]{4}\\U[0-9a-fA-F]{8}"
+token_pattern = re.compile("|".join([
+    r"(?P<skip>[ \t\r\n]+|//[^\r\n]*)",
+    r"(?P<block_comment>/\*)",
+    rf"(?P<ml_sq_string>'''[\s\S]*?''')",
+    rf'(?P<ml_dq_string>"""[\s\S]*?""")',
+    rf"(?P<sq_string>'(?:{any_esc_pattern_text}|\\'|[^\r\n\\'])*')",
+    rf'(?P<dq_string>"(?:{any_esc_pattern_text}|\\"|[^\r\n\\"])*")',
+    r"(?P<float>[0-9]+[uUlLsS]*\.[0-9]+[uUlLsS]*[fFdD]*)",
+    r"(?P<hex_int>0x[0-9a-fA-F]+[uUlLsS]*)",
+    r"(?P<dec_int>[0-9]+[uUlLsS]*)",
+    r"(?P<word>[a-zA-Z_][a-zA-Z0-9_]*!?)",
+    "(?P<operator>{})".format("|".join(
+        re.escape(text)
+        for text in sorted(literal_token_type_map, key=len, reverse=True)
+        if not text[0].isalpha()
+    )),
+]))
+block_comment_delimiter_pattern = re.compile(r"/\*|\*/")
+
+token_type_from_group_name = {
+    'ml_sq_string': LIT_ML_SQ_STRING,
+    'ml_dq_string': LIT_ML_DQ_STRING,
+    'sq_string': LIT_SQ_STRING,
+    'dq_string': LIT_DQ_STRING,
+    'float': LIT_FLOAT,
+    'hex_int': LIT_HEX_INT,
+    'dec_int': LIT_DEC_INT,
+}
+
+
+def tokenize(text: str) -> t.List[Token]:
+    """
+    Splits `text` into tokens like `antlr.QySourceFileLexer` would, ending with an `EOF` token.
+    Each token records the offset of its first character, like ANTLR's `start`.
+    """
+    tokens = []
+    match_token = token_pattern.match
+    pos = 0
+    text_len = len(text)
+
+    while pos < text_len:
+        match_obj = match_token(text, pos)
+        if match_obj is None:
+            raise ParseError(f"unexpected character at offset {pos}: {text[pos]!r}")
+        group_name = match_obj.lastgroup
+        end_pos = match_obj.end()
+
+        if group_name == 'skip':
+            pass
+        elif group_name == 'block_comment':
+            opt_end_pos = find_block_comment_end(text, pos)
+            if opt_end_pos is not None:
+                end_pos = opt_end_pos
+            else:
+                # an unterminated '/*' is just a '/' operator.
+                end_pos = pos + 1
+                tokens.append(Token(literal_token_type_map['/'], '/', pos))
+        else:
+            token_text = match_obj.group()
+            if group_name == 'word':
+                if token_text[-1] == '!':
+                    token_type = literal_token_type_map.get(token_text, MACRO_ID)
+                else:
+                    token_type = literal_token_type_map.get(token_text, ID)
+            elif group_name == 'operator':
+                token_type = literal_token_type_map[token_text]
+            else:
+                token_type = token_type_from_group_name[group_name]
+            tokens.append(Token(token_type, token_text, pos))
+
+        pos = end_pos
+
+    tokens.append(Token(EOF, '<EOF>', pos))
+    return tokens
+
+
+def find_block_comment_end(text: str, pos: int) -> t.Optional[int]:
+    """
+    Returns the end of the block comment starting at `pos`, or `None` if it is never closed.
+    Like ANTLR's lexer, this picks the longest match for the rule `'/*' (BLOCK_COMMENT|.)*? '*/'`: each nested
+    '/*' may either open a nested comment or be plain text, but a '*/' always closes the innermost open comment.
+    """
+    end_pos_set = find_block_comment_end_set(text, pos, {})
+    if not end_pos_set:
+        return None
+    end_pos = max(end_pos_set)
+
+    # ANTLR's choice among overlapping delimiters (e.g. '/*/*/') is hard to predict: let ANTLR lex these.
+    if len(end_pos_set) > 1 and ('/*/' in text[pos:end_pos] or '*/*' in text[pos:end_pos]):
+        raise ParseError("ambiguous nested block comment")
+
+    return end_pos
+
+
+def find_block_comment_end_set(text: str, pos: int, memo: t.Dict[int, t.Set[int]]) -> t.Set[int]:
+    if pos in memo:
+        return memo[pos]
+
+    end_pos_set = set()
+    visited_pos_set = set()
+    pending_pos_list = [pos + 2]
+    while pending_pos_list:
+        scan_pos = pending_pos_list.pop()
+        if scan_pos in visited_pos_set:
+            continue
+        visited_pos_set.add(scan_pos)
+
+        match_obj = block_comment_delimiter_pattern.search(text, scan_pos)
+        if match_obj is None:
+            continue
+        if match_obj.group() == '*/':
+            end_pos_set.add(match_obj.end())
+        else:
+            pending_pos_list.append(match_obj.start() + 1)
+            pending_pos_list.extend(find_block_comment_end_set(text, match_obj.start(), memo))
+
+    memo[pos] = end_pos_set
+    return end_pos_set
+
+
+#
+# Parser:
+#
+
+# maps each binary operator to its precedence and `ast1` operator: `None` marks `:=`, which is an
+# `UpdateExpression` rather than a `BinaryOpExpression`.
+# All binary operators are left-associative.
+binary_operator_table = {
+    ':=': (1, None),
+    'or': (2, ast1.BinaryOperator.LogicalOr),
+    '||': (2, ast1.BinaryOperator.LogicalOr),
+    'and': (3, ast1.BinaryOperator.LogicalAnd),
+    '&&': (3, ast1.BinaryOperator.LogicalAnd),
+    '|': (4, ast1.BinaryOperator.BitwiseOr),
+    '^': (5, ast1.BinaryOperator.BitwiseXOr),
+    '&': (6, ast1.BinaryOperator.BitwiseAnd),
+    '==': (7, ast1.BinaryOperator.Eq),
+    '!=': (7, ast1.BinaryOperator.NEq),
+    '<': (8, ast1.BinaryOperator.LThan),
+    '>': (8, ast1.BinaryOperator.GThan),
+    '<=': (8, ast1.BinaryOperator.LEq),
+    '>=': (8, ast1.BinaryOperator.GEq),
+    '<<': (9, ast1.BinaryOperator.LSh),
+    '>>': (9, ast1.BinaryOperator.RSh),
+    '+': (10, ast1.BinaryOperator.Add),
+    '-': (10, ast1.BinaryOperator.Sub),
+    '*': (11, ast1.BinaryOperator.Mul),
+    '/': (11, ast1.BinaryOperator.Div),
+    '%': (11, ast1.BinaryOperator.Mod),
+}
+
+copy_allocator_map = {
+    "push": ast1.CopyExpression.Allocator.Push,
+    "heap": ast1.CopyExpression.Allocator.Heap,
+}
+
+
+def parse_one_file(abs_file_path: str) -> t.List[ast1.BaseStatement]:
+    # reading like `antlr.FileStream`: ASCII, without newline translation.
+    with open(abs_file_path, 'rb') as source_file:
+        try:
+            text = source_file.read().decode('ascii')
+        except UnicodeDecodeError as exc:
+            raise ParseError(str(exc))
+    return parse_text(abs_file_path, text)
+
+
+def parse_text(source_file_path: str, text: str) -> t.List[ast1.BaseStatement]:
+    source_file_id = fb.intern_source_file(source_file_path, text)
+    return Parser(source_file_path, source_file_id, tokenize(text)).parse_source_file()
+
+
+class Parser(object):
+    """
+    Parses a token list produced by `tokenize`.
+    Each method below mirrors the grammar rule of the same name, and every node's location spans exactly the
+    tokens consumed by the corresponding ANTLR context, e.g. a parenthesized operand's parentheses are part of
+    the enclosing binary expression's location, but not of the operand's.
+    """
+
+    def __init__(self, source_file_path: str, source_file_id: int, tokens: t.List[Token]) -> None:
+        super().__init__()
+        self.source_file_path = source_file_path
+        self.source_file_table = fb.current_source_file_table()
+        self.source_file_id = source_file_id
+        self.tokens = tokens
+        self.index = 0
+
+    #
+    # helpers:
+    #
+
+    def loc(self, start_index: int):
+        return qy_parser.loc_of_tokens(
+            self.source_file_table, self.source_file_id, self.tokens[start_index], self.tokens[self.index - 1]
+        )
+
+    def peek_text(self, offset: int = 0) -> str:
+        return self.tokens[self.index + offset].text
+
+    def expect(self, text: str) -> Token:
+        tok = self.tokens[self.index]
+        if tok.text != text:
+            raise self.error(f"expected {text!r}")
+        self.index += 1
+        return tok
+
+    def expect_id(self) -> str:
+        tok = self.tokens[self.index]
+        if tok.type != ID:
+            raise self.error("expected an identifier")
+        self.index += 1
+        return tok.text
+
+    def error(self, message: str) -> ParseError:
+        tok = self.tokens[self.index]
+        return ParseError(f"{self.source_file_path}: at offset {tok.start}: {message}, got {tok.text!r}")
+
+    def find_closing_index(self, open_index: int, open_text: str, close_text: str) -> t.Optional[int]:
+        # returns the index of the token closing the bracket at `open_index`, if any.
+        depth = 0
+        for index in range(open_index, len(self.tokens)):
+            text = self.tokens[index].text
+            if text == open_text:
+                depth += 1
+            elif text == close_text:
+                depth -= 1
+                if depth == 0:
+                    return index
+        return None
+
+    def is_followed_by_arrow(self, open_paren_index: int) -> bool:
+        opt_close_index = self.find_closing_index(open_paren_index, '(', ')')
+        return opt_close_index is not None and self.tokens[opt_close_index + 1].text in ('->', '=>')
+
+    #
+    # Files & blocks:
+    #
+
+    def parse_source_file(self) -> t.List[ast1.BaseStatement]:
+        statements = []
+        while self.tokens[self.index].type != EOF:
+            statements.append(self.parse_statement())
+            self.expect(';')
+        return statements
+
+    def parse_block(self) -> t.List[ast1.BaseStatement]:
+        self.expect('{')
+        statements = []
+        while self.peek_text() != '}':
+            statements.append(self.parse_statement())
+            self.expect(';')
+        self.expect('}')
+        return statements
+
+    def parse_const_block(self) -> t.List[ast1.Bind1vStatement]:
+        self.expect('{')
+        bindings = []
+        while self.peek_text() != '}':
+            bindings.append(self.parse_bind1v_term())
+            self.expect(';')
+        self.expect('}')
+        return bindings
+
+    #
+    # statement:
+    #
+
+    def parse_statement(self) -> ast1.BaseStatement:
+        text = self.peek_text()
+        if text == 'val':
+            self.index += 1
+            return self.parse_bind1v_term()
+        elif text in ('pub', 'fn'):
+            return self.parse_bind1f_statement()
+        elif text == 'type':
+            return self.parse_bind1t_statement()
+        elif text == 'const':
+            return self.parse_const_statement()
+        elif text == 'return':
+            start_index = self.index
+            self.index += 1
+            ret_exp = self.parse_expression()
+            return ast1.ReturnStatement(self.loc(start_index), ret_exp)
+        elif text == 'while' or (text == 'do' and self.is_do_while_loop()):
+            return self.parse_loop_statement()
+        else:
+            start_index = self.index
+            discarded_exp = self.parse_expression()
+            return ast1.DiscardStatement(self.loc(start_index), discarded_exp)
+
+    def is_do_while_loop(self) -> bool:
+        # `do {...} while cond` is a loop, but `do {...}` is a discarded unary expression.
+        if self.peek_text(1) != '{':
+            return False
+        opt_close_index = self.find_closing_index(self.index + 1, '{', '}')
+        return opt_close_index is not None and self.tokens[opt_close_index + 1].text == 'while'
+
+    def parse_bind1v_term(self) -> ast1.Bind1vStatement:
+        start_index = self.index
+        name = self.expect_id()
+        self.expect('=')
+        initializer = self.parse_expression()
+        return ast1.Bind1vStatement(self.loc(start_index), name, initializer, False)
+
+    def parse_bind1f_statement(self) -> ast1.Bind1fStatement:
+        start_index = self.index
+        is_pub = self.peek_text() == 'pub'
+        if is_pub:
+            self.index += 1
+        self.expect('fn')
+        name = self.expect_id()
+
+        arg_name_list = []
+        opt_arg_type_list = []
+        self.expect('(')
+        for arg_name, opt_arg_type in self.parse_cs_list(')', self.parse_def_arg_spec):
+            arg_name_list.append(arg_name)
+            opt_arg_type_list.append(opt_arg_type)
+        self.expect(')')
+
+        opt_ret_ts = None
+        if self.peek_text() == '->':
+            self.index += 1
+            opt_ret_ts = self.parse_type_spec()
+
+        self.expect('=')
+        ret_exp = self.parse_expression()
+        return ast1.Bind1fStatement(
+            self.loc(start_index),
+            name,
+            arg_name_list,
+            opt_arg_type_list,
+            ret_exp,
+            opt_ret_ts,
+            is_pub
+        )
+
+    def parse_bind1t_statement(self) -> ast1.Bind1tStatement:
+        start_index = self.index
+        self.expect('type')
+        name = self.expect_id()
+        self.expect('=')
+        initializer = self.parse_type_spec()
+        return ast1.Bind1tStatement(self.loc(start_index), name, initializer)
+
+    def parse_const_statement(self) -> ast1.ConstStatement:
+        start_index = self.index
+        self.expect('const')
+        self.expect(':')
+        type_spec = self.parse_type_spec()
+        bind_statements = self.parse_const_block()
+        for statement in bind_statements:
+            statement.is_constant = True
+        return ast1.ConstStatement(self.loc(start_index), bind_statements, type_spec)
+
+    def parse_loop_statement(self) -> ast1.LoopStatement:
+        start_index = self.index
+        if self.peek_text() == 'while':
+            self.index += 1
+            cond = self.parse_expression()
+            self.expect('do')
+            body = self.parse_block()
+            loop_style = ast1.LoopStyle.WhileDo
+        else:
+            self.expect('do')
+            body = self.parse_block()
+            self.expect('while')
+            cond = self.parse_expression()
+            loop_style = ast1.LoopStyle.DoWhile
+        return ast1.LoopStatement(self.loc(start_index), cond, body, loop_style)
+
+    #
+    # expressions:
+    #
+
+    def parse_expression(self) -> ast1.BaseExpression:
+        return self.parse_binary_expression(1)
+
+    def parse_binary_expression(self, min_precedence: int) -> ast1.BaseExpression:
+        start_index = self.index
+        lt = self.parse_unary_expression()
+        while True:
+            opt_entry = binary_operator_table.get(self.tokens[self.index].text)
+            if opt_entry is None:
+                return lt
+            precedence, opt_operator = opt_entry
+            if precedence < min_precedence:
+                return lt
+            self.index += 1
+            rt = self.parse_binary_expression(precedence + 1)
+            if opt_operator is None:
+                lt = ast1.UpdateExpression(self.loc(start_index), store_address=lt, stored_value=rt)
+            else:
+                lt = ast1.BinaryOpExpression(self.loc(start_index), opt_operator, lt, rt)
+
+    def parse_unary_expression(self) -> ast1.BaseExpression:
+        opt_operator = qy_parser.unary_operator_map.get(self.tokens[self.index].text)
+        if opt_operator is None:
+            return self.parse_postfix_expression()
+        start_index = self.index
+        self.index += 1
+        operand = self.parse_unary_expression()
+        return ast1.UnaryOpExpression(self.loc(start_index), opt_operator, operand)
+
+    def parse_postfix_expression(self) -> ast1.BaseExpression:
+        start_index = self.index
+        exp = self.parse_primary_expression()
+        while True:
+            text = self.peek_text()
+            if text == '(':
+                self.index += 1
+                args = self.parse_cs_list(')', self.parse_expression)
+                self.expect(')')
+                exp = ast1.ProcCallExpression(self.loc(start_index), exp, args)
+            elif text == '.':
+                self.index += 1
+                key_text = self.peek_text()
+                if key_text in ('get', 'ptr'):
+                    self.index += 1
+                    self.expect('(')
+                    index_exp = self.parse_expression()
+                    self.expect(')')
+                    exp = ast1.IndexExpression(self.loc(start_index), exp, index_exp, ret_ref=(key_text == 'ptr'))
+                else:
+                    key = self.expect_id()
+                    exp = ast1.DotIdExpression(self.loc(start_index), exp, key)
+            else:
+                return exp
+
+    def parse_primary_expression(self) -> ast1.BaseExpression:
+        start_index = self.index
+        tok = self.tokens[start_index]
+        token_type = tok.type
+
+        if token_type == ID:
+            self.index += 1
+            return ast1.IdRefExpression(self.loc(start_index), tok.text)
+        elif token_type == LIT_DEC_INT:
+            self.index += 1
+            return qy_parser.make_int_expression(self.loc(start_index), tok.text, 10)
+        elif token_type == LIT_HEX_INT:
+            self.index += 1
+            return qy_parser.make_int_expression(self.loc(start_index), tok.text, 16)
+        elif token_type == LIT_FLOAT:
+            self.index += 1
+            return qy_parser.make_float_expression(self.loc(start_index), tok.text)
+        elif token_type in string_token_types:
+            return self.parse_lit_string()
+
+        text = tok.text
+        if text == '(':
+            self.index += 1
+            exp = self.parse_expression()
+            self.expect(')')
+            return exp
+        elif text == '{':
+            return self.parse_lambda_expression()
+        elif text == 'if':
+            self.index += 1
+            self.expect('(')
+            cond_exp = self.parse_expression()
+            self.expect(')')
+            then_exp = self.parse_lambda_expression()
+            else_exp = None
+            if self.peek_text() == 'else':
+                self.index += 1
+                else_exp = self.parse_lambda_expression()
+            return ast1.IfExpression(self.loc(start_index), cond_exp, then_exp, else_exp)
+        elif text in ('true', 'false'):
+            self.index += 1
+            if text == 'true':
+                return ast1.IntExpression(self.loc(start_index), text="1", value=1, base=10, is_unsigned=True, width_in_bits=1)
+            else:
+                return ast1.IntExpression(self.loc(start_index), text="0", value=0, base=10, is_unsigned=True, width_in_bits=1)
+        elif text == 'pred!':
+            self.index += 1
+            return ast1.IdRefExpression(self.loc(start_index), "pred!")
+        elif text == 'new':
+            self.index += 1
+            made_ts = self.parse_type_spec()
+            self.expect('(')
+            args = self.parse_cs_list(')', self.parse_expression)
+            self.expect(')')
+            return ast1.ConstructExpression(self.loc(start_index), made_ts, args)
+        elif text in copy_allocator_map:
+            self.index += 1
+            is_mut = self.peek_text() == 'mut'
+            if is_mut:
+                self.index += 1
+            copied = self.parse_expression()
+            return ast1.CopyExpression(self.loc(start_index), copied, copy_allocator_map[text], is_mut)
+        else:
+            raise self.error("expected an expression")
+
+    def parse_lit_string(self) -> ast1.StringExpression:
+        start_index = self.index
+        piece_text_list = []
+        piece_value_list = []
+        while self.tokens[self.index].type in string_token_types:
+            piece_text = self.tokens[self.index].text
+            piece_text_list.append(piece_text)
+            piece_value_list.append(python_ast.literal_eval(piece_text))
+            self.index += 1
+        value = ''.join(piece_value_list)
+        return ast1.StringExpression(self.loc(start_index), piece_text_list, value)
+
+    def parse_lambda_expression(self) -> ast1.LambdaExpression:
+        start_index = self.index
+        self.expect('{')
+
+        opt_arg_names = None
+        no_closure = True       # default to closure
+        if self.peek_text() == '(' and self.is_lambda_arg_list():
+            self.index += 1
+            opt_arg_names = self.parse_cs_list(')', self.expect_id)
+            self.expect(')')
+            no_closure = self.tokens[self.index].text == '->'
+            self.index += 1
+
+        # the last statement of the body is the tail expression if it is a discarded expression not followed by ';'
+        prefix = []
+        opt_tail_exp = None
+        while self.peek_text() != '}':
+            statement = self.parse_statement()
+            if self.peek_text() == ';':
+                self.index += 1
+                prefix.append(statement)
+            elif isinstance(statement, ast1.DiscardStatement):
+                opt_tail_exp = statement.discarded_exp
+                break
+            else:
+                raise self.error("expected ';'")
+        self.expect('}')
+
+        return ast1.LambdaExpression(self.loc(start_index), opt_arg_names, prefix, opt_tail_exp, no_closure)
+
+    def is_lambda_arg_list(self) -> bool:
+        # `{ (a, b) => ...` starts with an argument list, but `{ (a) + b ...` starts with an expression.
+        index = self.index + 1
+        if self.tokens[index].type == ID:
+            index += 1
+            while self.tokens[index].text == ',' and self.tokens[index + 1].type == ID:
+                index += 2
+        return self.tokens[index].text == ')' and self.tokens[index + 1].text in ('=>', '->')
+
+    #
+    # TypeSpec:
+    #
+
+    def parse_type_spec(self) -> ast1.BaseTypeSpec:
+        start_index = self.index
+        text = self.peek_text()
+        if text == '(' and self.is_followed_by_arrow(start_index):
+            self.index += 1
+            args = self.parse_cs_list(')', self.parse_type_arg_spec)
+            self.expect(')')
+            has_closure_slot = self.peek_text() == '=>'
+            self.index += 1
+            ret = self.parse_type_spec()
+            return ast1.ProcSignatureTypeSpec(
+                self.loc(start_index),
+                args,
+                ret,
+                has_closure_slot,
+                is_c_variadic=False
+            )
+        elif text in ('Array', 'MutArray'):
+            self.index += 1
+            self.expect('[')
+            elem_ts = self.parse_type_spec()
+            self.expect(',')
+            count_exp = self.parse_expression()
+            self.expect(']')
+            return ast1.ArrayTypeSpec(self.loc(start_index), elem_ts, count_exp, text.startswith('Mut'))
+        elif text in ('ArrayBox', 'MutArrayBox'):
+            self.index += 1
+            self.expect('[')
+            elem_ts = self.parse_type_spec()
+            self.expect(']')
+            return ast1.ArrayBoxTypeSpec(self.loc(start_index), elem_ts, text.startswith('Mut'))
+        else:
+            return self.parse_ptr_type_spec()
+
+    def parse_ptr_type_spec(self) -> ast1.BaseTypeSpec:
+        start_index = self.index
+        text = self.peek_text()
+        if text in ('Ptr', 'MutPtr'):
+            self.index += 1
+            self.expect('[')
+            pointee = self.parse_ptr_type_spec()
+            self.expect(']')
+            return ast1.PtrTypeSpec(self.loc(start_index), pointee, text == 'MutPtr')
+        else:
+            return self.parse_adt_type_spec()
+
+    def parse_adt_type_spec(self) -> ast1.BaseTypeSpec:
+        start_index = self.index
+        tok = self.tokens[start_index]
+        if tok.type == ID:
+            self.index += 1
+            return ast1.IdRefTypeSpec(self.loc(start_index), tok.text)
+        elif tok.text in qy_parser.builtin_primitive_type_identity_map:
+            self.index += 1
+            return ast1.BuiltinPrimitiveTypeSpec(self.loc(start_index), qy_parser.builtin_primitive_type_identity_map[tok.text])
+        elif tok.text == '{':
+            self.index += 1
+            args = self.parse_cs_list('}', self.parse_type_arg_spec)
+            self.expect('}')
+            return ast1.AdtTypeSpec(self.loc(start_index), ast1.LinearTypeOp.Sum, args)
+        elif tok.text == '(':
+            self.index += 1
+            args = self.parse_cs_list(')', self.parse_type_arg_spec)
+            self.expect(')')
+            return ast1.AdtTypeSpec(self.loc(start_index), ast1.LinearTypeOp.Product, args)
+        else:
+            raise self.error("expected a type specifier")
+
+    #
+    # Misc:
+    #
+
+    def parse_def_arg_spec(self) -> t.Tuple[str, ast1.BaseTypeSpec]:
+        name = self.expect_id()
+        self.expect(':')
+        ts = self.parse_type_spec()
+        return name, ts
+
+    def parse_type_arg_spec(self) -> t.Tuple[t.Optional[str], ast1.BaseTypeSpec]:
+        opt_name = None
+        if self.tokens[self.index].type == ID and self.peek_text(1) == ':':
+            opt_name = self.tokens[self.index].text
+            self.index += 2
+        ts = self.parse_type_spec()
+        return opt_name, ts
+
+    def parse_cs_list(self, close_text: str, parse_item: t.Callable[[], t.Any]) -> t.List[t.Any]:
+        # parses a possibly empty, comma-separated list ending before `close_text`
+        items = []
+        if self.peek_text() == close_text:
+            return items
+        items.append(parse_item())
+        while self.peek_text() == ',':
+            self.index += 1
+            items.append(parse_item())
+        return items
@@ -0,0 +1,109 @@
+"""
+`session` holds the mutable state shared by all phases of one compilation, which would otherwise live in module
+globals and grow with every compilation run in the same process.
+
+Compiler code reaches the state of the compilation it belongs to through `current()`.
+A `CompilationSession` is made current with `with session: ...`, for the running thread or task only (cf
+`contextvars`), so that each compilation run by a long-lived process (e.g. a build server or a test runner) has its
+own state. Work handed to another thread must run in a copy of the submitting thread's context (cf
+`ast2.QypSet.load_qyp_graph`).
+Leaving the `with` block closes the session, dropping everything it holds.
+Outside of any session (e.g. in tests), `current()` returns a process-wide default session, which is never closed.
+
+NOTE: read-only registries filled on import (e.g. `platform.Platform.name_map`, atomic types) are not compilation
+state, so they remain module globals.
+"""
+
+import contextvars
+import itertools
+import threading
+import typing as t
+import weakref
+from collections import defaultdict
+
+from . import feedback
+
+if t.TYPE_CHECKING:
+    from . import ast1
+    from . import types
+    from . import typer
+
+
+class CompilationSession(object):
+    def __init__(self) -> None:
+        super().__init__()
+
+        # every typed AST node created (or restored from a cache) during this compilation.
+        self.typed_ast_node_list: t.List["ast1.WbTypeMixin"] = []
+
+        # an index of free variables to the typed AST nodes and to the definitions mentioning them:
+        # cf `ast1.WbTypeMixin.apply_sub_everywhere` and `typer.Context.apply_sub_everywhere`
+        self.ast_node_sub_index: t.DefaultDict["types.VarType", t.List["ast1.WbTypeMixin"]] = defaultdict(list)
+        self.definition_sub_index: t.DefaultDict["types.VarType", t.List["typer.BaseDefinition"]] = defaultdict(list)
+
+        # the source of `types.BaseType.id`: unique within this compilation.
+        self.type_id_counter = itertools.count()
+
+        # types that are unique by contents: cf `types.BaseStructuralType.get` and `types.UniqueValueType.get`
+        self.structural_type_intern_table: "weakref.WeakValueDictionary[tuple, types.BaseStructuralType]" = \
+            weakref.WeakValueDictionary()
+        self.unique_value_type_cache: t.Dict[tuple, "types.UniqueValueType"] = {}
+
+        # the parent of every top-level context: created on first use, cf `typer.Context.builtin_root`
+        self.opt_builtin_root_ctx: t.Optional["typer.Context"] = None
+
+        # parsed Qy source files by absolute path: cf `qy_parser.parse_one_file`
+        self.file_parse_cache: t.Dict[str, t.List["ast1.BaseStatement"]] = {}
+
+        # translated C struct and union types by name: cf `c_parser.translate_clang_type_to_ts`
+        self.declaration_cache_map: t.Dict[str, "ast1.BaseTypeSpec"] = {}
+
+        # the values of compile-time constant definitions: cf `interp.ConstantEvaluator`
+        self.constant_value_map: t.Dict["typer.BaseDefinition", object] = {}
+
+        # the paths and line tables of source files, by the IDs used by `feedback.SourceFileLoc`: cf
+        # `feedback.intern_source_file`
+        self.source_file_table: t.Optional[feedback.SourceFileTable] = feedback.SourceFileTable()
+
+        self.is_closed = False
+        self.context_token_stack: t.List[contextvars.Token] = []
+
+    def __enter__(self) -> "CompilationSession":
+        assert not self.is_closed
+        self.context_token_stack.append(current_session_var.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        current_session_var.reset(self.context_token_stack.pop())
+        if not self.context_token_stack:
+            self.close()
+
+    def next_type_id(self) -> int:
+        return next(self.type_id_counter)
+
+    def close(self) -> None:
+        """
+        Drops all state held by this session, so it can be freed even if the session itself is still referenced.
+        """
+        self.typed_ast_node_list.clear()
+        self.ast_node_sub_index.clear()
+        self.definition_sub_index.clear()
+        self.structural_type_intern_table.clear()
+        self.unique_value_type_cache.clear()
+        self.opt_builtin_root_ctx = None
+        self.file_parse_cache.clear()
+        self.declaration_cache_map.clear()
+        self.constant_value_map.clear()
+        # NOTE: the table is dropped rather than cleared, since the locations referring to it may outlive this session.
+        self.source_file_table = None
+        self.is_closed = True
+
+
+default_session = CompilationSession()
+current_session_var: contextvars.ContextVar[CompilationSession] = contextvars.ContextVar(
+    "current_session", default=default_session
+)
+
+
+def current() -> CompilationSession:
+    return current_session_var.get()
@@ -0,0 +1,48 @@
+import unittest
+
+from . import feedback
+from . import session
+from . import typer
+from . import typer_test
+from . import types
+
+
+class TestCompilationSession(typer_test.PackageSetTestMixin, unittest.TestCase):
+    def test_sessions_do_not_share_state(self):
+        i32 = types.IntType.get(32, True)
+        with session.CompilationSession() as first_session:
+            first_ptr_type = types.PointerType.new(i32, False)
+            first_root_ctx = typer.Context.builtin_root()
+            first_file_id = feedback.intern_source_file("/first.qy", "val x = 1;\n")
+            self.assertIs(types.PointerType.new(i32, False), first_ptr_type)
+            with session.CompilationSession():
+                self.assertIsNot(types.PointerType.new(i32, False), first_ptr_type)
+                self.assertIsNot(typer.Context.builtin_root(), first_root_ctx)
+                self.assertEqual(feedback.intern_source_file("/second.qy", ""), first_file_id)
+            self.assertIs(session.current(), first_session)
+            self.assertIs(types.PointerType.new(i32, False), first_ptr_type)
+            first_loc = feedback.SourceFileLoc(feedback.current_source_file_table(), first_file_id, 4, 5)
+            self.assertEqual(str(first_loc), "/first.qy:1:5-6")
+
+        # leaving a session closes it, dropping everything it holds.
+        self.assertTrue(first_session.is_closed)
+        self.assertIsNone(first_session.opt_builtin_root_ctx)
+        self.assertEqual(len(first_session.structural_type_intern_table), 0)
+        self.assertIsNone(first_session.source_file_table)
+        self.assertIs(session.current(), session.default_session)
+
+        # locations can still be read once their session is closed, whatever session is current.
+        with session.CompilationSession():
+            feedback.intern_source_file("/other.qy", "")
+            self.assertEqual(str(first_loc), "/first.qy:1:5-6")
+        self.assertIs(session.current(), session.default_session)
+
+    def test_compilations_in_one_process_are_independent(self):
+        root_qyp_path = self.write_package("repeated", typer_test.well_typed_source_text)
+        default_node_count = len(session.default_session.typed_ast_node_list)
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine):
+                first_result = self.type_with_engine(root_qyp_path, engine)
+                self.assertIsNone(first_result[1])
+                self.assertEqual(self.type_with_engine(root_qyp_path, engine), first_result)
+        self.assertEqual(len(session.default_session.typed_ast_node_list), default_node_count)
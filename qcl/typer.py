@@ -1,30 +1,69 @@
 import abc
+import contextlib
+import io
 import typing as t
 import sys
 import enum
 import textwrap
+from collections import defaultdict
+from collections import deque
 
 from . import panic
-from . import pair
 from . import feedback as fb
 from . import types
 from . import ast1
 from . import ast2
+from . import disk_cache
 from . import interp
+from . import session
 
 
-def type_one_qyp_set(qyp_set: ast2.QypSet):
-    dto_list = DTOList()
-    new_ctx = Context(ContextKind.TopLevelOfQypSet, Context.builtin_root)
-    sub = Substitution.empty
+class TyperEngine(enum.Enum):
+    # solves by composing `Substitution`s, applied to every context, DTO, and AST node after each top-level statement.
+    Substitution = enum.auto()
+
+    # solves by binding variables in place in a union-find store, resolved once all constraints are solved.
+    # cf `uf_typer`
+    UnionFind = enum.auto()
+
+
+def type_one_qyp_set(
+    qyp_set: ast2.QypSet,
+    engine: TyperEngine = TyperEngine.Substitution,
+    opt_typed_scc_cache: t.Optional[disk_cache.DiskCache] = None
+):
+    """
+    Types every source file in a package set.
+    If `opt_typed_scc_cache` is set, definitions that are unchanged since a previous run are restored from this cache
+    rather than modelled again: cf `typer_cache`.
+    Whatever order statements and DTOs are typed in, the error reported is the first one in source order: cf
+    `ErrorLog`.
+    """
+    if engine == TyperEngine.UnionFind:
+        # NOTE: imported here since `uf_typer` is built on this module.
+        from . import uf_typer
+        uf_typer.type_one_qyp_set(qyp_set, opt_typed_scc_cache)
+        return
+
+    sink = SubstitutionSink()
+    new_ctx = Context(ContextKind.TopLevelOfQypSet, Context.builtin_root())
 
     for _, _, source_file in qyp_set.iter_src_paths():
         seed_one_source_file(source_file, new_ctx)
 
-    for _, _, source_file in qyp_set.iter_src_paths():
-        sub = model_one_source_file(source_file, dto_list, sub)
+    opt_scc_cache = None
+    if opt_typed_scc_cache is not None:
+        # NOTE: imported here since `typer_cache` is built on this module.
+        from . import typer_cache
+        # definitions are rewritten after each top-level statement, so their types are always up to date.
+        opt_scc_cache = typer_cache.TypedSccCache(opt_typed_scc_cache, qyp_set, new_ctx, engine, lambda t: t)
+
+    error_log = ErrorLog(qyp_set)
+    model_top_level_sccs(qyp_set, sink, error_log, opt_scc_cache)
+    sink.solve(error_log)
 
-    dto_list.solve()
+    if opt_scc_cache is not None:
+        opt_scc_cache.save()
 
     qyp_set.wb_root_ctx = new_ctx
 
@@ -39,7 +78,8 @@ def seed_one_source_file(sf: ast2.BaseSourceFile, new_ctx):
     `x_typer_ctx`
     """
 
-    for top_level_stmt in sf.stmt_list:
+    # statements may still be streaming in from the parser: see `ast2.BaseSourceFile.iter_stmts`.
+    for top_level_stmt in sf.iter_stmts():
         seed_one_top_level_stmt(new_ctx, top_level_stmt)
 
     sf.wb_typer_ctx = new_ctx
@@ -189,49 +229,330 @@ def seed_one_top_level_stmt(bind_in_ctx: "Context", stmt: ast1.BaseStatement):
 
 
 #
-# source file typing: part 2: modelling
+# source file typing: part 2: ordering
 #
 
-def model_one_source_file(
-    sf: ast2.BaseSourceFile, dto_list: "DTOList",
-    sub: t.Optional["Substitution"]
-) -> "Substitution":
+def order_top_level_stmts(qyp_set: ast2.QypSet) -> t.List[t.Tuple[ast2.BaseSourceFile, ast1.BaseStatement]]:
+    """
+    Returns every top-level statement in the package set (with its source file), ordered so that each statement is
+    modelled after the statements defining the symbols it refers to: cf `order_top_level_sccs`.
+    """
+    return [stmt_pair for scc in order_top_level_sccs(qyp_set) for stmt_pair in scc]
+
+
+def order_top_level_sccs(qyp_set: ast2.QypSet) -> t.List[t.List[t.Tuple[ast2.BaseSourceFile, ast1.BaseStatement]]]:
+    """
+    Returns every top-level statement in the package set (with its source file), grouped into the strongly connected
+    components (SCCs) of the reference graph, each SCC being a group of mutually recursive definitions.
+    SCCs are in topological order, so each statement is modelled after the statements defining the symbols it refers
+    to; otherwise (e.g. within an SCC), statements keep their source order.
+    This way, uses of a definition are mostly modelled once its type is known, rather than deferred as DTOs.
+    NOTE: references are found by name, ignoring scopes: a local shadowing a top-level symbol only adds an edge,
+    which can merge SCCs, but never breaks the order.
+    """
+    stmt_list = [
+        (source_file, stmt)
+        for _, _, source_file in qyp_set.iter_src_paths()
+        for stmt in source_file.stmt_list
+    ]
+
+    # all top-level symbols share the package set's context, so each name is defined by at most one statement.
+    stmt_index_map = {}
+    for stmt_index, (_, stmt) in enumerate(stmt_list):
+        bind_stmt_list = stmt.body if isinstance(stmt, ast1.ConstStatement) else [stmt]
+        for bind_stmt in bind_stmt_list:
+            if isinstance(bind_stmt, (ast1.Bind1vStatement, ast1.Bind1fStatement, ast1.Bind1tStatement)):
+                stmt_index_map[bind_stmt.name] = stmt_index
+
+    successor_lists = []
+    for stmt_index, (_, stmt) in enumerate(stmt_list):
+        successor_lists.append(sorted({
+            stmt_index_map[node.name]
+            for node in ast1.iter_subtree_nodes(stmt)
+            if isinstance(node, (ast1.IdRefExpression, ast1.IdRefTypeSpec)) and node.name in stmt_index_map
+        } - {stmt_index}))
+
+    return [
+        [stmt_list[stmt_index] for stmt_index in sorted(scc)]
+        for scc in find_sccs(successor_lists)
+    ]
+
+
+def find_sccs(successor_lists: t.List[t.List[int]]) -> t.List[t.List[int]]:
+    """
+    Returns the strongly connected components of a graph, given as the list of successors of each node, such that
+    each component comes after every component it refers to (i.e. in reverse topological order).
+    This is Tarjan's algorithm, with an explicit stack rather than recursion, so long chains of references cannot
+    exhaust Python's stack.
+    cf https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
+    """
+    node_count = len(successor_lists)
+    index_list: t.List[t.Optional[int]] = [None] * node_count
+    low_link_list = [0] * node_count
+    on_stack_list = [False] * node_count
+    scc_stack = []
+    scc_list = []
+    next_index = 0
+
+    for root in range(node_count):
+        if index_list[root] is not None:
+            continue
+
+        # each frame is a node, and the position of the next successor to visit:
+        call_stack = [(root, 0)]
+        while call_stack:
+            node, successor_pos = call_stack.pop()
+            if successor_pos == 0:
+                index_list[node] = low_link_list[node] = next_index
+                next_index += 1
+                scc_stack.append(node)
+                on_stack_list[node] = True
+
+            successor_list = successor_lists[node]
+            while successor_pos < len(successor_list):
+                successor = successor_list[successor_pos]
+                successor_pos += 1
+                if index_list[successor] is None:
+                    call_stack.append((node, successor_pos))
+                    call_stack.append((successor, 0))
+                    break
+                elif on_stack_list[successor]:
+                    low_link_list[node] = min(low_link_list[node], index_list[successor])
+            else:
+                # all successors visited: 'node' is the root of an SCC iff it cannot reach any node above it.
+                if low_link_list[node] == index_list[node]:
+                    scc = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack_list[member] = False
+                        scc.append(member)
+                        if member == node:
+                            break
+                    scc_list.append(scc)
+                if call_stack:
+                    parent, _ = call_stack[-1]
+                    low_link_list[parent] = min(low_link_list[parent], low_link_list[node])
+
+    return scc_list
+
+
+class ErrorLog(object):
+    """
+    Holds back the panics raised while typing separate parts of a package set (e.g. top-level statements, or DTOs),
+    along with what they printed, so that only the first one in source order is reported: statements are modelled in
+    SCC order (cf `order_top_level_sccs`), and DTOs are solved in the order their arguments are solved.
+    """
+
+    def __init__(self, qyp_set: ast2.QypSet) -> None:
+        super().__init__()
+        self.source_file_index_map = {
+            source_file.file_path: source_file_index
+            for source_file_index, (_, _, source_file) in enumerate(qyp_set.iter_src_paths())
+        }
+        self.opt_first_error: t.Optional[t.Tuple[t.Tuple[int, int], panic.PanicException, str]] = None
+
+    @property
+    def has_errors(self) -> bool:
+        return self.opt_first_error is not None
+
+    def try_run(self, loc: fb.ILoc, fn: t.Callable[..., t.Any], *args) -> bool:
+        """
+        Calls `fn(*args)`, returning whether it finished: if it panics instead, the panic is logged as an error at
+        `loc`.
+        """
+        stderr_buffer = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(stderr_buffer):
+                fn(*args)
+        except panic.PanicException as exc:
+            source_pos = self.source_pos(loc)
+            if self.opt_first_error is None or source_pos < self.opt_first_error[0]:
+                self.opt_first_error = (source_pos, exc, stderr_buffer.getvalue())
+            return False
+        sys.stderr.write(stderr_buffer.getvalue())
+        return True
+
+    def precedes_first_error(self, loc: fb.ILoc) -> bool:
+        return self.opt_first_error is None or self.source_pos(loc) < self.opt_first_error[0]
+
+    def report(self):
+        """
+        Reports the first error logged so far in source order, if any, by raising its panic again.
+        """
+        if self.opt_first_error is not None:
+            _, exc, stderr_text = self.opt_first_error
+            sys.stderr.write(stderr_text)
+            raise exc
+
+    def source_pos(self, loc: fb.ILoc) -> t.Tuple[int, int]:
+        # locations outside the package set's source files (e.g. in C headers) come last.
+        if isinstance(loc, fb.SourceFileLoc):
+            opt_source_file_index = self.source_file_index_map.get(loc.file_path, None)
+            if opt_source_file_index is not None:
+                return opt_source_file_index, loc.start_offset
+        return len(self.source_file_index_map), 0
+
+
+#
+# source file typing: part 3: modelling
+#
+
+# Modelling is shared by every engine (cf `TyperEngine`): it walks each statement, and hands the constraints it finds
+# to a sink (cf `BaseConstraintSink`), which solves them in its engine's own way.
+
+class BaseConstraintSink(object, metaclass=abc.ABCMeta):
+    """
+    Receives the constraints found by modelling: pairs of types that must be identical, and DTOs.
+    Types returned by modelling may mention variables that the sink has bound since: they are only up to date once
+    rewritten by the sink (cf `rewrite_type`).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # the top-level context of the statement being modelled, with its child count and the pending DTO count when
+        # this statement began: cf `begin_top_level_stmt`.
+        self.opt_stmt_start: t.Optional[t.Tuple["Context", int, int]] = None
+
+    @abc.abstractmethod
+    def unify(self, t1: types.BaseType, t2: types.BaseType, opt_loc: t.Optional[fb.ILoc] = None):
+        pass
+
+    @abc.abstractmethod
+    def add_dto(self, dto: "BaseDTO"):
+        pass
+
+    @abc.abstractmethod
+    def rewrite_type(self, t: types.BaseType) -> types.BaseType:
+        pass
+
+    def begin_top_level_stmt(self, top_level_ctx: "Context"):
+        """
+        Notes what `drop_top_level_stmt` returns to, before a top-level statement is modelled in `top_level_ctx`.
+        """
+        self.opt_stmt_start = (top_level_ctx, len(top_level_ctx.children), self.pending_dto_count())
+
+    def end_top_level_stmt(self):
+        pass
+
+    def drop_top_level_stmt(self):
+        """
+        Forgets the bindings and DTOs received, and the contexts created, since the last top-level statement began,
+        once modelling this statement failed: so they cannot cause errors in the statements modelled next.
+        """
+        assert self.opt_stmt_start is not None
+        top_level_ctx, old_child_count, old_pending_dto_count = self.opt_stmt_start
+        del top_level_ctx.children[old_child_count:]
+        self.roll_back(old_pending_dto_count)
+
+    @abc.abstractmethod
+    def roll_back(self, old_pending_dto_count: int):
+        """
+        Forgets the bindings made since the last top-level statement ended, and the pending DTOs received after the
+        first `old_pending_dto_count` ones.
+        """
+
+    @abc.abstractmethod
+    def pending_dto_count(self) -> int:
+        """
+        Returns the number of DTOs received that could not be solved yet.
+        """
+
+
+class SubstitutionSink(BaseConstraintSink):
+    """
+    Solves constraints by composing `Substitution`s: the substitution built while modelling a top-level statement is
+    applied to every context, DTO, and AST node once this statement is modelled.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.dto_list = DTOList()
+
+        # the bindings made since the last call to `apply_sub_everywhere`.
+        self.sub = Substitution.empty
+
+    def unify(self, t1: types.BaseType, t2: types.BaseType, opt_loc: t.Optional[fb.ILoc] = None):
+        u_sub = unify(self.sub.rewrite_type(t1), self.sub.rewrite_type(t2), opt_loc=opt_loc)
+        self.sub = u_sub.compose(self.sub, opt_loc)
+
+    def add_dto(self, dto: "BaseDTO"):
+        self.dto_list.add_dto(dto, self)
+
+    def rewrite_type(self, t: types.BaseType) -> types.BaseType:
+        return self.sub.rewrite_type(t)
+
+    def end_top_level_stmt(self):
+        self.apply_sub_everywhere()
+
+    def roll_back(self, old_pending_dto_count: int):
+        # the substitution is only applied once a statement ends.
+        self.sub = Substitution.empty
+        self.dto_list.truncate(old_pending_dto_count)
+
+    def pending_dto_count(self) -> int:
+        return len(self.dto_list.pending_dto_map)
+
+    def apply_sub_everywhere(self):
+        sub = self.sub
+        self.sub = Substitution.empty
+        Context.apply_sub_everywhere(sub)
+        self.dto_list.update(sub)
+        ast1.WbTypeMixin.apply_sub_everywhere(sub)
+
+    def solve(self, error_log: "ErrorLog"):
+        self.dto_list.solve(self, error_log)
+
+
+def model_top_level_sccs(
+    qyp_set: ast2.QypSet,
+    sink: BaseConstraintSink,
+    error_log: "ErrorLog",
+    opt_scc_cache: t.Optional["typer_cache.TypedSccCache"] = None
+):
+    """
+    Models every top-level statement in the package set, one SCC at a time: cf `order_top_level_sccs`.
+    Once a statement fails, its constraints are dropped and the rest of its SCC is skipped, but the SCCs with
+    statements earlier in source order are still modelled, so that `error_log` reports the first error in source
+    order.
+    """
+    for scc in order_top_level_sccs(qyp_set):
+        # SCCs keep their statements in source order:
+        if error_log.has_errors and not error_log.precedes_first_error(scc[0][1].loc):
+            continue
+
+        if opt_scc_cache is not None and opt_scc_cache.try_restore(scc):
+            continue
+        for source_file, stmt in scc:
+            if not error_log.try_run(stmt.loc, model_one_top_level_stmt, source_file, stmt, sink):
+                sink.drop_top_level_stmt()
+                break
+        else:
+            if opt_scc_cache is not None:
+                opt_scc_cache.note_modelled(scc)
+
+    error_log.report()
+
+
+def model_one_top_level_stmt(sf: ast2.BaseSourceFile, stmt: ast1.BaseStatement, sink: BaseConstraintSink):
     sf_top_level_context = sf.wb_typer_ctx
     assert isinstance(sf_top_level_context, Context)
-    return model_one_block(sf_top_level_context, sf.stmt_list, dto_list, init_sub=sub, is_top_level=True)
+    sink.begin_top_level_stmt(sf_top_level_context)
+    model_one_statement(sf_top_level_context, stmt, sink)
+    sink.end_top_level_stmt()
 
 
-def model_one_block(
-    ctx: "Context",
-    stmt_list: t.List[ast1.BaseStatement],
-    dto_list: "DTOList",
-    init_sub: t.Optional["Substitution"] = None,
-    is_top_level=False
-) -> t.Tuple["Substitution", types.BaseType]:
-    sub, _ = model_one_block_with_type(ctx, stmt_list, dto_list, init_sub, is_top_level)
-    return sub
+def model_one_block(ctx: "Context", stmt_list: t.List[ast1.BaseStatement], sink: BaseConstraintSink):
+    model_one_block_with_type(ctx, stmt_list, sink)
 
 
 def model_one_block_with_type(
     ctx: "Context",
     stmt_list: t.List[ast1.BaseStatement],
-    dto_list: "DTOList",
-    init_sub: t.Optional["Substitution"] = None,
-    is_top_level=False
-) -> t.Tuple["Substitution", types.BaseType]:
-    if init_sub is None:
-        init_sub = Substitution.empty
-
-    assert isinstance(init_sub, Substitution)
-    sub = init_sub
-
+    sink: BaseConstraintSink
+) -> types.BaseType:
     for stmt in stmt_list:
-        stmt_sub = model_one_statement(ctx, stmt, dto_list)
-        sub = stmt_sub.compose(sub, stmt.loc)
-        if is_top_level:
-            Context.apply_sub_everywhere(sub)
-            dto_list.update(sub)
-            ast1.WbTypeMixin.apply_sub_everywhere(sub)
+        model_one_statement(ctx, stmt, sink)
 
     shallow_return_type = types.VoidType.singleton
     if stmt_list:
@@ -239,7 +560,7 @@ def model_one_block_with_type(
         if isinstance(last_stmt, ast1.ReturnStatement) and last_stmt.is_shallow:
             shallow_return_type = last_stmt.returned_exp.wb_type
 
-    return sub, shallow_return_type
+    return shallow_return_type
 
 
 def model_one_lambda_body(
@@ -247,12 +568,11 @@ def model_one_lambda_body(
     arg_name_type_list: t.List[t.Tuple[str, types.BaseType]],
     body_prefix_stmt_list: t.List["ast1.BaseStatement"],
     opt_body_tail_exp: t.Optional["ast1.BaseExpression"],
-    dto_list: "DTOList"
-) -> t.Tuple["Substitution", types.BaseType]:
+    sink: BaseConstraintSink
+) -> types.BaseType:
     # setting the function context, 'local_return_type' attribute, init other stuff
     fn_ctx = Context(ContextKind.FunctionBlock, ctx)
     fn_ctx.local_return_type = types.VarType(f"fn_return")
-    sub = Substitution.empty
 
     # defining each formal argument for this function:
     for arg_index, (arg_name, arg_type) in enumerate(arg_name_type_list):
@@ -263,29 +583,28 @@ def model_one_lambda_body(
     # solving any prefix statements:
     #   - any 'return' statements are associated with the nearest 'return_type' attribute, set above.
     if body_prefix_stmt_list:
-        sub = model_one_block(ctx, body_prefix_stmt_list, dto_list).compose(sub, loc)
+        model_one_block(ctx, body_prefix_stmt_list, sink)
 
     # solving the tail expression:
     tail_return_type = types.VoidType.singleton
     tail_loc = loc
     if opt_body_tail_exp is not None:
-        tail_sub, tail_return_type = model_one_exp(fn_ctx, opt_body_tail_exp, dto_list)
-        sub = tail_sub.compose(sub, opt_body_tail_exp.loc)
+        tail_return_type = model_one_exp(fn_ctx, opt_body_tail_exp, sink)
         tail_loc = opt_body_tail_exp.loc
-    sub = unify(fn_ctx.local_return_type, tail_return_type, tail_loc).compose(sub, loc)
+    sink.unify(fn_ctx.local_return_type, tail_return_type, tail_loc)
 
-    # returns sub + _return type_, not type of lambda
-    return sub, fn_ctx.local_return_type
+    # returns _return type_, not type of lambda
+    return fn_ctx.local_return_type
 
 
-def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "DTOList") -> "Substitution":
+def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", sink: BaseConstraintSink):
     stmt.wb_ctx = ctx
 
     if isinstance(stmt, ast1.Bind1vStatement):
         if isinstance(stmt, ast1.Extern1vStatement):
-            exp_sub, exp_type = model_one_type_spec(ctx, stmt.var_type_spec, dto_list)
+            exp_type = model_one_type_spec(ctx, stmt.var_type_spec, sink)
         else:
-            exp_sub, exp_type = model_one_exp(ctx, stmt.initializer, dto_list)
+            exp_type = model_one_exp(ctx, stmt.initializer, sink)
 
         if ctx.kind in (ContextKind.TopLevelOfQypSet, ContextKind.ConstImmediatelyInvokedFunctionBlock):
             # definition is already seeded-- just retrieve and unify.
@@ -293,13 +612,8 @@ def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "D
             # - the 'ctx_with_loc' context is a child of the global context containing the defined symbol
             # - the 'ctx_with_loc' context is used to extend the global context with 'pred!' or other special keywords.
             definition = ctx.lookup(stmt.name)
-            def_sub, def_type = definition.scheme.instantiate()
-            last_sub = def_sub.compose(exp_sub, stmt.loc)
-            return unify(
-                last_sub.rewrite_type(def_type),
-                last_sub.rewrite_type(exp_type),
-                opt_loc=stmt.loc
-            ).compose(last_sub, stmt.loc)
+            _, def_type = definition.scheme.instantiate()
+            sink.unify(def_type, exp_type, opt_loc=stmt.loc)
         else:
             # try to create a local definition using the expression type.
             definition = ValueDefinition(stmt.loc, stmt.name, Scheme([], exp_type), stmt)
@@ -311,15 +625,10 @@ def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "D
                     f"first: {conflicting_def.loc}\n"
                     f"later: {definition.loc}"
                 )
-            else:
-                def_sub, def_type = definition.scheme.instantiate()
-                return def_sub.compose(exp_sub, stmt.loc)
 
     elif isinstance(stmt, ast1.Bind1fStatement):
-        last_sub = Substitution.empty
         if stmt.opt_ret_ts:
-            ret_sub, ret_type = model_one_type_spec(ctx, stmt.opt_ret_ts, dto_list)
-            last_sub = ret_sub.compose(last_sub, stmt.loc)
+            ret_type = model_one_type_spec(ctx, stmt.opt_ret_ts, sink)
         else:
             ret_type = types.VoidType.singleton
         if isinstance(stmt, ast1.Extern1fStatement):
@@ -327,55 +636,39 @@ def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "D
             arg_type_list = []
             for arg_ts in stmt.args_types:
                 assert arg_ts.wb_type is not None
-                arg_ts_sub, this_arg_type = model_one_type_spec(ctx, arg_ts, dto_list)
-                last_sub = arg_ts_sub.compose(last_sub, arg_ts.loc)
-                arg_type_list.append(this_arg_type)
+                arg_type_list.append(model_one_type_spec(ctx, arg_ts, sink))
         else:
             arg_name_type_list = []
             arg_type_list = []
             for arg_index, (arg_name, opt_arg_ts) in enumerate(zip(stmt.args_names, stmt.args_types)):
                 if opt_arg_ts is not None:
-                    this_arg_sub, this_arg_type = model_one_type_spec(ctx, opt_arg_ts, dto_list)
-                    last_sub = this_arg_sub.compose(last_sub, opt_arg_ts.loc)
+                    this_arg_type = model_one_type_spec(ctx, opt_arg_ts, sink)
                 else:
                     this_arg_type = types.VarType(f"arg{arg_index}:{arg_name}")
                 arg_type_list.append(this_arg_type)
                 arg_name_type_list.append((arg_name, this_arg_type))
-            ret_sub, ret_type2 = model_one_lambda_body(ctx, stmt.loc, arg_name_type_list, [], stmt.body_exp, dto_list)
-            last_sub = last_sub.compose(ret_sub, stmt.body_exp.loc)
-            ret_type = last_sub.rewrite_type(ret_type)
-            ret_type2 = last_sub.rewrite_type(ret_type2)
-            last_sub = unify(ret_type, ret_type2).compose(last_sub, stmt.body_exp.loc)
+            ret_type2 = model_one_lambda_body(ctx, stmt.loc, arg_name_type_list, [], stmt.body_exp, sink)
+            sink.unify(ret_type, ret_type2)
         proc_type = types.ProcedureType.new(arg_type_list, ret_type)
-        def_sub, def_type = ctx.try_lookup(stmt.name).scheme.instantiate()
-        last_sub = def_sub.compose(last_sub, stmt.loc).compose(last_sub, stmt.loc)
-        return unify(
-            last_sub.rewrite_type(proc_type),
-            last_sub.rewrite_type(def_type),
-            opt_loc=stmt.loc
-        ).compose(last_sub, stmt.loc)
+        _, def_type = ctx.try_lookup(stmt.name).scheme.instantiate()
+        sink.unify(proc_type, def_type, opt_loc=stmt.loc)
 
     elif isinstance(stmt, ast1.Bind1tStatement):
         definition = ctx.try_lookup(stmt.name)
         assert definition is not None
-        def_sub, def_type = definition.scheme.instantiate()
-        ts_sub, ts_type = model_one_type_spec(ctx, stmt.initializer, dto_list)
-        last_sub = ts_sub.compose(def_sub, stmt.initializer.loc)
-        return unify(
-            last_sub.rewrite_type(def_type),
-            last_sub.rewrite_type(ts_type),
-            opt_loc=stmt.loc
-        ).compose(last_sub, stmt.loc)
+        _, def_type = definition.scheme.instantiate()
+        ts_type = model_one_type_spec(ctx, stmt.initializer, sink)
+        sink.unify(def_type, ts_type, opt_loc=stmt.loc)
 
     elif isinstance(stmt, ast1.ConstStatement):
-        sub, enum_type = model_one_type_spec(ctx, stmt.const_type_spec, dto_list)
+        enum_type = model_one_type_spec(ctx, stmt.const_type_spec, sink)
 
         const_iife_ctx = stmt.root_ctx
         const_iife_ctx.local_return_type = enum_type
 
         # In order to model statements in an IIFE, we must handle binding 'pred!' which must be resolved at compile time.
         # - we create a synthetic definition of pred! in the scope of each statement but the first
-        # - pred! maps to the previous element's ID as an expression: this symbolic representation makes it fully and 
+        # - pred! maps to the previous element's ID as an expression: this symbolic representation makes it fully and
         #   trivially compatible with anything added later in the compilation pipeline
         for i, (const_bind_stmt, synth_pred_binder) in enumerate(zip(stmt.body, stmt.wb_synth_pred_binders)):
             assert isinstance(const_bind_stmt, ast1.Bind1vStatement)
@@ -383,16 +676,13 @@ def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "D
             post_ctx = stmt.post_ctx_of_constant(i)
 
             # note 'ctx_with_pred' so 'pred!' resolves correctly
-            sub = model_one_statement(pre_ctx, const_bind_stmt, dto_list).compose(sub, const_bind_stmt.loc)
+            model_one_statement(pre_ctx, const_bind_stmt, sink)
 
             # type-checking: must check both binding and 'pred!' binding:
-            sub = unify(const_bind_stmt.initializer.wb_type, enum_type, const_bind_stmt.loc).compose(sub, const_bind_stmt.loc)
-            scm = post_ctx.lookup("pred!").scheme
-            pred_type = sub.rewrite_type(scm.instantiate_monomorphically())
-            sub = unify(pred_type, enum_type, const_bind_stmt.loc).compose(sub, const_bind_stmt.loc)
-            sub = model_one_statement(post_ctx, synth_pred_binder, dto_list).compose(sub, const_bind_stmt.loc)
-
-        return sub
+            sink.unify(const_bind_stmt.initializer.wb_type, enum_type, const_bind_stmt.loc)
+            pred_type = post_ctx.lookup("pred!").scheme.instantiate_monomorphically()
+            sink.unify(pred_type, enum_type, const_bind_stmt.loc)
+            model_one_statement(post_ctx, synth_pred_binder, sink)
 
     elif isinstance(stmt, ast1.ReturnStatement):
         if ctx.return_type is None:
@@ -401,172 +691,114 @@ def model_one_statement(ctx: "Context", stmt: "ast1.BaseStatement", dto_list: "D
                 "Cannot 'return' outside a function block",
                 opt_loc=stmt.loc
             )
-        ret_exp_sub, ret_exp_type = model_one_exp(ctx, stmt.returned_exp, dto_list)
-        l = stmt.loc
-        return unify(ret_exp_type, ret_exp_sub.rewrite_type(ctx.return_type),l).compose(ret_exp_sub,l)
+        ret_exp_type = model_one_exp(ctx, stmt.returned_exp, sink)
+        sink.unify(ret_exp_type, ctx.return_type, stmt.loc)
 
     elif isinstance(stmt, ast1.DiscardStatement):
-        sub, _ = model_one_exp(ctx, stmt.discarded_exp, dto_list)
-        return sub
+        model_one_exp(ctx, stmt.discarded_exp, sink)
 
     elif isinstance(stmt, ast1.LoopStatement):
         # if `while (cond) do {body...}`, then model 'cond' before 'body'
-        cond_exp_sub, cond_exp_type = (
-            model_one_exp(ctx, stmt.cond, dto_list)
-            if stmt.loop_style == ast1.LoopStyle.WhileDo else
-            (None, None)
-        )
+        if stmt.loop_style == ast1.LoopStyle.WhileDo:
+            model_one_exp(ctx, stmt.cond, sink)
 
         # modelling body:
-        body_sub = model_one_block(ctx, stmt.body, dto_list)
+        model_one_block(ctx, stmt.body, sink)
 
         # if `do {body...} while (cond)`, then model 'body' before 'cond'
-        cond_exp_sub, cond_exp_type = (
-            model_one_exp(ctx, stmt.cond, dto_list)
-            if stmt.loop_style == ast1.LoopStyle.DoWhile else
-            (cond_exp_sub, cond_exp_type)
-        )
-
-        # returning:
-        assert cond_exp_type is not None and cond_exp_sub is not None
-        return (
-            body_sub.compose(cond_exp_sub, stmt.loc)
-            if stmt.loop_style == ast1.LoopStyle.DoWhile else
-            cond_exp_sub.compose(body_sub, stmt.loc)
-        )
+        if stmt.loop_style == ast1.LoopStyle.DoWhile:
+            model_one_exp(ctx, stmt.cond, sink)
 
     elif isinstance(stmt, ast1.BaseLoopControlStatement):
-        return Substitution.empty
+        pass
 
     else:
         raise NotImplementedError(f"Don't know how to solve types: {stmt.desc}")
 
 
-def model_one_exp(
-    ctx: "Context",
-    exp: ast1.BaseExpression,
-    dto_list: "DTOList"
-) -> t.Tuple["Substitution", types.BaseType]:
+def model_one_exp(ctx: "Context", exp: ast1.BaseExpression, sink: BaseConstraintSink) -> types.BaseType:
     exp.wb_ctx = ctx
-    exp_sub, exp_type = help_model_one_exp(ctx, exp, dto_list)
+    exp_type = help_model_one_exp(ctx, exp, sink)
     exp.wb_type = exp_type
-    return exp_sub, exp_sub.rewrite_type(exp_type)
+    return exp_type
 
 
-def help_model_one_exp(
-    ctx: "Context",
-    exp: ast1.BaseExpression,
-    dto_list: "DTOList"
-) -> t.Tuple["Substitution", types.BaseType]:
+def help_model_one_exp(ctx: "Context", exp: ast1.BaseExpression, sink: BaseConstraintSink) -> types.BaseType:
     if isinstance(exp, ast1.IdRefExpression):
-        found_definition = ctx.try_lookup(exp.name)
-        if found_definition is None:
-            panic.because(
-                panic.ExitCode.TyperModelerUndefinedIdError,
-                f"Value identifier '{exp.name}' used, but not defined or declared",
-                opt_loc=exp.loc
-            )
-        if not isinstance(found_definition, ValueDefinition):
-            panic.because(
-                panic.ExitCode.TyperModelerInvalidIdError,
-                f"ID '{exp.name}' does not refer to a value, but was used as one.",
-                opt_loc=exp.loc
-            )
-        sub, id_type = found_definition.scheme.instantiate()
-        return sub, id_type
+        found_definition = look_up_value_definition(ctx, exp)
+        _, id_type = found_definition.scheme.instantiate()
+        return id_type
 
     elif isinstance(exp, ast1.IntExpression):
-        return Substitution.empty, types.IntType.get(exp.width_in_bits, not exp.is_unsigned)
+        return types.IntType.get(exp.width_in_bits, not exp.is_unsigned)
 
     elif isinstance(exp, ast1.FloatExpression):
-        return Substitution.empty, types.FloatType.get(exp.width_in_bits)
+        return types.FloatType.get(exp.width_in_bits)
 
     elif isinstance(exp, ast1.StringExpression):
         builtin_string_def = ctx.try_lookup("String")
         assert isinstance(builtin_string_def, TypeDefinition)
-        return Substitution.empty, builtin_string_def.scheme.instantiate_monomorphically()
+        return builtin_string_def.scheme.instantiate_monomorphically()
 
     elif isinstance(exp, ast1.ConstructExpression):
-        made_ts_sub, made_type = model_one_type_spec(ctx, exp.made_ts, dto_list)
-        args_sub = Substitution.empty
+        made_type = model_one_type_spec(ctx, exp.made_ts, sink)
         initializer_type_list = []
         initializer_locs_list = []
         for initializer_arg_exp in exp.initializer_list:
-            initializer_arg_sub, initializer_arg_type = model_one_exp(ctx, initializer_arg_exp, dto_list)
-            args_sub = initializer_arg_sub.compose(args_sub, exp.loc)
-            initializer_type_list.append(initializer_arg_type)
+            initializer_type_list.append(model_one_exp(ctx, initializer_arg_exp, sink))
             initializer_locs_list.append(initializer_arg_exp.loc)
 
         # setting up a DTO to constrain actual arg types based on constructed type
         # i.e. ensuring the signature of the constructor function is satisfied
-        dto_list.add_dto(ConstructorArgCheckDTO(exp.loc, made_type, initializer_type_list, initializer_locs_list))
+        sink.add_dto(ConstructorArgCheckDTO(exp.loc, made_type, initializer_type_list, initializer_locs_list))
 
         # the constructed instance can be referenced directly or via a pointer:
-        # preparing the return type:
-        sub = args_sub.compose(made_ts_sub, exp.loc)
-        ret_type = sub.rewrite_type(made_type)
-
-        return sub, ret_type
+        return made_type
 
     elif isinstance(exp, ast1.CopyExpression):
-        copied_sub, copied_type = model_one_exp(ctx, exp.copied_val, dto_list)
-        ret_type = types.PointerType.new(pointee_type=copied_type, is_mut=exp.is_mut)
-        return copied_sub, ret_type
+        copied_type = model_one_exp(ctx, exp.copied_val, sink)
+        return types.PointerType.new(pointee_type=copied_type, is_mut=exp.is_mut)
 
     elif isinstance(exp, ast1.UnaryOpExpression):
         res_type = types.VarType(f"unary_op_{exp.operator.name.lower()}_res", exp.loc)
-        operand_sub, operand_type = model_one_exp(ctx, exp.operand, dto_list)
-        operation_dto_sub = dto_list.add_dto(UnaryOpDTO(exp.loc, exp.operator, res_type, operand_type))
-        return operand_sub.compose(operation_dto_sub, exp.loc), res_type
+        operand_type = model_one_exp(ctx, exp.operand, sink)
+        sink.add_dto(UnaryOpDTO(exp.loc, exp.operator, res_type, operand_type))
+        return res_type
 
     elif isinstance(exp, ast1.BinaryOpExpression):
         res_type = types.VarType(f"binary_op_{exp.operator.name.lower()}_res")
-        lt_operand_sub, lt_operand_type = model_one_exp(ctx, exp.lt_operand_exp, dto_list)
-        rt_operand_sub, rt_operand_type = model_one_exp(ctx, exp.rt_operand_exp, dto_list)
-        operation_dto_sub = dto_list.add_dto(BinaryOpDTO(exp.loc, exp.operator, res_type, lt_operand_type, rt_operand_type))
-        sub = operation_dto_sub.compose(rt_operand_sub, exp.loc).compose(lt_operand_sub, exp.loc)
-        return sub, res_type
+        lt_operand_type = model_one_exp(ctx, exp.lt_operand_exp, sink)
+        rt_operand_type = model_one_exp(ctx, exp.rt_operand_exp, sink)
+        sink.add_dto(BinaryOpDTO(exp.loc, exp.operator, res_type, lt_operand_type, rt_operand_type))
+        return res_type
 
     elif isinstance(exp, ast1.ProcCallExpression):
         # collecting actual procedure type information:
         # type based on how the procedure is used, derived from 'actual' arguments and 'actual' return type
-        all_arg_sub = Substitution.empty
-        arg_type_list = []
-        for arg_exp in exp.arg_exps:
-            arg_sub, arg_type = model_one_exp(ctx, arg_exp, dto_list)
-            arg_type_list.append(all_arg_sub.rewrite_type(arg_type))
-            all_arg_sub = arg_sub.compose(all_arg_sub, exp.loc)
+        arg_type_list = [model_one_exp(ctx, arg_exp, sink) for arg_exp in exp.arg_exps]
         proxy_src_type = types.VarType(f"proc_call_ret")
         actual_proc_type = types.ProcedureType.new(arg_type_list, proxy_src_type)
 
         # collecting formal procedure type information:
         # type based on how the procedure was defined in this context:
-        formal_proc_sub, formal_proc_type = model_one_exp(ctx, exp.proc, dto_list)
-        last_sub = formal_proc_sub.compose(all_arg_sub, exp.loc)
+        formal_proc_type = model_one_exp(ctx, exp.proc, sink)
 
         # unifying, returning:
-        sub = unify(
-            last_sub.rewrite_type(formal_proc_type),
-            last_sub.rewrite_type(actual_proc_type),
-            opt_loc=exp.loc
-        ).compose(last_sub, exp.loc)
-        return sub, sub.rewrite_type(proxy_src_type)
+        sink.unify(formal_proc_type, actual_proc_type, opt_loc=exp.loc)
+        return proxy_src_type
 
     elif isinstance(exp, ast1.DotIdExpression):
-        container_sub, container_type = model_one_exp(ctx, exp.container, dto_list)
+        container_type = model_one_exp(ctx, exp.container, sink)
         proxy_src_type = types.VarType(f"dot_{exp.key}")
-        add_dto_sub = dto_list.add_dto(DotIdDTO(exp.loc, container_type, proxy_src_type, exp.key))
-        return add_dto_sub.compose(container_sub, exp.loc), proxy_src_type
+        sink.add_dto(DotIdDTO(exp.loc, container_type, proxy_src_type, exp.key))
+        return proxy_src_type
 
     elif isinstance(exp, ast1.IfExpression):
         # first, modelling the 'cond':
-        cond_sub, cond_type = model_one_exp(ctx, exp.cond_exp, dto_list)
-        sub = cond_sub
+        cond_type = model_one_exp(ctx, exp.cond_exp, sink)
 
         # modelling 'then', and 'else' branch expressions:
-        def help_model_branch_type(branch_exp, sub):
-            nonlocal ctx, dto_list
-
+        def help_model_branch_type(branch_exp):
             # first, ensuring this branch is a 0-ary lambda:
             assert isinstance(branch_exp, ast1.LambdaExpression)
             if branch_exp.arg_names:
@@ -577,32 +809,28 @@ def help_model_one_exp(
                 )
 
             # next, typing the branch:
-            branch_sub, branch_lambda_type = model_one_exp(ctx, branch_exp, dto_list)
-            branch_lambda_type = sub.rewrite_type(branch_lambda_type)
-            sub = branch_sub.compose(sub, branch_exp.loc)
+            branch_lambda_type = model_one_exp(ctx, branch_exp, sink)
 
             # extracting the branch return-value as the 'ite' return value
             assert isinstance(branch_lambda_type, types.ProcedureType)
-            branch_type = branch_lambda_type.ret_type
+            return branch_lambda_type.ret_type
 
-            # returning:
-            return sub, branch_type
-        sub, then_type = help_model_branch_type(exp.then_exp, sub)
-        sub, else_type = (
-            help_model_branch_type(exp.else_exp, sub)
+        then_type = help_model_branch_type(exp.then_exp)
+        else_type = (
+            help_model_branch_type(exp.else_exp)
             if exp.else_exp is not None else
-            (Substitution.empty, types.VoidType.singleton)
+            types.VoidType.singleton
         )
 
         # next, unifying types to type-check.
         ret_type = types.VarType(f"ite_ret_type", exp.loc)
         bool_type = types.IntType.get(1, is_signed=False)
-        sub = unify(cond_type, bool_type, exp.loc).compose(sub, exp.loc)     # ensuring 'cond' is a boolean
-        sub = unify(then_type, else_type, exp.loc).compose(sub, exp.loc)     # ensuring branches return the same type
-        sub = unify(then_type, ret_type, exp.loc).compose(sub, exp.loc)      # ensuring branches return the ret type
+        sink.unify(cond_type, bool_type, exp.loc)         # ensuring 'cond' is a boolean
+        sink.unify(then_type, else_type, exp.loc)         # ensuring branches return the same type
+        sink.unify(then_type, ret_type, exp.loc)          # ensuring branches return the ret type
 
         # finally, returning:
-        return sub, sub.rewrite_type(ret_type)
+        return ret_type
 
     elif isinstance(exp, ast1.LambdaExpression):
         # TODO: check that 'has_closure_slot' is respected before passing to C++
@@ -623,11 +851,8 @@ def help_model_one_exp(
 
         opt_tail_exp = exp.opt_body_tail
 
-        sub, ret_type = model_one_lambda_body(ctx, exp.loc, arg_name_type_list, prefix_stmt_list, opt_tail_exp, dto_list)
-
-        ret_type = sub.rewrite_type(ret_type)
-        arg_type = [sub.rewrite_type(arg_type) for arg_type in arg_types]
-        return sub, types.ProcedureType.new(arg_types, ret_type, has_closure_slot=has_closure_slot, is_c_variadic=False)
+        ret_type = model_one_lambda_body(ctx, exp.loc, arg_name_type_list, prefix_stmt_list, opt_tail_exp, sink)
+        return types.ProcedureType.new(arg_types, ret_type, has_closure_slot=has_closure_slot, is_c_variadic=False)
 
     elif isinstance(exp, ast1.UpdateExpression):
         # typechecking the following rule:
@@ -636,173 +861,172 @@ def help_model_one_exp(
         proxy_src_type = types.VarType(f"update_proxy_src_type", exp.loc)
         proxy_dst_type = types.PointerType.new(proxy_src_type, is_mut=True)
 
-        dst_sub, dst_type = model_one_exp(ctx, exp.store_address, dto_list)
-        sub = dst_sub
-
-        src_sub, src_type = model_one_exp(ctx, exp.stored_value, dto_list)
-        sub = src_sub.compose(dst_sub, exp.loc)
-
-        src_type = sub.rewrite_type(src_type)
-        dst_type = sub.rewrite_type(dst_type)
-        proxy_dst_type = sub.rewrite_type(proxy_dst_type)
-        proxy_src_type = sub.rewrite_type(proxy_src_type)
+        dst_type = model_one_exp(ctx, exp.store_address, sink)
+        src_type = model_one_exp(ctx, exp.stored_value, sink)
 
         # unifying src type with the src proxy:
-        src_typecheck_sub = unify(proxy_src_type, src_type, exp.loc)
-        proxy_src_type = src_typecheck_sub.rewrite_type(proxy_src_type)
-        proxy_dst_type = src_typecheck_sub.rewrite_type(proxy_dst_type)
-        sub = src_typecheck_sub.compose(sub, exp.loc)
+        sink.unify(proxy_src_type, src_type, exp.loc)
 
         # unifying dst type with the dst proxy:
-        # via above sub, the dst proxy should contain information about actual src type.
-        dst_typecheck_sub = unify(proxy_dst_type, dst_type, exp.loc)
-        proxy_src_type = dst_typecheck_sub.rewrite_type(proxy_src_type)
-        proxy_dst_type = dst_typecheck_sub.rewrite_type(proxy_dst_type)
-        sub = dst_typecheck_sub.compose(sub, exp.loc)
+        # via above unification, the dst proxy should contain information about actual src type.
+        sink.unify(proxy_dst_type, dst_type, exp.loc)
 
-        return sub, proxy_src_type
+        return proxy_src_type
 
     elif isinstance(exp, ast1.IndexExpression):
-        container_sub, container_type = model_one_exp(ctx, exp.container, dto_list)
-        sub = container_sub
-
-        index_sub, index_type = model_one_exp(ctx, exp.index, dto_list)
-        index_type = sub.rewrite_type(index_type)
-        sub = index_sub.compose(sub, exp.loc)
-
-        index_dto_sub = dto_list.add_dto(IsIntTypeDTO(exp.loc, index_type, "array-like index expression"))
-        sub = index_dto_sub.compose(sub, exp.loc)
+        container_type = model_one_exp(ctx, exp.container, sink)
+        index_type = model_one_exp(ctx, exp.index, sink)
+        sink.add_dto(IsIntTypeDTO(exp.loc, index_type, "array-like index expression"))
 
         res_type = types.VarType("res-type", opt_loc=exp.loc)
-        get_item_dto_sub = dto_list.add_dto(GetArrayLikeElementDTO(exp.loc, container_type, res_type, exp.ret_ref))
-        sub = get_item_dto_sub.compose(sub, exp.loc)
+        sink.add_dto(GetArrayLikeElementDTO(exp.loc, container_type, res_type, exp.ret_ref))
 
-        return sub, res_type
+        return res_type
 
     else:
         raise NotImplementedError(f"Don't know how to solve types: {exp.desc}")
 
 
-def model_one_type_spec(
-    ctx: "Context",
-    ts: "ast1.BaseTypeSpec",
-    dto_list: "DTOList"
-) -> t.Tuple["Substitution", types.BaseType]:
+def model_one_type_spec(ctx: "Context", ts: "ast1.BaseTypeSpec", sink: BaseConstraintSink) -> types.BaseType:
     if ts.wb_type is not None:
         assert isinstance(ts.wb_type, types.BaseType)
-        return Substitution.empty, ts.wb_type
+        return ts.wb_type
     else:
         ts.wb_ctx = ctx
-        ts_sub, ts_type = help_model_one_type_spec(ctx, ts, dto_list)
+        ts_type = help_model_one_type_spec(ctx, ts, sink)
         ts.wb_type = ts_type
-        return ts_sub, ts_sub.rewrite_type(ts_type)
+        return ts_type
 
 
-def help_model_one_type_spec(
-    ctx: "Context",
-    ts: "ast1.BaseTypeSpec",
-    dto_list: "DTOList"
-) -> t.Tuple["Substitution", types.BaseType]:
+def help_model_one_type_spec(ctx: "Context", ts: "ast1.BaseTypeSpec", sink: BaseConstraintSink) -> types.BaseType:
     if isinstance(ts, ast1.BuiltinPrimitiveTypeSpec):
-        return Substitution.empty, {
-            ast1.BuiltinPrimitiveTypeIdentity.Float32: types.FloatType.get(32),
-            ast1.BuiltinPrimitiveTypeIdentity.Float64: types.FloatType.get(64),
-            ast1.BuiltinPrimitiveTypeIdentity.Int8: types.IntType.get(8, is_signed=True),
-            ast1.BuiltinPrimitiveTypeIdentity.Int16: types.IntType.get(16, is_signed=True),
-            ast1.BuiltinPrimitiveTypeIdentity.Int32: types.IntType.get(32, is_signed=True),
-            ast1.BuiltinPrimitiveTypeIdentity.Int64: types.IntType.get(64, is_signed=True),
-            ast1.BuiltinPrimitiveTypeIdentity.Bool: types.IntType.get(1, is_signed=False),
-            ast1.BuiltinPrimitiveTypeIdentity.UInt8: types.IntType.get(8, is_signed=False),
-            ast1.BuiltinPrimitiveTypeIdentity.UInt16: types.IntType.get(16, is_signed=False),
-            ast1.BuiltinPrimitiveTypeIdentity.UInt32: types.IntType.get(32, is_signed=False),
-            ast1.BuiltinPrimitiveTypeIdentity.UInt64: types.IntType.get(64, is_signed=False),
-            ast1.BuiltinPrimitiveTypeIdentity.Void: types.VoidType.singleton
-        }[ts.identity]
+        return get_builtin_primitive_type(ts.identity)
 
     elif isinstance(ts, ast1.IdRefTypeSpec):
-        found_definition = ctx.try_lookup(ts.name)
-        if found_definition is None:
-            panic.because(
-                panic.ExitCode.TyperModelerUndefinedIdError,
-                f"Undefined ID used: {ts.name}",
-                opt_loc=ts.loc
-            )
-        if not isinstance(found_definition, TypeDefinition):
-            panic.because(
-                panic.ExitCode.TyperModelerInvalidIdError,
-                f"ID '{ts.name}' does not refer to a type, but was used as one.",
-                opt_loc=ts.loc
-            )
-        sub, def_type = found_definition.scheme.instantiate()
-        return sub, def_type
+        found_definition = look_up_type_definition(ctx, ts)
+        _, def_type = found_definition.scheme.instantiate()
+        return def_type
 
     elif isinstance(ts, ast1.ProcSignatureTypeSpec):
-        all_args_sub = Substitution.empty
         all_arg_types = []
         if ts.opt_args_list:
             for opt_arg_name, arg_type in ts.opt_args_list:
-                arg_sub, arg_type = model_one_type_spec(ctx, arg_type, dto_list)
-                all_args_sub = arg_sub.compose(all_args_sub, ts.loc)
-                all_arg_types.append(arg_type)
-        ret_sub, ret_type = model_one_type_spec(ctx, ts.ret_ts, dto_list)
-        sub = ret_sub.compose(all_args_sub, ts.loc)
-        return sub, types.ProcedureType.new(all_arg_types, ret_type, ts.takes_closure)
+                all_arg_types.append(model_one_type_spec(ctx, arg_type, sink))
+        ret_type = model_one_type_spec(ctx, ts.ret_ts, sink)
+        return types.ProcedureType.new(all_arg_types, ret_type, ts.takes_closure)
 
     elif isinstance(ts, ast1.AdtTypeSpec):
-        sub = Substitution.empty
-        fields = []
-        for field_name, field_ts in ts.fields_list:
-            field_sub, field_type = model_one_type_spec(ctx, field_ts, dto_list)
-            sub = field_sub.compose(sub, ts.loc)
-            fields.append((field_name, field_type))
+        fields = [
+            (field_name, model_one_type_spec(ctx, field_ts, sink))
+            for field_name, field_ts in ts.fields_list
+        ]
         if ts.linear_op == ast1.LinearTypeOp.Product:
-            return sub, types.StructType(fields)
+            return types.StructType(fields)
         elif ts.linear_op == ast1.LinearTypeOp.Sum:
-            return sub, types.UnionType(fields)
+            return types.UnionType(fields)
         else:
             raise NotImplementedError(f"Unknown LinearTypeOp: {ts.linear_op.name}")
 
     elif isinstance(ts, ast1.PtrTypeSpec):
-        pointee_sub, pointee_type = model_one_type_spec(ctx, ts.pointee_type_spec, dto_list)
-        return pointee_sub, types.PointerType.new(pointee_type, ts.is_mut)
+        pointee_type = model_one_type_spec(ctx, ts.pointee_type_spec, sink)
+        return types.PointerType.new(pointee_type, ts.is_mut)
 
     elif isinstance(ts, ast1.ArrayTypeSpec):
-        element_sub, element_type = model_one_type_spec(ctx, ts.element_type_spec, dto_list)
-        sub = element_sub
-
-        count_sub, count_type = model_one_exp(ctx, ts.count_expression, dto_list)
-        sub = count_sub.compose(sub, ts.count_expression.loc)
+        element_type = model_one_type_spec(ctx, ts.element_type_spec, sink)
+        count_type = model_one_exp(ctx, ts.count_expression, sink)
 
         # NOTE: must run evaluation AFTER modelling so 'ctx' is valid for const IDs
-        count_value = interp.evaluate_constant(ts.count_expression)
-        count_value_type_encoding = types.UniqueValueType(count_value)
-
-        if not isinstance(count_value, int):
-            panic.because(
-                panic.ExitCode.CompileTimeEvaluationError,
-                f"Expected an integer as array count, got: {count_value}",
-                opt_loc=ts.count_expression.loc
-            )
-        if count_value < 0:
-            panic.because(
-                panic.ExitCode.CompileTimeEvaluationError,
-                f"Received a negative value as array count: either overflow or logical error: {count_value}",
-                opt_loc=ts.count_expression.loc
-            )
+        count_value_type_encoding = evaluate_array_count(ts.count_expression)
 
-        add_dto_sub = dto_list.add_dto(IsIntTypeDTO(ts.count_expression.loc, count_type, "array type-spec size"))
-        sub = add_dto_sub.compose(sub, ts.count_expression.loc)
-
-        return sub, types.ArrayType.new(element_type, count_value_type_encoding, ts.is_mut)
+        sink.add_dto(IsIntTypeDTO(ts.count_expression.loc, count_type, "array type-spec size"))
+        return types.ArrayType.new(element_type, count_value_type_encoding, ts.is_mut)
 
     elif isinstance(ts, ast1.ArrayBoxTypeSpec):
-        element_sub, element_type = model_one_type_spec(ctx, ts.element_type_spec, dto_list)
-        return element_sub, types.ArrayBoxType.new(element_type, ts.is_mut)
+        element_type = model_one_type_spec(ctx, ts.element_type_spec, sink)
+        return types.ArrayBoxType.new(element_type, ts.is_mut)
 
     else:
         raise NotImplementedError(f"Don't know how to solve type-spec: {ts.desc}")
 
 
+#
+# source file typing: lookups and helpers shared by every engine (cf `TyperEngine`)
+#
+
+def look_up_value_definition(ctx: "Context", exp: ast1.IdRefExpression) -> "ValueDefinition":
+    found_definition = ctx.try_lookup(exp.name)
+    if found_definition is None:
+        panic.because(
+            panic.ExitCode.TyperModelerUndefinedIdError,
+            f"Value identifier '{exp.name}' used, but not defined or declared",
+            opt_loc=exp.loc
+        )
+    if not isinstance(found_definition, ValueDefinition):
+        panic.because(
+            panic.ExitCode.TyperModelerInvalidIdError,
+            f"ID '{exp.name}' does not refer to a value, but was used as one.",
+            opt_loc=exp.loc
+        )
+    return found_definition
+
+
+def look_up_type_definition(ctx: "Context", ts: ast1.IdRefTypeSpec) -> "TypeDefinition":
+    found_definition = ctx.try_lookup(ts.name)
+    if found_definition is None:
+        panic.because(
+            panic.ExitCode.TyperModelerUndefinedIdError,
+            f"Undefined ID used: {ts.name}",
+            opt_loc=ts.loc
+        )
+    if not isinstance(found_definition, TypeDefinition):
+        panic.because(
+            panic.ExitCode.TyperModelerInvalidIdError,
+            f"ID '{ts.name}' does not refer to a type, but was used as one.",
+            opt_loc=ts.loc
+        )
+    return found_definition
+
+
+def get_builtin_primitive_type(identity: ast1.BuiltinPrimitiveTypeIdentity) -> types.BaseType:
+    return {
+        ast1.BuiltinPrimitiveTypeIdentity.Float32: types.FloatType.get(32),
+        ast1.BuiltinPrimitiveTypeIdentity.Float64: types.FloatType.get(64),
+        ast1.BuiltinPrimitiveTypeIdentity.Int8: types.IntType.get(8, is_signed=True),
+        ast1.BuiltinPrimitiveTypeIdentity.Int16: types.IntType.get(16, is_signed=True),
+        ast1.BuiltinPrimitiveTypeIdentity.Int32: types.IntType.get(32, is_signed=True),
+        ast1.BuiltinPrimitiveTypeIdentity.Int64: types.IntType.get(64, is_signed=True),
+        ast1.BuiltinPrimitiveTypeIdentity.Bool: types.IntType.get(1, is_signed=False),
+        ast1.BuiltinPrimitiveTypeIdentity.UInt8: types.IntType.get(8, is_signed=False),
+        ast1.BuiltinPrimitiveTypeIdentity.UInt16: types.IntType.get(16, is_signed=False),
+        ast1.BuiltinPrimitiveTypeIdentity.UInt32: types.IntType.get(32, is_signed=False),
+        ast1.BuiltinPrimitiveTypeIdentity.UInt64: types.IntType.get(64, is_signed=False),
+        ast1.BuiltinPrimitiveTypeIdentity.Void: types.VoidType.singleton
+    }[identity]
+
+
+def evaluate_array_count(count_exp: ast1.BaseExpression) -> types.UniqueValueType:
+    """
+    Evaluates the (already modelled) count expression of an array type-spec, returning its encoding as a type.
+    """
+    count_value = interp.evaluate_constant(count_exp)
+    count_value_type_encoding = types.UniqueValueType.get(count_value)
+
+    if not isinstance(count_value, int):
+        panic.because(
+            panic.ExitCode.CompileTimeEvaluationError,
+            f"Expected an integer as array count, got: {count_value}",
+            opt_loc=count_exp.loc
+        )
+    if count_value < 0:
+        panic.because(
+            panic.ExitCode.CompileTimeEvaluationError,
+            f"Received a negative value as array count: either overflow or logical error: {count_value}",
+            opt_loc=count_exp.loc
+        )
+
+    return count_value_type_encoding
+
+
 #
 # source file typing: part 3: deferred resolution (solving)
 #
@@ -811,64 +1035,87 @@ def help_model_one_type_spec(
 # (cf BaseDTO below)
 
 class DTOList(object):
+    """
+    Holds the DTOs that could not be solved yet by a `SubstitutionSink`, indexed by the free variables of their
+    arguments: since a DTO's solution only depends on its arguments, it is only retried once a substitution binds one
+    of these variables.
+    """
+
     def __init__(self):
-        self.internal_dto_list: t.List[BaseDTO] = []
+        self.pending_dto_map: t.Dict[int, BaseDTO] = {}
+        self.dto_index: t.Dict[types.VarType, t.List[BaseDTO]] = defaultdict(list)
+        self.worklist: t.Deque[BaseDTO] = deque()
+        self.worklist_dto_id_set: t.Set[int] = set()
 
-    def add_dto(self, dto: "BaseDTO") -> "Substitution":
+    def add_dto(self, dto: "BaseDTO", sink: "SubstitutionSink"):
         # before adding to the list, we first try applying immediately
-        finished, sub = dto.increment_solution()
-        if finished:
-            return sub
-        else:
-            self.internal_dto_list.append(dto)
-            return Substitution.empty
-
-    def update(self, sub, opt_replacement_internal_dto_list=None):
-        if opt_replacement_internal_dto_list is not None:
-            dto_list = opt_replacement_internal_dto_list
-            self.internal_dto_list = dto_list
-        else:
-            dto_list = self.internal_dto_list
-
-        for dto in dto_list:
+        dto.rewrite_with_sub(sink)
+        if not dto.increment_solution(sink):
+            self.pending_dto_map[id(dto)] = dto
+            self.index_dto(dto, dto.oc_free_vars())
+
+    def truncate(self, pending_dto_count: int):
+        # DTOs are only removed from the pending map by `solve`, so the last ones in the map are the last ones added.
+        # NOTE: stale entries in `dto_index` are skipped by `update`.
+        while len(self.pending_dto_map) > pending_dto_count:
+            self.pending_dto_map.popitem()
+
+    def index_dto(self, dto: "BaseDTO", free_vars: t.Iterable[types.VarType]):
+        for var in free_vars:
+            self.dto_index[var].append(dto)
+
+    def solve_one_dto(self, dto: "BaseDTO", sink: "SubstitutionSink"):
+        if dto.increment_solution(sink):
+            del self.pending_dto_map[id(dto)]
+
+            # applying the substitution, which wakes up the DTOs it affects:
+            sink.apply_sub_everywhere()
+
+    def update(self, sub: "Substitution"):
+        # like `Context.apply_sub_everywhere`: only the DTOs indexed under a substituted variable can change, and each
+        # is queued to be retried by `solve`.
+        affected_dto_map = {}
+        for var in sub.oc_sub_map_keys:
+            for dto in self.dto_index.pop(var, ()):
+                if id(dto) in self.pending_dto_map:
+                    affected_dto_map[id(dto)] = dto
+
+        for dto_id, dto in affected_dto_map.items():
+            old_free_vars = dto.oc_free_vars()
             dto.rewrite_with_sub(sub)
-
-    def solve(self) -> "Substitution":
-        finished = False
-        while not finished:
-            # solving one iteration:
-            old_dto_list = self.internal_dto_list
-            finished, new_dto_list, sub = DTOList.solve_one_iteration(old_dto_list)
-
-            # ensuring solving hasn't stalled:
-            if not finished and len(new_dto_list) == len(old_dto_list):
-                panic.because(
-                    panic.ExitCode.TyperDtoSolverStalledError,
-                    f"TYPER: DTOList solution stalled with {len(new_dto_list)} constraints remaining:\n" +
-                    '\n'.join(map(str, new_dto_list)) + "\n"
-                    "... HINT: This could be due to a syntax error OR insufficient type hints."
-                )
-
-            # applying the substitution:
-            Context.apply_sub_everywhere(sub)
-            self.update(sub, new_dto_list)
-            ast1.WbTypeMixin.apply_sub_everywhere(sub)
-
-    @staticmethod
-    def solve_one_iteration(dto_list: t.List["BaseDTO"]) -> t.Tuple[bool, t.List["BaseDTO"], "Substitution"]:
-        if len(dto_list) == 0:
-            return True, dto_list, Substitution.empty
-
-        new_dto_list = []
-        sub = Substitution.empty
-        all_finished = True
-        for dto in dto_list:
-            dto_finished, dto_sub = dto.increment_solution()
-            if not dto_finished:
-                new_dto_list.append(dto)
-                all_finished = False
-            sub = sub.compose(dto_sub, dto.loc)
-        return all_finished, new_dto_list, sub
+            self.index_dto(
+                dto,
+                [
+                    var
+                    for var in dto.oc_free_vars()
+                    if var not in old_free_vars or var in sub.oc_sub_map_keys
+                ]
+            )
+            if dto_id not in self.worklist_dto_id_set:
+                self.worklist_dto_id_set.add(dto_id)
+                self.worklist.append(dto)
+
+    def solve(self, sink: "SubstitutionSink", error_log: ErrorLog):
+        while self.worklist:
+            dto = self.worklist.popleft()
+            self.worklist_dto_id_set.remove(id(dto))
+
+            # like `model_top_level_sccs`, solving goes on after a DTO fails, so the first error in source order is
+            # reported: each failed DTO is dropped, along with the part of its solution found so far.
+            if not error_log.try_run(dto.loc, self.solve_one_dto, dto, sink):
+                del self.pending_dto_map[id(dto)]
+                sink.sub = Substitution.empty
+        error_log.report()
+
+        # ensuring solving hasn't stalled: no pending DTO can change anymore.
+        if self.pending_dto_map:
+            remaining_dto_list = list(self.pending_dto_map.values())
+            panic.because(
+                panic.ExitCode.TyperDtoSolverStalledError,
+                f"TYPER: DTOList solution stalled with {len(remaining_dto_list)} constraints remaining:\n" +
+                '\n'.join(map(str, remaining_dto_list)) + "\n"
+                "... HINT: This could be due to a syntax error OR insufficient type hints."
+            )
 
 
 # DTO = Deferred Typer Order
@@ -885,8 +1132,11 @@ class BaseDTO(object, metaclass=abc.ABCMeta):
         self.arg_type_list: t.List[types.BaseType] = arg_type_list
 
     @abc.abstractmethod
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
-        pass
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
+        """
+        Tries to solve this DTO from its (up to date) argument types, handing the constraints it implies to `sink`.
+        Returns whether this DTO is finished: if not, no constraint was handed to `sink`.
+        """
 
     @abc.abstractmethod
     def prefix_str(self):
@@ -898,7 +1148,10 @@ class BaseDTO(object, metaclass=abc.ABCMeta):
     def __repr__(self):
         return str(self)
 
-    def rewrite_with_sub(self, sub: "Substitution"):
+    def oc_free_vars(self) -> t.Set[types.VarType]:
+        return set().union(*(arg_type.oc_free_vars for arg_type in self.arg_type_list))
+
+    def rewrite_with_sub(self, sub: t.Union["Substitution", BaseConstraintSink]):
         for i in range(len(self.arg_type_list)):
             self.arg_type_list[i] = sub.rewrite_type(self.arg_type_list[i])
 
@@ -911,9 +1164,10 @@ class IteCondTypeCheckDTO(BaseDTO):
     def condition_type(self):
         return self.arg_type_list[0]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         if self.condition_type.is_var:
-            return True, Substitution.get({self.condition_type: types.IntType.get(1, is_signed=False)})
+            sink.unify(self.condition_type, types.IntType.get(1, is_signed=False))
+            return True
         elif self.condition_type != types.IntType.get(1, is_signed=False):
             panic.because(
                 panic.ExitCode.TyperDtoSolverFailedError,
@@ -921,7 +1175,7 @@ class IteCondTypeCheckDTO(BaseDTO):
                 opt_loc=self.loc
             )
         else:
-            return True, Substitution.empty
+            return True
 
     def prefix_str(self):
         return f"IfThenElse(cond={self.condition_type})"
@@ -940,51 +1194,54 @@ class UnaryOpDTO(BaseDTO):
     def operand_type(self) -> types.BaseType:
         return self.arg_type_list[1]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         operand_kind = self.operand_type.kind()
         if self.unary_op == ast1.UnaryOperator.LogicalNot:
-            arg_u_sub = unify(self.operand_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
-            ret_u_sub = unify(self.return_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
-            return True, ret_u_sub.compose(arg_u_sub)
+            sink.unify(self.operand_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
+            sink.unify(self.return_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
+            return True
         elif self.unary_op in (ast1.UnaryOperator.Minus, ast1.UnaryOperator.Plus):
             if self.operand_type.is_var:
-                return False, Substitution.empty
+                return False
             else:
+                # NOTE: compares the kind against `types.IntType` rather than `types.TypeKind.Int`, so integer operands
+                # are rejected below.
                 if operand_kind == types.IntType:
                     if self.operand_type.is_signed:
                         # + <int> => return identity
-                        ret_sub = unify(self.operand_type, self.return_type, opt_loc=self.loc)
-                        return True, ret_sub
+                        sink.unify(self.operand_type, self.return_type, opt_loc=self.loc)
+                        return True
                     else:
                         # + <uint> => return a signed integer of the same width
                         ret_type = types.IntType.get(self.operand_type.width_in_bits, is_signed=True)
-                        ret_sub = unify(ret_type, self.return_type, opt_loc=self.loc)
-                        return True, ret_sub
+                        sink.unify(ret_type, self.return_type, opt_loc=self.loc)
+                        return True
                 elif operand_kind == types.TypeKind.Float:
-                    ret_sub = unify(self.return_type, self.operand_type, opt_loc=self.loc)
-                    return True, ret_sub
+                    sink.unify(self.return_type, self.operand_type, opt_loc=self.loc)
+                    return True
                 else:
                     self.panic_because_invalid_overload()
         elif self.unary_op == ast1.UnaryOperator.Do:
             if self.operand_type.is_var:
-                return False, Substitution.empty
+                return False
             else:
                 if operand_kind == types.TypeKind.Procedure:
                     assert isinstance(self.operand_type, types.ProcedureType)
                     if self.operand_type.arg_count != 0:
                         self.panic_because_invalid_overload(more="expected 0-arg procedure")
                     ret_type = self.operand_type.ret_type
-                    ret_sub = unify(ret_type, self.return_type, opt_loc=self.loc)
-                    return True, ret_sub
+                    sink.unify(ret_type, self.return_type, opt_loc=self.loc)
+                    return True
                 else:
                     self.panic_because_invalid_overload()
         elif self.unary_op == ast1.UnaryOperator.DeRef:
             if self.operand_type.is_var:
-                return False, Substitution.empty
+                return False
             else:
                 if operand_kind == types.TypeKind.Pointer:
                     sol_type = self.operand_type.pointee_type
-                    return True, unify(sol_type, self.return_type, self.loc)
+                    sink.unify(sol_type, self.return_type, self.loc)
+                    return True
                 else:
                     panic.because(
                         panic.ExitCode.TyperDtoSolverFailedError,
@@ -1051,24 +1308,24 @@ class BinaryOpDTO(BaseDTO):
     def rt_operand_type(self):
         return self.arg_type_list[2]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         # can infer if we have either argument type
         # NOTE: can infer from return type as well, but would lose ability to handle operator overloads.
         if self.lt_operand_type.is_var and self.rt_operand_type.is_var:
-            return False, Substitution.empty
+            return False
 
         # arithmetic operators
         if self.binary_op in BinaryOpDTO.arithmetic_binary_operator_set:
             # arithmetic binary operators are symmetrically typed: arguments must have the same type.
-            symmetric_args_sub = unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
-            lt_operand_type = symmetric_args_sub.rewrite_type(self.lt_operand_type)
-            rt_operand_type = symmetric_args_sub.rewrite_type(self.rt_operand_type)
+            sink.unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
+            lt_operand_type = sink.rewrite_type(self.lt_operand_type)
+            rt_operand_type = sink.rewrite_type(self.rt_operand_type)
 
             # dispatching based on atomicity:
             if lt_operand_type.is_atomic:
                 if isinstance(lt_operand_type, (types.IntType, types.FloatType)):
-                    ret_sub = unify(lt_operand_type, self.return_type, opt_loc=self.loc)
-                    return True, ret_sub.compose(symmetric_args_sub, self.loc)
+                    sink.unify(lt_operand_type, self.return_type, opt_loc=self.loc)
+                    return True
                 else:
                     panic.because(
                         panic.ExitCode.TyperDtoSolverFailedError,
@@ -1088,9 +1345,9 @@ class BinaryOpDTO(BaseDTO):
         # comparison operators
         elif self.binary_op in BinaryOpDTO.comparison_binary_operator_set:
             # comparison operators are symmetrically typed: arguments must have the same type.
-            symmetric_args_sub = unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
-            lt_operand_type = symmetric_args_sub.rewrite_type(self.lt_operand_type)
-            rt_operand_type = symmetric_args_sub.rewrite_type(self.rt_operand_type)
+            sink.unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
+            lt_operand_type = sink.rewrite_type(self.lt_operand_type)
+            rt_operand_type = sink.rewrite_type(self.rt_operand_type)
 
             builtin_operation_is_defined = (
                 # equality is defined on all types.
@@ -1099,8 +1356,8 @@ class BinaryOpDTO(BaseDTO):
                 lt_operand_type.is_atomic
             )
             if builtin_operation_is_defined:
-                ret_sub = unify(self.return_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
-                return True, ret_sub.compose(symmetric_args_sub, self.loc)
+                sink.unify(self.return_type, types.IntType.get(1, is_signed=False), opt_loc=self.loc)
+                return True
             elif not lt_operand_type.is_atomic:
                 panic.because(
                     panic.ExitCode.TyperDtoSolverFailedError,
@@ -1119,12 +1376,11 @@ class BinaryOpDTO(BaseDTO):
         # boolean operators
         elif self.binary_op in BinaryOpDTO.logical_binary_operator_set:
             # NOTE: for now, forcing to be boolean. Can expand once operator overloading is supported.
-            symmetric_args_sub = unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
+            sink.unify(self.lt_operand_type, self.rt_operand_type, opt_loc=self.loc)
             bool_type = types.IntType.get(1, is_signed=False)
-            args_check_sub = unify(symmetric_args_sub.rewrite_type(self.lt_operand_type), bool_type, opt_loc=self.loc)
-            l = self.loc
-            ret_sub = unify(self.return_type, types.IntType.get(1, is_signed=False), opt_loc=l)
-            return True, ret_sub.compose(args_check_sub,l).compose(symmetric_args_sub,l)
+            sink.unify(self.lt_operand_type, bool_type, opt_loc=self.loc)
+            sink.unify(self.return_type, bool_type, opt_loc=self.loc)
+            return True
 
         else:
             raise NotImplementedError(f"Solving one iter for BinaryOpDTO for binary op: {self.binary_op.name}")
@@ -1146,9 +1402,9 @@ class DotIdDTO(BaseDTO):
     def proxy_ret_type(self) -> types.BaseType:
         return self.arg_type_list[1]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         if self.container_type.is_var:
-            return False, Substitution.empty
+            return False
         if not self.container_type.is_composite:
             panic.because(
                 panic.ExitCode.TyperDtoSolverFailedError,
@@ -1165,8 +1421,8 @@ class DotIdDTO(BaseDTO):
                     panic.ExitCode.TyperDtoSolverFailedError,
                     f"Undefined field `{self.key_name}` in composite container type: {self.container_type}"                )
 
-            sub = unify(self.proxy_ret_type, field_type, self.loc)
-            return True, sub
+            sink.unify(self.proxy_ret_type, field_type, self.loc)
+            return True
 
     def prefix_str(self):
         return f"DOT({self.container_type}, {self.key_name}, {self.proxy_ret_type})"
@@ -1194,14 +1450,16 @@ class IsIntTypeDTO(BaseDTO):
     def prefix_str(self):
         return f"INT?({self.checked_type})"
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         if self.checked_type.is_var:
-            return True, Substitution.get({self.checked_type: types.IntType.get(64, True)})
+            # defaulting:
+            sink.unify(self.checked_type, types.IntType.get(64, True))
+            return True
         else:
             if self.checked_type.kind() == types.TypeKind.Int:
                 assert isinstance(self.checked_type, types.IntType)
                 if self.checked_type.is_signed:
-                    return True, Substitution.empty
+                    return True
                 else:
                     panic.because(
                         panic.ExitCode.TyperDtoSolverFailedError,
@@ -1229,7 +1487,7 @@ class GetArrayLikeElementDTO(BaseDTO):
     def res_type(self):
         return self.arg_type_list[1]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         def is_flat_array_type(t):
             return isinstance(t, (types.ArrayType, types.ArrayBoxType))
 
@@ -1238,16 +1496,18 @@ class GetArrayLikeElementDTO(BaseDTO):
             elem_type = self.container_type.element_type
 
             if not self.ret_ref:
-                return True, unify(self.res_type, elem_type, self.loc)
+                sink.unify(self.res_type, elem_type, self.loc)
             else:
-                return True, unify(self.res_type, types.PointerType.new(elem_type, is_mut=self.container_type.is_mut))
+                sink.unify(self.res_type, types.PointerType.new(elem_type, is_mut=self.container_type.is_mut))
+            return True
 
         if isinstance(self.container_type, types.PointerType) and is_flat_array_type(self.container_type.pointee_type):
             array_type = self.container_type.pointee_type
             elem_type = array_type.element_type
-            return True, unify(self.res_type, types.PointerType.new(elem_type, is_mut=self.container_type.is_mut))
+            sink.unify(self.res_type, types.PointerType.new(elem_type, is_mut=self.container_type.is_mut))
+            return True
 
-        return False, Substitution.empty
+        return False
 
     def prefix_str(self):
         return f"GET_ARRAYLIKE_ELEMENT({self.container_type}, {self.res_type})"
@@ -1266,12 +1526,11 @@ class ConstructorArgCheckDTO(BaseDTO):
     def actual_arg_type_list(self):
         return self.arg_type_list[1:]
 
-    def increment_solution(self) -> t.Tuple[bool, "Substitution"]:
+    def increment_solution(self, sink: BaseConstraintSink) -> bool:
         if any((t.is_var for t in [self.constructor_type] + self.actual_arg_type_list)):
-            return False, Substitution.empty
+            return False
 
         assert isinstance(self.constructor_type, types.BaseConcreteType)
-        sub = Substitution.empty
         formal_arg_type_list = list(self.constructor_type.constructor_arg_type_tuple())
 
         formal_arg_count = len(formal_arg_type_list)
@@ -1285,9 +1544,9 @@ class ConstructorArgCheckDTO(BaseDTO):
 
         args_iterator = zip(formal_arg_type_list, self.actual_arg_type_list, self.actual_arg_locs)
         for formal_type, actual_type, actual_loc in args_iterator:
-            sub = unify(formal_type, actual_type, actual_loc).compose(sub, actual_loc)
+            sink.unify(formal_type, actual_type, actual_loc)
 
-        return True, sub
+        return True
 
     def prefix_str(self):
         return f"CONSTRUCT({self.constructor_type}, ({', '.join(map(str, self.actual_arg_type_list))}))"
@@ -1304,90 +1563,104 @@ def unify(
 ) -> "Substitution":
     """
     Returns the most general substitution that would make these types identical when both are rewritten.
-    WARNING:
-        types must be checked for infinite-size (aka loops in composites) before-hand-- otherwise, will stack overflow.
+    Pairs of fields are unified in order with an explicit stack rather than recursion, so that deeply nested types
+    cannot exhaust Python's stack: each pair is first rewritten with the substitution from the pairs before it.
     """
 
-    # if already equal, return empty sub
-    if t1 == t2:
-        return Substitution.empty
-
-    # var -> anything else (including var)
-    if t1.is_var or t2.is_var:
-        if t1.is_var and t2.is_var:
-            # must ensure eliminations are consistent;
-            #   - always replace with newer type (t1.id > t2.id => var=t1, replacement=t2)
-            #   - always replace with older type (t1.id < t2.id => var=t2, replacement=t1)
-            # for correctness: solver should be invariant to this: good way to hunt for bugs.
-            if t1.id > t2.id:
+    # the substitution is grown in place as variables are bound (it is only returned once complete), rather than
+    # composed with each binding: `replacement_index` maps each variable to the keys of `sub_map` whose replacements
+    # mention it, so only these are rewritten when it is bound.
+    sub_map: t.Dict[types.VarType, types.BaseType] = {}
+    replacement_index: t.Dict[types.VarType, t.List[types.VarType]] = defaultdict(list)
+    s = Substitution(sub_map, _suppress_construct_empty_error=True)
+
+    stack = [(t1, t2)]
+    while stack:
+        t1, t2 = stack.pop()
+        t1 = s.rewrite_type(t1)
+        t2 = s.rewrite_type(t2)
+
+        # if already equal, nothing to do
+        if t1 == t2:
+            continue
+
+        # var -> anything else (including var)
+        if t1.is_var or t2.is_var:
+            if t1.is_var and t2.is_var:
+                # must ensure eliminations are consistent;
+                #   - always replace with newer type (t1.id > t2.id => var=t1, replacement=t2)
+                #   - always replace with older type (t1.id < t2.id => var=t2, replacement=t1)
+                # for correctness: solver should be invariant to this: good way to hunt for bugs.
+                if t1.id > t2.id:
+                    var_type = t1
+                    replacement_type = t2
+                else:
+                    var_type = t2
+                    replacement_type = t1
+            elif t1.is_var:
                 var_type = t1
                 replacement_type = t2
             else:
                 var_type = t2
                 replacement_type = t1
-        elif t1.is_var:
-            var_type = t1
-            replacement_type = t2
-        else:
-            # includes the case where both types are variables.
-            var_type = t2
-            replacement_type = t1
-
-        # perform an occurs-check here:
-        # - ensure 'var_type' is not one of the free variables of 'rewritten_type'
-        # - can define a method named 'free_vars' on types that returns the set of free type variables
-        #   recursively
-        # cf https://en.wikipedia.org/wiki/Occurs_check
-        if var_type in replacement_type.iter_free_vars():
-            raise_unification_error(
-                t1, t2,
-                "occurs check failed: this is probably a compiler/language bug",
-                opt_loc=opt_loc
-            )
-
-        return Substitution.get({var_type: replacement_type})
-
-    # composite types => just unify each field recursively.
-    elif t1.kind() == t2.kind() and t1.is_composite:
-        assert t2.is_composite
 
-        if t1.has_user_defined_field_names():
-            # ensure field names & field counts are identical:
-            if t1.field_names != t2.field_names:
-                raise_unification_error(opt_loc=opt_loc)
-        else:
-            # just check field counts (optimization)
-            if len(t1.field_names) != len(t2.field_names):
-                raise_unification_error(t1, t2, opt_loc=opt_loc)
-
-        # checking that other type properties match:
-        if t1.kind() == types.TypeKind.Procedure:
-            assert isinstance(t1, types.ProcedureType)
-            assert isinstance(t2, types.ProcedureType)
-            closure_slots_ok = t1.has_closure_slot == t2.has_closure_slot
-            if not closure_slots_ok:
+            # perform an occurs-check here:
+            # - ensure 'var_type' is not one of the free variables of 'replacement_type'
+            # cf https://en.wikipedia.org/wiki/Occurs_check
+            if var_type in replacement_type.oc_free_vars:
                 raise_unification_error(
                     t1, t2,
-                    opt_more=(
-                        "Cannot unify a procedure type with a closure slot with "
-                        "a procedure type without one"
-                    ),
+                    "occurs check failed: this is probably a compiler/language bug",
                     opt_loc=opt_loc
                 )
 
-        # generate a substitution by unifying matching fields:
-        s = Substitution.empty
-        for ft1, ft2 in zip(t1.field_types, t2.field_types):
-            s = unify(
-                s.rewrite_type(ft1),
-                s.rewrite_type(ft2),
-                opt_loc=opt_loc
-            ).compose(s, opt_loc)
-        return s
-
-    # any other case: raise a unification error.
-    else:
-        raise_unification_error(t1, t2, opt_loc=opt_loc)
+            var_sub = Substitution.get({var_type: replacement_type})
+            affected_key_list = replacement_index.pop(var_type, [])
+            for key in affected_key_list:
+                sub_map[key] = var_sub.rewrite_type(sub_map[key])
+            sub_map[var_type] = replacement_type
+            affected_key_list.append(var_type)
+            for var in replacement_type.oc_free_vars:
+                replacement_index[var].extend(affected_key_list)
+            s.oc_sub_map_keys.add(var_type)
+            s.oc_rewrite_memo.clear()
+
+        # composite types => just unify each field.
+        elif t1.kind() == t2.kind() and t1.is_composite:
+            assert t2.is_composite
+
+            if t1.has_user_defined_field_names():
+                # ensure field names & field counts are identical:
+                if t1.field_names != t2.field_names:
+                    raise_unification_error(t1, t2, opt_loc=opt_loc)
+            else:
+                # just check field counts (optimization)
+                if len(t1.field_names) != len(t2.field_names):
+                    raise_unification_error(t1, t2, opt_loc=opt_loc)
+
+            # checking that other type properties match:
+            if t1.kind() == types.TypeKind.Procedure:
+                assert isinstance(t1, types.ProcedureType)
+                assert isinstance(t2, types.ProcedureType)
+                closure_slots_ok = t1.has_closure_slot == t2.has_closure_slot
+                if not closure_slots_ok:
+                    raise_unification_error(
+                        t1, t2,
+                        opt_more=(
+                            "Cannot unify a procedure type with a closure slot with "
+                            "a procedure type without one"
+                        ),
+                        opt_loc=opt_loc
+                    )
+
+            # unifying matching fields, first to last:
+            stack.extend(reversed(list(zip(t1.field_types, t2.field_types))))
+
+        # any other case: raise a unification error.
+        else:
+            raise_unification_error(t1, t2, opt_loc=opt_loc)
+
+    return Substitution.get(sub_map)
 
 
 def raise_unification_error(t: types.BaseType, u: types.BaseType, opt_more=None, opt_loc=None):
@@ -1430,7 +1703,10 @@ class ContextKind(enum.Enum):
 
 
 class Context(object):
-    builtin_root: "Context" = None
+    # the current compilation session (cf `session.CompilationSession`) holds an index of free variables to the
+    # definitions whose schemes mention them, in any context: its `definition_sub_index`.
+    # it is updated and used by 'apply_sub_everywhere', so that only definitions mentioning a substituted variable are
+    # rewritten: definitions without free variables are never indexed, so never rewritten.
 
     def __init__(self, kind: ContextKind, parent: t.Optional["Context"]) -> None:
         super().__init__()
@@ -1456,6 +1732,7 @@ class Context(object):
         else:
             self.symbol_table[definition.name] = definition
             definition.bound_in_ctx = self
+            Context.index_definition(definition, definition.scheme.body.oc_free_vars)
             return None
 
     def try_lookup(self, name: str) -> t.Optional["BaseDefinition"]:
@@ -1511,22 +1788,44 @@ class Context(object):
         for child_context in self.children:
             child_context.print(1+indent_count)
 
-    def apply_sub_in_place_to_sub_tree(self, sub: "Substitution"):
-        # applying to 'self'
-        for def_obj in self.symbol_table.values():
-            assert isinstance(def_obj, BaseDefinition)
-            def_obj.scheme = sub.rewrite_scheme(def_obj.scheme)
+    @staticmethod
+    def builtin_root() -> "Context":
+        """
+        Returns the parent of every top-level context in the current compilation session.
+        """
+        current_session = session.current()
+        if current_session.opt_builtin_root_ctx is None:
+            current_session.opt_builtin_root_ctx = Context(ContextKind.BuiltinRoot, None)
+        return current_session.opt_builtin_root_ctx
 
-        # applying to 'self.children'
-        for child_ctx in self.children:
-            child_ctx.apply_sub_in_place_to_sub_tree(sub)
+    @staticmethod
+    def index_definition(definition: "BaseDefinition", free_vars: t.Iterable[types.VarType]):
+        sub_index = session.current().definition_sub_index
+        for var in free_vars:
+            sub_index[var].append(definition)
 
     @staticmethod
     def apply_sub_everywhere(s):
-        Context.builtin_root.apply_sub_in_place_to_sub_tree(s)
-
-
-Context.builtin_root = Context(ContextKind.BuiltinRoot, None)
+        # like `ast1.WbTypeMixin.apply_sub_everywhere`: only the definitions indexed under a substituted variable can
+        # change, and each is re-indexed under the variables its rewritten scheme introduces.
+        sub_index = session.current().definition_sub_index
+        affected_def_map = {}
+        for var in s.oc_sub_map_keys:
+            for def_obj in sub_index.pop(var, ()):
+                affected_def_map[id(def_obj)] = def_obj
+
+        for def_obj in affected_def_map.values():
+            assert isinstance(def_obj, BaseDefinition)
+            old_free_vars = def_obj.scheme.body.oc_free_vars
+            def_obj.scheme = s.rewrite_scheme(def_obj.scheme)
+            Context.index_definition(
+                def_obj,
+                [
+                    var
+                    for var in def_obj.scheme.body.oc_free_vars
+                    if var not in old_free_vars or var in s.oc_sub_map_keys
+                ]
+            )
 
 
 #
@@ -1602,6 +1901,9 @@ class Substitution(object):
         self.sub_map = sub_map
         self.oc_sub_map_keys = set(sub_map.keys())
 
+        # hash-consed types rewritten by this substitution, mapped to their rewritten form.
+        self.oc_rewrite_memo: t.Dict[types.BaseStructuralType, types.BaseType] = {}
+
     def compose(self, applied_first: "Substitution", src_loc: fb.ILoc) -> "Substitution":
         # composeSubst s1 s2 = Map.union (Map.map (applySubst s1) s2) s1
 
@@ -1668,49 +1970,63 @@ class Substitution(object):
         # if not, we just return the type as is.
         assert isinstance(t.oc_free_vars, set)
         if self.oc_sub_map_keys & t.oc_free_vars:
-            return self._rewrite_type(t, None)
+            return self._rewrite_type(t)
         else:
             return t
 
-    def _rewrite_type(self, t: types.BaseType, rw_in_progress_pair_list: pair.List) -> types.BaseType:
+    def _rewrite_type(self, t: types.BaseType) -> types.BaseType:
         assert isinstance(t, types.BaseType)
 
         if self is Substitution.empty:
             return t
-        if pair.list_contains(rw_in_progress_pair_list, t):
-            raise InfiniteSizeTypeException()
-
-        rw_in_progress_pair_list = pair.cons(t, rw_in_progress_pair_list)
-
-        # BoundVar in `sub_map` -> replacement
-        # FreeVar in `sub_map` -> replacement
-        opt_replacement_t = self.sub_map.get(t, None)
-        if opt_replacement_t is not None:
-            return opt_replacement_t
-
-        # Composite types: map rewrite on each component
-        # FIXME: must pass more attributes for types like 'Procedure'
-        if isinstance(t, types.BaseCompositeType):
-            rt_is_t = False
-            new_fields = []
-            for element_name, element_type in t.fields:
-                rt_field_type = self._rewrite_type(element_type, rw_in_progress_pair_list)
-                new_field = (element_name, rt_field_type)
-                new_fields.append(new_field)
-                rt_is_t |= rt_field_type is not element_type
-            if rt_is_t:
-                rt = t.copy_with_elements(new_fields)
-                if isinstance(t, types.PointerType):
-                    rt.contents_is_mut = t.contents_is_mut
-                elif isinstance(t, types.ProcedureType):
-                    rt.is_c_variadic = t.is_c_variadic
-                return rt
-            else:
-                return t
 
-        # Otherwise, just return the type as is:
-        assert t.is_atomic or t.is_var
-        return t
+        # rewriting bottom-up with an explicit stack rather than recursion, so that deeply nested types cannot exhaust
+        # Python's stack: each composite type is visited before its fields, then again once they are rewritten.
+        rw_type_map: t.Dict[int, types.BaseType] = {}
+        rw_in_progress_type_ids: t.Set[int] = set()
+        stack: t.List[t.Tuple[types.BaseType, bool]] = [(t, False)]
+        while stack:
+            u, fields_are_rewritten = stack.pop()
+
+            if fields_are_rewritten:
+                rw_in_progress_type_ids.remove(id(u))
+                new_fields = [(field_name, rw_type_map[id(field_type)]) for field_name, field_type in u.fields]
+                rt_is_u = all(
+                    rt_field_type is field_type
+                    for (_, rt_field_type), field_type in zip(new_fields, u.field_types)
+                )
+                ru = u if rt_is_u else u.copy_with_elements(new_fields)
+                if isinstance(u, types.BaseStructuralType):
+                    self.oc_rewrite_memo[u] = ru
+                rw_type_map[id(u)] = ru
+                continue
+
+            if id(u) in rw_type_map:
+                continue
+
+            # BoundVar in `sub_map` -> replacement
+            # FreeVar in `sub_map` -> replacement
+            # Types without any variable in `sub_map` -> the type as is
+            if u.is_var:
+                rw_type_map[id(u)] = self.sub_map.get(u, u)
+                continue
+            if self.oc_sub_map_keys.isdisjoint(u.oc_free_vars):
+                rw_type_map[id(u)] = u
+                continue
+            opt_rewritten_u = self.oc_rewrite_memo.get(u, None) if isinstance(u, types.BaseStructuralType) else None
+            if opt_rewritten_u is not None:
+                rw_type_map[id(u)] = opt_rewritten_u
+                continue
+
+            # Composite types: map rewrite on each component
+            assert isinstance(u, types.BaseCompositeType)
+            if id(u) in rw_in_progress_type_ids:
+                raise InfiniteSizeTypeException()
+            rw_in_progress_type_ids.add(id(u))
+            stack.append((u, True))
+            stack.extend((field_type, False) for field_type in u.field_types)
+
+        return rw_type_map[id(t)]
 
     def rewrite_scheme(self, s: "Scheme") -> "Scheme":
         if s.vars:
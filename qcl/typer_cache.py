@@ -0,0 +1,420 @@
+"""
+`typer_cache` lets the typer restore unchanged top-level definitions from a previous run instead of modelling them
+again (cf `TranspileOptions.opt_cache_dir_path`).
+
+Top-level statements are modelled one SCC (group of mutually recursive definitions) at a time, after the SCCs they
+refer to: cf `typer.order_top_level_sccs`.
+Each SCC is cached under a key computed from its statements' source text (or structure, for statements translated
+from C headers) and the seeded types of the symbols it defines (e.g. the C types of externs), along with the solved
+types of the top-level symbols it refers to.
+While both are unchanged, the SCC's statements are restored along with everything the typer wrote back (types,
+contexts, and definitions) rather than modelled: so after an edit, only the edited SCCs are modelled again, along
+with the SCCs whose dependencies' solved types changed as a result.
+Locations are cached relative to the start of each SCC's statements, so that SCCs moved by edits elsewhere in their
+source files are still restored.
+
+An SCC is only cached if the types of the symbols it refers to were fully solved before it was modelled, and the
+types of the symbols it defines are fully solved once it is modelled: later uses of these symbols then cannot refine
+their types, and any type variables left in the SCC are local to it, so they are solved by its own DTOs alone.
+SCCs with 'const' blocks are never cached, since these define symbols in a chain of contexts (cf
+`typer.seed_one_top_level_stmt`).
+"""
+
+import functools
+import io
+import pickle
+import typing as t
+
+from . import config
+from . import feedback as fb
+from . import ast1
+from . import ast2
+from . import disk_cache
+from . import interp
+from . import qy_parser
+from . import types
+from . import typer
+from . import uf_typer
+
+
+Scc = t.List[t.Tuple[ast2.BaseSourceFile, ast1.BaseStatement]]
+
+# the name and fingerprint of each top-level symbol an SCC refers to:
+DependencyFingerprintList = t.List[t.Tuple[str, str]]
+
+
+class TypedSccCache(object):
+    """
+    Restores and saves the typed SCCs of one package set, keeping every SCC of the package set in a single persistent
+    cache entry (mapping each SCC's key to the fingerprints of its dependencies and its pickled statements), so each
+    run reads and writes a single file.
+    Before modelling each SCC, call `try_restore`, which installs the cached SCC if there is one; otherwise, call
+    `note_modelled` once it is modelled. Finally, call `save` once every DTO is solved.
+    """
+
+    def __init__(
+        self,
+        cache: disk_cache.DiskCache,
+        qyp_set: ast2.QypSet,
+        top_level_ctx: typer.Context,
+        engine: typer.TyperEngine,
+        resolve_type: t.Callable[[types.BaseType], types.BaseType]
+    ) -> None:
+        """
+        :param resolve_type: returns a type with every variable solved so far substituted, e.g. `lambda t: t` for the
+            substitution engine, which rewrites definitions after each top-level statement.
+        """
+        super().__init__()
+        self.cache = cache
+        self.top_level_ctx = top_level_ctx
+        self.resolve_type = resolve_type
+        self.entry_key = disk_cache.hash_digest(typer_fingerprint(), engine.name, qyp_set.root_qyp.file_path)
+        self.old_scc_entry_map: t.Dict[str, t.Tuple[DependencyFingerprintList, bytes]] = cache.get(self.entry_key) or {}
+        self.new_scc_entry_map: t.Dict[str, t.Tuple[DependencyFingerprintList, bytes]] = {}
+
+        # each modelled SCC that may be cached: its key, the fingerprints of its dependencies, the definitions of its
+        # symbols, and the contexts it created.
+        self.modelled_scc_list: t.List[t.Tuple[
+            Scc, str, DependencyFingerprintList, t.List[typer.BaseDefinition], t.List[typer.Context]
+        ]] = []
+        self.opt_modelled_scc_key = None
+        self.modelled_scc_dep_fingerprints: DependencyFingerprintList = []
+        self.modelled_scc_old_child_count = 0
+
+        # the position of each top-level statement, so that its restored version can replace it:
+        self.stmt_pos_map = {
+            id(stmt): (source_file, stmt_index)
+            for _, _, source_file in qyp_set.iter_src_paths()
+            for stmt_index, stmt in enumerate(source_file.stmt_list)
+        }
+        self.source_text_map: t.Dict[int, str] = {}
+        self.type_fingerprint_memo: t.Dict[int, t.Tuple[types.BaseType, str]] = {}
+
+    def try_restore(self, scc: Scc) -> bool:
+        """
+        Restores a cached SCC in place of the given one, returning whether it was restored: if not, the SCC must be
+        modelled, then passed to `note_modelled`.
+        """
+        self.opt_modelled_scc_key = opt_scc_key = self.scc_key(scc)
+        self.modelled_scc_old_child_count = len(self.top_level_ctx.children)
+        if opt_scc_key is None:
+            return False
+
+        opt_entry = self.old_scc_entry_map.get(opt_scc_key, None)
+        if opt_entry is not None:
+            dep_fingerprints, data = opt_entry
+            if self.are_current_dependency_fingerprints(dep_fingerprints) and self.restore(scc, data):
+                self.new_scc_entry_map[opt_scc_key] = opt_entry
+                self.opt_modelled_scc_key = None
+                return True
+
+        # the SCC is modelled: it can only be cached if its dependencies' types are already solved.
+        self.modelled_scc_dep_fingerprints = []
+        for name in sorted(self.scc_dependency_names(scc)):
+            opt_fingerprint = self.opt_dependency_fingerprint(name)
+            if opt_fingerprint is None:
+                self.opt_modelled_scc_key = None
+                break
+            self.modelled_scc_dep_fingerprints.append((name, opt_fingerprint))
+        return False
+
+    def note_modelled(self, scc: Scc):
+        if self.opt_modelled_scc_key is None:
+            return
+
+        definition_list = self.scc_definitions(scc)
+        if all(not self.resolve_type(definition.scheme.body).oc_free_vars for definition in definition_list):
+            self.modelled_scc_list.append((
+                scc,
+                self.opt_modelled_scc_key,
+                self.modelled_scc_dep_fingerprints,
+                definition_list,
+                self.top_level_ctx.children[self.modelled_scc_old_child_count:]
+            ))
+        self.opt_modelled_scc_key = None
+
+    def save(self):
+        """
+        Caches every modelled SCC whose types are all solved, replacing the SCCs cached by previous runs (so SCCs
+        that no longer exist are dropped).
+        """
+        for scc, scc_key, dep_fingerprints, definition_list, child_ctx_list in self.modelled_scc_list:
+            stmt_list = [stmt for _, stmt in scc]
+            if not is_solved(stmt_list, definition_list, child_ctx_list):
+                continue
+
+            import_name_map = {}
+            for name, _ in dep_fingerprints:
+                definition = self.top_level_ctx.symbol_table[name]
+                if isinstance(definition, typer.TypeDefinition):
+                    import_name_map[id(definition.scheme.body)] = name
+
+            data_file = io.BytesIO()
+            pickler = TypedSccPickler(data_file, self.top_level_ctx, import_name_map, self.scc_base_offset_map(scc))
+            try:
+                pickler.dump((stmt_list, definition_list, child_ctx_list))
+            except RecursionError:
+                continue
+            self.new_scc_entry_map[scc_key] = (dep_fingerprints, data_file.getvalue())
+
+        if self.new_scc_entry_map.keys() != self.old_scc_entry_map.keys():
+            self.cache.put(self.entry_key, self.new_scc_entry_map)
+
+    def restore(self, scc: Scc, data: bytes) -> bool:
+        unpickler = TypedSccUnpickler(
+            io.BytesIO(data), self.top_level_ctx, self.resolve_type, self.scc_base_offset_map(scc)
+        )
+        try:
+            stmt_list, definition_list, child_ctx_list = unpickler.load()
+        except Exception:
+            return False
+
+        for (_, old_stmt), new_stmt in zip(scc, stmt_list):
+            source_file, stmt_index = self.stmt_pos_map[id(old_stmt)]
+            source_file.stmt_list[stmt_index] = new_stmt
+        for definition in definition_list:
+            self.top_level_ctx.symbol_table[definition.name] = definition
+        self.top_level_ctx.children.extend(child_ctx_list)
+        return True
+
+    def scc_key(self, scc: Scc) -> t.Optional[str]:
+        """
+        Returns the key of an SCC, or `None` if it cannot be cached (i.e. if it has a 'const' block).
+        """
+        if any(isinstance(stmt, ast1.ConstStatement) for _, stmt in scc):
+            return None
+
+        base_offset_map = self.scc_base_offset_map(scc)
+        key_parts = []
+        for _, stmt in scc:
+            if isinstance(stmt.loc, fb.SourceFileLoc):
+                # the text of a statement (with its offset relative to the SCC's other statements) determines its
+                # structure and relative locations.
+                key_parts.append(stmt.loc.file_path)
+                key_parts.append(str(stmt.loc.start_offset - base_offset_map[stmt.loc.file_id]))
+                key_parts.append(self.source_text(stmt.loc.file_id)[stmt.loc.start_offset:stmt.loc.end_offset])
+            else:
+                try:
+                    key_parts.append(repr(ast1.dump_tree(stmt)))
+                except RecursionError:
+                    return None
+        for definition in self.scc_definitions(scc):
+            key_parts.append(definition_fingerprint(definition, type_fingerprint(definition.scheme.body)))
+        return disk_cache.hash_digest(*key_parts)
+
+    def scc_definitions(self, scc: Scc) -> t.List[typer.BaseDefinition]:
+        return [self.top_level_ctx.symbol_table[stmt.name] for _, stmt in scc]
+
+    def scc_dependency_names(self, scc: Scc) -> t.Set[str]:
+        # like `typer.order_top_level_sccs`, references are found by name, ignoring scopes.
+        scc_name_set = {stmt.name for _, stmt in scc}
+        return {
+            node.name
+            for node in ast1.iter_subtree_nodes([stmt for _, stmt in scc])
+            if isinstance(node, (ast1.IdRefExpression, ast1.IdRefTypeSpec))
+            and node.name not in scc_name_set
+            and node.name in self.top_level_ctx.symbol_table
+        }
+
+    @staticmethod
+    def scc_base_offset_map(scc: Scc) -> t.Dict[int, int]:
+        # maps the ID of each source file with statements in the SCC to the offset of its first such statement.
+        base_offset_map = {}
+        for _, stmt in scc:
+            if isinstance(stmt.loc, fb.SourceFileLoc):
+                base_offset_map.setdefault(stmt.loc.file_id, stmt.loc.start_offset)
+        return base_offset_map
+
+    def opt_dependency_fingerprint(self, name: str) -> t.Optional[str]:
+        """
+        Returns the fingerprint of a top-level definition, or `None` if its type is not fully solved yet.
+        """
+        definition = self.top_level_ctx.symbol_table.get(name, None)
+        if definition is None:
+            return None
+        def_type = self.resolve_type(definition.scheme.body)
+        if def_type.oc_free_vars:
+            return None
+
+        # solved types never change, so their fingerprints are only computed once.
+        opt_memo_item = self.type_fingerprint_memo.get(id(def_type), None)
+        if opt_memo_item is None:
+            opt_memo_item = self.type_fingerprint_memo[id(def_type)] = (def_type, type_fingerprint(def_type))
+        _, def_type_fingerprint = opt_memo_item
+        return definition_fingerprint(definition, def_type_fingerprint)
+
+    def are_current_dependency_fingerprints(self, dep_fingerprints: DependencyFingerprintList) -> bool:
+        return all(
+            self.opt_dependency_fingerprint(name) == dep_fingerprint
+            for name, dep_fingerprint in dep_fingerprints
+        )
+
+    def source_text(self, file_id: int) -> str:
+        opt_text = self.source_text_map.get(file_id, None)
+        if opt_text is None:
+            # like `feedback.SourceFileTable.load_line_table`, offsets count every byte as one character.
+            with open(fb.current_source_file_table().file_path(file_id), "rb") as source_file:
+                opt_text = self.source_text_map[file_id] = source_file.read().decode("latin-1")
+        return opt_text
+
+
+def is_solved(
+    stmt_list: t.List[ast1.BaseStatement],
+    definition_list: t.List[typer.BaseDefinition],
+    ctx_list: t.List[typer.Context]
+) -> bool:
+    """
+    Checks that no typed node in the given statements, and no definition in the given contexts (or their children)
+    has a free type variable left.
+    """
+    for node in ast1.iter_subtree_nodes(stmt_list):
+        if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None and node.wb_type.oc_free_vars:
+            return False
+
+    definition_list = list(definition_list)
+    ctx_stack = list(ctx_list)
+    while ctx_stack:
+        ctx = ctx_stack.pop()
+        definition_list.extend(ctx.symbol_table.values())
+        ctx_stack.extend(ctx.children)
+    return all(not definition.scheme.body.oc_free_vars for definition in definition_list)
+
+
+def definition_fingerprint(definition: typer.BaseDefinition, def_type_fingerprint: str) -> str:
+    return repr((
+        definition.__class__.__name__,
+        definition.name,
+        definition.extern_tag,
+        definition.is_compile_time_constant,
+        def_type_fingerprint
+    ))
+
+
+def type_fingerprint(root_type: types.BaseType) -> str:
+    """
+    Returns a rendering of a type that is the same across runs: unlike `str`, it omits type IDs, numbering variables
+    and shared (or recursive) component types by their first occurrence instead.
+    """
+    token_list = []
+    token_pos_map = {}
+    stack = [root_type]
+    while stack:
+        t = stack.pop()
+        opt_token_pos = token_pos_map.get(id(t), None)
+        if opt_token_pos is not None:
+            token_list.append(("ref", opt_token_pos))
+            continue
+
+        token_pos_map[id(t)] = len(token_list)
+        if t.is_var:
+            token_list.append(("var",))
+        elif t.is_composite:
+            token_list.append((
+                t.__class__.__name__, t.opt_name, t.is_mut,
+                *(getattr(t, attr_name, None) for attr_name in types.ProcedureType.attr_names),
+                tuple(t.field_names)
+            ))
+            stack.extend(reversed(t.field_types))
+        else:
+            # NOTE: atomic types are shared, so their `is_mut` is not part of any definition's interface: cf
+            # `TypedSccPickler`.
+            token_list.append((t.__class__.__name__, str(t)))
+    return repr(token_list)
+
+
+@functools.lru_cache(maxsize=None)
+def typer_fingerprint() -> str:
+    return disk_cache.hash_digest(
+        config.COMPILER_VERSION,
+        qy_parser.grammar_fingerprint(),
+        qy_parser.ast_builder_fingerprint(),
+        disk_cache.hash_source_files(__file__, typer.__file__, uf_typer.__file__, types.__file__, interp.__file__)
+    )
+
+
+class TypedSccPickler(pickle.Pickler):
+    """
+    Pickles typed statements, referring to the package set's contexts and to the types of the symbols they import by
+    name, to atomic types by value (cf `c_parser.TranslationPickler`), and to locations in the statements' source
+    files by offset from the first statement in each file (cf `TypedSccCache.scc_base_offset_map`).
+    Unlike `c_parser.TranslationPickler`, atomic types are restored without their `is_mut`: the typer never sets it,
+    and these types are shared by every statement, so restoring an SCC must not change it.
+    """
+
+    def __init__(
+        self, data_file,
+        top_level_ctx: typer.Context,
+        import_name_map: t.Dict[int, str],
+        base_offset_map: t.Dict[int, int]
+    ) -> None:
+        super().__init__(data_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.top_level_ctx = top_level_ctx
+        self.builtin_root_ctx = typer.Context.builtin_root()
+        self.import_name_map = import_name_map
+        self.base_offset_map = base_offset_map
+        self.file_index_map = {file_id: file_index for file_index, file_id in enumerate(base_offset_map)}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, fb.SourceFileLoc):
+            opt_file_index = self.file_index_map.get(obj.file_id, None)
+            if opt_file_index is None:
+                return None
+            base_offset = self.base_offset_map[obj.file_id]
+            return ("loc", opt_file_index, obj.start_offset - base_offset, obj.end_offset - base_offset)
+        elif obj is self.top_level_ctx:
+            return ("top_level_ctx",)
+        elif obj is self.builtin_root_ctx:
+            return ("builtin_root_ctx",)
+        elif not isinstance(obj, types.BaseType):
+            return None
+
+        opt_import_name = self.import_name_map.get(id(obj), None)
+        if opt_import_name is not None:
+            return ("import", opt_import_name)
+        elif isinstance(obj, types.IntType):
+            return ("int", obj.width_in_bits, obj.is_signed)
+        elif isinstance(obj, types.FloatType):
+            return ("float", obj.width_in_bits)
+        elif isinstance(obj, types.VoidType):
+            return ("void",)
+        else:
+            return None
+
+
+class TypedSccUnpickler(pickle.Unpickler):
+    def __init__(
+        self, data_file,
+        top_level_ctx: typer.Context,
+        resolve_type: t.Callable[[types.BaseType], types.BaseType],
+        base_offset_map: t.Dict[int, int]
+    ) -> None:
+        super().__init__(data_file)
+        self.top_level_ctx = top_level_ctx
+        self.resolve_type = resolve_type
+        self.base_offset_list = list(base_offset_map.items())
+        self.source_file_table = fb.current_source_file_table()
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == "loc":
+            _, file_index, rel_start_offset, rel_end_offset = pid
+            file_id, base_offset = self.base_offset_list[file_index]
+            return fb.SourceFileLoc(
+                self.source_file_table, file_id, base_offset + rel_start_offset, base_offset + rel_end_offset
+            )
+        elif kind == "top_level_ctx":
+            return self.top_level_ctx
+        elif kind == "builtin_root_ctx":
+            return typer.Context.builtin_root()
+        elif kind == "import":
+            return self.resolve_type(self.top_level_ctx.symbol_table[pid[1]].scheme.body)
+        elif kind == "int":
+            _, width_in_bits, is_signed = pid
+            return types.IntType.get(width_in_bits, is_signed)
+        elif kind == "float":
+            _, width_in_bits = pid
+            return types.FloatType.get(width_in_bits)
+        elif kind == "void":
+            return types.VoidType.singleton
+        else:
+            raise pickle.UnpicklingError(f"unknown persistent ID: {pid}")
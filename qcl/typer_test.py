@@ -0,0 +1,480 @@
+import contextlib
+import io
+import json
+import os
+import os.path
+import re
+import tempfile
+import unittest
+import unittest.mock
+
+from . import ast1
+from . import ast2
+from . import disk_cache
+from . import feedback as fb
+from . import panic
+from . import platform
+from . import qy_parser
+from . import session
+from . import typer
+from . import types
+from . import uf_typer
+
+
+repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+well_typed_source_text = """
+type Vec2 = (x: Float, y: Float);
+type Body = (pos: Vec2, vel: Vec2, mass: Float);
+
+const: Int {
+    MODE_A = 0;
+    MODE_B = 1 + pred!;
+};
+
+fn dot (a: Vec2, b: Vec2) -> Float = do {
+    a.x * b.x + a.y * b.y
+};
+fn step (body: Body, dt: Float) -> Body = do {
+    val pos = body.pos;
+    val vel = body.vel;
+    val moved = new Vec2(pos.x + vel.x * dt, pos.y + vel.y * dt);
+    new Body(moved, vel, body.mass)
+};
+fn sum (n: Int) -> Int = do {
+    val xs = new MutArray[Int, 4](7);
+    xs.ptr(1) := n;
+    val total = push mut 0;
+    val i = push mut 0;
+    while (*i < 4) do {
+        total := *total + xs.get(*i);
+        i := *i + 1;
+    };
+    *total
+};
+fn pick (c: Bool, a: Int, b: Int) -> Int = do {
+    if (c) { a } else { b }
+};
+pub fn main () -> Int = do {
+    val b = new Body(new Vec2(0.0f, 1.0f), new Vec2(1.0f, 0.0f), 2.0f);
+    val b2 = step(b, 0.5f);
+    val d = dot(b2.pos, b2.vel);
+    pick(d > 0.0f and d < 10.0f, sum(MODE_A), 0)
+};
+"""
+
+ill_typed_source_texts = {
+    "float widths": "fn f () -> Float = do { 1.0 };",
+    "undefined value": "fn f () -> Int = do { g(1) };",
+    "constructor arity": "type P = (x: Int, y: Int);\nfn f () -> P = do { new P(1) };",
+    "non-composite field": "fn f (p: Int) -> Int = do { p.y };",
+    "call arity": "fn f (x: Int) -> Int = do { x };\nfn g () -> Int = do { f(1, 2) };",
+}
+
+
+def describe_types(qyp_set: ast2.QypSet):
+    """
+    Returns the types of every typed AST node and every definition in the typed package set, as strings in which
+    variables are numbered in order of appearance and anonymous struct IDs are omitted, so that dumps from separate
+    compilations can be compared.
+    """
+    var_number_map = {}
+
+    def describe(t):
+        text = re.sub(r"\b(struct|union)#[0-9a-f]+\{", r"\1{", str(t))
+        return re.sub(
+            r"'([^'#]*)#([0-9a-f]+)",
+            lambda match: f"'{match[1]}#{var_number_map.setdefault(match[2], len(var_number_map))}",
+            text
+        )
+
+    node_lines = []
+    for _, _, source_file in qyp_set.iter_src_paths():
+        for node in ast1.iter_subtree_nodes(source_file.stmt_list):
+            if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None:
+                node_lines.append(f"{node.__class__.__name__} @ {node.loc}: {describe(node.wb_type)}")
+
+    def_lines = []
+    ctx_stack = [qyp_set.wb_root_ctx]
+    while ctx_stack:
+        ctx = ctx_stack.pop()
+        for name, definition in ctx.symbol_table.items():
+            def_lines.append(f"{ctx.kind.name}: {name}: {describe(definition.scheme.body)}")
+        ctx_stack.extend(reversed(ctx.children))
+
+    return node_lines, def_lines
+
+
+class PackageSetTestMixin(object):
+    """
+    Mixed into test cases (before `unittest.TestCase`) that write packages into a temporary directory, and load and
+    type them like the compiler would.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # `qsl_qyp_dep_path` is found relative to 'qc.py', which is not running.
+        self.old_qsl_qyp_dep_path = ast2.qsl_qyp_dep_path
+        ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        ast2.qsl_qyp_dep_path = self.old_qsl_qyp_dep_path
+        self.temp_dir.cleanup()
+        super().tearDown()
+
+    def write_package(self, name, source_text):
+        package_dir_path = os.path.join(self.temp_dir.name, name)
+        os.mkdir(package_dir_path)
+        with open(os.path.join(package_dir_path, f"{name}.qy"), "w") as source_file:
+            source_file.write(source_text)
+        qyp_path = os.path.join(package_dir_path, f"{name}.qyp.jsonc")
+        with open(qyp_path, "w") as qyp_file:
+            json.dump({"author": "test", "help": name, "src": [f"./{name}.qy"], "deps": []}, qyp_file)
+        return qyp_path
+
+    def type_with_engine(self, root_qyp_path, engine):
+        """
+        Loads and types a package set from scratch, as if from a fresh compiler: returns the type dump and the exit
+        code of the compiler's panic, if any.
+        """
+        with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+                typer.type_one_qyp_set(qyp_set, engine)
+            except panic.PanicException as exc:
+                return None, exc.exit_code
+            return describe_types(qyp_set), None
+
+
+class TestTyperEngines(PackageSetTestMixin, unittest.TestCase):
+    def assert_engines_agree(self, root_qyp_path):
+        """
+        Checks that both engines fail with the same exit code, or infer exactly the same types.
+        """
+        expected_dump, expected_exit_code = self.type_with_engine(root_qyp_path, typer.TyperEngine.Substitution)
+        dump, exit_code = self.type_with_engine(root_qyp_path, typer.TyperEngine.UnionFind)
+        self.assertEqual((dump, exit_code), (expected_dump, expected_exit_code))
+        return dump, exit_code
+
+    def test_engines_agree_on_examples(self):
+        for root_qyp_path in [
+            os.path.join(repo_dir_path, "eg", "debug", "sandbox.qyp.jsonc"),
+            os.path.join(repo_dir_path, "eg", "debug", "sandbox-ss1.qyp.jsonc"),
+            self.write_package("well_typed", well_typed_source_text),
+        ]:
+            with self.subTest(root_qyp_path=root_qyp_path):
+                dump, exit_code = self.assert_engines_agree(root_qyp_path)
+                self.assertIsNone(exit_code)
+
+                # every type is solved:
+                node_lines, def_lines = dump
+                self.assertTrue(node_lines)
+                self.assertFalse([line for line in node_lines + def_lines if "'" in line])
+
+    def test_engines_agree_on_errors(self):
+        for name, source_text in ill_typed_source_texts.items():
+            with self.subTest(name=name):
+                _, exit_code = self.assert_engines_agree(self.write_package(name.replace(" ", "_"), source_text))
+                self.assertIsNotNone(exit_code)
+
+        for example_name in ["qsltest1", "sandbox-ss7"]:
+            with self.subTest(name=example_name):
+                _, exit_code = self.assert_engines_agree(
+                    os.path.join(repo_dir_path, "eg", "debug", f"{example_name}.qyp.jsonc")
+                )
+                self.assertIsNotNone(exit_code)
+
+
+    def test_if_without_else_is_solved(self):
+        # the 'cond' and 'then' branch of an `if` without an `else` are solved like any other expression, so the
+        # results of both operators below are not left as variables.
+        root_qyp_path = self.write_package(
+            "if_without_else",
+            "fn f (n: Int) -> Void = do { if (n > 0) { val m = n - 1; }; };\n"
+        )
+        (node_lines, _), exit_code = self.assert_engines_agree(root_qyp_path)
+        self.assertIsNone(exit_code)
+        self.assertEqual(
+            [line.split(": ")[-1] for line in node_lines if line.startswith("BinaryOpExpression")],
+            ["I32", "Bool"]
+        )
+
+
+class TestDefinitionOrder(PackageSetTestMixin, unittest.TestCase):
+    def test_find_sccs(self):
+        # 0 -> 1 <-> 2 -> 3, 4 -> 4
+        scc_list = typer.find_sccs([[1], [2], [1, 3], [], [4]])
+        self.assertEqual(list(map(sorted, scc_list)), [[3], [1, 2], [0], [4]])
+
+        # a long chain, deeper than Python's default recursion limit:
+        chain_length = 3000
+        scc_list = typer.find_sccs([[i + 1] for i in range(chain_length - 1)] + [[]])
+        self.assertEqual(scc_list, [[i] for i in reversed(range(chain_length))])
+
+    def test_definitions_are_modelled_after_their_dependencies(self):
+        source_text = (
+            "fn is_even (n: Int) -> Bool = do { if (n == 0) { 1 == 1 } else { is_odd(n - 1) } };\n"
+            "fn is_odd (n: Int) -> Bool = do { if (n == 0) { 1 == 0 } else { is_even(n - 1) } };\n"
+            "fn area (r: Rect) -> Int = do { r.w * r.h };\n"
+            "type Rect = (w: Int, h: Int);\n"
+            "fn main () -> Int = do { if (is_even(LIMIT)) { area(new Rect(1, 2)) } else { 0 } };\n"
+            "const: Int { LIMIT = 10; };\n"
+        )
+        root_qyp_path = self.write_package("order", source_text)
+        with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()):
+            qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+        stmt_names = [
+            stmt.body[0].name if isinstance(stmt, ast1.ConstStatement) else stmt.name
+            for _, stmt in typer.order_top_level_stmts(qyp_set)
+            if stmt.loc.file_path.endswith("order.qy")
+        ]
+        self.assertEqual(stmt_names, ["is_even", "is_odd", "Rect", "area", "LIMIT", "main"])
+
+
+    def test_errors_are_reported_in_source_order(self):
+        # in each case, 'second' is modelled first, since 'first' depends on it.
+        error_cases = {
+            "undefined": (
+                "fn first () -> Int = do { second() + missing_in_first };\n"
+                "fn second () -> Int = do { missing_in_second };\n",
+                panic.ExitCode.TyperModelerUndefinedIdError,
+                "missing_in_first"
+            ),
+            "unification": (
+                "fn first () -> Int = do { second() + 1.0 };\n"
+                "fn second () -> Int = do { 1.0f };\n",
+                panic.ExitCode.TyperUnificationError,
+                "F64"
+            ),
+            "undefined_after_unification": (
+                "fn first () -> Int = do { second() + 1.0 };\n"
+                "fn second () -> Int = do { missing_in_second };\n",
+                panic.ExitCode.TyperUnificationError,
+                "F64"
+            ),
+        }
+        for name, (source_text, expected_exit_code, expected_text) in error_cases.items():
+            root_qyp_path = self.write_package(name, source_text)
+            for engine in typer.TyperEngine:
+                with self.subTest(name=name, engine=engine):
+                    stderr_buffer = io.StringIO()
+                    with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()):
+                        qyp_set = ast2.QypSet.load(
+                            root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions()
+                        )
+                        with contextlib.redirect_stderr(stderr_buffer), \
+                                self.assertRaises(panic.PanicException) as caught:
+                            typer.type_one_qyp_set(qyp_set, engine)
+                    self.assertEqual(caught.exception.exit_code, expected_exit_code)
+                    self.assertIn(expected_text, stderr_buffer.getvalue())
+                    self.assertEqual(stderr_buffer.getvalue().count("PANIC"), 1)
+
+
+class TestTypedSccCache(PackageSetTestMixin, unittest.TestCase):
+    source_text = (
+        "type Num = Int;\n"
+        "fn twice (x: Num) -> Num = do { x + x };\n"
+        "fn quad (x: Num) -> Num = do { twice(twice(x)) };\n"
+        "type Vec2 = (x: Float, y: Float);\n"
+        "fn dot (a: Vec2, b: Vec2) -> Float = do { a.x * b.x + a.y * b.y };\n"
+        "const: Int { LIMIT = 10; };\n"
+        "pub fn main () -> Int = do { val d = dot(new Vec2(1.0f, 0.0f), new Vec2(0.5f, 2.0f)); LIMIT };\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.scc_cache = disk_cache.DiskCache(self.temp_dir.name, "typed_sccs")
+
+    def type_with_cache(self, root_qyp_path, engine):
+        """
+        Like `type_with_engine`, but with the typed SCC cache: returns the type dump and the names of
+        the package's modelled top-level statements.
+        """
+        with unittest.mock.patch.object(
+            typer, "model_one_top_level_stmt", wraps=typer.model_one_top_level_stmt
+        ) as model_one_top_level_stmt:
+            with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()):
+                qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+                typer.type_one_qyp_set(qyp_set, engine, self.scc_cache)
+                dump = describe_types(qyp_set)
+        modelled_names = [
+            stmt.body[0].name if isinstance(stmt, ast1.ConstStatement) else stmt.name
+            for call in model_one_top_level_stmt.call_args_list
+            for stmt in [call.args[1]]
+            if stmt.loc.file_path.endswith("incremental.qy")
+        ]
+        return dump, modelled_names
+
+    def test_only_changed_definitions_are_modelled(self):
+        root_qyp_path = self.write_package("incremental", self.source_text)
+        source_file_path = os.path.join(os.path.dirname(root_qyp_path), "incremental.qy")
+        edited_source_text = "// moved\n" + self.source_text.replace("a.y * b.y", "a.y * b.x")
+        edits = [
+            # nothing changed: only 'const' blocks are modelled, since they are never cached.
+            (self.source_text, ["LIMIT"]),
+            # a changed body, and every definition moved by a new line: the interface of 'dot' is unchanged.
+            (edited_source_text, ["dot", "LIMIT"]),
+            # a changed type: every definition depending on its solved type is modelled again.
+            (
+                edited_source_text.replace("type Num = Int;", "type Num = Long;"),
+                ["Num", "twice", "quad", "LIMIT"]
+            ),
+        ]
+        for engine in typer.TyperEngine:
+            with open(source_file_path, "w") as source_file:
+                source_file.write(self.source_text)
+            _, modelled_names = self.type_with_cache(root_qyp_path, engine)
+            self.assertEqual(modelled_names, ["Num", "twice", "quad", "Vec2", "dot", "LIMIT", "main"])
+
+            for source_text, expected_modelled_names in edits:
+                with self.subTest(engine=engine, source_text=source_text):
+                    with open(source_file_path, "w") as source_file:
+                        source_file.write(source_text)
+                    expected_dump, _ = self.type_with_engine(root_qyp_path, engine)
+                    dump, modelled_names = self.type_with_cache(root_qyp_path, engine)
+                    self.assertEqual(modelled_names, expected_modelled_names)
+                    self.assertEqual(dump[0], expected_dump[0])
+                    self.assertEqual(sorted(dump[1]), sorted(expected_dump[1]))
+
+    def test_restoring_leaves_shared_atomic_types_alone(self):
+        root_qyp_path = self.write_package("incremental", self.source_text)
+        i32 = types.IntType.get(32, is_signed=True)
+        for engine in typer.TyperEngine:
+            with self.subTest(engine=engine):
+                for is_restored in [False, True]:
+                    with session.CompilationSession(), contextlib.redirect_stdout(io.StringIO()):
+                        qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+                        # translating C headers (cf `c_parser`) sets `is_mut` on atomic types:
+                        loaded_is_mut = i32.is_mut
+                        if not is_restored:
+                            i32.is_mut = not loaded_is_mut
+                        typer.type_one_qyp_set(qyp_set, engine, self.scc_cache)
+                        if is_restored:
+                            self.assertEqual(i32.is_mut, loaded_is_mut)
+                        i32.is_mut = loaded_is_mut
+
+
+class TestDeepTypes(unittest.TestCase):
+    # deeper than Python's default recursion limit:
+    depth = 3000
+
+    def make_nested_pointer_type(self, innermost_type):
+        t = innermost_type
+        for _ in range(self.depth):
+            t = types.PointerType.new(types.StructType([("p", t)]), is_mut=False)
+        return t
+
+    def test_unify_and_rewrite_deep_types(self):
+        int_type = types.IntType.get(32, is_signed=True)
+        var = types.VarType("v")
+        var_type = self.make_nested_pointer_type(var)
+        int_ptr_type = types.PointerType.new(int_type, is_mut=False)
+        concrete_type = self.make_nested_pointer_type(int_ptr_type)
+        self.assertEqual(var_type.oc_free_vars, {var})
+        self.assertEqual(list(var_type.iter_free_vars()), [var])
+
+        sub = typer.unify(var_type, concrete_type)
+        self.assertIs(sub.sub_map[var], int_ptr_type)
+        rewritten_type = sub.rewrite_type(var_type)
+        self.assertFalse(rewritten_type.oc_free_vars)
+
+        store = uf_typer.TypeVarStore()
+        store.unify(var_type, concrete_type)
+        self.assertIs(store.find(var), int_ptr_type)
+        self.assertFalse(store.rewrite_type(var_type).oc_free_vars)
+
+    def test_unify_wide_procedure_types(self):
+        int_type = types.IntType.get(32, is_signed=True)
+        var_list = [types.VarType(f"v{i}") for i in range(self.depth)]
+        var_proc_type = types.ProcedureType.new(var_list, var_list[0])
+        int_proc_type = types.ProcedureType.new([int_type] * self.depth, int_type)
+
+        sub = typer.unify(var_proc_type, int_proc_type)
+        self.assertIs(sub.rewrite_type(var_proc_type), int_proc_type)
+
+        store = uf_typer.TypeVarStore()
+        store.unify(var_proc_type, int_proc_type)
+        self.assertIs(store.rewrite_type(var_proc_type), int_proc_type)
+
+
+class TestTypeVarStore(unittest.TestCase):
+    def test_find_compresses_paths(self):
+        store = uf_typer.TypeVarStore()
+        var_list = [types.VarType(f"v{i}") for i in range(5)]
+        # binding each variable to the previous (older) one, newest first, so the bindings form one long path:
+        for older_var, newer_var in reversed(list(zip(var_list, var_list[1:]))):
+            store.unify(newer_var, older_var)
+        int_type = types.IntType.get(32, is_signed=True)
+        store.unify(var_list[0], int_type)
+        self.assertIs(store.binding_map[var_list[-1]], var_list[-2])
+
+        self.assertIs(store.find(var_list[-1]), int_type)
+        self.assertTrue(all(store.binding_map[var] is int_type for var in var_list))
+
+    def test_rewrite_type_resolves_nested_vars(self):
+        store = uf_typer.TypeVarStore()
+        element_var = types.VarType("element")
+        pointer_var = types.VarType("pointer")
+        proc_type = types.ProcedureType.new([types.PointerType.new(element_var, is_mut=True)], pointer_var)
+        store.unify(pointer_var, types.PointerType.new(element_var, is_mut=False))
+        store.unify(element_var, types.FloatType.get(64))
+
+        self.assertEqual(str(store.rewrite_type(proc_type)), "(MutPtr[F64])->Ptr[F64]")
+        self.assertIs(store.rewrite_type(types.FloatType.get(32)), types.FloatType.get(32))
+
+    def test_occurs_check(self):
+        store = uf_typer.TypeVarStore()
+        var = types.VarType("v")
+        other_var = types.VarType("w")
+        store.unify(other_var, types.PointerType.new(var, is_mut=False))
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(panic.PanicException) as cm:
+                store.unify(var, types.ArrayBoxType.new(other_var, is_mut=False))
+        self.assertEqual(cm.exception.exit_code, panic.ExitCode.TyperUnificationError)
+
+
+    def test_roll_back_undoes_bindings_and_path_compression(self):
+        store = uf_typer.TypeVarStore()
+        var_list = [types.VarType(f"v{i}") for i in range(3)]
+        int_type = types.IntType.get(32, is_signed=True)
+        store.unify(var_list[1], var_list[0])
+        store.commit()
+        pointer_type = types.PointerType.new(var_list[1], is_mut=False)
+        self.assertIs(store.rewrite_type(pointer_type).pointee_type, var_list[0])
+
+        # binding the path's end, then compressing the path through it:
+        store.unify(var_list[0], var_list[2])
+        store.unify(var_list[2], int_type)
+        self.assertIs(store.find(var_list[1]), int_type)
+        self.assertIs(store.rewrite_type(pointer_type).pointee_type, int_type)
+
+        store.roll_back()
+        self.assertEqual(store.binding_map, {var_list[1]: var_list[0]})
+        self.assertIs(store.rewrite_type(pointer_type).pointee_type, var_list[0])
+
+
+class TestConstraintSinks(unittest.TestCase):
+    def test_drop_top_level_stmt_forgets_dtos_and_contexts(self):
+        for sink_class in [typer.SubstitutionSink, uf_typer.UnionFindSink]:
+            with self.subTest(sink_class=sink_class), session.CompilationSession():
+                sink = sink_class()
+                top_level_ctx = typer.Context(typer.ContextKind.TopLevelOfQypSet, typer.Context.builtin_root())
+                loc = fb.BuiltinLoc("test")
+
+                # a statement that ends, then one that fails, each leaving a DTO pending and creating a context:
+                for is_dropped in [False, True]:
+                    sink.begin_top_level_stmt(top_level_ctx)
+                    sink.add_dto(typer.DotIdDTO(loc, types.VarType("container"), types.VarType("field"), "x"))
+                    typer.Context(typer.ContextKind.FunctionArgs, top_level_ctx)
+                    if is_dropped:
+                        sink.drop_top_level_stmt()
+                    else:
+                        sink.end_top_level_stmt()
+
+                self.assertEqual(sink.pending_dto_count(), 1)
+                self.assertEqual(len(top_level_ctx.children), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 """
 Types
 - nominal type system (i.e. t1 == t2 <=> id(t1) == id(t2))
+- anonymous structural types (pointers, procedures, arrays, array-boxes) and unique values are hash-consed, so equal
+  types are the same instance within a compilation session: cf `BaseStructuralType.get`, `session`
 """
 
 import abc
@@ -10,6 +12,7 @@ import math
 import typing as t
 
 from . import feedback as fb
+from . import session
 
 
 #
@@ -32,12 +35,9 @@ class TypeKind(enum.Enum):
 
 
 class BaseType(object, metaclass=abc.ABCMeta):
-    id_counter = 0
-
     def __init__(self) -> None:
         super().__init__()
-        self.id = BaseType.id_counter
-        BaseType.id_counter += 1
+        self.id = session.current().next_type_id()
         
         # common type properties:
         self.is_mut = False
@@ -45,6 +45,12 @@ class BaseType(object, metaclass=abc.ABCMeta):
         # optimization cache: computed and cached properties
         self.oc_free_vars = None
 
+    def __setstate__(self, state):
+        # types restored by `pickle` (e.g. from the C header cache) are distinct from all other types, so they need
+        # fresh IDs.
+        self.__dict__.update(state)
+        self.id = session.current().next_type_id()
+
     def init_optimization_cache(self):
         self.oc_free_vars = set(self.iter_free_vars())
     
@@ -243,41 +249,95 @@ class BaseCompositeType(BaseConcreteType):
         self.init_optimization_cache()
 
     def copy_with_elements(self, new_elements: t.List[BaseType]) -> "BaseCompositeType":
-        # constructing a base type with the same fields:
-        copy = self.__class__(new_elements)
-
         # copying details:
-        if isinstance(copy, ProcedureType):
-            assert isinstance(self, ProcedureType)
-            copy.has_closure_slot = self.has_closure_slot
-            copy.is_c_variadic = self.is_c_variadic
-        elif isinstance(copy, PointerType):
-            assert isinstance(self, PointerType)
-            copy.contents_is_mut = self.contents_is_mut
+        if isinstance(self, ProcedureType):
+            attrs = {"has_closure_slot": self.has_closure_slot, "is_c_variadic": self.is_c_variadic}
+        elif isinstance(self, PointerType):
+            attrs = {"contents_is_mut": self.contents_is_mut}
         else:
-            pass
+            attrs = {}
 
-        return copy
+        # constructing a type of the same class with the same details:
+        if isinstance(self, BaseStructuralType):
+            return self.__class__.get(new_elements, **attrs)
+        else:
+            return self.__class__(new_elements, **attrs)
 
     @classmethod
     def has_user_defined_field_names(cls) -> bool:
         return False
 
-    def iter_free_vars(self):
-        for field_type in self.field_types:
-            yield from field_type.iter_free_vars()
-    
-    def __hash__(self) -> int:
-        return hash((self.kind().value, *self.field_types))
+    def init_optimization_cache(self):
+        # fields are always constructed first, so their free variables are already known.
+        self.oc_free_vars = set().union(*(field_type.oc_free_vars for field_type in self.field_types))
 
-    def __eq__(self, o: object) -> bool:
-        return self.kind == o.kind and self.fields == o.fields
+    def iter_free_vars(self):
+        # depth-first, with an explicit stack rather than recursion, so that deeply nested types cannot exhaust
+        # Python's stack.
+        visited_type_ids = set()
+        stack = [self]
+        while stack:
+            t = stack.pop()
+            if t.is_var:
+                if id(t) not in visited_type_ids:
+                    visited_type_ids.add(id(t))
+                    yield t
+            elif t.is_composite and t.oc_free_vars and id(t) not in visited_type_ids:
+                visited_type_ids.add(id(t))
+                stack.extend(reversed(t.field_types))
 
     def constructor_arg_type_tuple(self):
         return (self,)
 
 
-class PointerType(BaseCompositeType):
+class BaseStructuralType(BaseCompositeType):
+    """
+    Anonymous composite types, identified by their fields and attributes alone.
+    These are hash-consed: constructed only by `get`, which returns the existing instance for equal types, so they are
+    compared and hashed by identity (like every other type), and must never be modified in place.
+    """
+
+    # the attributes (besides `is_mut`) that identify a type along with its fields: must be `__init__` arguments.
+    attr_names: t.Tuple[str, ...] = ("contents_is_mut",)
+
+    @classmethod
+    def get(cls, fields: t.List[t.Tuple[t.Optional[str], BaseType]], is_mut: bool = False, **attrs):
+        return intern_structural_type(cls, fields, is_mut, tuple(attrs.get(name) for name in cls.attr_names))
+
+    def __reduce__(self):
+        # types restored by `pickle` are interned again, so they are still shared.
+        attr_values = tuple(getattr(self, name) for name in self.attr_names)
+        return intern_structural_type, (self.__class__, self.fields, self.is_mut, attr_values)
+
+    def with_is_mut(self, is_mut: bool) -> "BaseStructuralType":
+        attr_values = tuple(getattr(self, name) for name in self.attr_names)
+        return intern_structural_type(self.__class__, self.fields, is_mut, attr_values)
+
+
+def intern_structural_type(
+    cls: t.Type[BaseStructuralType],
+    fields: t.List[t.Tuple[t.Optional[str], BaseType]],
+    is_mut: bool,
+    attr_values: t.Tuple[object, ...]
+) -> BaseStructuralType:
+    # NOTE: a key refers to field types by ID, which is safe since an interned type keeps its fields alive.
+    key = (
+        cls, is_mut, attr_values,
+        *(field_name for field_name, _ in fields),
+        *(id(field_type) for _, field_type in fields)
+    )
+    intern_table = session.current().structural_type_intern_table
+    opt_interned_type = intern_table.get(key, None)
+    if opt_interned_type is not None:
+        return opt_interned_type
+    else:
+        new_interned_type = cls(list(fields), **dict(zip(cls.attr_names, attr_values)))
+        new_interned_type.is_mut = is_mut
+        intern_table[key] = new_interned_type
+        return new_interned_type
+
+
+class PointerType(BaseStructuralType):
     @property
     def pointee_type(self) -> "BaseType":
         return self.field_types[0]
@@ -288,14 +348,16 @@ class PointerType(BaseCompositeType):
 
     @staticmethod
     def new(pointee_type: BaseConcreteType, is_mut: bool):
-        return PointerType([('pointee', pointee_type)], contents_is_mut=is_mut)
+        return PointerType.get([('pointee', pointee_type)], contents_is_mut=is_mut)
 
     @classmethod
     def kind(cls):
         return TypeKind.Pointer
 
 
-class ProcedureType(BaseCompositeType):
+class ProcedureType(BaseStructuralType):
+    attr_names = ("contents_is_mut", "has_closure_slot", "is_c_variadic")
+
     def __init__(self, fields: t.List[t.Tuple[str, BaseType]], opt_name=None, has_closure_slot=None, is_c_variadic=None, contents_is_mut=None) -> None:
         super().__init__(fields, opt_name=opt_name, contents_is_mut=contents_is_mut)
         self.has_closure_slot = has_closure_slot
@@ -332,7 +394,7 @@ class ProcedureType(BaseCompositeType):
         has_closure_slot: bool = False,
         is_c_variadic: bool = False
     ) -> "ProcedureType":
-        pt = ProcedureType(
+        pt = ProcedureType.get(
             [('ret_type', ret_type)] +
             [(f'arg.{i}', arg_type) for i, arg_type in enumerate(arg_types)],
             has_closure_slot=has_closure_slot,
@@ -350,6 +412,12 @@ class BaseAlgebraicType(BaseCompositeType):
     def prefix(cls):
         pass
 
+    def __hash__(self) -> int:
+        return hash((self.kind().value, *self.field_types))
+
+    def __eq__(self, o: object) -> bool:
+        return self.kind == o.kind and self.fields == o.fields
+
     @classmethod
     def has_user_defined_field_names(cls) -> bool:
         return True
@@ -384,7 +452,7 @@ class UnionType(BaseAlgebraicType):
         return TypeKind.Union
 
 
-class ArrayType(BaseCompositeType):
+class ArrayType(BaseStructuralType):
     @property
     def element_type(self) -> "BaseType":
         return self.field_types[0]
@@ -404,7 +472,7 @@ class ArrayType(BaseCompositeType):
     @staticmethod
     def new(element_type: BaseConcreteType, count_value_encoding: "UniqueValueType", is_mut: bool):
         assert isinstance(count_value_encoding, UniqueValueType) and isinstance(count_value_encoding.unique_value, int)
-        return ArrayType([('element_type', element_type), ('encoded_count', count_value_encoding)], contents_is_mut=is_mut)
+        return ArrayType.get([('element_type', element_type), ('encoded_count', count_value_encoding)], contents_is_mut=is_mut)
 
     @classmethod
     def kind(cls):
@@ -414,7 +482,7 @@ class ArrayType(BaseCompositeType):
         return (self.element_type,)
 
 
-class ArrayBoxType(BaseCompositeType):
+class ArrayBoxType(BaseStructuralType):
     @property
     def element_type(self) -> "BaseType":
         return self.field_types[0]
@@ -425,7 +493,7 @@ class ArrayBoxType(BaseCompositeType):
 
     @staticmethod
     def new(element_type: BaseConcreteType, is_mut: bool):
-        return ArrayBoxType([('element_type', element_type)], contents_is_mut=is_mut)
+        return ArrayBoxType.get([('element_type', element_type)], contents_is_mut=is_mut)
 
     @classmethod
     def kind(cls):
@@ -437,15 +505,31 @@ class ArrayBoxType(BaseCompositeType):
 
 class UniqueValueType(BaseType):
     def __init__(self, unique_value: object):
+        """
+        Do not invoke this constructor directly.
+        """
+
         super().__init__()
         self.unique_value = unique_value
+        self.init_optimization_cache()
 
-    def __eq__(self, o: object) -> bool:
-        return isinstance(o, UniqueValueType) and self.value == o.value
+    def __reduce__(self):
+        # like structural types, unique values restored by `pickle` are interned again.
+        return UniqueValueType.get, (self.unique_value,)
+
+    @staticmethod
+    def get(unique_value: object) -> "UniqueValueType":
+        # NOTE: keyed by type too, since e.g. `1 == 1.0 == True`.
+        key = (type(unique_value), unique_value)
+        cache = session.current().unique_value_type_cache
+        opt_cached_type = cache.get(key, None)
+        if opt_cached_type is not None:
+            return opt_cached_type
+        else:
+            new_cached_type = UniqueValueType(unique_value)
+            cache[key] = new_cached_type
+            return new_cached_type
 
-    def __hash__(self) -> int:
-        return hash(self.unique_value)
-    
     def __str__(self) -> str:
         return str(self.unique_value)
 
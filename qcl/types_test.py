@@ -1,4 +1,5 @@
 from . import types
+import pickle
 import unittest
 
 
@@ -59,4 +60,38 @@ class TestTypes(unittest.TestCase):
         for width_in_bits, float_t in t_map.items():
             check_caching_ok(width_in_bits, float_t)
 
+    def test_structural_types_are_interned(self):
+        i32 = types.IntType.get(32, is_signed=True)
+        var = types.VarType("v")
+        struct_t = types.StructType([("x", i32)])
+        twin_struct_t = types.StructType([("x", i32)])
+
+        def make_type_list(struct_t):
+            return [
+                types.PointerType.new(var, is_mut=True),
+                types.PointerType.new(struct_t, is_mut=False),
+                types.ProcedureType.new([i32, var], types.VoidType.singleton),
+                types.ProcedureType.new([i32, var], types.VoidType.singleton, has_closure_slot=True),
+                types.ArrayType.new(i32, types.UniqueValueType.get(4), is_mut=False),
+                types.ArrayBoxType.new(var, is_mut=True),
+            ]
+
+        # equal types are the same instance, and differ by any field or attribute:
+        t_list = make_type_list(struct_t)
+        for t, fresh_t in zip(t_list, make_type_list(struct_t)):
+            self.assertIs(fresh_t, t)
+        self.assertEqual(len(set(map(id, t_list))), len(t_list))
+
+        # ... except for nominal types, which are never merged:
+        self.assertIsNot(types.PointerType.new(twin_struct_t, is_mut=False), t_list[1])
+
+        # copies are interned too, and so are types restored by `pickle`:
+        pointer_t = t_list[0]
+        self.assertIs(pointer_t.copy_with_elements([("pointee", var)]), pointer_t)
+        self.assertIsNot(pointer_t.with_is_mut(True), pointer_t)
+        self.assertIs(pointer_t.with_is_mut(True), pointer_t.with_is_mut(True))
+        restored_var, restored_pointer_t = pickle.loads(pickle.dumps((var, pointer_t)))
+        self.assertIs(restored_pointer_t, types.PointerType.new(restored_var, is_mut=True))
+        self.assertIs(pickle.loads(pickle.dumps(types.UniqueValueType.get(4))), types.UniqueValueType.get(4))
+
     # TODO: test more kinds of types.
@@ -0,0 +1,334 @@
+"""
+`uf_typer` is an alternative engine for `typer` (cf `typer.TyperEngine.UnionFind`) that solves type variables with a
+mutable union-find store instead of by composing `typer.Substitution`s.
+Unifying two types binds variables in place, so no substitution is ever built, composed, or applied to every
+context, DTO, and AST node after each top-level statement: instead, bindings are followed lazily (with path
+compression) whenever a type is inspected, and every context and AST node is resolved once, after all constraints
+are solved.
+It shares `typer`'s contexts, definitions, seeding, modelling, DTOs, and error messages, and only solves the
+constraints they find differently (cf `UnionFindSink`), so both engines infer the same types.
+"""
+
+import typing as t
+
+from . import panic
+from . import feedback as fb
+from . import types
+from . import ast1
+from . import ast2
+from . import disk_cache
+from . import typer
+
+
+def type_one_qyp_set(qyp_set: ast2.QypSet, opt_typed_scc_cache: t.Optional[disk_cache.DiskCache] = None):
+    sink = UnionFindSink()
+    store = sink.store
+    new_ctx = typer.Context(typer.ContextKind.TopLevelOfQypSet, typer.Context.builtin_root())
+
+    for _, _, source_file in qyp_set.iter_src_paths():
+        typer.seed_one_source_file(source_file, new_ctx)
+
+    opt_scc_cache = None
+    if opt_typed_scc_cache is not None:
+        # NOTE: imported here since `typer_cache` is built on this module.
+        from . import typer_cache
+        opt_scc_cache = typer_cache.TypedSccCache(
+            opt_typed_scc_cache, qyp_set, new_ctx, typer.TyperEngine.UnionFind, store.rewrite_type
+        )
+
+    error_log = typer.ErrorLog(qyp_set)
+    typer.model_top_level_sccs(qyp_set, sink, error_log, opt_scc_cache)
+    sink.solve(error_log)
+
+    # writing back solved types: the store rewrites types like a substitution mapping each bound variable to its
+    # solution.
+    typer.Context.apply_sub_everywhere(store)
+    ast1.WbTypeMixin.apply_sub_everywhere(store)
+
+    if opt_scc_cache is not None:
+        opt_scc_cache.save()
+
+    qyp_set.wb_root_ctx = new_ctx
+
+
+#
+# Type variable store:
+#
+
+class TypeVarStore(object):
+    """
+    Maps each bound type variable to the type it was unified with (possibly another variable).
+    Can rewrite types and schemes like a `typer.Substitution` that maps each bound variable to its solution.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.binding_map: t.Dict[types.VarType, types.BaseType] = {}
+
+        # hash-consed types rewritten by `rewrite_type`, mapped to their last rewritten form: since variables are only
+        # ever bound, never unbound, this form can only need further rewriting, never undoing.
+        self.rewrite_memo: t.Dict[types.BaseStructuralType, types.BaseType] = {}
+
+        # each variable bound or re-pointed since the last `commit`, with its previous binding (or `None` if it was
+        # unbound), so that `roll_back` can undo them.
+        self.undo_log: t.List[t.Tuple[types.VarType, t.Optional[types.BaseType]]] = []
+
+    @property
+    def oc_sub_map_keys(self) -> t.AbstractSet[types.VarType]:
+        # like `typer.Substitution.oc_sub_map_keys`: the variables rewritten by `rewrite_type`.
+        return self.binding_map.keys()
+
+    def find(self, t: types.BaseType) -> types.BaseType:
+        """
+        Returns the representative of `t`: either an unbound variable or a non-variable type (whose fields may still
+        contain bound variables).
+        """
+        if not t.is_var or t not in self.binding_map:
+            return t
+
+        rep = t
+        while rep.is_var and rep in self.binding_map:
+            rep = self.binding_map[rep]
+
+        # path compression: pointing every variable on the path directly at the representative
+        while t is not rep:
+            next_t = self.binding_map[t]
+            self.undo_log.append((t, next_t))
+            self.binding_map[t] = rep
+            t = next_t
+
+        return rep
+
+    def unify(self, t1: types.BaseType, t2: types.BaseType, opt_loc: t.Optional[fb.ILoc] = None):
+        """
+        Binds variables so that both types are identical once resolved, or raises a unification error.
+        Like `typer.unify`, pairs of fields are unified in order with an explicit stack rather than recursion.
+        """
+        stack = [(t1, t2)]
+        while stack:
+            t1, t2 = stack.pop()
+            t1 = self.find(t1)
+            t2 = self.find(t2)
+
+            if t1 == t2:
+                continue
+
+            # var -> anything else (including var)
+            if t1.is_var or t2.is_var:
+                if t1.is_var and t2.is_var:
+                    # like `typer.unify`, always replacing with the older variable.
+                    if t1.id > t2.id:
+                        var_type, replacement_type = t1, t2
+                    else:
+                        var_type, replacement_type = t2, t1
+                elif t1.is_var:
+                    var_type, replacement_type = t1, t2
+                else:
+                    var_type, replacement_type = t2, t1
+
+                if self.occurs(var_type, replacement_type):
+                    self.raise_unification_error(
+                        t1, t2,
+                        "occurs check failed: this is probably a compiler/language bug",
+                        opt_loc=opt_loc
+                    )
+
+                self.undo_log.append((var_type, None))
+                self.binding_map[var_type] = replacement_type
+
+            # composite types => just unify each field.
+            elif t1.kind() == t2.kind() and t1.is_composite:
+                if t1.has_user_defined_field_names():
+                    if t1.field_names != t2.field_names:
+                        self.raise_unification_error(t1, t2, opt_loc=opt_loc)
+                else:
+                    if len(t1.field_names) != len(t2.field_names):
+                        self.raise_unification_error(t1, t2, opt_loc=opt_loc)
+
+                if t1.kind() == types.TypeKind.Procedure:
+                    assert isinstance(t1, types.ProcedureType)
+                    assert isinstance(t2, types.ProcedureType)
+                    if t1.has_closure_slot != t2.has_closure_slot:
+                        self.raise_unification_error(
+                            t1, t2,
+                            opt_more=(
+                                "Cannot unify a procedure type with a closure slot with "
+                                "a procedure type without one"
+                            ),
+                            opt_loc=opt_loc
+                        )
+
+                stack.extend(reversed(list(zip(t1.field_types, t2.field_types))))
+
+            # any other case: raise a unification error.
+            else:
+                self.raise_unification_error(t1, t2, opt_loc=opt_loc)
+
+    def commit(self):
+        self.undo_log.clear()
+
+    def roll_back(self):
+        """
+        Undoes every binding made since the last `commit`.
+        """
+        if not self.undo_log:
+            return
+        for var, opt_old_binding in reversed(self.undo_log):
+            if opt_old_binding is None:
+                del self.binding_map[var]
+            else:
+                self.binding_map[var] = opt_old_binding
+        self.undo_log.clear()
+
+        # memoized forms may rely on undone bindings:
+        self.rewrite_memo.clear()
+
+    def occurs(self, var_type: types.VarType, t: types.BaseType) -> bool:
+        """
+        Returns whether `var_type` occurs in `t` once resolved.
+        """
+        # NOTE: `rewrite_type` is memoized, so checking a long chain of bound variables does not walk it every time.
+        return var_type in self.rewrite_type(t).oc_free_vars
+
+    def raise_unification_error(self, t1, t2, opt_more=None, opt_loc=None):
+        typer.raise_unification_error(self.rewrite_type(t1), self.rewrite_type(t2), opt_more, opt_loc)
+
+    def rewrite_type(self, t: types.BaseType) -> types.BaseType:
+        """
+        Returns `t` with every bound variable replaced by its solution, or `t` itself if none of its variables are
+        bound.
+        Like `typer.Substitution.rewrite_type`, composite types are copied rather than modified, bottom-up with an
+        explicit stack rather than recursion.
+        """
+        if self.is_resolved(t):
+            return t
+
+        # each type is rewritten from its representative `v`, or from the last rewritten form `w` of `v` if any:
+        rw_type_map: t.Dict[int, types.BaseType] = {}
+        rw_in_progress_type_ids: t.Set[int] = set()
+        stack: t.List[t.Tuple[types.BaseType, t.Optional[types.BaseType]]] = [(t, None)]
+        while stack:
+            v, opt_w = stack.pop()
+
+            if opt_w is not None:
+                rw_in_progress_type_ids.remove(id(v))
+                rv = opt_w.copy_with_elements([
+                    (field_name, rw_type_map[id(self.find(field_type))])
+                    for field_name, field_type in opt_w.fields
+                ])
+                if isinstance(v, types.BaseStructuralType):
+                    self.rewrite_memo[v] = rv
+                rw_type_map[id(v)] = rv
+                continue
+
+            v = self.find(v)
+            if id(v) in rw_type_map:
+                continue
+            w = self.rewrite_memo.get(v, v) if isinstance(v, types.BaseStructuralType) else v
+            if not w.is_composite or self.is_resolved(w):
+                rw_type_map[id(v)] = w
+                continue
+            if id(v) in rw_in_progress_type_ids:
+                raise typer.InfiniteSizeTypeException()
+
+            rw_in_progress_type_ids.add(id(v))
+            stack.append((v, w))
+            stack.extend((field_type, None) for field_type in w.field_types)
+
+        return rw_type_map[id(self.find(t))]
+
+    def is_resolved(self, t: types.BaseType) -> bool:
+        return not any(var in self.binding_map for var in t.oc_free_vars)
+
+    def rewrite_scheme(self, s: typer.Scheme) -> typer.Scheme:
+        # NOTE: a scheme's bound variables are never bound in the store: they are replaced by fresh variables on
+        # instantiation.
+        return typer.Scheme(s.vars, self.rewrite_type(s.body))
+
+
+#
+# Constraint sink:
+#
+
+class UnionFindSink(typer.BaseConstraintSink):
+    """
+    Solves the constraints found by `typer`'s modelling by binding variables in a `TypeVarStore`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.store = TypeVarStore()
+        self.dto_list = DTOList(self)
+
+    def unify(self, t1: types.BaseType, t2: types.BaseType, opt_loc: t.Optional[fb.ILoc] = None):
+        self.store.unify(t1, t2, opt_loc)
+
+    def add_dto(self, dto: typer.BaseDTO):
+        self.dto_list.add_dto(dto)
+
+    def rewrite_type(self, t: types.BaseType) -> types.BaseType:
+        return self.store.rewrite_type(t)
+
+    def end_top_level_stmt(self):
+        self.store.commit()
+
+    def roll_back(self, old_pending_dto_count: int):
+        self.store.roll_back()
+        del self.dto_list.internal_dto_list[old_pending_dto_count:]
+
+    def pending_dto_count(self) -> int:
+        return len(self.dto_list.internal_dto_list)
+
+    def solve(self, error_log: typer.ErrorLog):
+        self.dto_list.solve(error_log)
+
+
+#
+# Deferred resolution (solving):
+#
+
+class DTOList(object):
+    """
+    Like `typer.DTOList`, holds the DTOs that could not be solved yet: since nothing is told when variables are bound,
+    every pending DTO is retried until none can be solved.
+    """
+
+    def __init__(self, sink: UnionFindSink):
+        super().__init__()
+        self.sink = sink
+        self.internal_dto_list: t.List[typer.BaseDTO] = []
+
+    def add_dto(self, dto: typer.BaseDTO):
+        # before adding to the list, we first try solving immediately
+        if not self.solve_one_dto(dto):
+            self.internal_dto_list.append(dto)
+
+    def solve_one_dto(self, dto: typer.BaseDTO) -> bool:
+        # like DTOs rewritten by `typer.DTOList.update`, so solvers and error messages see solved types.
+        dto.rewrite_with_sub(self.sink)
+        return dto.increment_solution(self.sink)
+
+    def solve(self, error_log: typer.ErrorLog):
+        store = self.sink.store
+        while self.internal_dto_list:
+            old_dto_list = self.internal_dto_list
+            self.internal_dto_list = []
+            failed_count = 0
+            for dto in old_dto_list:
+                # like `typer.DTOList.solve`, each failed DTO is dropped, along with the bindings it made so far.
+                if error_log.try_run(dto.loc, self.add_dto, dto):
+                    store.commit()
+                else:
+                    store.roll_back()
+                    failed_count += 1
+
+            # ensuring solving hasn't stalled:
+            if len(self.internal_dto_list) + failed_count == len(old_dto_list):
+                error_log.report()
+                panic.because(
+                    panic.ExitCode.TyperDtoSolverStalledError,
+                    f"TYPER: DTOList solution stalled with {len(self.internal_dto_list)} constraints remaining:\n" +
+                    '\n'.join(map(str, self.internal_dto_list)) + "\n"
+                    "... HINT: This could be due to a syntax error OR insufficient type hints."
+                )
+        error_log.report()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Measures the memory retained by parsed `ast1` trees.
+
+Parses every Qy source file under 'eg/' and 'qsl/' (or the paths given on the command line), keeps the resulting
+trees alive, and uses `tracemalloc` to report how many bytes they retain in total, per AST node, and per byte of
+source text.
+Every file is parsed once before measuring, so that parser caches (e.g. ANTLR's DFA) are not counted.
+
+Usage (from the repository root):
+    $ python3 scripts/ast_memory.bench.py [--scale K] [--parse-mode MODE] [path ...]
+
+`--scale K` parses every file K times, so that small fixed costs do not dominate.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import panic
+from qcl import qy_parser
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root_paths = args.paths or [os.path.join(repo_dir_path, "eg"), os.path.join(repo_dir_path, "qsl")]
+    mode = {mode.name: mode for mode in qy_parser.ParseMode}[args.parse_mode]
+
+    # warming up parser caches, and filtering out files that do not parse:
+    file_paths = []
+    for file_path in sorted(find_qy_files(root_paths)):
+        if try_parse(file_path, mode) is not None:
+            file_paths.append(file_path)
+        else:
+            print(f"skip (syntax error): {os.path.relpath(file_path, repo_dir_path)}")
+    source_byte_count = args.scale * sum(os.path.getsize(file_path) for file_path in file_paths)
+
+    gc.collect()
+    node_count_before = count_ast_nodes()
+    tracemalloc.start()
+    start_bytes, _ = tracemalloc.get_traced_memory()
+
+    trees = [try_parse(file_path, mode) for _ in range(args.scale) for file_path in file_paths]
+    gc.collect()
+
+    end_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    node_count = count_ast_nodes() - node_count_before
+    retained_bytes = end_bytes - start_bytes
+
+    print(f"files: {len(file_paths)} x {args.scale}, source bytes: {source_byte_count}")
+    print(f"AST nodes:             {node_count}")
+    print(f"retained bytes:        {retained_bytes}")
+    print(f"bytes per AST node:    {retained_bytes / max(1, node_count):.1f}")
+    print(f"bytes per source byte: {retained_bytes / max(1, source_byte_count):.2f}")
+
+    del trees
+    return 0
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--scale", type=int, default=10)
+    arg_parser.add_argument(
+        "--parse-mode", default=qy_parser.ParseMode.SllThenLl.name,
+        choices=[mode.name for mode in qy_parser.ParseMode]
+    )
+    arg_parser.add_argument("paths", nargs="*")
+    return arg_parser.parse_args()
+
+
+def find_qy_files(root_paths):
+    for root_path in root_paths:
+        if os.path.isfile(root_path):
+            yield os.path.abspath(root_path)
+            continue
+        for dir_path, _, file_names in os.walk(root_path):
+            for file_name in file_names:
+                if file_name.endswith(".qy"):
+                    yield os.path.abspath(os.path.join(dir_path, file_name))
+
+
+def try_parse(file_path, mode):
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return qy_parser.parse_one_file_without_caching(file_path, mode)
+        except panic.PanicException:
+            return None
+
+
+def count_ast_nodes():
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, ast1.BaseFileNode))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
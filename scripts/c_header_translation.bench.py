@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Compares translating C headers to Qy with `c_parser`'s lean extraction mode against the full mode it replaced.
+
+The full mode parses each header with libclang's default options (so function bodies are parsed too) and translates
+every top-level cursor of the TU, including those of included files.
+The lean mode (`c_parser.parse_tu` and `c_parser.translate_tu`) skips function bodies, parses the header as an
+incomplete TU, only visits the header's own cursors, and stops once every provided symbol is found.
+Reports the time spent parsing and translating in both modes, and checks that both produce identical `ast1` trees.
+
+With no paths, benchmarks a generated single-header library (declarations, inline function bodies, and some
+standard headers included); real headers (e.g. a vendored single-header library, or 'sqlite3.h') can be given on the
+command line.
+Each header provides `--symbols K` functions, spread evenly over its own function declarations (the last one included,
+so stopping early only helps if some symbols cannot be translated), or the symbols given with `--provides`.
+
+Usage (from the repository root):
+    $ python3 scripts/c_header_translation.bench.py [--repeat N] [--symbols K | --provides SYM,...] [-D...] [header ...]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import c_parser
+from qcl import panic
+from qcl import session
+
+
+def main():
+    args = parse_args()
+    c_flags = [f"-D{macro}" for macro in args.defines]
+
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        header_paths = [os.path.abspath(path) for path in args.paths]
+        if not header_paths:
+            header_paths = [write_generated_header(scratch_dir_path, args.generated_size)]
+
+        all_same = True
+        for header_path in header_paths:
+            if args.provides:
+                provided_symbols = set(args.provides.split(","))
+            else:
+                provided_symbols = pick_provided_symbols(header_path, c_flags, args.symbols)
+            print(f"{header_path}: {os.path.getsize(header_path)} bytes, providing {len(provided_symbols)} symbol(s)")
+
+            dumps = []
+            for mode_name, parse, translate in [
+                ("full", parse_full, translate_full),
+                ("lean", c_parser.parse_tu, c_parser.translate_tu),
+            ]:
+                parse_time = 0.0
+                translate_time = 0.0
+                for _ in range(args.repeat):
+                    session.current().declaration_cache_map.clear()
+                    start_time = time.perf_counter()
+                    tu = parse(header_path, c_flags)
+                    parse_time += time.perf_counter() - start_time
+
+                    rem_provided_symbols = set(provided_symbols)
+                    start_time = time.perf_counter()
+                    stmt_list = translate(tu, header_path, rem_provided_symbols)
+                    translate_time += time.perf_counter() - start_time
+                    del tu
+
+                print(
+                    f"    {mode_name}: parse {1000 * parse_time / args.repeat:10.2f} ms, "
+                    f"translate {1000 * translate_time / args.repeat:10.2f} ms, "
+                    f"total {1000 * (parse_time + translate_time) / args.repeat:10.2f} ms"
+                    + (f" (missing: {', '.join(sorted(rem_provided_symbols))})" if rem_provided_symbols else "")
+                )
+                dumps.append(ast1.dump_tree(stmt_list))
+
+            is_same = all(dump == dumps[0] for dump in dumps)
+            print("    ast1 trees identical" if is_same else "    ast1 trees DIFFER")
+            all_same = all_same and is_same
+
+    return 0 if all_same else 1
+
+
+def parse_full(header_path, c_flags):
+    return c_parser.get_index().parse(header_path, args=c_flags)
+
+
+def translate_full(tu, file_path, rem_provided_symbols):
+    stmt_list = []
+    for node in tu.cursor.get_children():
+        stmt_list += c_parser.translate_tu_top_level_stmt(tu, file_path, node, rem_provided_symbols)
+    return stmt_list
+
+
+def pick_provided_symbols(header_path, c_flags, symbol_count):
+    """
+    Returns up to `symbol_count` functions declared in the header itself that can be translated, spread evenly.
+    """
+    tu = c_parser.parse_tu(header_path, c_flags)
+    function_names = []
+    for node in tu.cursor.get_children():
+        if node.kind != c_parser.CursorKind.FUNCTION_DECL or node.spelling in function_names:
+            continue
+        if not c_parser.is_in_main_file(node.location):
+            continue
+        session.current().declaration_cache_map.clear()
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                list(c_parser.translate_tu_top_level_stmt(tu, header_path, node, {node.spelling}))
+        except (panic.PanicException, NotImplementedError, KeyError, AssertionError):
+            continue
+        function_names.append(node.spelling)
+    session.current().declaration_cache_map.clear()
+
+    if len(function_names) <= symbol_count:
+        return set(function_names)
+    step = (len(function_names) - 1) / (symbol_count - 1) if symbol_count > 1 else 0
+    return {function_names[round(len(function_names) - 1 - i * step)] for i in range(symbol_count)}
+
+
+def write_generated_header(dir_path, function_count):
+    """
+    Writes a header in the style of a single-header library: types, declarations, and inline definitions.
+    """
+    lines = [
+        "#pragma once",
+        "#include <stdio.h>",
+        "#include <stdlib.h>",
+        "#include <string.h>",
+        "#include <stdint.h>",
+        "",
+    ]
+    for index in range(function_count):
+        lines += [
+            f"typedef struct Gen{index} {{ int32_t a; double b; char name[16]; struct Gen{index}* next; }} Gen{index};",
+            f"Gen{index}* gen{index}_new(int32_t a, double b);",
+            f"static inline double gen{index}_sum(Gen{index} const* it) {{",
+            f"    double total = 0.0;",
+            f"    for (Gen{index} const* p = it; p != NULL; p = p->next) {{",
+            f"        total += p->a * p->b + (double) strlen(p->name);",
+            f"        if (total > {index + 1}e6) {{ printf(\"overflow in %s\\n\", p->name); abort(); }}",
+            f"    }}",
+            f"    return total;",
+            f"}}",
+            "",
+        ]
+    header_path = os.path.join(dir_path, "generated_single_header_lib.h")
+    with open(header_path, "w") as header_file:
+        header_file.write("\n".join(lines))
+    return header_path
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("paths", nargs="*", help="Headers to translate (default: a generated header).")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Times each header is parsed and translated.")
+    arg_parser.add_argument("--symbols", type=int, default=8, help="Number of functions each header provides.")
+    arg_parser.add_argument("--provides", help="Comma-separated symbols provided by every header.")
+    arg_parser.add_argument("-D", dest="defines", action="append", default=[], help="Defines a macro for libclang.")
+    arg_parser.add_argument(
+        "--generated-size", type=int, default=2000,
+        help="Number of types and functions in the generated header."
+    )
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmarks compile-time evaluation of enum-style 'const' blocks, whose entries each refer to their predecessor with
+`pred!`, against the recursive evaluator `interp` used before values were memoized.
+
+Each generated program has one 'const' block of `--entries N` entries (`E0 = 0; E1 = 1 + pred!; ...`).
+For each size, the program is loaded and typed once (not timed), then every `pred!` is evaluated in order, as
+`cpp_emitter` does: the reference evaluator re-evaluates the whole chain behind each `pred!`, so it is expected to
+scale quadratically with the size of the block (and to need a raised recursion limit), while `interp` evaluates each
+definition once, so it is expected to scale linearly.
+The reference is only run on blocks of up to `--max-reference-entries` entries.
+Also checks that both evaluators produce identical values.
+
+Usage (from the repository root):
+    $ python3 scripts/const_eval.bench.py [--entries N,...] [--max-reference-entries N]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import ast2
+from qcl import interp
+from qcl import panic
+from qcl import platform
+from qcl import qy_parser
+from qcl import session
+from qcl import typer
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+
+    all_same = True
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        for entry_count in args.entries:
+            root_qyp_path = write_generated_package(scratch_dir_path, entry_count)
+            print(f"{entry_count} entries:")
+
+            all_values = []
+            evaluator_list = [("memoized", interp.evaluate_constant)]
+            if entry_count <= args.max_reference_entries:
+                evaluator_list.append(("reference", evaluate_constant_recursively))
+            for evaluator_name, evaluate in evaluator_list:
+                with session.CompilationSession():
+                    pred_refs = load_pred_refs(root_qyp_path)
+                    start_time = time.perf_counter()
+                    values = [evaluate(pred_ref) for pred_ref in pred_refs]
+                    run_time = time.perf_counter() - start_time
+                print(f"    {evaluator_name:>9}: {1000 * run_time:10.2f} ms")
+                all_values.append(values)
+
+            is_same = all(values == all_values[0] for values in all_values)
+            print("    values identical" if is_same else "    values DIFFER")
+            all_same = all_same and is_same
+
+    return 0 if all_same else 1
+
+
+def load_pred_refs(root_qyp_path):
+    """
+    Loads and types the generated package, returning every `pred!` reference in its 'const' block, in order.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+        typer.type_one_qyp_set(qyp_set, typer.TyperEngine.UnionFind)
+    (const_stmt,) = qyp_set.root_qyp.src_map[os.path.join(os.path.dirname(root_qyp_path), "generated.qy")].stmt_list
+    return [
+        node
+        for entry in const_stmt.body
+        for node in ast1.iter_subtree_nodes(entry.initializer)
+        if isinstance(node, ast1.IdRefExpression) and node.name == "pred!"
+    ]
+
+
+def evaluate_constant_recursively(exp):
+    """
+    The recursive evaluator `interp.evaluate_constant` replaced, for reference (unsupported operators are omitted).
+    """
+    if isinstance(exp, (ast1.IntExpression, ast1.FloatExpression, ast1.StringExpression)):
+        return exp.value
+    elif isinstance(exp, ast1.UnaryOpExpression):
+        operand_value = evaluate_constant_recursively(exp.operand)
+        return {
+            ast1.UnaryOperator.LogicalNot: lambda: not operand_value,
+            ast1.UnaryOperator.Minus: lambda: -operand_value,
+            ast1.UnaryOperator.Plus: lambda: +operand_value
+        }[exp.operator]()
+    elif isinstance(exp, ast1.BinaryOpExpression):
+        lt_operand_value = evaluate_constant_recursively(exp.lt_operand_exp)
+        rt_operand_value = evaluate_constant_recursively(exp.rt_operand_exp)
+        return {
+            ast1.BinaryOperator.Mul: lambda: lt_operand_value * rt_operand_value,
+            ast1.BinaryOperator.Add: lambda: lt_operand_value + rt_operand_value,
+            ast1.BinaryOperator.Sub: lambda: lt_operand_value - rt_operand_value,
+            ast1.BinaryOperator.LSh: lambda: lt_operand_value << rt_operand_value,
+            ast1.BinaryOperator.BitwiseOr: lambda: lt_operand_value | rt_operand_value,
+        }[exp.operator]()
+    elif isinstance(exp, ast1.IdRefExpression):
+        return evaluate_constant_recursively(exp.lookup_def_obj().binder.initializer)
+    else:
+        panic.because(panic.ExitCode.CompileTimeEvaluationError, f"Cannot evaluate: {exp.desc}", opt_loc=exp.loc)
+
+
+def write_generated_package(dir_path, entry_count):
+    lines = ["const: Int {", "    E0 = 0;"]
+    for entry_index in range(1, entry_count):
+        lines.append(f"    E{entry_index} = 1 + pred!;")
+    lines.append("};")
+
+    package_dir_path = os.path.join(dir_path, f"generated-{entry_count}")
+    os.makedirs(package_dir_path, exist_ok=True)
+    with open(os.path.join(package_dir_path, "generated.qy"), "w") as source_file:
+        source_file.write("\n".join(lines) + "\n")
+    qyp_path = os.path.join(package_dir_path, "generated.qyp.jsonc")
+    with open(qyp_path, "w") as qyp_file:
+        json.dump({"author": "bench", "help": "generated", "src": ["./generated.qy"], "deps": []}, qyp_file)
+    return qyp_path
+
+
+def parse_args():
+    def int_list(text):
+        return [int(item) for item in text.split(",")]
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--entries", type=int_list, default=[1000, 2000, 4000, 16000],
+        help="Comma-separated numbers of entries in the generated 'const' block."
+    )
+    arg_parser.add_argument(
+        "--max-reference-entries", type=int, default=2000,
+        help="The largest block evaluated with the reference evaluator."
+    )
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    # the reference evaluator recurses once per entry in a chain.
+    sys.setrecursionlimit(100000)
+    sys.exit(main())
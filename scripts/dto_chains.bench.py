@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the typer's deferred constraints (DTOs) on generated programs in which they depend on each other in long
+chains.
+
+Each generated program has `--functions N` functions that each walk down a few levels of nested structs with `.inner`
+field accesses, starting from the result of a function that is only defined at the end of the file, then square the
+innermost `.v` field `--depth D` times in a row: so each field access (`DotIdDTO`) waits on the previous one, and
+each multiplication (`BinaryOpDTO`) on the one before it, until the whole program is modelled and the DTOs are solved.
+(That last function calls every other one, so it is still modelled last when definitions are ordered by their
+dependencies: cf `typer.order_top_level_stmts`.)
+For each size, the program is loaded once per engine (the load is not timed), typed with `typer.type_one_qyp_set`,
+and the best-of-`--runs` typing time is reported: since the substitution engine only retries a DTO once a substitution
+binds one of its arguments' variables, its typing time should scale linearly with `D`.
+Also checks that both engines infer identical types for every node.
+
+Usage (from the repository root):
+    $ python3 scripts/dto_chains.bench.py [--runs N] [--functions N,...] [--depth D,...]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import ast2
+from qcl import platform
+from qcl import qy_parser
+from qcl import session
+from qcl import typer
+
+
+# the number of nested structs walked down by each generated function, before its chain of multiplications.
+nesting_depth = 8
+
+engine_names = {
+    typer.TyperEngine.Substitution: "substitution",
+    typer.TyperEngine.UnionFind: "union-find",
+}
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+
+    all_same = True
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        for function_count in args.functions:
+            for depth in args.depth:
+                root_qyp_path = write_generated_package(scratch_dir_path, function_count, depth)
+                print(f"{function_count} function(s) x depth {depth}:")
+
+                dumps = []
+                for engine, engine_name in engine_names.items():
+                    best_time = None
+                    for _ in range(args.runs):
+                        # each run is a fresh compilation, with nothing left over from previous runs.
+                        with session.CompilationSession():
+                            with contextlib.redirect_stdout(io.StringIO()):
+                                qyp_set = ast2.QypSet.load(
+                                    root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions()
+                                )
+                            start_time = time.perf_counter()
+                            typer.type_one_qyp_set(qyp_set, engine)
+                            run_time = time.perf_counter() - start_time
+                        best_time = run_time if best_time is None else min(best_time, run_time)
+                    print(f"    {engine_name:>12}: {1000 * best_time:10.2f} ms")
+                    dumps.append(dump_types(qyp_set))
+
+                is_same = all(dump == dumps[0] for dump in dumps)
+                print("    inferred types identical" if is_same else "    inferred types DIFFER")
+                all_same = all_same and is_same
+
+    return 0 if all_same else 1
+
+
+def dump_types(qyp_set):
+    """
+    Returns the type of every typed node of the generated source file, with the IDs of anonymous structs omitted.
+    """
+    dump = []
+    for qyp_name, _, source_file in qyp_set.iter_src_paths():
+        if qyp_name != "generated":
+            continue
+        for node in ast1.iter_subtree_nodes(source_file.stmt_list):
+            if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None:
+                dump.append((str(node.loc), re.sub(r"#[0-9a-f]+", "", str(node.wb_type))))
+    return dump
+
+
+def write_generated_package(dir_path, function_count, depth):
+    lines = ["type Node0 = (v: Float);"]
+    for level in range(1, nesting_depth + 1):
+        lines.append(f"type Node{level} = (inner: Node{level - 1}, v: Float);")
+    for fn_index in range(function_count):
+        lines.append(f"fn chain{fn_index} (seed: Node{nesting_depth}) -> Float = do {{")
+        lines.append(f"    val n{nesting_depth} = make(seed);")
+        for level in range(nesting_depth, 0, -1):
+            lines.append(f"    val n{level - 1} = n{level}.inner;")
+        lines.append("    val s0 = n0.v;")
+        for stmt_index in range(1, depth + 1):
+            lines.append(f"    val s{stmt_index} = s{stmt_index - 1} * s{stmt_index - 1};")
+        lines.append(f"    s{depth}")
+        lines.append("};")
+    lines.append(f"fn make (seed: Node{nesting_depth}) -> Node{nesting_depth} = do {{")
+    for fn_index in range(function_count):
+        lines.append(f"    val r{fn_index} = chain{fn_index}(seed);")
+    lines.append("    seed")
+    lines.append("};")
+
+    package_dir_path = os.path.join(dir_path, f"generated-{function_count}-{depth}")
+    os.makedirs(package_dir_path, exist_ok=True)
+    with open(os.path.join(package_dir_path, "generated.qy"), "w") as source_file:
+        source_file.write("\n".join(lines) + "\n")
+    qyp_path = os.path.join(package_dir_path, "generated.qyp.jsonc")
+    with open(qyp_path, "w") as qyp_file:
+        json.dump({"author": "bench", "help": "generated", "src": ["./generated.qy"], "deps": []}, qyp_file)
+    return qyp_path
+
+
+def parse_args():
+    def int_list(text):
+        return [int(item) for item in text.split(",")]
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--runs", type=int, default=3, help="Times each program is typed by each engine.")
+    arg_parser.add_argument(
+        "--functions", type=int_list, default=[10, 40],
+        help="Comma-separated numbers of generated functions."
+    )
+    arg_parser.add_argument(
+        "--depth", type=int_list, default=[40, 160, 640],
+        help="Comma-separated lengths of the chain of multiplications in each generated function."
+    )
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmarks incremental re-parsing against re-parsing from scratch, by replaying a sequence of edits on a large file.
+
+Concatenates K copies of every parseable Qy source file under 'eg/' and 'qsl/' (or the paths given on the command
+line) into one large file, then replays an edit sequence on it: after each edit, the file is re-parsed both with
+`qy_parser.reparse_after_edit` and from scratch with `qy_parser.parse_text_incrementally`, and the results are checked
+to be identical.
+
+The edit sequence is either read from a JSON-lines file (`--replay`, one `qy_parser.TextEdit` per line, e.g.
+`{"start_offset": 10, "end_offset": 12, "new_text": "x"}`, with offsets into the text before that edit), or generated
+from a seed to mimic an editing session:
+renaming identifiers, changing numbers, adding and removing blank lines, and adding and removing statements.
+`--record` saves the replayed sequence for later runs.
+
+Usage (from the repository root):
+    $ python3 scripts/incremental_parse.bench.py [--scale K] [--edits N] [--seed S] [--record FILE | --replay FILE]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import antlr
+from qcl import ast1
+from qcl import panic
+from qcl import qy_parser
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root_paths = args.paths or [os.path.join(repo_dir_path, "eg"), os.path.join(repo_dir_path, "qsl")]
+    file_path = os.path.join(repo_dir_path, "scaled.bench.qy")
+
+    text_pieces = []
+    for source_file_path in sorted(find_qy_files(root_paths)):
+        with open(source_file_path) as f:
+            source_text = f.read()
+        if try_parse(file_path, source_text) is None:
+            print(f"skip (syntax error): {os.path.relpath(source_file_path, repo_dir_path)}")
+            continue
+        text_pieces.append(source_text + "\n")
+    text = "".join(text_pieces * args.scale)
+
+    if args.replay:
+        with open(args.replay) as f:
+            edits = [qy_parser.TextEdit(**json.loads(line)) for line in f if line.strip()]
+    else:
+        edits = None
+    rng = random.Random(args.seed)
+
+    start_time = time.perf_counter()
+    parse = qy_parser.parse_text_incrementally(file_path, text)
+    print(f"file: {len(text)} bytes, {len(parse.tokens)} tokens, {len(parse.stmt_list)} top-level statements")
+    print(f"initial parse: {1000 * (time.perf_counter() - start_time):.2f} ms")
+
+    replayed_edits = []
+    incremental_time = 0.0
+    full_time = 0.0
+    reparsed_stmt_count = 0
+    relexed_token_count = 0
+    all_same = True
+    for edit_index in range(len(edits) if edits is not None else args.edits):
+        edit = edits[edit_index] if edits is not None else make_edit(rng, parse)
+        replayed_edits.append(edit)
+        new_text = edit.apply(parse.text)
+
+        start_time = time.perf_counter()
+        expected_parse = qy_parser.parse_text_incrementally(file_path, new_text)
+        full_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        parse = qy_parser.reparse_after_edit(parse, edit)
+        incremental_time += time.perf_counter() - start_time
+
+        reparsed_stmt_count += parse.reparsed_stmt_count
+        relexed_token_count += parse.relexed_token_count
+        if ast1.dump_tree(parse.stmt_list) != ast1.dump_tree(expected_parse.stmt_list):
+            print(f"MISMATCH after edit #{edit_index}: {edit}")
+            all_same = False
+            break
+
+    if args.record:
+        with open(args.record, "w") as f:
+            for edit in replayed_edits:
+                f.write(json.dumps({"start_offset": edit.start_offset, "end_offset": edit.end_offset, "new_text": edit.new_text}))
+                f.write("\n")
+
+    edit_count = max(1, len(replayed_edits))
+    print(f"edits: {len(replayed_edits)}")
+    print(f"     from scratch: {1000 * full_time / edit_count:10.2f} ms per edit")
+    print(f"      incremental: {1000 * incremental_time / edit_count:10.2f} ms per edit")
+    print(f"re-parsed statements per edit: {reparsed_stmt_count / edit_count:.2f}")
+    print(f"re-lexed tokens per edit:      {relexed_token_count / edit_count:.2f}")
+    print("ast1 trees identical" if all_same else "ast1 trees DIFFER")
+    return 0 if all_same else 1
+
+
+def make_edit(rng: random.Random, parse: qy_parser.IncrementalParse) -> qy_parser.TextEdit:
+    """
+    Returns a random edit that keeps `parse.text` syntactically valid.
+    """
+    kind = rng.random()
+    if kind < 0.4:
+        # renaming an identifier:
+        token = pick_token(rng, parse, antlr.QySourceFileLexer.ID)
+        return qy_parser.TextEdit(token.start, token.stop + 1, f"{token.text}_{rng.randrange(100)}")
+    elif kind < 0.7:
+        # changing a number:
+        token = pick_token(rng, parse, antlr.QySourceFileLexer.LIT_DEC_INT)
+        return qy_parser.TextEdit(token.start, token.stop + 1, str(rng.randrange(1000)))
+    elif kind < 0.85:
+        # adding a blank line or a statement between two top-level statements:
+        stmt_index = rng.randrange(len(parse.stmt_first_tokens))
+        offset = parse.stmt_first_tokens[stmt_index].start
+        new_text = "\n" if rng.random() < 0.5 else f"val bench_{rng.randrange(1000)} = {rng.randrange(1000)};\n"
+        return qy_parser.TextEdit(offset, offset, new_text)
+    else:
+        # removing a top-level statement:
+        stmt_index = rng.randrange(len(parse.stmt_first_tokens) - 1)
+        return qy_parser.TextEdit(
+            parse.stmt_first_tokens[stmt_index].start,
+            parse.stmt_first_tokens[stmt_index + 1].start,
+            ""
+        )
+
+
+def pick_token(rng: random.Random, parse: qy_parser.IncrementalParse, token_type: int):
+    while True:
+        token = parse.tokens[rng.randrange(len(parse.tokens))]
+        if token.type == token_type:
+            return token
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("paths", nargs="*", help="Files or directories to search for '.qy' files.")
+    arg_parser.add_argument("--scale", type=int, default=20, help="Copies of the corpus in the edited file.")
+    arg_parser.add_argument("--edits", type=int, default=30, help="Number of generated edits.")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed for generated edits.")
+    arg_parser.add_argument("--record", metavar="FILE", help="Saves the replayed edits to FILE.")
+    arg_parser.add_argument("--replay", metavar="FILE", help="Replays the edits in FILE instead of generating edits.")
+    return arg_parser.parse_args()
+
+
+def find_qy_files(root_paths):
+    for root_path in root_paths:
+        if os.path.isfile(root_path):
+            yield os.path.abspath(root_path)
+            continue
+        for dir_path, _, file_names in os.walk(root_path):
+            for file_name in file_names:
+                if file_name.endswith(".qy"):
+                    yield os.path.abspath(os.path.join(dir_path, file_name))
+
+
+def try_parse(file_path, text):
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return qy_parser.parse_text_incrementally(file_path, text)
+        except panic.PanicException:
+            return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
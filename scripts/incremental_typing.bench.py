@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmarks retyping a generated program after small edits, with the typed SCC cache (cf `typer_cache`).
+
+Each generated program has `--functions N` functions whose bodies are chains of `--statements K` local bindings, each
+function calling the previous one (as in 'typer_engines.bench.py').
+For each size and engine, the program is typed without the cache, then with an empty cache (which is filled), then
+with the filled cache after each of these edits to its source file:
+- 'unchanged': no edit;
+- 'body edit': one function's body is changed, and a line is inserted above it, moving every later definition;
+- 'interface edit': the return type of one function is changed, so the definitions calling it are modelled again.
+Loads are not timed. The typing time and the number of top-level statements modelled (rather than restored) are
+reported for each run: with the cache, both should be proportional to the edit rather than to the program.
+Also checks that the types inferred with the cache are identical to those inferred without it.
+
+Usage (from the repository root):
+    $ python3 scripts/incremental_typing.bench.py [--functions N,...] [--statements K,...]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import ast2
+from qcl import disk_cache
+from qcl import platform
+from qcl import qy_parser
+from qcl import session
+from qcl import typer
+
+
+engine_names = {
+    typer.TyperEngine.Substitution: "substitution",
+    typer.TyperEngine.UnionFind: "union-find",
+}
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+
+    all_same = True
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        for function_count in args.functions:
+            for statement_count in args.statements:
+                print(f"{function_count} function(s) x {statement_count} statement(s):")
+                for engine, engine_name in engine_names.items():
+                    cache_dir_path = os.path.join(scratch_dir_path, f"cache-{engine_name}")
+                    scc_cache = disk_cache.DiskCache(cache_dir_path, "typed_sccs")
+                    edit_list = [
+                        ("no cache", None, ""),
+                        ("empty cache", scc_cache, ""),
+                        ("unchanged", scc_cache, ""),
+                        ("body edit", scc_cache, "body"),
+                        ("interface edit", scc_cache, "interface"),
+                    ]
+                    print(f"    {engine_name}:")
+                    for edit_name, opt_scc_cache, edit in edit_list:
+                        root_qyp_path = write_generated_package(scratch_dir_path, function_count, statement_count, edit)
+                        run_time, modelled_count, dump = type_once(root_qyp_path, engine, opt_scc_cache)
+                        print(f"        {edit_name:>14}: {1000 * run_time:10.2f} ms, {modelled_count:5} statement(s) modelled")
+                        if opt_scc_cache is not None:
+                            _, _, expected_dump = type_once(root_qyp_path, engine, None)
+                            if dump != expected_dump:
+                                print("            inferred types DIFFER from those inferred without the cache")
+                                all_same = False
+                    shutil.rmtree(cache_dir_path, ignore_errors=True)
+
+    return 0 if all_same else 1
+
+
+def type_once(root_qyp_path, engine, opt_scc_cache):
+    """
+    Loads and types a package set in a fresh compilation session: returns the typing time, the number of modelled
+    top-level statements in the generated source file, and its types.
+    """
+    with session.CompilationSession():
+        with contextlib.redirect_stdout(io.StringIO()):
+            qyp_set = ast2.QypSet.load(root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions())
+        with unittest.mock.patch.object(
+            typer, "model_one_top_level_stmt", wraps=typer.model_one_top_level_stmt
+        ) as model_one_top_level_stmt:
+            start_time = time.perf_counter()
+            typer.type_one_qyp_set(qyp_set, engine, opt_scc_cache)
+            run_time = time.perf_counter() - start_time
+
+    modelled_count = sum(
+        1
+        for call in model_one_top_level_stmt.call_args_list
+        if call.args[1].loc.file_path.endswith("generated.qy")
+    )
+    return run_time, modelled_count, dump_types(qyp_set)
+
+
+def dump_types(qyp_set):
+    """
+    Returns the type of every typed node of the generated source file, with the IDs of anonymous structs omitted.
+    """
+    dump = []
+    for qyp_name, _, source_file in qyp_set.iter_src_paths():
+        if qyp_name != "generated":
+            continue
+        for node in ast1.iter_subtree_nodes(source_file.stmt_list):
+            if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None:
+                dump.append((str(node.loc), re.sub(r"#[0-9a-f]+", "", str(node.wb_type))))
+    return dump
+
+
+def write_generated_package(dir_path, function_count, statement_count, edit):
+    """
+    Writes the generated program, with the given edit (cf module docstring) applied to the middle function.
+    """
+    edited_fn_index = function_count // 2
+    lines = [
+        "type Vec2 = (x: Float, y: Float);",
+        "type Vec2d = (x: Double, y: Double);",
+        "",
+        "fn scale0 (v: Vec2, s: Float) -> Vec2 = do {",
+        "    new Vec2(v.x * s, v.y * s)",
+        "};",
+    ]
+    for fn_index in range(1, function_count + 1):
+        is_edited = fn_index == edited_fn_index
+        if is_edited and edit == "body":
+            lines.append("// edited below")
+        if is_edited and edit == "interface":
+            lines.append(f"fn scale{fn_index} (v: Vec2, s: Float) -> Vec2d = do {{")
+        else:
+            lines.append(f"fn scale{fn_index} (v: Vec2, s: Float) -> Vec2 = do {{")
+        lines.append(f"    val a0 = v.x * s;")
+        lines.append(f"    val b0 = v.y + a0;" if not (is_edited and edit == "body") else f"    val b0 = v.y - a0;")
+        for stmt_index in range(1, statement_count + 1):
+            # the function calling the edited one stops using its result if its interface changed.
+            call_text = f"scale{fn_index - 1}(new Vec2(a{stmt_index - 1}, b{stmt_index - 1}), s)"
+            if fn_index == edited_fn_index + 1 and edit == "interface":
+                lines.append(f"    val d{stmt_index} = {call_text};")
+                lines.append(f"    val w{stmt_index} = new Vec2(a{stmt_index - 1}, b{stmt_index - 1});")
+            else:
+                lines.append(f"    val w{stmt_index} = {call_text};")
+            lines.append(f"    val a{stmt_index} = w{stmt_index}.x - b{stmt_index - 1} * s;")
+            lines.append(f"    val b{stmt_index} = w{stmt_index}.y + a{stmt_index} / 2.0f;")
+        if is_edited and edit == "interface":
+            lines.append(f"    new Vec2d(1.0, 2.0)")
+        else:
+            lines.append(f"    new Vec2(a{statement_count}, b{statement_count})")
+        lines.append("};")
+
+    package_dir_path = os.path.join(dir_path, f"generated-{function_count}-{statement_count}")
+    os.makedirs(package_dir_path, exist_ok=True)
+    with open(os.path.join(package_dir_path, "generated.qy"), "w") as source_file:
+        source_file.write("\n".join(lines) + "\n")
+    qyp_path = os.path.join(package_dir_path, "generated.qyp.jsonc")
+    with open(qyp_path, "w") as qyp_file:
+        json.dump({"author": "bench", "help": "generated", "src": ["./generated.qy"], "deps": []}, qyp_file)
+    return qyp_path
+
+
+def parse_args():
+    def int_list(text):
+        return [int(item) for item in text.split(",")]
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--functions", type=int_list, default=[40, 160],
+        help="Comma-separated numbers of generated functions."
+    )
+    arg_parser.add_argument(
+        "--statements", type=int_list, default=[10, 40],
+        help="Comma-separated numbers of statement groups in each generated function."
+    )
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
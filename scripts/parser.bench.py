@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the Qy parser's modes against each other.
+
+Parses every Qy source file under 'eg/' and 'qsl/' (or the paths given on the command line) once per parse
+mode, reports the best-of-N wall time for each mode, and checks that every mode produces an identical `ast1`
+tree for every file.
+
+Usage (from the repository root):
+    $ python3 scripts/parser.bench.py [--runs N] [--scale K] [path ...]
+
+`--scale K` additionally concatenates K copies of every parseable file into one large scratch file, so that
+the timing is not dominated by per-file overhead.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import panic
+from qcl import qy_parser
+
+
+mode_names = {
+    qy_parser.ParseMode.SllThenLl: "sll-ll",
+    qy_parser.ParseMode.ExactAmbiguityDetection: "exact-ambiguity",
+    qy_parser.ParseMode.Pratt: "pratt",
+}
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root_paths = args.paths or [os.path.join(repo_dir_path, "eg"), os.path.join(repo_dir_path, "qsl")]
+    file_paths = sorted(find_qy_files(root_paths))
+
+    # filtering out files that do not parse in any mode (e.g. examples using retired syntax):
+    parseable_file_paths = []
+    for file_path in file_paths:
+        results = {mode: try_parse(file_path, mode) for mode in mode_names}
+        ok_modes = [mode for mode, result in results.items() if result is not None]
+        if not ok_modes:
+            print(f"skip (syntax error): {os.path.relpath(file_path, repo_dir_path)}")
+            continue
+        if len(ok_modes) != len(results):
+            print(f"MISMATCH: {file_path} only parsed in modes: {', '.join(mode_names[m] for m in ok_modes)}")
+            return 1
+        parseable_file_paths.append(file_path)
+
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        if args.scale > 0 and parseable_file_paths:
+            scaled_file_path = os.path.join(scratch_dir_path, "scaled.qy")
+            with open(scaled_file_path, "w") as scaled_file:
+                for _ in range(args.scale):
+                    for file_path in parseable_file_paths:
+                        with open(file_path) as f:
+                            scaled_file.write(f.read())
+                        scaled_file.write("\n")
+            parseable_file_paths.append(scaled_file_path)
+
+        print(f"files: {len(parseable_file_paths)}, runs: {args.runs}")
+
+        all_same = True
+        timings = {mode: 0.0 for mode in mode_names}
+        for file_path in parseable_file_paths:
+            dumps = {}
+            for mode in mode_names:
+                best_time = float('inf')
+                for _ in range(args.runs):
+                    start_time = time.perf_counter()
+                    stmt_list = qy_parser.parse_one_file_without_caching(file_path, mode)
+                    best_time = min(best_time, time.perf_counter() - start_time)
+                timings[mode] += best_time
+                dumps[mode] = ast1.dump_tree(stmt_list)
+            if len(set(dumps.values())) != 1:
+                print(f"MISMATCH: ast1 trees differ between modes for {file_path}")
+                all_same = False
+
+    for mode, total_time in timings.items():
+        print(f"{mode_names[mode]:>16}: {1000 * total_time:10.2f} ms")
+    print("ast1 trees identical across modes" if all_same else "ast1 trees DIFFER across modes")
+    return 0 if all_same else 1
+
+
+def find_qy_files(root_paths):
+    for root_path in root_paths:
+        if os.path.isfile(root_path):
+            yield os.path.abspath(root_path)
+            continue
+        for dir_path, _, file_names in os.walk(root_path):
+            for file_name in file_names:
+                if file_name.endswith(".qy"):
+                    yield os.path.abspath(os.path.join(dir_path, file_name))
+
+
+def try_parse(file_path, mode):
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            return qy_parser.parse_one_file_without_caching(file_path, mode)
+    except panic.PanicException:
+        return None
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmarks the Qy parser's modes against each other.")
+    arg_parser.add_argument("paths", nargs="*", help="Files or directories to search for '.qy' files.")
+    arg_parser.add_argument("--runs", type=int, default=5, help="Number of timed runs per file and mode.")
+    arg_parser.add_argument("--scale", type=int, default=20, help="Copies of the corpus in the scaled file.")
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Compares the peak memory use of whole-file and streaming (statement-at-a-time) parsing.
+
+Concatenates K copies of every parseable Qy source file under 'eg/' and 'qsl/' (or the paths given on the command
+line) into one large scratch file, then parses it with `qy_parser.parse_one_file_without_caching` and with
+`qy_parser.iter_one_file_without_caching`, keeping all statements alive in both cases (as the typer does).
+Reports the wall time, the peak memory traced by `tracemalloc` while parsing, and the memory retained afterwards,
+and checks that both produce identical `ast1` trees.
+
+Usage (from the repository root):
+    $ python3 scripts/stream_parse.bench.py [--scale K] [--parse-mode MODE] [path ...]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import panic
+from qcl import qy_parser
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root_paths = args.paths or [os.path.join(repo_dir_path, "eg"), os.path.join(repo_dir_path, "qsl")]
+    mode = {mode.name: mode for mode in qy_parser.ParseMode}[args.parse_mode]
+
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        scaled_file_path = os.path.join(scratch_dir_path, "scaled.qy")
+        with open(scaled_file_path, "w") as scaled_file:
+            for file_path in sorted(find_qy_files(root_paths)):
+                if try_parse(file_path, mode) is None:
+                    print(f"skip (syntax error): {os.path.relpath(file_path, repo_dir_path)}")
+                    continue
+                with open(file_path) as f:
+                    text = f.read()
+                for _ in range(args.scale):
+                    scaled_file.write(text)
+                    scaled_file.write("\n")
+
+        # warming up parser caches (e.g. ANTLR's DFA), so they are not counted:
+        try_parse(scaled_file_path, mode)
+        print(f"scaled file: {os.path.getsize(scaled_file_path)} bytes")
+
+        dumps = []
+        for strategy_name, parse in [
+            ("whole-file", lambda: qy_parser.parse_one_file_without_caching(scaled_file_path, mode)),
+            ("streaming", lambda: list(qy_parser.iter_one_file_without_caching(scaled_file_path, mode))),
+        ]:
+            gc.collect()
+            tracemalloc.start()
+            start_bytes, _ = tracemalloc.get_traced_memory()
+            start_time = time.perf_counter()
+            stmt_list = parse()
+            elapsed_time = time.perf_counter() - start_time
+            gc.collect()
+            end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"{strategy_name:>12}: {1000 * elapsed_time:10.2f} ms, "
+                f"peak {(peak_bytes - start_bytes) / 2**20:8.2f} MiB, "
+                f"retained {(end_bytes - start_bytes) / 2**20:8.2f} MiB"
+            )
+            dumps.append(ast1.dump_tree(stmt_list))
+            del stmt_list
+
+    all_same = all(dump == dumps[0] for dump in dumps)
+    print("ast1 trees identical" if all_same else "ast1 trees DIFFER")
+    return 0 if all_same else 1
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--scale", type=int, default=20, help="Copies of each file in the scaled file.")
+    arg_parser.add_argument(
+        "--parse-mode", default=qy_parser.ParseMode.SllThenLl.name,
+        choices=[mode.name for mode in qy_parser.ParseMode]
+    )
+    arg_parser.add_argument("paths", nargs="*", help="Files or directories to search for '.qy' files.")
+    return arg_parser.parse_args()
+
+
+def find_qy_files(root_paths):
+    for root_path in root_paths:
+        if os.path.isfile(root_path):
+            yield os.path.abspath(root_path)
+            continue
+        for dir_path, _, file_names in os.walk(root_path):
+            for file_name in file_names:
+                if file_name.endswith(".qy"):
+                    yield os.path.abspath(os.path.join(dir_path, file_name))
+
+
+def try_parse(file_path, mode):
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            return qy_parser.parse_one_file_without_caching(file_path, mode)
+        except panic.PanicException:
+            return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the typer's engines against each other on generated programs of growing size.
+
+Each generated program has `--functions N` functions whose bodies are chains of `--statements K` local bindings
+(field accesses, arithmetic, calls, and constructions), so that types are only known by inference.
+For each size, the program is loaded once per engine (the load is not timed), typed with `typer.type_one_qyp_set`,
+and the best-of-`--runs` typing time is reported: the substitution engine is expected to scale super-linearly with
+the size of each function and of the program, and the union-find engine linearly.
+Also checks that both engines infer identical types for every node.
+
+Usage (from the repository root):
+    $ python3 scripts/typer_engines.bench.py [--runs N] [--functions N,...] [--statements K,...]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qcl import ast1
+from qcl import ast2
+from qcl import platform
+from qcl import qy_parser
+from qcl import session
+from qcl import typer
+
+
+engine_names = {
+    typer.TyperEngine.Substitution: "substitution",
+    typer.TyperEngine.UnionFind: "union-find",
+}
+
+
+def main():
+    args = parse_args()
+    repo_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ast2.qsl_qyp_dep_path = "$" + os.path.join(repo_dir_path, "qsl", "qsl.qyp.jsonc")
+
+    all_same = True
+    with tempfile.TemporaryDirectory() as scratch_dir_path:
+        for function_count in args.functions:
+            for statement_count in args.statements:
+                root_qyp_path = write_generated_package(scratch_dir_path, function_count, statement_count)
+                print(f"{function_count} function(s) x {statement_count} statement(s):")
+
+                dumps = []
+                for engine, engine_name in engine_names.items():
+                    best_time = None
+                    for _ in range(args.runs):
+                        # each run is a fresh compilation, with nothing left over from previous runs.
+                        with session.CompilationSession():
+                            with contextlib.redirect_stdout(io.StringIO()):
+                                qyp_set = ast2.QypSet.load(
+                                    root_qyp_path, platform.core_linux_amd64, qy_parser.ParseOptions()
+                                )
+                            start_time = time.perf_counter()
+                            typer.type_one_qyp_set(qyp_set, engine)
+                            run_time = time.perf_counter() - start_time
+                        best_time = run_time if best_time is None else min(best_time, run_time)
+                    print(f"    {engine_name:>12}: {1000 * best_time:10.2f} ms")
+                    dumps.append(dump_types(qyp_set))
+
+                is_same = all(dump == dumps[0] for dump in dumps)
+                print("    inferred types identical" if is_same else "    inferred types DIFFER")
+                all_same = all_same and is_same
+
+    return 0 if all_same else 1
+
+
+def dump_types(qyp_set):
+    """
+    Returns the type of every typed node of the generated source file, with the IDs of anonymous structs omitted.
+    """
+    dump = []
+    for qyp_name, _, source_file in qyp_set.iter_src_paths():
+        if qyp_name != "generated":
+            continue
+        for node in ast1.iter_subtree_nodes(source_file.stmt_list):
+            if isinstance(node, ast1.WbTypeMixin) and node.wb_type is not None:
+                dump.append((str(node.loc), re.sub(r"#[0-9a-f]+", "", str(node.wb_type))))
+    return dump
+
+
+def write_generated_package(dir_path, function_count, statement_count):
+    lines = [
+        "type Vec2 = (x: Float, y: Float);",
+        "",
+        "fn scale0 (v: Vec2, s: Float) -> Vec2 = do {",
+        "    new Vec2(v.x * s, v.y * s)",
+        "};",
+    ]
+    for fn_index in range(1, function_count + 1):
+        lines.append(f"fn scale{fn_index} (v: Vec2, s: Float) -> Vec2 = do {{")
+        lines.append(f"    val a0 = v.x * s;")
+        lines.append(f"    val b0 = v.y + a0;")
+        for stmt_index in range(1, statement_count + 1):
+            lines.append(f"    val w{stmt_index} = scale{fn_index - 1}(new Vec2(a{stmt_index - 1}, b{stmt_index - 1}), s);")
+            lines.append(f"    val a{stmt_index} = w{stmt_index}.x - b{stmt_index - 1} * s;")
+            lines.append(f"    val b{stmt_index} = w{stmt_index}.y + a{stmt_index} / 2.0f;")
+        lines.append(f"    new Vec2(a{statement_count}, b{statement_count})")
+        lines.append("};")
+
+    package_dir_path = os.path.join(dir_path, f"generated-{function_count}-{statement_count}")
+    os.makedirs(package_dir_path, exist_ok=True)
+    with open(os.path.join(package_dir_path, "generated.qy"), "w") as source_file:
+        source_file.write("\n".join(lines) + "\n")
+    qyp_path = os.path.join(package_dir_path, "generated.qyp.jsonc")
+    with open(qyp_path, "w") as qyp_file:
+        json.dump({"author": "bench", "help": "generated", "src": ["./generated.qy"], "deps": []}, qyp_file)
+    return qyp_path
+
+
+def parse_args():
+    def int_list(text):
+        return [int(item) for item in text.split(",")]
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--runs", type=int, default=3, help="Times each program is typed by each engine.")
+    arg_parser.add_argument(
+        "--functions", type=int_list, default=[10, 40, 160],
+        help="Comma-separated numbers of generated functions."
+    )
+    arg_parser.add_argument(
+        "--statements", type=int_list, default=[10, 40],
+        help="Comma-separated numbers of statement groups in each generated function."
+    )
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main())